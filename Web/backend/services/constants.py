@@ -1,6 +1,8 @@
 BASE_PATH = "/home/mt23veo3/BabyShark"
 
 TRADE_LOG = f"{BASE_PATH}/trades_log.csv"
+TRADE_ARCHIVE = f"{BASE_PATH}/trade_archive"  # <ngày>.npz do TradeArchive (trade_simulator.py) ghi
+EQUITY_CURVE = f"{BASE_PATH}/equity_curve.bin"  # chuỗi equity của EquityTracker (equity_tracker.py)
 SIGNALS_LOG = f"{BASE_PATH}/signals_log.csv"
 TRADE_STATE = f"{BASE_PATH}/trade_state.json"
 CONFIG = f"{BASE_PATH}/config.json"
@@ -2,6 +2,10 @@ import json
 import csv
 from datetime import datetime
 from collections import defaultdict
+
+import numpy as np
+
+from services.ledger_service import group_sum, load_equity_curve, load_ledger
 from services.constants import TRADE_LOG, SIGNALS_LOG, TRADE_STATE, CONFIG, ALERTS_LOG
 
 TRADE_LOG = "../../trades_log.csv"
@@ -46,6 +50,9 @@ def get_total_equity():
     return {"equity": safe_float(config.get("initial_equity", 0))}
 
 def get_total_pnl():
+    led = load_ledger()
+    if led is not None:
+        return {"total_pnl": float(np.nansum(led["result"]))}
     trades = safe_load_csv(TRADE_LOG)
     pnl = 0.0
     for t in trades:
@@ -53,6 +60,9 @@ def get_total_pnl():
     return {"total_pnl": pnl}
 
 def get_daily_pnl():
+    led = load_ledger()
+    if led is not None:
+        return [{"date": d, "pnl": p} for d, p in group_sum(led["day"], led["result"])]
     trades = safe_load_csv(TRADE_LOG)
     daily = defaultdict(float)
     for t in trades:
@@ -73,6 +83,21 @@ def get_bot_status():
     }
 
 def get_risk_metrics():
+    # Bot ghi sẵn equity/peak/max drawdown (EquityTracker) + sổ lệnh .npz: chỉ đọc, không duyệt lại CSV
+    curve = load_equity_curve()
+    led = load_ledger()
+    if curve is not None and led is not None:
+        pnl = np.nan_to_num(led["result"])
+        total = len(pnl)
+        last = curve[-1]
+        return {
+            "winrate": (int((pnl > 0).sum()) / total * 100) if total else 0,
+            "max_drawdown": float(curve[:, 3].max()),
+            "max_drawdown_pct": float(curve[:, 4].max()),
+            "equity": float(last[1]),
+            "peak": float(last[2]),
+            "trade_count": total
+        }
     trades = safe_load_csv(TRADE_LOG)
     total = len(trades)
     win = sum(1 for t in trades if safe_float(t.get("pnl", 0)) > 0)
@@ -0,0 +1,53 @@
+import glob
+import os
+
+import numpy as np
+
+from services.constants import EQUITY_CURVE, TRADE_ARCHIVE
+
+# Cùng thứ tự cột với equity_tracker.EQUITY_COLUMNS của bot
+EQUITY_COLUMNS = ("ts", "equity", "peak", "max_drawdown", "max_drawdown_pct")
+
+def load_ledger(root=TRADE_ARCHIVE):
+    """
+    Ghép các sổ lệnh dạng cột <YYYY-MM-DD>.npz (trade_ledger.TradeLedger) của bot.
+    Trả {cột: mảng} gồm day/symbol/status/result/fee/time_close; None nếu chưa có archive.
+    """
+    paths = sorted(glob.glob(os.path.join(root, "????-??-??.npz")))
+    if not paths:
+        return None
+    cols = {"day": [], "symbol": [], "status": [], "result": [], "fee": [], "time_close": []}
+    for p in paths:
+        try:
+            with np.load(p, allow_pickle=False) as z:
+                n = len(z["result"])
+                cols["day"].append(np.full(n, os.path.basename(p)[:-len(".npz")], dtype=object))
+                for k in ("result", "fee", "time_close"):
+                    cols[k].append(z[k])
+                for k in ("symbol", "status"):
+                    labels = np.append(z[f"{k}__labels"].astype(object), None)
+                    cols[k].append(labels[z[k]])
+        except Exception:
+            continue
+    if not cols["day"]:
+        return None
+    return {k: np.concatenate(v) for k, v in cols.items()}
+
+def group_sum(keys, values):
+    """[(khóa, tổng)] theo thứ tự khóa tăng dần; NaN (lệnh hủy/chưa có P&L) tính là 0."""
+    keys = np.asarray(keys, dtype=object)
+    keys = np.where(keys == None, "unknown", keys).astype(str)  # noqa: E711
+    uniq, inv = np.unique(keys, return_inverse=True)
+    sums = np.bincount(inv, weights=np.nan_to_num(values), minlength=len(uniq))
+    return [(str(k), float(s)) for k, s in zip(uniq, sums)]
+
+def load_equity_curve(path=EQUITY_CURVE):
+    """Chuỗi equity (n, len(EQUITY_COLUMNS)) float64; None nếu chưa có file."""
+    try:
+        raw = np.fromfile(path, dtype=np.float64)
+    except Exception:
+        return None
+    n = len(raw) // len(EQUITY_COLUMNS)
+    if n == 0:
+        return None
+    return raw[:n * len(EQUITY_COLUMNS)].reshape(n, len(EQUITY_COLUMNS))
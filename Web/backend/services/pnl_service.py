@@ -1,6 +1,10 @@
 import csv
 from collections import defaultdict
+
+import numpy as np
+
 from services.constants import TRADE_LOG
+from services.ledger_service import group_sum, load_ledger
 
 def safe_float(val, default=0.0):
     try:
@@ -25,6 +29,17 @@ def safe_load_csv(path):
     return result
 
 def get_pnl_summary():
+    led = load_ledger()
+    if led is not None:
+        pnl = np.nan_to_num(led["result"])
+        count, win, loss = len(pnl), int((pnl > 0).sum()), int((pnl < 0).sum())
+        return {
+            "total_pnl": float(pnl.sum()),
+            "win_count": win,
+            "loss_count": loss,
+            "trade_count": count,
+            "winrate": (win / count * 100) if count else 0,
+        }
     trades = safe_load_csv(TRADE_LOG)
     total = sum(safe_float(t.get("pnl", 0)) for t in trades)
     win = sum(1 for t in trades if safe_float(t.get("pnl", 0)) > 0)
@@ -39,6 +54,9 @@ def get_pnl_summary():
     }
 
 def get_pnl_by_day():
+    led = load_ledger()
+    if led is not None:
+        return [{"date": d, "pnl": p} for d, p in group_sum(led["day"], led["result"])]
     trades = safe_load_csv(TRADE_LOG)
     by_day = defaultdict(float)
     for t in trades:
@@ -48,6 +66,9 @@ def get_pnl_by_day():
     return [{"date": d, "pnl": by_day[d]} for d in sorted(by_day.keys())]
 
 def get_pnl_by_symbol():
+    led = load_ledger()
+    if led is not None:
+        return [{"symbol": s, "pnl": p} for s, p in group_sum(led["symbol"], led["result"])]
     trades = safe_load_csv(TRADE_LOG)
     by_symbol = defaultdict(float)
     for t in trades:
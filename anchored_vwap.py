@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+VWAP neo (anchored) dùng chung cho indicators.py, indicators_ta.py và stream.
+
+Anchor hỗ trợ:
+- "daily_utc"      : reset mỗi 00:00 UTC
+- "weekly"         : reset thứ Hai 00:00 UTC (giống nến 1w của Binance)
+- "session:HH:MM"  : reset mỗi ngày lúc HH:MM UTC (phiên tùy chỉnh)
+- "rolling:N"      : VWAP của N nến gần nhất
+- "cumulative"     : cộng dồn từ nến đầu khung, không reset (hành vi cũ)
+"""
+from collections import deque
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DAY_MS = 86_400_000
+WEEK_MS = 7 * DAY_MS
+_WEEK_OFFSET_MS = 4 * DAY_MS  # 1970-01-01 là thứ Năm -> lùi 4 ngày về thứ Hai
+
+def vwap_anchor(cfg) -> str:
+    return ((cfg or {}).get("indicators", {}) or {}).get("vwap_anchor", "daily_utc")
+
+def parse_anchor(anchor: Optional[str]) -> Tuple[str, int]:
+    """
+    Trả về (loại, tham số): offset ms với session, N với rolling, 0 với loại còn lại.
+    """
+    if anchor is None:
+        return "daily_utc", 0
+    a = str(anchor).strip().lower()
+    if a in ("daily", "daily_utc", "d1"):
+        return "daily_utc", 0
+    if a in ("weekly", "weekly_utc", "w1"):
+        return "weekly", 0
+    if a in ("cumulative", "none"):
+        return "cumulative", 0
+    kind, _, arg = a.partition(":")
+    if kind == "session":
+        hh, _, mm = arg.partition(":")
+        offset = (int(hh or 0) * 60 + int(mm or 0)) * 60_000
+        if not 0 <= offset < DAY_MS:
+            raise ValueError(f"session anchor ngoài 00:00-23:59: {anchor}")
+        return "session", offset
+    if kind == "rolling":
+        n = int(arg)
+        if n <= 0:
+            raise ValueError(f"rolling anchor cần N > 0: {anchor}")
+        return "rolling", n
+    raise ValueError(f"VWAP anchor không hỗ trợ: {anchor}")
+
+def anchor_key(ts_ms, kind: str, arg: int = 0):
+    """Mã nhóm anchor cho timestamp (ms, scalar hoặc mảng int64)."""
+    if kind == "daily_utc":
+        return ts_ms // DAY_MS
+    if kind == "weekly":
+        return (ts_ms - _WEEK_OFFSET_MS) // WEEK_MS
+    if kind == "session":
+        return (ts_ms - arg) // DAY_MS
+    return ts_ms * 0
+
+def _timestamps_ms(index, ts) -> Optional[np.ndarray]:
+    if ts is not None:
+        if isinstance(ts, (pd.Series, pd.Index)) and pd.api.types.is_datetime64_any_dtype(ts):
+            return (pd.DatetimeIndex(ts).as_unit("ns").asi8 // 1_000_000).astype(np.int64)
+        return np.asarray(ts, dtype=np.int64)
+    if isinstance(index, pd.DatetimeIndex):
+        return (index.as_unit("ns").asi8 // 1_000_000).astype(np.int64)
+    return None
+
+def anchored_vwap(price, volume, ts_ms=None, anchor: str = "daily_utc") -> np.ndarray:
+    """
+    VWAP theo anchor, vector hóa bằng cumsum theo nhóm.
+    Volume NaN tính là 0; nhóm chưa có volume -> trả về giá của nến.
+    """
+    kind, arg = parse_anchor(anchor)
+    p = np.asarray(price, dtype=np.float64)
+    v = np.nan_to_num(np.asarray(volume, dtype=np.float64), nan=0.0)
+    n = len(p)
+    if n == 0:
+        return np.empty(0, dtype=np.float64)
+    pv = p * v
+    cum_pv = np.cumsum(pv)
+    cum_v = np.cumsum(v)
+    if kind == "rolling":
+        start = np.maximum(np.arange(n) - arg, -1)
+    elif kind == "cumulative":
+        start = np.full(n, -1)
+    else:
+        if ts_ms is None:
+            raise ValueError(f"anchor {anchor} cần timestamp")
+        key = anchor_key(np.asarray(ts_ms, dtype=np.int64), kind, arg)
+        first = np.r_[True, key[1:] != key[:-1]]
+        start = np.maximum.accumulate(np.where(first, np.arange(n), 0)) - 1
+    prev_pv = np.where(start >= 0, cum_pv[np.maximum(start, 0)], 0.0)
+    prev_v = np.where(start >= 0, cum_v[np.maximum(start, 0)], 0.0)
+    grp_pv = cum_pv - prev_pv
+    grp_v = cum_v - prev_v
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.where(grp_v > 0, grp_pv / grp_v, p)
+    return out
+
+def vwap_series(price: pd.Series, volume: pd.Series, ts=None, anchor: str = "daily_utc") -> pd.Series:
+    """
+    Bản pandas của anchored_vwap. `ts` là timestamp ms / datetime; bỏ trống thì lấy
+    từ DatetimeIndex của `price`.
+    """
+    kind, _ = parse_anchor(anchor)
+    ts_ms = None
+    if kind not in ("rolling", "cumulative"):
+        ts_ms = _timestamps_ms(price.index, ts)
+        if ts_ms is None:
+            # Không có mốc thời gian -> giữ hành vi cũ
+            anchor = "cumulative"
+    return pd.Series(anchored_vwap(price, volume, ts_ms, anchor), index=price.index)
+
+class VwapAccumulator:
+    """
+    Chế độ tăng dần: giữ tổng (pv, v) của anchor hiện tại, O(1) mỗi nến.
+    update() ghi nến đã đóng; peek() tính cho nến đang chạy mà không ghi.
+    """
+    __slots__ = ("kind", "arg", "key", "sum_pv", "sum_v", "window")
+
+    def __init__(self, anchor: str = "daily_utc"):
+        self.kind, self.arg = parse_anchor(anchor)
+        self.key = None
+        self.sum_pv = 0.0
+        self.sum_v = 0.0
+        self.window = deque(maxlen=self.arg) if self.kind == "rolling" else None
+
+    def _sums(self, ts_ms, pv, v):
+        if self.kind == "rolling":
+            if len(self.window) == self.arg:
+                old_pv, old_v = self.window[0]
+                return self.sum_pv - old_pv + pv, self.sum_v - old_v + v, None
+            return self.sum_pv + pv, self.sum_v + v, None
+        if self.kind == "cumulative":
+            return self.sum_pv + pv, self.sum_v + v, None
+        if ts_ms is None:
+            raise ValueError(f"anchor {self.kind} cần timestamp")
+        key = anchor_key(int(ts_ms), self.kind, self.arg)
+        if key != self.key:
+            return pv, v, key
+        return self.sum_pv + pv, self.sum_v + v, key
+
+    @staticmethod
+    def _value(price, sum_pv, sum_v):
+        return sum_pv / sum_v if sum_v > 0 else price
+
+    def update(self, ts_ms, price, volume) -> float:
+        v = 0.0 if volume != volume else float(volume)
+        pv = float(price) * v
+        self.sum_pv, self.sum_v, key = self._sums(ts_ms, pv, v)
+        if key is not None:
+            self.key = key
+        if self.window is not None:
+            self.window.append((pv, v))
+        return self._value(float(price), self.sum_pv, self.sum_v)
+
+    def peek(self, ts_ms, price, volume) -> float:
+        v = 0.0 if volume != volume else float(volume)
+        sum_pv, sum_v, _ = self._sums(ts_ms, float(price) * v, v)
+        return self._value(float(price), sum_pv, sum_v)
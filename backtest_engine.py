@@ -0,0 +1,540 @@
+# -*- coding: utf-8 -*-
+"""
+Backtest luồng vào lệnh thật của main.run_once (sideway, breakout -> probe -> promote -> full,
+anti-chase, trap, trailing, TP/SL, đảo chiều, timeout probe, cooldown) trên OHLCV lưu sẵn.
+
+- Mọi điều kiện không phụ thuộc trạng thái lệnh (điểm phiếu M5/M15/H1, regime, breakout,
+  anti-chase, sideway...) được tính vector hóa một lần cho cả lịch sử của từng symbol.
+- Vòng lặp theo thời gian chỉ ghé các nến có lệnh mở hoặc có tín hiệu vào lệnh; nhiều symbol
+  dùng chung một số dư như TradeSimulator của main (xử lý theo thứ tự symbol trong config).
+- TP/SL chạm trong nến được xét bằng high/low (thay cho vòng refresh M5), khớp tại mức SL/TP
+  (hoặc giá mở nếu nhảy gap qua mức); cùng nến chạm cả hai thì tính SL trước.
+- Chỉ dùng nến ĐÃ ĐÓNG: H1/M5 ghép as-of theo giờ đóng nến M15 (không nhìn trước).
+
+Kết quả ghi cùng schema trades_sim_log.csv của TradeSimulator.
+
+    python backtest_engine.py --symbols BTC/USDT ETH/USDT --root data/candles --out backtest_trades.csv
+"""
+import argparse
+import csv
+import json
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from candle_store import CandleStore, timeframe_ms
+from indicators import calculate_indicators
+from tight_gate import required_indicators, vote_directions, vote_matrix
+from trade_simulator import TradeSimulator, to_gmt7_str
+from votes import compile_weights
+
+M15_MS = timeframe_ms("15m")
+LEVERAGE = 10
+COOLDOWN_SEC = 15 * 60
+ROI_TARGET = 1.0
+# Trailing của main: ROI (× đòn bẩy) >= TRAIL_ROI thì dời SL về max(entry, giá - TRAIL_BUFFER × entry)
+TRAIL_ROI = 0.03
+TRAIL_BUFFER = 0.002
+_HEAVY_VOTES = ("EMA200", "Supertrend", "Range")
+# Series luồng vào lệnh dùng ngoài phiếu (breakout, anti-chase, sideway, regime)
+TRADE_INDICATORS = {
+    "15m": ("atr", "ma50", "ema200", "rsi", "bollinger_bands_upper", "bollinger_bands_lower"),
+    "1h": ("adx", "ema200", "supertrend", "range_filter"),
+}
+
+class BacktestSimulator(TradeSimulator):
+    """TradeSimulator không ghi file: sự kiện giữ trong RAM, cùng cột với trades_sim_log.csv."""
+    def __init__(self, capital=100.0, leverage=LEVERAGE, fee_bps=4):
+        self.events: List[Dict] = []
+        super().__init__(capital=capital, leverage=leverage, fee_bps=fee_bps, log_path=None,
+                         archive_dir=None, archive_memory=None, equity_path=None)
+
+    def _init_csv(self):
+        pass
+
+    def log_event(self, event_type, trade, extra=None):
+        row = {k: trade.get(k, "") for k in self.csv_fieldnames}
+        row['event_type'] = event_type
+        if extra:
+            row.update(extra)
+        for tcol in ["time_open", "time_close"]:
+            row[tcol + "_human"] = to_gmt7_str(trade.get(tcol))
+        self.events.append(row)
+
+    def write_csv(self, path):
+        write_events(path, self.events, self.csv_fieldnames)
+
+CSV_FIELDS = [
+    "event_type","symbol","direction","stage","entry","close_price","time_open","time_close",
+    "size","result","status","sl","tp","is_probe","fee","pnl_pct","r_value","reason",
+    "time_open_human","time_close_human"
+]
+
+def write_events(path, events: Iterable[Dict], fieldnames=None):
+    """Ghi sự kiện theo đúng cột trades_sim_log.csv."""
+    with open(path, "w", encoding="utf-8", newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames or CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for row in events:
+            writer.writerow(row)
+
+# ---- Tham số lấy từ config giống run_once ----
+def _upper_keys(d):
+    return {(k.upper() if isinstance(k, str) else k): v for k, v in (d or {}).items()}
+
+def _side_codes(score_long: np.ndarray, score_short: np.ndarray, eps: float = 0.1) -> np.ndarray:
+    """decide_side vector hóa: +1 LONG / -1 SHORT / 0 NEUTRAL."""
+    return np.where(score_long - score_short > eps, 1, np.where(score_short - score_long > eps, -1, 0)).astype(np.int8)
+
+def _asof(src_close_ts: np.ndarray, dst_close_ts: np.ndarray) -> np.ndarray:
+    """Chỉ số nến nguồn cuối cùng đã đóng tại giờ đóng của từng nến đích (-1 = chưa có)."""
+    return np.searchsorted(src_close_ts, dst_close_ts, side="right") - 1
+
+def _close_ts(df: pd.DataFrame, tf: str) -> np.ndarray:
+    return df['timestamp'].to_numpy(dtype=np.int64) + timeframe_ms(tf)
+
+def indicator_plan(cfg=None) -> Dict[str, set]:
+    """Chỉ báo cần cho từng khung: phiếu có trọng số (M5 dùng trọng số mặc định) + TRADE_INDICATORS."""
+    wsets = (cfg or {}).get("weights_sets") or {}
+    return {
+        "5m": required_indicators(None),
+        "15m": required_indicators(wsets.get("M15", {}), TRADE_INDICATORS["15m"]),
+        "1h": required_indicators(wsets.get("H1", {}), TRADE_INDICATORS["1h"], weighted_only=True),
+    }
+
+def symbol_features(m15: pd.DataFrame, h1: pd.DataFrame, m5: Optional[pd.DataFrame] = None, cfg=None,
+                    ind_m15=None, ind_h1=None, ind_m5=None) -> Dict[str, np.ndarray]:
+    """
+    Phần chỉ phụ thuộc dữ liệu + chỉ báo + weights_sets (không phụ thuộc regime/trading/engine):
+    OHLCV và chỉ báo M15, điểm phiếu M15/H1, heavy hits, ADX H1 ghép as-of, hướng phiếu M5.
+    Mọi mảng theo từng nến M15, trừ "m5_side" (theo nến M5, tra qua "j5").
+    ind_*: chỉ báo tính sẵn trên cả khung (None = tự tính). m5=None -> bỏ qua xác nhận M5.
+    """
+    cfg = cfg or {}
+    wsets = cfg.get("weights_sets") or {}
+    plan = indicator_plan(cfg)
+    if ind_m15 is None:
+        ind_m15 = calculate_indicators(m15, cfg, timeframe="15m", only=plan["15m"])
+    if ind_h1 is None:
+        ind_h1 = calculate_indicators(h1, cfg, timeframe="1h", only=plan["1h"])
+    if ind_m15 is None or ind_h1 is None:
+        raise ValueError("Không đủ dữ liệu để tính chỉ báo M15/H1")
+
+    w_m15_u, w_h1_u = _upper_keys(wsets.get("M15", {})), _upper_keys(wsets.get("H1", {}))
+    cw_m15, cw_h1 = compile_weights(w_m15_u), compile_weights(w_h1_u)
+
+    # M15: điểm phiếu theo trọng số M15
+    sc15 = cw_m15.scores(*vote_matrix(m15, ind_m15, cw_m15))
+    sl15, ss15 = sc15["score_long"], sc15["score_short"]
+    side15 = _side_codes(sl15, ss15)
+
+    # H1: map đã lọc theo weights_sets.H1 cho điểm, map đầy đủ cho heavy hits
+    h1_dirs = vote_directions(h1, ind_h1)
+    h1_filtered = {k: v for k, v in h1_dirs.items() if k.upper() in w_h1_u}
+    sch1 = cw_h1.scores(*vote_matrix(h1, ind_h1, cw_h1, dirs_by_name=h1_filtered))
+    heavy = np.stack([h1_dirs[k] for k in _HEAVY_VOTES if k in h1_dirs]) if h1_dirs else np.zeros((1, len(h1)), np.int8)
+    hits_long, hits_short = (heavy == 1).sum(axis=0), (heavy == -1).sum(axis=0)
+
+    t15 = _close_ts(m15, "15m")
+    j = _asof(_close_ts(h1, "1h"), t15)
+    jj = np.maximum(j, 0)
+    side_h1 = _side_codes(sch1["score_long"][jj], sch1["score_short"][jj])
+    # check_indicator_input: M15/H1 >= 200 nến (M5 >= 215)
+    valid = (np.arange(len(m15)) >= 199) & (j >= 199)
+
+    if m5 is not None:
+        ind_m5 = ind_m5 if ind_m5 is not None else calculate_indicators(m5, cfg, timeframe="5m", only=plan["5m"])
+        # snapshot_m5_confirmed chấm M5 theo trọng số mặc định
+        cw_def = compile_weights(None)
+        sc5 = cw_def.scores(*vote_matrix(m5, ind_m5, cw_def))
+        m5_side = _side_codes(sc5["score_long"], sc5["score_short"])
+        j5 = _asof(_close_ts(m5, "5m"), t15)
+        valid &= j5 >= 214
+    else:
+        m5_side, j5 = None, None
+
+    f = lambda k: ind_m15[k].to_numpy(dtype=np.float64)
+    return {
+        "ts": (t15 // 1000).astype(np.float64),
+        "open": m15['open'].to_numpy(dtype=np.float64), "high": m15['high'].to_numpy(dtype=np.float64),
+        "low": m15['low'].to_numpy(dtype=np.float64), "close": m15['close'].to_numpy(dtype=np.float64),
+        "volume": m15['volume'].to_numpy(dtype=np.float64),
+        "avg_vol": m15['volume'].rolling(20).mean().to_numpy(dtype=np.float64),
+        "atr": f('atr'), "ma50": f('ma50'), "ema200": f('ema200'), "rsi": f('rsi'),
+        "bb_upper": f('bollinger_bands_upper'), "bb_lower": f('bollinger_bands_lower'),
+        "sl15": sl15, "ss15": ss15, "side15": side15, "side_h1": side_h1,
+        "adx_h1": ind_h1['adx'].to_numpy(dtype=np.float64)[jj],
+        "hhits": np.where(side15 == 1, hits_long[jj], np.where(side15 == -1, hits_short[jj], 0)),
+        "valid": valid, "j5": j5, "m5_side": m5_side,
+    }
+
+# Khóa không theo nến M15 (không cắt khi lấy lát thời gian)
+_NON_BAR_KEYS = ("m5_side",)
+
+def slice_features(F: Dict[str, np.ndarray], lo: int, hi: int) -> Dict[str, np.ndarray]:
+    """Features của các nến M15 [lo, hi) (view, không copy); chỉ báo giữ nguyên giá trị tính trên cả lịch sử."""
+    return {k: (v if k in _NON_BAR_KEYS or v is None else v[lo:hi]) for k, v in F.items()}
+
+def entry_arrays(F: Dict[str, np.ndarray], cfg=None) -> Dict[str, np.ndarray]:
+    """Regime, breakout, anti-chase, xác nhận M5, sideway theo regime/engine của cfg (chỉ phép toán mảng)."""
+    cfg = cfg or {}
+    side15, side_h1, adx_h1, hhits = F["side15"], F["side_h1"], F["adx_h1"], F["hhits"]
+    valid = F["valid"]
+    r = cfg.get("regime", {}) or {}
+    rn, rs, rsw = r.get("normal", {}) or {}, r.get("strong", {}) or {}, r.get("sideway", {}) or {}
+    aligned = (side15 == side_h1) & (side15 != 0)
+    strong = (adx_h1 >= float(rs.get("adx_h1", 32))) & (hhits >= int(rs.get("heavy_hits", 4)))
+    normal = (adx_h1 >= float(rn.get("adx_h1", 28))) & (hhits >= int(rn.get("heavy_hits", 3)))
+    regime = np.where(aligned, np.where(strong, 2, np.where(normal, 1, 0)), 0).astype(np.int8)
+    by_regime = lambda key, d_str, d_norm: np.where(regime == 2, float(rs.get(key, d_str)), float(rn.get(key, d_norm)))
+    snap_bars = by_regime("m5_snapshot_bars", 1, 2).astype(np.int64)
+    body_mult = by_regime("body_atr_mult", 1.2, 1.3)
+    vol_mult = by_regime("vol_ma20_mult", 1.6, 1.8)
+    ema_buf = by_regime("ema_buffer_atr", 0.15, 0.2)
+    anti_mult = by_regime("anti_chase_atr_mult", 1.8, 1.2)
+    direct_flag = np.where(regime == 2, bool(rs.get("direct_full", True)), bool(rn.get("direct_full", False)))
+
+    o, c, vol, avg_vol = F["open"], F["close"], F["volume"], F["avg_vol"]
+    atr, ma50, ema200 = F["atr"], F["ma50"], F["ema200"]
+    sl15, ss15 = F["sl15"], F["ss15"]
+    with np.errstate(invalid="ignore"):
+        trade_dir = np.where(sl15 - ss15 > 0.1, 1, np.where(ss15 - sl15 > 0.1, -1, 1)).astype(np.int8)
+        anti_chase = np.abs(c - ma50) > anti_mult * atr
+        base_ok = (atr > 0) & (avg_vol > 0) & (ema200 > 0) & (vol >= vol_mult * avg_vol)
+        brk_long = base_ok & ((c - o) >= body_mult * atr) & (c >= ema200 + ema_buf * atr)
+        brk_short = base_ok & ((o - c) >= body_mult * atr) & (c <= ema200 - ema_buf * atr)
+        breakout = np.where(trade_dir == 1, brk_long, brk_short)
+
+        # Xác nhận M5 (snapshot_m5_confirmed: >= 1 trong `snap_bars` nến M5 cuối đồng pha hoặc trung lập)
+        if F.get("m5_side") is not None:
+            side5, j5 = F["m5_side"], F["j5"]
+            m5_ok = snap_bars <= 0
+            for k in range(int(snap_bars.max(initial=0))):
+                jk = j5 - k
+                s5 = side5[np.maximum(jk, 0)]
+                hit = (jk >= 0) & ((s5 == side15) | (s5 == 0))
+                m5_ok = m5_ok | ((k < snap_bars) & hit)
+        else:
+            m5_ok = np.ones(len(c), dtype=bool)
+
+        engine = cfg.get("engine", {}) or {}
+        bypass_normal = bool(engine.get("bypass_anti_chase_on_breakout_normal", False))
+        allow_anti = (regime == 2) | ((regime == 1) & bypass_normal)
+        entry = aligned & (regime > 0) & breakout & m5_ok & (~anti_chase | allow_anti)
+        allow_direct = bool(engine.get("direct_full_on_strong_breakout", False))
+        direct_full = allow_direct & (regime == 2) & direct_flag
+
+        sw_cond = adx_h1 < float(rsw.get("adx_h1", 18))
+        quiet = vol < 1.2 * avg_vol
+        sw_long = (c <= F["bb_lower"]) & (F["rsi"] < float(rsw.get("sideway_rsi_long", 40))) & quiet
+        sw_short = (c >= F["bb_upper"]) & (F["rsi"] > float(rsw.get("sideway_rsi_short", 60))) & quiet
+        sideway = np.where(sw_cond, np.where(sw_long, 1, np.where(sw_short, -1, 0)), 0).astype(np.int8)
+
+    return {
+        "ts": F["ts"], "open": o, "high": F["high"], "low": F["low"], "close": c, "volume": vol, "avg_vol": avg_vol,
+        "atr": atr, "ma50": ma50, "side15": side15, "trade_dir": trade_dir, "anti_mult": anti_mult,
+        "regime": regime, "entry": entry & valid, "direct_full": direct_full, "sideway": np.where(valid, sideway, 0),
+        "m5_ok": m5_ok, "valid": valid, "candidate": valid & (entry | (sideway != 0)),
+    }
+
+def prepare_symbol(m15: pd.DataFrame, h1: pd.DataFrame, m5: Optional[pd.DataFrame] = None, cfg=None,
+                   ind_m15=None, ind_h1=None, ind_m5=None) -> Dict[str, np.ndarray]:
+    """
+    Mảng theo từng nến M15 cho mọi điều kiện không phụ thuộc trạng thái lệnh
+    (= entry_arrays(symbol_features(...))).
+    """
+    return entry_arrays(symbol_features(m15, h1, m5, cfg, ind_m15, ind_h1, ind_m5), cfg)
+
+def engine_params(cfg=None) -> Dict[str, float]:
+    """Tham số vào lệnh/quản lý lệnh đọc từ config (trading, tight_mode, risk, signal_flow, regime.sideway)."""
+    cfg = cfg or {}
+    trading = cfg.get("trading", {}) or {}
+    tight = cfg.get("tight_mode", {}) or {}
+    sw = (cfg.get("regime", {}) or {}).get("sideway", {}) or {}
+    return {
+        "probe_pct": float(trading.get("probe_pct", 0.1)),
+        "full_pct": float(trading.get("full_pct", 0.5)),
+        "min_notional": float((cfg.get("risk", {}) or {}).get("min_notional", 5.0)),
+        "promote_pullback_atr": float(cfg.get("promote_pullback_atr", 0.5)),
+        "probe_timeout_min": int((cfg.get("signal_flow", {}) or {}).get("probe_timeout_min", 30)),
+        "sl_mult_probe": float(trading.get("sl_atr_mult_probe", tight.get("sl_atr_mult", 1.0))),
+        "sl_mult_full": float(trading.get("sl_atr_mult_full", tight.get("sl_atr_mult", 1.2))),
+        "plan_sl_mult": float(tight.get("sl_atr_mult", 1.2)),
+        "sw_sl": sw.get("sl_atr_mult", 0.9), "sw_tp": sw.get("tp_atr_mult", 0.8),
+        "sw_pct": sw.get("max_pos_size_pct", 0.08),
+    }
+
+class BacktestEngine:
+    """
+    Phát lại run_once trên mảng chuẩn bị sẵn (prepare_symbol) của nhiều symbol.
+    Trạng thái live (LAST_TRADE, LAST_CLOSE_TIME) được giữ theo symbol trong engine.
+    """
+    def __init__(self, cfg=None, capital=100.0, leverage=LEVERAGE, fee_bps=4):
+        self.cfg = cfg or {}
+        self.sim = BacktestSimulator(capital=capital, leverage=leverage, fee_bps=fee_bps)
+        for k, v in engine_params(self.cfg).items():
+            setattr(self, k, v)
+        self.trail_roi, self.trail_buffer = TRAIL_ROI, TRAIL_BUFFER
+        self.open: Dict[str, List[Dict]] = {}
+        self.n_open = 0
+        self.last_trade: Dict[str, Dict] = {}
+        self.last_close: Dict[str, float] = {}
+        self.stats = {"bars_visited": 0, "trailing_updates": 0}
+
+    # ---- Tiện ích giống main ----
+    @staticmethod
+    def _initial_sl(entry, direction, atr_val, mult):
+        if entry is None or atr_val is None or mult is None or mult <= 0:
+            return None
+        return max(0.0, entry - mult * atr_val) if direction == "LONG" else entry + mult * atr_val
+
+    def _trailing(self, trade, price_now):
+        entry, direction = trade.get("entry"), trade.get("direction")
+        if entry is None or direction not in ("LONG", "SHORT"):
+            return
+        raw_roi = ((price_now - entry) / entry) if direction == "LONG" else ((entry - price_now) / entry)
+        if raw_roi * (self.sim.leverage or 1) >= self.trail_roi:
+            old_sl = trade.get("sl")
+            if direction == "LONG":
+                new_sl = max(old_sl if old_sl is not None else -1e20, price_now - self.trail_buffer * entry, entry)
+            else:
+                new_sl = min(old_sl if old_sl is not None else 1e20, price_now + self.trail_buffer * entry, entry)
+            if old_sl is None or abs(new_sl - (old_sl or 0)) > 1e-9:
+                trade["sl"] = round(new_sl, 6)
+                self.stats["trailing_updates"] += 1
+
+    def _close(self, symbol, trade, price, status, now, reason, on_closed=True):
+        self.sim.close_trade(trade, price, status, now, reason=reason)
+        opens = self.open.get(symbol, [])
+        if trade in opens:
+            opens.remove(trade)
+            self.n_open -= 1
+        if on_closed:
+            self.last_trade[symbol] = {"direction": trade.get("direction"), "entry": float(trade.get("entry") or 0)}
+        if on_closed or status == "TIMEOUT":
+            self.last_close[symbol] = now
+
+    def _open(self, symbol, direction, entry, sl, tp, size, is_probe, now, r_value, reason):
+        trade = self.sim.open_trade(symbol, direction, entry=entry, sl=sl, tp=tp, size_quote=size,
+                                    is_probe=is_probe, now_ts=now, r_value=r_value, reason=reason)
+        self.open.setdefault(symbol, []).append(trade)
+        self.n_open += 1
+        return trade
+
+    def _intrabar(self, symbol, A, i, now):
+        """TP/SL chạm trong nến theo high/low (thay vòng refresh M5 của live)."""
+        o, h, l = A["open"][i], A["high"][i], A["low"][i]
+        for t in list(self.open.get(symbol, [])):
+            sl, tp = t.get("sl"), t.get("tp")
+            if t["direction"] == "LONG":
+                if sl is not None and l <= sl:
+                    self._close(symbol, t, min(sl, o), "SL", now, "stop_loss")
+                elif tp is not None and h >= tp:
+                    self._close(symbol, t, max(tp, o), "TP", now, "take_profit")
+            else:
+                if sl is not None and h >= sl:
+                    self._close(symbol, t, max(sl, o), "SL", now, "stop_loss")
+                elif tp is not None and l <= tp:
+                    self._close(symbol, t, min(tp, o), "TP", now, "take_profit")
+
+    def _stage(self, symbol, stage):
+        found = None
+        for t in self.open.get(symbol, []):
+            if t["stage"] == stage:
+                found = t
+        return found
+
+    def step(self, symbol, A, i):
+        """Một lần run_once cho `symbol` tại giờ đóng nến M15 thứ i."""
+        self.stats["bars_visited"] += 1
+        now = A["ts"][i]
+        if self.open.get(symbol):
+            self._intrabar(symbol, A, i, now)
+        if not A["valid"][i]:
+            return
+        if symbol in self.last_close and now - self.last_close[symbol] < COOLDOWN_SEC:
+            return
+        price = A["close"][i]
+        atr_val = A["atr"][i]
+        ma50 = A["ma50"][i]
+        side15 = int(A["side15"][i])
+        sim = self.sim
+
+        probe = self._stage(symbol, "probe")
+        if probe is not None and (now - probe.get("time_open", now)) / 60.0 >= self.probe_timeout_min:
+            self._close(symbol, probe, price, "TIMEOUT", now, "probe_timeout", on_closed=False)
+
+        trade_dir = "LONG" if A["trade_dir"][i] == 1 else "SHORT"
+
+        sw = int(A["sideway"][i])
+        if sw:
+            size = max(sim.balance * self.sw_pct, 0)
+            if size >= self.min_notional:
+                d = "LONG" if sw == 1 else "SHORT"
+                if d == "LONG":
+                    sl, tp = price - self.sw_sl * atr_val, price + self.sw_tp * atr_val
+                else:
+                    sl, tp = price + self.sw_sl * atr_val, price - self.sw_tp * atr_val
+                t = self._open(symbol, d, price, round(sl, 5), round(tp, 5), size, True, now, None, "sideway_entry")
+                t["sideway"] = True
+                return
+
+        if A["entry"][i]:
+            last = self.last_trade.get(symbol)
+            blocked = (last is not None and last.get("direction") and last["direction"] != trade_dir
+                       and abs(price - last["entry"]) < (atr_val or 0) * 0.7)
+            if not blocked:
+                probe, full = self._stage(symbol, "probe"), self._stage(symbol, "full")
+                tp = price * (1 + ROI_TARGET / LEVERAGE) if trade_dir == "LONG" else price * (1 - ROI_TARGET / LEVERAGE)
+                if A["direct_full"][i] and not full and not probe:
+                    size = max(sim.balance * self.full_pct, 0)
+                    if size >= self.min_notional:
+                        sl = self._initial_sl(price, trade_dir, atr_val, self.sl_mult_full)
+                        self._open(symbol, trade_dir, price, sl, tp, size, False, now, None,
+                                   f"full_direct_breakout_{trade_dir.lower()}")
+                elif not A["direct_full"][i] and not probe and not full:
+                    size = max(sim.balance * self.probe_pct, 0)
+                    if size >= self.min_notional:
+                        sl = self._initial_sl(price, trade_dir, atr_val, self.sl_mult_probe)
+                        r_value = round(self.plan_sl_mult * atr_val, 6)
+                        self._open(symbol, trade_dir, price, sl, tp, size, True, now, r_value,
+                                   f"probe_breakout_{trade_dir.lower()}")
+
+        probe, full = self._stage(symbol, "probe"), self._stage(symbol, "full")
+        if probe is not None:
+            pullback_ok = abs(price - float(probe["entry"])) <= self.promote_pullback_atr * atr_val
+            candle_dir = "LONG" if price > A["open"][i] else "SHORT"
+            avg_vol = A["avg_vol"][i]
+            big_trap = (candle_dir != probe["direction"]) and (A["volume"][i] > 1.8 * avg_vol if avg_vol else False)
+            anti_now = abs(price - ma50) > A["anti_mult"][i] * atr_val if atr_val else False
+            if pullback_ok and not big_trap and not anti_now:
+                if full is None:
+                    size = max(sim.balance * self.full_pct, 0)
+                    if size >= self.min_notional:
+                        sim.promote_trade(probe, size, price, now_ts=now)
+                        new_sl = self._initial_sl(price, probe["direction"], atr_val, self.sl_mult_full)
+                        old_sl = probe.get("sl")
+                        if old_sl is None:
+                            probe["sl"] = new_sl
+                        elif new_sl is not None:
+                            probe["sl"] = max(old_sl, new_sl) if probe["direction"] == "LONG" else min(old_sl, new_sl)
+            elif big_trap:
+                self._close(symbol, probe, price, "TRAP", now, "trap_reversal", on_closed=False)
+
+        for t in list(self.open.get(symbol, [])):
+            tp_sim, sl_sim = t.get("tp"), t.get("sl")  # như run_once: mức trước khi dời trailing
+            self._trailing(t, price)
+            d = t["direction"]
+            if tp_sim is not None and ((d == "LONG" and price >= tp_sim) or (d == "SHORT" and price <= tp_sim)):
+                self._close(symbol, t, price, "TP", now, "take_profit")
+            elif sl_sim is not None and ((d == "LONG" and price <= sl_sim) or (d == "SHORT" and price >= sl_sim)):
+                self._close(symbol, t, price, "SL", now, "stop_loss")
+            elif side15 != 0 and (side15 == 1) != (d == "LONG"):
+                self._close(symbol, t, price, "REVERSE", now, "reverse_signal")
+
+    def run(self, arrays: Dict[str, Dict[str, np.ndarray]]) -> "BacktestResult":
+        """arrays: {symbol: prepare_symbol(...)}; symbol xử lý theo thứ tự dict (như config.symbols)."""
+        symbols = list(arrays)
+        if not symbols:
+            return BacktestResult(self.sim, self.open)
+        timeline = np.unique(np.concatenate([A["ts"] for A in arrays.values()]))
+        # Chỉ số nến của từng symbol trên trục thời gian chung (-1 = không có nến)
+        bar_at, cand = {}, {}
+        any_cand = np.zeros(len(timeline), dtype=bool)
+        for s, A in arrays.items():
+            pos = np.minimum(np.searchsorted(A["ts"], timeline), len(A["ts"]) - 1)
+            hit = A["ts"][pos] == timeline
+            bar_at[s] = np.where(hit, pos, -1).tolist()
+            cand[s] = A["candidate"].tolist()
+            any_cand |= hit & A["candidate"][pos]
+        for k in range(len(timeline)):
+            if not any_cand[k] and not self.n_open:
+                continue
+            for s in symbols:
+                i = bar_at[s][k]
+                if i >= 0 and (cand[s][i] or self.open.get(s)):
+                    self.step(s, arrays[s], i)
+        return BacktestResult(self.sim, self.open)
+
+    def close_all(self, arrays: Dict[str, Dict[str, np.ndarray]], status="END", reason="end_of_data"):
+        """Đóng mọi lệnh còn mở tại giá đóng nến cuối của symbol (chốt sổ cuối lát/cửa sổ)."""
+        for s, A in arrays.items():
+            for t in list(self.open.get(s, [])):
+                self._close(s, t, float(A["close"][-1]), status, A["ts"][-1], reason, on_closed=False)
+        return BacktestResult(self.sim, self.open)
+
+class BacktestResult:
+    def __init__(self, sim: BacktestSimulator, open_trades: Dict[str, List[Dict]]):
+        self.events = sim.events
+        self.trades = sim.trades
+        self.balance = sim.balance
+        self.initial_capital = sim.initial_capital
+        self.open_trades = [t for ts in open_trades.values() for t in ts]
+
+    def write_csv(self, path):
+        write_events(path, self.events, CSV_FIELDS)
+
+    def summary(self) -> Dict[str, float]:
+        return summarize(self.trades, self.initial_capital)
+
+def summarize(trades: Iterable[Dict], capital: float = 100.0) -> Dict[str, float]:
+    """Chỉ số tổng hợp trên các lệnh đã đóng (theo thứ tự giờ đóng)."""
+    closed = sorted((t for t in trades if t.get("time_close") and t.get("result") is not None),
+                    key=lambda t: float(t["time_close"]))
+    return summarize_pnl(np.array([float(t["result"]) for t in closed], dtype=np.float64),
+                         float(sum(float(t.get("fee") or 0) for t in closed)), capital)
+
+def summarize_pnl(pnl: np.ndarray, fees: float = 0.0, capital: float = 100.0) -> Dict[str, float]:
+    """summarize trên mảng lãi/lỗ ròng đã xếp theo giờ đóng lệnh."""
+    equity = capital + np.cumsum(pnl)
+    peak = np.maximum.accumulate(np.r_[capital, equity])[1:] if len(pnl) else np.array([])
+    max_dd = float(((peak - equity) / peak).max()) if len(pnl) else 0.0
+    wins, losses = pnl[pnl > 0], pnl[pnl < 0]
+    return {
+        "trades": int(len(pnl)),
+        "wins": int(len(wins)),
+        "losses": int(len(losses)),
+        "win_rate": float(len(wins) / len(pnl)) if len(pnl) else 0.0,
+        "pnl": float(pnl.sum()),
+        "fees": float(fees),
+        "profit_factor": float(wins.sum() / -losses.sum()) if len(losses) and losses.sum() else float("inf") if len(wins) else 0.0,
+        "max_drawdown_pct": max_dd * 100.0,
+        "final_equity": float(equity[-1]) if len(pnl) else float(capital),
+    }
+
+def load_history(symbols, root="data/candles", timeframes=("5m", "15m", "1h")) -> Dict[str, Dict[str, pd.DataFrame]]:
+    store = CandleStore(root=root, memory_rows=10 ** 9)
+    return {s: {tf: store.load(s, tf) for tf in timeframes} for s in symbols}
+
+def run_backtest(history: Dict[str, Dict[str, pd.DataFrame]], cfg=None, capital=100.0, fee_bps=4) -> BacktestResult:
+    """history: {symbol: {"15m": df, "1h": df, "5m": df|None}} (cột timestamp ms + OHLCV)."""
+    arrays = {}
+    for s, frames in history.items():
+        m15, h1 = frames.get("15m"), frames.get("1h")
+        if m15 is None or h1 is None or len(m15) < 200 or len(h1) < 200:
+            print(f"[BACKTEST] {s}: thiếu dữ liệu M15/H1, bỏ qua")
+            continue
+        m5 = frames.get("5m")
+        arrays[s] = prepare_symbol(m15, h1, m5 if m5 is not None and len(m5) >= 215 else None, cfg)
+    return BacktestEngine(cfg, capital=capital, fee_bps=fee_bps).run(arrays)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default="config.json")
+    ap.add_argument("--symbols", nargs="*", help="mặc định: config.symbols")
+    ap.add_argument("--root", default="data/candles", help="thư mục CandleStore")
+    ap.add_argument("--capital", type=float, default=100.0)
+    ap.add_argument("--out", default="backtest_trades.csv")
+    args = ap.parse_args()
+    cfg = json.load(open(args.config, encoding="utf-8"))
+    symbols = args.symbols or cfg.get("symbols", [])
+    t0 = time.perf_counter()
+    history = load_history(symbols, args.root)
+    res = run_backtest(history, cfg, capital=args.capital)
+    res.write_csv(args.out)
+    print(f"[BACKTEST] {len(symbols)} symbol | {time.perf_counter() - t0:.1f}s | {res.summary()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Backtest song song cho lưới (symbol × profile cấu hình) trên process pool.
+
+- OHLCV và chỉ báo của mỗi symbol chỉ tính MỘT lần cho mỗi nhóm tham số chỉ báo, lưu thành
+  file .npy trong thư mục làm việc; worker mở bằng np.load(mmap_mode="r") nên dữ liệu không bị
+  pickle theo từng job và các worker dùng chung page cache của hệ điều hành.
+- Mỗi job (symbol, profile) chạy BacktestEngine với vốn riêng và ghi checkpoint
+  jobs/<id>.json khi xong; chạy lại cùng thư mục sẽ bỏ qua job đã có checkpoint.
+  Id job gồm cấu hình + dấu vân tay dữ liệu, nên đổi config/nến sẽ chạy lại đúng phần đó.
+- Kết quả gộp: trades_<profile>.csv (đúng cột trades_sim_log.csv) + summary.csv.
+
+    python backtest_parallel.py --profiles base fast_m15 --symbols BTC/USDT ETH/USDT --work bt_work -j 8
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from backtest_engine import CSV_FIELDS, BacktestEngine, indicator_plan, load_history, prepare_symbol, summarize, write_events
+from candle_store import COLUMNS
+from config import apply_profile
+from indicator_cache import params_hash
+from indicators import calculate_indicators
+
+TIMEFRAMES = ("5m", "15m", "1h")
+# Số nến tối thiểu như check_indicator_input của run_once
+MIN_BARS = {"5m": 215, "15m": 200, "1h": 200}
+
+def _slug(symbol: str) -> str:
+    return symbol.replace('/', '').replace(':', '_')
+
+def _digest(obj) -> str:
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+
+def _write_json(path, obj):
+    """Ghi file tạm rồi os.replace: checkpoint không bao giờ bị ghi dở."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+class ArrayStore:
+    """
+    Mảng OHLCV/chỉ báo dạng .npy: <root>/<symbol>/<tf>/ohlcv/<cột>.npy và <root>/<symbol>/<tf>/<nhóm>/<key>.npy.
+    meta.json được ghi sau cùng, đánh dấu bộ mảng đã đầy đủ.
+    """
+    def __init__(self, root: str):
+        self.root = root
+
+    def _dir(self, symbol, tf, group):
+        return os.path.join(self.root, _slug(symbol), tf, group)
+
+    def _save_arrays(self, d, arrays: Dict[str, np.ndarray], meta: Dict):
+        os.makedirs(d, exist_ok=True)
+        for k, arr in arrays.items():
+            tmp = os.path.join(d, f"{k}.tmp.npy")
+            np.save(tmp, np.ascontiguousarray(arr))
+            os.replace(tmp, os.path.join(d, f"{k}.npy"))
+        _write_json(os.path.join(d, "meta.json"), meta)
+
+    def _meta(self, d) -> Optional[Dict]:
+        try:
+            with open(os.path.join(d, "meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def fingerprint(self, symbol) -> Optional[str]:
+        meta = self._meta(os.path.join(self.root, _slug(symbol)))
+        return meta.get("fingerprint") if meta else None
+
+    def save_frames(self, symbol, frames: Dict[str, pd.DataFrame], fingerprint: str):
+        """Ghi lại toàn bộ symbol (xóa chỉ báo cũ) khi dữ liệu nến đổi."""
+        shutil.rmtree(os.path.join(self.root, _slug(symbol)), ignore_errors=True)
+        for tf, df in frames.items():
+            if df is not None and len(df):
+                self._save_arrays(self._dir(symbol, tf, "ohlcv"), {c: df[c].to_numpy() for c in COLUMNS}, {"rows": len(df)})
+        _write_json(os.path.join(self.root, _slug(symbol), "meta.json"), {"fingerprint": fingerprint})
+
+    def load_frame(self, symbol, tf) -> Optional[pd.DataFrame]:
+        d = self._dir(symbol, tf, "ohlcv")
+        if self._meta(d) is None:
+            return None
+        return pd.DataFrame({c: np.load(os.path.join(d, f"{c}.npy"), mmap_mode="r") for c in COLUMNS})
+
+    def indicator_keys(self, symbol, tf, group) -> Optional[set]:
+        meta = self._meta(self._dir(symbol, tf, group))
+        return None if meta is None else set(meta["series"]) | set(meta["values"])
+
+    def save_indicators(self, symbol, tf, group, ind: Optional[Dict]):
+        series = {k: v.to_numpy() for k, v in (ind or {}).items() if hasattr(v, "to_numpy")}
+        values = {k: v for k, v in (ind or {}).items() if k not in series}
+        self._save_arrays(self._dir(symbol, tf, group), series,
+                          {"series": sorted(series), "values": values, "missing": ind is None})
+
+    def load_indicators(self, symbol, tf, group) -> Optional[Dict]:
+        d = self._dir(symbol, tf, group)
+        meta = self._meta(d)
+        if meta is None or meta.get("missing"):
+            return None
+        out = dict(meta["values"])
+        for k in meta["series"]:
+            out[k] = pd.Series(np.load(os.path.join(d, f"{k}.npy"), mmap_mode="r"), copy=False)
+        return out
+
+def _fingerprint(frames: Dict[str, pd.DataFrame]) -> str:
+    parts = {}
+    for tf, df in frames.items():
+        if df is not None and len(df):
+            parts[tf] = [len(df), int(df['timestamp'].iloc[0]), int(df['timestamp'].iloc[-1]), float(df['close'].sum())]
+    return _digest(parts)
+
+def _indicator_group(cfg, tf) -> str:
+    return params_hash(cfg, tf)
+
+# ---- Hàm chạy trong worker (cấp module để pickle được) ----
+def _compute_indicators(store_root, symbol, tf, group, cfg, only):
+    store = ArrayStore(store_root)
+    df = store.load_frame(symbol, tf)
+    ind = calculate_indicators(df, cfg, timeframe=tf, only=only) if df is not None else None
+    store.save_indicators(symbol, tf, group, ind)
+    return symbol, tf
+
+def _run_job(store_root, job: Dict, cfg, capital, fee_bps):
+    store = ArrayStore(store_root)
+    symbol = job["symbol"]
+    frames = {tf: store.load_frame(symbol, tf) for tf in TIMEFRAMES}
+    payload = {**job, "events": [], "summary": summarize([], capital), "open_trades": 0, "error": None}
+    if any(frames[tf] is None or len(frames[tf]) < MIN_BARS[tf] for tf in ("15m", "1h")):
+        payload["error"] = "thiếu dữ liệu M15/H1"
+    else:
+        ind = {tf: store.load_indicators(symbol, tf, job["groups"][tf]) for tf in TIMEFRAMES}
+        m5 = frames["5m"] if frames["5m"] is not None and len(frames["5m"]) >= MIN_BARS["5m"] else None
+        try:
+            arrays = prepare_symbol(frames["15m"], frames["1h"], m5, cfg, ind_m15=ind["15m"], ind_h1=ind["1h"],
+                                    ind_m5=ind["5m"] if m5 is not None else None)
+            res = BacktestEngine(cfg, capital=capital, fee_bps=fee_bps).run({symbol: arrays})
+            payload.update(events=res.events, summary=res.summary(), open_trades=len(res.open_trades))
+        except ValueError as e:
+            payload["error"] = str(e)
+    _write_json(job["checkpoint"], payload)
+    return payload
+
+class SweepResult:
+    def __init__(self, payloads: List[Dict], capital: float):
+        self.payloads = payloads
+        self.capital = capital
+
+    def profiles(self) -> List[str]:
+        return list(dict.fromkeys(p["profile"] for p in self.payloads))
+
+    def events(self, profile: str) -> List[Dict]:
+        """Sự kiện của mọi symbol cho một profile (theo thứ tự symbol, trong mỗi symbol theo thời gian)."""
+        return [e for p in self.payloads if p["profile"] == profile for e in p["events"]]
+
+    def summary(self) -> pd.DataFrame:
+        rows = [{"profile": p["profile"], "symbol": p["symbol"], **p["summary"], "open_trades": p["open_trades"],
+                 "error": p["error"] or ""} for p in self.payloads]
+        for prof in self.profiles():
+            jobs = [p for p in self.payloads if p["profile"] == prof and not p["error"]]
+            closed = [e for p in jobs for e in p["events"] if e["event_type"] == "close"]
+            # Mỗi job có vốn riêng -> danh mục gộp có vốn = capital × số job
+            rows.append({"profile": prof, "symbol": "ALL", **summarize(closed, self.capital * max(1, len(jobs))),
+                         "open_trades": sum(p["open_trades"] for p in jobs), "error": ""})
+        return pd.DataFrame(rows)
+
+    def write(self, out_dir: str):
+        os.makedirs(out_dir, exist_ok=True)
+        for prof in self.profiles():
+            write_events(os.path.join(out_dir, f"trades_{prof}.csv"), self.events(prof), CSV_FIELDS)
+        self.summary().to_csv(os.path.join(out_dir, "summary.csv"), index=False)
+
+def profile_configs(cfg: Dict, names: Iterable[str]) -> Dict[str, Dict]:
+    """{tên: config đã áp profile}; "base" = config gốc không overlay."""
+    out = {}
+    for name in names:
+        c = copy.deepcopy(cfg)
+        if name != "base":
+            if name not in (cfg.get("profiles") or {}):
+                raise KeyError(f"Không có profile {name} trong config")
+            apply_profile(c, name)
+        c.pop("profiles", None)
+        out[name] = c
+    return out
+
+def run_sweep(symbols: List[str], profiles: Dict[str, Dict], work_dir: str = "bt_work",
+              history: Optional[Dict[str, Dict[str, pd.DataFrame]]] = None, root: str = "data/candles",
+              processes: Optional[int] = None, capital: float = 100.0, fee_bps: float = 4,
+              resume: bool = True) -> SweepResult:
+    """
+    profiles: {tên: config}. history: {symbol: {tf: df}} (None = đọc CandleStore `root`).
+    processes=0 chạy tuần tự trong tiến trình hiện tại.
+    """
+    store_root = os.path.join(work_dir, "arrays")
+    store = ArrayStore(store_root)
+    history = history if history is not None else load_history(symbols, root, TIMEFRAMES)
+    fps = {}
+    for s in symbols:
+        frames = {tf: (history.get(s) or {}).get(tf) for tf in TIMEFRAMES}
+        fps[s] = _fingerprint(frames)
+        if store.fingerprint(s) != fps[s]:
+            store.save_frames(s, frames, fps[s])
+
+    # Nhóm profile theo tham số chỉ báo; mỗi nhóm tính hợp các key cần một lần
+    groups: Dict[tuple, set] = {}
+    prof_groups = {}
+    for name, cfg in profiles.items():
+        plan = indicator_plan(cfg)
+        prof_groups[name] = {tf: _indicator_group(cfg, tf) for tf in TIMEFRAMES}
+        for tf in TIMEFRAMES:
+            groups.setdefault((tf, prof_groups[name][tf]), (cfg, set()))[1].update(plan[tf])
+    ind_tasks = []
+    for s in symbols:
+        for (tf, group), (cfg, keys) in groups.items():
+            have = store.indicator_keys(s, tf, group)
+            if have is None or not keys <= have:
+                ind_tasks.append((store_root, s, tf, group, cfg, sorted(keys | (have or set()))))
+
+    payloads, jobs = {}, []
+    for s in symbols:
+        for name, cfg in profiles.items():
+            jid = _digest([s, name, cfg, fps[s], capital, fee_bps])
+            job = {"id": jid, "symbol": s, "profile": name, "groups": prof_groups[name],
+                   "checkpoint": os.path.join(work_dir, "jobs", f"{_slug(s)}__{name}__{jid}.json")}
+            if resume and os.path.exists(job["checkpoint"]):
+                with open(job["checkpoint"], encoding="utf-8") as f:
+                    payloads[jid] = json.load(f)
+            else:
+                jobs.append((job, cfg))
+    print(f"[SWEEP] {len(symbols)} symbol × {len(profiles)} profile | chỉ báo: {len(ind_tasks)} | "
+          f"job mới: {len(jobs)} | từ checkpoint: {len(payloads)}")
+
+    t0 = time.perf_counter()
+    if processes == 0:
+        for t in ind_tasks:
+            _compute_indicators(*t)
+        for job, cfg in jobs:
+            payloads[job["id"]] = _run_job(store_root, job, cfg, capital, fee_bps)
+    elif ind_tasks or jobs:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for f in [pool.submit(_compute_indicators, *t) for t in ind_tasks]:
+                f.result()
+            futures = [pool.submit(_run_job, store_root, job, cfg, capital, fee_bps) for job, cfg in jobs]
+            for (job, _), f in zip(jobs, futures):
+                payloads[job["id"]] = f.result()
+    print(f"[SWEEP] xong sau {time.perf_counter() - t0:.1f}s")
+
+    order = [_digest([s, name, cfg, fps[s], capital, fee_bps]) for name, cfg in profiles.items() for s in symbols]
+    return SweepResult([payloads[j] for j in order], capital)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default="config.json")
+    ap.add_argument("--profiles", nargs="*", default=["base"], help='tên trong config.profiles; "base" = config gốc')
+    ap.add_argument("--symbols", nargs="*", help="mặc định: config.symbols")
+    ap.add_argument("--root", default="data/candles", help="thư mục CandleStore")
+    ap.add_argument("--work", default="bt_work", help="thư mục mảng memmap + checkpoint")
+    ap.add_argument("-j", "--processes", type=int, default=None)
+    ap.add_argument("--capital", type=float, default=100.0)
+    ap.add_argument("--out", default="bt_results")
+    ap.add_argument("--no-resume", action="store_true")
+    args = ap.parse_args()
+    with open(args.config, encoding="utf-8") as f:
+        cfg = json.load(f)
+    symbols = args.symbols or cfg.get("symbols", [])
+    res = run_sweep(symbols, profile_configs(cfg, args.profiles), args.work, root=args.root,
+                    processes=args.processes, capital=args.capital, resume=not args.no_resume)
+    res.write(args.out)
+    print(res.summary()[lambda d: d["symbol"] == "ALL"].to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from candle_store import timeframe_ms
+
+class BarCloseScheduler:
+    """
+    Lịch chạy bám theo giờ đóng nến.
+    - Vòng nặng (run_once) chạy ngay sau khi nến M5/M15/H1 đóng + `settle_sec`
+      (chờ sàn chốt nến).
+    - Giữa hai lần đóng nến chỉ chạy vòng nhẹ mỗi `refresh_sec` để cập nhật nến đang chạy.
+    """
+    def __init__(self, timeframes: Sequence[str] = ("5m", "15m", "1h"), settle_sec: float = 3.0, refresh_sec: float = 15.0):
+        self.timeframes = list(timeframes)
+        self.settle_sec = float(settle_sec)
+        self.refresh_sec = float(refresh_sec)
+        self._tf_sec = {tf: timeframe_ms(tf) / 1000.0 for tf in self.timeframes}
+
+    def next_close(self, now: Optional[float] = None) -> Tuple[float, List[str]]:
+        """
+        Trả về (thời điểm chạy vòng nặng kế tiếp, các khung vừa đóng nến tại thời điểm đó).
+        """
+        if now is None:
+            now = time.time()
+        fire_at = None
+        closed: List[str] = []
+        for tf, sec in self._tf_sec.items():
+            boundary = (int((now - self.settle_sec) // sec) + 1) * sec
+            t = boundary + self.settle_sec
+            if fire_at is None or t < fire_at - 1e-6:
+                fire_at, closed = t, [tf]
+            elif abs(t - fire_at) <= 1e-6:
+                closed.append(tf)
+        return fire_at, closed
+
+    def next_event(self, now: Optional[float] = None) -> Tuple[float, str, List[str]]:
+        """
+        Trả về (thời điểm, "close" | "refresh", khung đóng nến).
+        Vòng nhẹ không chen vào sát trước vòng nặng (< refresh_sec).
+        """
+        if now is None:
+            now = time.time()
+        fire_at, closed = self.next_close(now)
+        if self.refresh_sec > 0 and now + 2 * self.refresh_sec <= fire_at:
+            return now + self.refresh_sec, "refresh", []
+        return fire_at, "close", closed
+
+def utc_date(ts: float) -> str:
+    return datetime.fromtimestamp(float(ts), tz=timezone.utc).date().isoformat()
+
+class DayRollover:
+    """
+    Phát hiện sang ngày mới giữa hai vòng lặp (ngày tính bằng `day_fn(epoch)`).
+    check(now) trả về ngày vừa kết thúc đúng một lần khi ngày đổi, còn lại None,
+    nên không phụ thuộc vòng lặp có chạy đúng phút 23:59 hay không.
+    """
+    def __init__(self, day_fn: Callable[[float], str] = utc_date, now: Optional[float] = None):
+        self.day_fn = day_fn
+        self.day = day_fn(time.time() if now is None else now)
+
+    def check(self, now: Optional[float] = None) -> Optional[str]:
+        day = self.day_fn(time.time() if now is None else now)
+        if day == self.day:
+            return None
+        done, self.day = self.day, day
+        return done
+
+def build_scheduler(cfg) -> BarCloseScheduler:
+    sc = (cfg.get("scheduler") or {})
+    return BarCloseScheduler(
+        timeframes=sc.get("close_timeframes", ["5m", "15m", "1h"]),
+        settle_sec=float(sc.get("settle_sec", 3)),
+        refresh_sec=float(sc.get("refresh_sec", 15)),
+    )
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Đo tốc độ kernel mảng (indicator_kernels) so với vòng lặp pandas .iloc cũ
+trên 400 nến và 100k nến, đồng thời kiểm tra kết quả trùng khớp.
+
+    python bench_indicator_kernels.py [--sizes 400 100000] [--legacy-max 100000]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import ta
+
+from indicator_kernels import band_direction, supertrend_kernel
+
+# ---- Bản pandas cũ (tham chiếu) ----
+def legacy_supertrend(df, atr, multiplier=3):
+    hl2 = (df['high'] + df['low']) / 2
+    basic_ub = hl2 + multiplier * atr
+    basic_lb = hl2 - multiplier * atr
+    final_ub = basic_ub.copy()
+    final_lb = basic_lb.copy()
+    supertrend_list = [1]
+    for i in range(1, len(df)):
+        if df['close'].iloc[i-1] > final_ub.iloc[i-1]:
+            final_ub.iloc[i] = min(basic_ub.iloc[i], final_ub.iloc[i-1])
+        else:
+            final_ub.iloc[i] = basic_ub.iloc[i]
+        if df['close'].iloc[i-1] < final_lb.iloc[i-1]:
+            final_lb.iloc[i] = max(basic_lb.iloc[i], final_lb.iloc[i-1])
+        else:
+            final_lb.iloc[i] = basic_lb.iloc[i]
+        if df['close'].iloc[i] > final_ub.iloc[i-1]:
+            supertrend_list.append(1)
+        elif df['close'].iloc[i] < final_lb.iloc[i-1]:
+            supertrend_list.append(-1)
+        else:
+            supertrend_list.append(supertrend_list[-1])
+    return pd.Series(supertrend_list, index=df.index)
+
+def legacy_band_direction(c, upper, lower):
+    direction = pd.Series(index=c.index, dtype=float)
+    curr = -1
+    for i in range(len(c)):
+        if np.isnan(upper.iloc[i]) or np.isnan(lower.iloc[i]):
+            direction.iloc[i] = curr
+            continue
+        if c.iloc[i] > upper.iloc[i]:
+            curr = 1
+        elif c.iloc[i] < lower.iloc[i]:
+            curr = -1
+        direction.iloc[i] = curr
+    return direction
+
+def make_ohlcv(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.5, n))
+    open_ = np.r_[close[0], close[:-1]] + rng.normal(0, 0.1, n)
+    high = np.maximum(open_, close) + rng.uniform(0, 0.5, n)
+    low = np.minimum(open_, close) - rng.uniform(0, 0.5, n)
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': rng.uniform(1, 100, n)})
+
+def _best(fn, repeat):
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t)
+    return best, out
+
+def run(n, legacy_max, repeat):
+    df = make_ohlcv(n)
+    atr10 = ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=10)
+    base = df['close'].ewm(span=20, adjust=False).mean()
+    atr14 = df['high'].sub(df['low']).rolling(14).mean()
+    upper, lower = base + 1.5 * atr14, base - 1.5 * atr14
+
+    t_st, (_, _, st) = _best(lambda: supertrend_kernel(df['high'], df['low'], df['close'], atr10, 3, first_dir=1), repeat)
+    t_rf, rf = _best(lambda: band_direction(df['close'], upper, lower, init=-1), repeat)
+    print(f"[BENCH] n={n:>7}  supertrend kernel {t_st * 1e3:9.2f} ms   range_filter kernel {t_rf * 1e3:9.2f} ms")
+    if n > legacy_max:
+        return
+    t_st_old, st_old = _best(lambda: legacy_supertrend(df, atr10, 3), 1)
+    t_rf_old, rf_old = _best(lambda: legacy_band_direction(df['close'], upper, lower), 1)
+    assert np.array_equal(st, st_old.to_numpy()), "supertrend lệch so với bản pandas"
+    assert np.array_equal(rf, rf_old.to_numpy()), "range_filter lệch so với bản pandas"
+    print(f"[BENCH] n={n:>7}  supertrend pandas {t_st_old * 1e3:9.2f} ms (x{t_st_old / t_st:,.0f})   "
+          f"range_filter pandas {t_rf_old * 1e3:9.2f} ms (x{t_rf_old / t_rf:,.0f})")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[400, 100_000])
+    ap.add_argument("--legacy-max", type=int, default=100_000, help="bỏ qua bản pandas cũ khi n lớn hơn")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    for n in args.sizes:
+        run(n, args.legacy_max, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+_UNIT_MS = {"m": 60_000, "h": 3_600_000, "d": 86_400_000, "w": 604_800_000}
+
+def timeframe_ms(timeframe: str) -> int:
+    tf = str(timeframe).strip()
+    return int(tf[:-1]) * _UNIT_MS[tf[-1].lower()]
+
+def _empty_frame() -> pd.DataFrame:
+    df = pd.DataFrame({c: pd.Series(dtype="float64") for c in COLUMNS})
+    df['timestamp'] = df['timestamp'].astype("int64")
+    return df
+
+def _normalize(df) -> pd.DataFrame:
+    if df is None or len(df) == 0:
+        return _empty_frame()
+    if not isinstance(df, pd.DataFrame):
+        df = pd.DataFrame(df, columns=COLUMNS)
+    df = df[COLUMNS].copy()
+    df['timestamp'] = df['timestamp'].astype("int64")
+    for c in COLUMNS[1:]:
+        df[c] = df[c].astype("float64")
+    return df
+
+class CandleStore:
+    """
+    Kho nến OHLCV cục bộ theo (symbol, timeframe).
+    - Trên đĩa: một file CSV mỗi cặp, chỉ append các nến ĐÃ ĐÓNG.
+    - Trong RAM: giữ tối đa `memory_rows` nến đóng gần nhất cho mỗi cặp.
+    Nến đang hình thành không bao giờ được ghi xuống đĩa.
+    """
+    def __init__(self, root="data/candles", memory_rows=5000):
+        self.root = root
+        self.memory_rows = int(memory_rows)
+        self._frames: Dict[Tuple[str, str], pd.DataFrame] = {}
+        self._lock = threading.RLock()
+
+    def _path(self, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.root, f"{symbol.replace('/', '').replace(':', '_')}_{timeframe}.csv")
+
+    def load(self, symbol: str, timeframe: str) -> pd.DataFrame:
+        key = (symbol, timeframe)
+        with self._lock:
+            df = self._frames.get(key)
+            if df is not None:
+                return df
+            path = self._path(symbol, timeframe)
+            df = _empty_frame()
+            if os.path.exists(path):
+                try:
+                    df = _normalize(pd.read_csv(path))
+                    df = df.drop_duplicates('timestamp', keep='last').sort_values('timestamp').reset_index(drop=True)
+                except Exception as e:
+                    print(f"[STORE] Lỗi đọc {path}: {e!r}")
+                    df = _empty_frame()
+            df = df.tail(self.memory_rows).reset_index(drop=True)
+            self._frames[key] = df
+            return df
+
+    def last_closed_ts(self, symbol: str, timeframe: str) -> Optional[int]:
+        df = self.load(symbol, timeframe)
+        return int(df['timestamp'].iloc[-1]) if len(df) else None
+
+    def closed_count(self, symbol: str, timeframe: str) -> int:
+        return len(self.load(symbol, timeframe))
+
+    def merge(self, symbol: str, timeframe: str, ohlcv, now_ms: Optional[int] = None) -> pd.DataFrame:
+        """
+        Gộp dữ liệu mới từ sàn vào kho. Trả về lịch sử nến đóng + nến đang chạy (nếu có).
+        """
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        tf_ms = timeframe_ms(timeframe)
+        new = _normalize(ohlcv)
+        is_closed = (new['timestamp'] + tf_ms) <= now_ms
+        closed_new = new[is_closed]
+        forming = new[~is_closed].tail(1)
+        with self._lock:
+            old = self.load(symbol, timeframe)
+            last_ts = int(old['timestamp'].iloc[-1]) if len(old) else None
+            append = closed_new if last_ts is None else closed_new[closed_new['timestamp'] > last_ts]
+            if len(append):
+                self._append_disk(symbol, timeframe, append)
+                merged = pd.concat([old, append], ignore_index=True) if len(old) else append.reset_index(drop=True)
+                merged = merged.tail(self.memory_rows).reset_index(drop=True)
+                self._frames[(symbol, timeframe)] = merged
+            else:
+                merged = old
+        if len(forming):
+            return pd.concat([merged, forming], ignore_index=True)
+        return merged.copy()
+
+    def reset(self, symbol: str, timeframe: str):
+        with self._lock:
+            self._frames.pop((symbol, timeframe), None)
+            path = self._path(symbol, timeframe)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _append_disk(self, symbol: str, timeframe: str, rows: pd.DataFrame):
+        path = self._path(symbol, timeframe)
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            write_header = not os.path.exists(path) or os.path.getsize(path) == 0
+            rows.to_csv(path, mode='a', header=write_header, index=False)
+        except Exception as e:
+            print(f"[STORE] Lỗi ghi {path}: {e!r}")
@@ -1,3 +1,6 @@
+import json
+import os
+
 SL_TP_CONFIG = {
     "sl_atr_mult": 1.2,
     "rr_target": 2.0,
@@ -14,3 +17,32 @@ SIGNAL_MONITOR_CONFIG = {
     "alert_on_direction_change": True,
     "alert_partial_close": True
 }
+
+# Các mục của config được profile (config.json -> profiles.<tên>) ghi đè
+PROFILE_SECTIONS = ("weights_sets", "thresholds", "tight_mode", "trading", "risk", "scheduler", "engine", "signal_flow", "regime", "discord")
+
+def apply_profile(cfg, prof):
+    """Ghi đè cfg theo profile `prof` (tên trong cfg["profiles"] hoặc dict overlay); sửa tại chỗ và trả về cfg."""
+    p = ((cfg.get("profiles") or {}).get(prof) or {}) if isinstance(prof, str) else (prof or {})
+    for k in PROFILE_SECTIONS:
+        if k in p: cfg.setdefault(k, {}).update(p[k])
+    if "adx_h1_threshold" in p:
+        cfg["adx_h1_threshold"] = p["adx_h1_threshold"]
+    return cfg
+
+def write_profile(config_path: str, name: str, profile):
+    """Thêm/ghi đè profiles.<name> trong config.json (giữ nguyên định dạng phần còn lại nếu chưa có mục profiles)."""
+    with open(config_path, encoding="utf-8") as f:
+        text = f.read()
+    cfg = json.loads(text)
+    if "profiles" not in cfg:
+        body = json.dumps({name: profile}, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+        end = text.rstrip().rfind("}")
+        text = text[:end].rstrip() + ',\n  "profiles": ' + body + "\n}" + text[len(text.rstrip()):]
+    else:
+        cfg["profiles"][name] = profile
+        text = json.dumps(cfg, indent=2, ensure_ascii=False) + "\n"
+    tmp = config_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, config_path)
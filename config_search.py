@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Tìm cấu hình regime/trading/engine bằng successive halving trên các lát thời gian.
+
+- Chỉ báo, điểm phiếu, ghép H1/M5 (symbol_features) tính MỘT lần cho mỗi symbol trên cả lịch sử;
+  lát thời gian chỉ là view cắt từ đó (SliceCache), nên mỗi ứng viên chỉ chạy lại entry_arrays
+  (phép toán mảng) + vòng mô phỏng lệnh.
+- Vòng r chấm các ứng viên còn lại trên lát dài min_days × eta^r (neo ở cuối dữ liệu), giữ 1/eta
+  tốt nhất rồi đẩy lên lát dài hơn; vòng cuối chạy trên toàn bộ lịch sử.
+- Tham số tìm kiếm không được đổi indicators/weights_sets (features dùng chung cho mọi ứng viên).
+
+    python config_search.py --symbols BTC/USDT ETH/USDT --n 81 --eta 3 --min-days 14 --write halving_best
+"""
+import argparse
+import copy
+import json
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backtest_engine import BacktestEngine, entry_arrays, load_history, slice_features, symbol_features
+from config import PROFILE_SECTIONS, write_profile
+
+# Lưới mặc định (khóa dạng "mục.khóa con...")
+SEARCH_SPACE = {
+    "regime.normal.adx_h1": [22, 25, 28, 30],
+    "regime.normal.heavy_hits": [2, 3],
+    "regime.normal.body_atr_mult": [1.0, 1.2, 1.3, 1.5],
+    "regime.normal.vol_ma20_mult": [1.4, 1.6, 1.8, 2.0],
+    "regime.normal.anti_chase_atr_mult": [0.8, 1.2, 1.6],
+    "regime.strong.adx_h1": [28, 32, 36],
+    "regime.strong.anti_chase_atr_mult": [1.4, 1.8, 2.2],
+    "regime.sideway.adx_h1": [0, 15, 18, 22],
+    "trading.probe_pct": [0.05, 0.1, 0.15],
+    "trading.full_pct": [0.3, 0.5],
+    "trading.sl_atr_mult_probe": [0.8, 1.0, 1.5],
+    "trading.sl_atr_mult_full": [1.0, 1.2, 1.5],
+    "engine.direct_full_on_strong_breakout": [False, True],
+    "engine.bypass_anti_chase_on_breakout_normal": [False, True],
+}
+
+def set_path(cfg: Dict, path: str, value):
+    node = cfg
+    keys = path.split(".")
+    for k in keys[:-1]:
+        node = node.setdefault(k, {})
+    node[keys[-1]] = value
+
+def sample_candidates(base_cfg: Dict, space: Dict[str, list], n: int, seed: int = 0) -> List[Tuple[Dict, Dict]]:
+    """[(tham số, config)] gồm config gốc (tham số rỗng) + n-1 tổ hợp ngẫu nhiên không trùng."""
+    rng = np.random.default_rng(seed)
+    out, seen = [({}, copy.deepcopy(base_cfg))], set()
+    total = math.prod(len(v) for v in space.values()) if space else 1
+    while len(out) < min(n, total + 1):
+        params = {k: vals[int(rng.integers(len(vals)))] for k, vals in space.items()}
+        key = json.dumps(params, sort_keys=True)
+        if key in seen:
+            continue
+        seen.add(key)
+        cfg = copy.deepcopy(base_cfg)
+        for k, v in params.items():
+            set_path(cfg, k, v)
+        out.append((params, cfg))
+    return out
+
+def profile_overlay(cfg: Dict, base_cfg: Dict) -> Dict:
+    """Overlay cho config.profiles: cả mục (apply_profile chỉ update một cấp) với mục khác config gốc."""
+    return {k: copy.deepcopy(cfg[k]) for k in PROFILE_SECTIONS if k in cfg and cfg[k] != base_cfg.get(k)}
+
+class SliceCache:
+    """Features của từng symbol cắt theo giờ bắt đầu lát (giây); lát đã cắt được giữ lại."""
+    def __init__(self, features: Dict[str, Dict[str, np.ndarray]]):
+        self.features = features
+        self.t_end = max(float(F["ts"][-1]) for F in features.values())
+        self._slices: Dict[Optional[float], Dict] = {}
+
+    def get(self, days: Optional[float]) -> Dict[str, Dict[str, np.ndarray]]:
+        """Lát `days` ngày cuối (None = toàn bộ lịch sử)."""
+        start = None if days is None else self.t_end - days * 86400.0
+        cached = self._slices.get(start)
+        if cached is None:
+            cached = {}
+            for s, F in self.features.items():
+                lo = 0 if start is None else int(np.searchsorted(F["ts"], start, side="right"))
+                if lo < len(F["ts"]):
+                    cached[s] = slice_features(F, lo, len(F["ts"]))
+            self._slices[start] = cached
+        return cached
+
+def evaluate(cfg: Dict, feats: Dict[str, Dict[str, np.ndarray]], capital: float = 100.0, fee_bps: float = 4) -> Dict:
+    arrays = {s: entry_arrays(F, cfg) for s, F in feats.items()}
+    return BacktestEngine(cfg, capital=capital, fee_bps=fee_bps).run(arrays).summary()
+
+def rung_days(span_days: float, n: int, eta: int = 3, min_days: float = 14.0) -> List[Optional[float]]:
+    """Độ dài lát của từng vòng: min_days × eta^r cho tới khi phủ hết dữ liệu hoặc còn 1 ứng viên; vòng cuối = None."""
+    days, r = [], 0
+    while n > 1 and min_days * eta ** r < span_days:
+        days.append(min_days * eta ** r)
+        n = max(1, n // eta)
+        r += 1
+    return days + [None]
+
+def successive_halving(cache: SliceCache, candidates: List[Tuple[Dict, Dict]], eta: int = 3, min_days: float = 14.0,
+                       metric: str = "pnl", min_trades: int = 5, capital: float = 100.0, fee_bps: float = 4,
+                       verbose: bool = True) -> List[Dict]:
+    """
+    Trả về lịch sử chấm điểm [{"rung", "days", "index", "params", "score", **summary}];
+    ứng viên sống sót cuối cùng là các dòng của vòng cuối, xếp giảm dần theo score.
+    cache: SliceCache dùng chung, hoặc list một SliceCache cho mỗi ứng viên (cùng lịch sử, features
+    khác nhau khi ứng viên đổi indicators/weights_sets).
+    """
+    caches = cache if isinstance(cache, list) else [cache] * len(candidates)
+    span = (caches[0].t_end - min(float(F["ts"][0]) for F in caches[0].features.values())) / 86400.0
+    alive = list(range(len(candidates)))
+    history = []
+    rungs = rung_days(span, len(candidates), eta, min_days)
+    for r, days in enumerate(rungs):
+        t0 = time.perf_counter()
+        rows = []
+        for i in alive:
+            params, cfg = candidates[i]
+            s = evaluate(cfg, caches[i].get(days), capital, fee_bps)
+            score = float(s.get(metric, 0.0)) if s["trades"] >= min_trades else float("-inf")
+            rows.append({"rung": r, "days": days, "index": i, "params": params, "score": score, **s})
+        rows.sort(key=lambda row: row["score"], reverse=True)
+        history.extend(rows)
+        label = "toàn bộ" if days is None else f"{days:g} ngày"
+        if verbose:
+            print(f"[HALVING] vòng {r} ({label}): {len(rows)} ứng viên | tốt nhất {metric}={rows[0]['score']:.4f} | "
+                  f"{time.perf_counter() - t0:.1f}s")
+        if r < len(rungs) - 1:
+            alive = [row["index"] for row in rows[:max(1, len(rows) // eta)]]
+    return history
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default="config.json")
+    ap.add_argument("--symbols", nargs="*", help="mặc định: config.symbols")
+    ap.add_argument("--root", default="data/candles", help="thư mục CandleStore")
+    ap.add_argument("--space", help="file JSON {\"regime.normal.adx_h1\": [..], ...} (mặc định SEARCH_SPACE)")
+    ap.add_argument("--n", type=int, default=81, help="số ứng viên (gồm config gốc)")
+    ap.add_argument("--eta", type=int, default=3)
+    ap.add_argument("--min-days", type=float, default=14.0)
+    ap.add_argument("--metric", default="pnl", help="khóa của backtest_engine.summarize")
+    ap.add_argument("--min-trades", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--write", metavar="PROFILE", help="ghi ứng viên tốt nhất vào config.profiles.<PROFILE>")
+    args = ap.parse_args()
+    with open(args.config, encoding="utf-8") as f:
+        cfg = json.load(f)
+    space = SEARCH_SPACE
+    if args.space:
+        with open(args.space, encoding="utf-8") as f:
+            space = json.load(f)
+
+    t0 = time.perf_counter()
+    history = load_history(args.symbols or cfg.get("symbols", []), args.root)
+    features = {}
+    for s, frames in history.items():
+        m15, h1, m5 = frames.get("15m"), frames.get("1h"), frames.get("5m")
+        if m15 is None or h1 is None or len(m15) < 200 or len(h1) < 200:
+            print(f"[HALVING] {s}: thiếu dữ liệu M15/H1, bỏ qua")
+            continue
+        features[s] = symbol_features(m15, h1, m5 if m5 is not None and len(m5) >= 215 else None, cfg)
+    print(f"[HALVING] features {len(features)} symbol | {time.perf_counter() - t0:.1f}s")
+
+    cands = sample_candidates(cfg, space, args.n, args.seed)
+    rows = successive_halving(SliceCache(features), cands, args.eta, args.min_days, args.metric, args.min_trades)
+    final = [r for r in rows if r["rung"] == rows[-1]["rung"]]
+    best = final[0]
+    base = next((r for r in reversed(rows) if r["index"] == 0), None)
+    print(f"[HALVING] tốt nhất: {args.metric}={best['score']:.4f} trades={best['trades']} params={json.dumps(best['params'])}")
+    if base is not None:
+        print(f"[HALVING] config gốc (vòng {base['rung']}): {args.metric}={base['score']:.4f}")
+    if args.write:
+        write_profile(args.config, args.write, profile_overlay(cands[best["index"]][1], cfg))
+        print(f"[HALVING] đã ghi profiles.{args.write} vào {args.config}")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,164 @@
+import asyncio
+import time
+
 import ccxt
+import ccxt.async_support as ccxt_async
 import pandas as pd
 
+from candle_store import CandleStore, timeframe_ms
+from rate_limiter import PRIORITY_SCAN, endpoint_weight, get_scheduler
+
 _exchange = ccxt.binance()
+_async_exchange = None
+_store = CandleStore("data/candles")
+
+PAGE_LIMIT = 1000
+MAX_PAGES = 10
+
+def set_candle_store(store):
+    global _store
+    _store = store
+
+def get_candle_store():
+    return _store
+
+def _klines(symbol, timeframe, priority, since=None, limit=None):
+    return get_scheduler().call(
+        _exchange.fetch_ohlcv, symbol, timeframe, since=since, limit=limit,
+        weight=endpoint_weight("klines", limit), priority=priority, exchange=_exchange,
+    )
+
+async def _klines_async(ex, symbol, timeframe, priority, since=None, limit=None):
+    return await get_scheduler().call_async(
+        ex.fetch_ohlcv, symbol, timeframe, since=since, limit=limit,
+        weight=endpoint_weight("klines", limit), priority=priority, exchange=ex,
+    )
+
+def _incremental_since(symbol, timeframe, limit):
+    # Kho đủ lịch sử: chỉ hỏi sàn các nến sau nến đóng cuối cùng
+    last_ts = _store.last_closed_ts(symbol, timeframe)
+    if last_ts is not None and _store.closed_count(symbol, timeframe) >= limit - 1:
+        return last_ts + timeframe_ms(timeframe)
+    return None
+
+def _next_page_since(batch, timeframe):
+    if not batch or len(batch) < PAGE_LIMIT:
+        return None
+    return int(batch[-1][0]) + timeframe_ms(timeframe)
+
+def _check_full_fetch(symbol, timeframe, ohlcv):
+    last_ts = _store.last_closed_ts(symbol, timeframe)
+    if ohlcv and last_ts is not None and int(ohlcv[0][0]) > last_ts + timeframe_ms(timeframe):
+        # Không để lịch sử bị thủng ở giữa
+        _store.reset(symbol, timeframe)
+
+def _merge(symbol, timeframe, ohlcv, limit):
+    df = _store.merge(symbol, timeframe, ohlcv, now_ms=int(time.time() * 1000))
+    return df.tail(limit).reset_index(drop=True)
 
-def fetch_data(symbol, timeframe, limit=300):
+def _fetch_since(symbol, timeframe, since, priority=PRIORITY_SCAN):
+    rows = []
+    for _ in range(MAX_PAGES):
+        batch = _klines(symbol, timeframe, priority, since=since, limit=PAGE_LIMIT)
+        rows.extend(batch or [])
+        since = _next_page_since(batch, timeframe)
+        if since is None:
+            return rows
+    return None
+
+def fetch_data(symbol, timeframe, limit=300, use_store=True, priority=PRIORITY_SCAN):
+    try:
+        if not use_store or _store is None:
+            ohlcv = _klines(symbol, timeframe, priority, limit=limit)
+            df = pd.DataFrame(ohlcv, columns=['timestamp','open','high','low','close','volume'])
+            return df
+        ohlcv = None
+        since = _incremental_since(symbol, timeframe, limit)
+        if since is not None:
+            ohlcv = _fetch_since(symbol, timeframe, since, priority)
+            if ohlcv is None:
+                print(f"[STORE] {symbol} {timeframe}: khoảng trống quá lớn, tải lại từ đầu")
+                _store.reset(symbol, timeframe)
+        if ohlcv is None:
+            ohlcv = _klines(symbol, timeframe, priority, limit=limit)
+            _check_full_fetch(symbol, timeframe, ohlcv)
+        return _merge(symbol, timeframe, ohlcv, limit)
+    except Exception as e:
+        print(f"Lỗi khi lấy dữ liệu {symbol} {timeframe}: {e}")
+        return None
+
+# -------- Async (ccxt.async_support) --------
+def _get_async_exchange():
+    global _async_exchange
+    if _async_exchange is None:
+        _async_exchange = ccxt_async.binance()
+    return _async_exchange
+
+async def close_async_exchange():
+    global _async_exchange
+    if _async_exchange is not None:
+        try:
+            await _async_exchange.close()
+        finally:
+            _async_exchange = None
+
+async def _fetch_since_async(ex, symbol, timeframe, since, priority=PRIORITY_SCAN):
+    rows = []
+    for _ in range(MAX_PAGES):
+        batch = await _klines_async(ex, symbol, timeframe, priority, since=since, limit=PAGE_LIMIT)
+        rows.extend(batch or [])
+        since = _next_page_since(batch, timeframe)
+        if since is None:
+            return rows
+    return None
+
+async def fetch_data_async(symbol, timeframe, limit=300, use_store=True, priority=PRIORITY_SCAN):
+    ex = _get_async_exchange()
     try:
-        ohlcv = _exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
-        df = pd.DataFrame(ohlcv, columns=['timestamp','open','high','low','close','volume'])
-        return df
+        if not use_store or _store is None:
+            ohlcv = await _klines_async(ex, symbol, timeframe, priority, limit=limit)
+            return pd.DataFrame(ohlcv, columns=['timestamp','open','high','low','close','volume'])
+        # Đọc/ghi CSV của kho chạy trong thread pool: event loop không bị chặn khi nhiều cặp ghi đĩa cùng lúc
+        ohlcv = None
+        since = await asyncio.to_thread(_incremental_since, symbol, timeframe, limit)
+        if since is not None:
+            ohlcv = await _fetch_since_async(ex, symbol, timeframe, since, priority)
+            if ohlcv is None:
+                print(f"[STORE] {symbol} {timeframe}: khoảng trống quá lớn, tải lại từ đầu")
+                await asyncio.to_thread(_store.reset, symbol, timeframe)
+        if ohlcv is None:
+            ohlcv = await _klines_async(ex, symbol, timeframe, priority, limit=limit)
+            await asyncio.to_thread(_check_full_fetch, symbol, timeframe, ohlcv)
+        return await asyncio.to_thread(_merge, symbol, timeframe, ohlcv, limit)
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
         print(f"Lỗi khi lấy dữ liệu {symbol} {timeframe}: {e}")
         return None
+
+async def fetch_many(requests, max_concurrency=10, timeout_sec=10.0, use_store=True):
+    """
+    Tải song song nhiều cặp (symbol, timeframe, limit[, priority]).
+    Mỗi request có deadline riêng; request quá hạn trả về None thay vì chặn cả vòng.
+    Request ưu tiên cao (symbol đang có lệnh) được xếp lấy slot trước.
+    Trả về {(symbol, timeframe): DataFrame | None}.
+    """
+    sem = asyncio.Semaphore(max(1, int(max_concurrency)))
+
+    async def _one(symbol, timeframe, limit, priority):
+        async with sem:
+            try:
+                return await asyncio.wait_for(
+                    fetch_data_async(symbol, timeframe, limit, use_store=use_store, priority=priority),
+                    timeout=timeout_sec,
+                )
+            except asyncio.TimeoutError:
+                print(f"[FETCH] Quá hạn {timeout_sec}s khi lấy {symbol} {timeframe}")
+                return None
+
+    requests = sorted(
+        ((r[0], r[1], r[2], r[3] if len(r) > 3 else PRIORITY_SCAN) for r in requests),
+        key=lambda r: r[3],
+    )
+    results = await asyncio.gather(*(_one(*r) for r in requests))
+    return {(s, tf): df for (s, tf, _, _), df in zip(requests, results)}
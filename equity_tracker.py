@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Theo dõi equity tăng dần theo giá (mark-to-market) cho TradeSimulator.
+
+- equity = balance (đã chốt) + lãi/lỗ chưa chốt (đã trừ phí nếu đóng ngay) của các lệnh mở;
+  peak / max drawdown cập nhật O(1) mỗi lần có giá mới (mark) hoặc khi lệnh đóng.
+- Mỗi lệnh mở giữ O(1) trạng thái: giá thấp/cao nhất từ lúc mở + lãi/lỗ chưa chốt lần trước.
+  MAE/MFE (% giá so với entry, luôn >= 0) ghi thẳng vào lệnh (mae_pct/mfe_pct) -> vào archive/ledger.
+- Chuỗi equity lưu gọn: file nhị phân chỉ ghi thêm, mỗi bản ghi EQUITY_COLUMNS float64
+  (đọc bằng load_curve / np.fromfile(...).reshape(-1, len(EQUITY_COLUMNS))).
+- Khởi động lại: tiếp tục từ bản ghi cuối của file (equity, peak, max drawdown); lãi/lỗ của phiên
+  mới cộng lên equity cũ (carry = equity cuối - balance lúc khởi tạo), nên chuỗi liền mạch.
+"""
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+EQUITY_COLUMNS = ("ts", "equity", "peak", "max_drawdown", "max_drawdown_pct")
+
+def load_curve(path: str) -> np.ndarray:
+    """Chuỗi equity (n, len(EQUITY_COLUMNS)); bỏ bản ghi cuối nếu bị ghi dở."""
+    if not path or not os.path.exists(path):
+        return np.empty((0, len(EQUITY_COLUMNS)))
+    raw = np.fromfile(path, dtype=np.float64)
+    n = len(raw) // len(EQUITY_COLUMNS)
+    return raw[:n * len(EQUITY_COLUMNS)].reshape(n, len(EQUITY_COLUMNS))
+
+def last_record(path: str) -> Optional[np.ndarray]:
+    """Bản ghi đầy đủ cuối cùng của file (None nếu chưa có); chỉ đọc đuôi file."""
+    rec = 8 * len(EQUITY_COLUMNS)
+    if not path or not os.path.exists(path):
+        return None
+    n = os.path.getsize(path) // rec
+    if n == 0:
+        return None
+    with open(path, "rb") as f:
+        f.seek((n - 1) * rec)
+        return np.frombuffer(f.read(rec), dtype=np.float64)
+
+class EquityTracker:
+    def __init__(self, simulator, path: Optional[str] = "equity_curve.bin", min_interval_sec: float = 300.0):
+        """
+        simulator: TradeSimulator (đọc balance, _calc_fee).
+        path: file chuỗi equity (None = không ghi), có sẵn thì tiếp tục từ bản ghi cuối.
+        min_interval_sec: equity không đổi thì cách tối thiểu bao lâu mới ghi thêm một bản ghi.
+        """
+        self.sim = simulator
+        self.path = path
+        self.min_interval_sec = min_interval_sec
+        self._open: Dict[int, list] = {}  # id(trade) -> [trade, giá thấp nhất, giá cao nhất, lãi/lỗ chưa chốt]
+        self.unrealized = 0.0
+        self.carry = 0.0  # equity phiên trước chuyển sang (equity = balance + unrealized + carry)
+        self.equity = self.peak = float(simulator.balance)
+        self.max_drawdown = self.max_drawdown_pct = 0.0
+        self._last_ts = None
+        self._last_equity = None
+        self._resume()
+
+    def _resume(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        rec = 8 * len(EQUITY_COLUMNS)
+        size = os.path.getsize(self.path)
+        if size % rec:
+            # Bản ghi cuối bị ghi dở: cắt bỏ để các bản ghi sau không lệch cột
+            with open(self.path, "r+b") as f:
+                f.truncate(size - size % rec)
+        last = last_record(self.path)
+        if last is None:
+            return
+        ts, equity, peak, max_dd, max_dd_pct = (float(x) for x in last)
+        self.carry = equity - float(self.sim.balance)
+        self.equity, self.peak = equity, peak
+        self.max_drawdown, self.max_drawdown_pct = max_dd, max_dd_pct
+        self._last_ts, self._last_equity = ts, equity
+
+    def _update(self):
+        if not self._open:
+            self.unrealized = 0.0  # hết lệnh mở: bỏ sai số cộng dồn
+        self.equity = self.sim.balance + self.unrealized + self.carry
+        if self.equity > self.peak:
+            self.peak = self.equity
+        dd = self.peak - self.equity
+        if dd > self.max_drawdown:
+            self.max_drawdown = dd
+            self.max_drawdown_pct = dd / self.peak * 100.0 if self.peak > 0 else 0.0
+
+    def _excursion(self, st, price):
+        trade, entry = st[0], st[0]["entry"]
+        if price < st[1]:
+            st[1] = price
+        if price > st[2]:
+            st[2] = price
+        if not entry:
+            return
+        if trade["direction"] == "LONG":
+            fav, adv = st[2] - entry, entry - st[1]
+        else:
+            fav, adv = entry - st[1], st[2] - entry
+        trade["mfe_pct"] = max(0.0, fav / entry * 100.0)
+        trade["mae_pct"] = max(0.0, adv / entry * 100.0)
+
+    def mark(self, trade, price):
+        """Giá mới của một lệnh mở: cập nhật MAE/MFE, lãi/lỗ chưa chốt, equity/peak/drawdown."""
+        if price is None or trade.get("entry") is None or trade.get("time_close"):
+            return
+        price = float(price)
+        st = self._open.get(id(trade))
+        if st is None:
+            entry = trade["entry"]
+            st = self._open[id(trade)] = [trade, min(entry, price), max(entry, price), 0.0]
+        self._excursion(st, price)
+        entry, size = trade["entry"], trade["size"] or 0.0
+        gross = (price - entry) * size if trade["direction"] == "LONG" else (entry - price) * size
+        upl = gross - self.sim._calc_fee(entry, price, size)
+        self.unrealized += upl - st[3]
+        st[3] = upl
+        self._update()
+
+    def on_close(self, trade):
+        """Lệnh vừa đóng/hủy (balance đã gồm lãi/lỗ): bỏ trạng thái, chốt MAE/MFE theo giá đóng."""
+        st = self._open.pop(id(trade), None)
+        if st is None:
+            self._update()
+            return
+        if trade.get("close_price") is not None:
+            self._excursion(st, float(trade["close_price"]))
+        self.unrealized -= st[3]
+        self._update()
+
+    def snapshot(self) -> Dict[str, float]:
+        return {"equity": self.equity, "peak": self.peak, "unrealized": self.unrealized,
+                "max_drawdown": self.max_drawdown, "max_drawdown_pct": self.max_drawdown_pct,
+                "open_trades": len(self._open)}
+
+    def sample(self, ts: float) -> bool:
+        """Ghi một điểm vào chuỗi equity nếu equity đổi hoặc đã quá min_interval_sec; True nếu đã ghi."""
+        if self.path is None:
+            return False
+        if (self._last_equity is not None and abs(self.equity - self._last_equity) < 1e-9
+                and ts - self._last_ts < self.min_interval_sec):
+            return False
+        rec = np.array([ts, self.equity, self.peak, self.max_drawdown, self.max_drawdown_pct], dtype=np.float64)
+        try:
+            with open(self.path, "ab") as f:
+                f.write(rec.tobytes())
+        except Exception as e:
+            print(f"[EQUITY] Lỗi ghi {self.path}: {e}")
+            return False
+        self._last_ts, self._last_equity = ts, self.equity
+        return True
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Cache kết quả chỉ báo theo (symbol, timeframe, nến đóng cuối, hash tham số).
+
+- Miss (nến đóng mới): tính bằng calculate_indicators vector hóa trên đúng DataFrame truyền vào
+  (rẻ hơn seed stream thuần Python); H1: 1 lần/giờ, D1: 1 lần/ngày.
+- Cùng nến đóng, nến đang chạy đổi: vài lần đầu tính lại vector hóa; từ lần vá thứ
+  STREAM_AFTER_PATCHES mới seed stream một lần rồi vá O(1) từ trạng thái của phần đã đóng
+  (chi phí seed được khấu hao khi nến đang chạy được hỏi nhiều lần).
+- Kết quả dùng chung giữa các lần gọi: mỗi lần trả bản sao dict, Series bên trong chỉ đọc
+  (ghi vào sẽ ValueError) -> người gọi không làm hỏng cache.
+- LRU + trần bộ nhớ; stats cho biết hit/miss để theo dõi lượng tính toán tiết kiệm được.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from anchored_vwap import vwap_anchor
+from candle_store import timeframe_ms
+from indicators import calculate_indicators, resolve_indicators
+from indicators_stream import StreamingIndicators
+
+# Ước lượng bộ nhớ mỗi nến của một entry (deque float + Series kết quả)
+_BYTES_PER_KEY_ROW = 48
+# Số lần vá nến đang chạy (cùng nến đóng) trước khi seed stream thay cho tính lại vector hóa
+STREAM_AFTER_PATCHES = 3
+
+def params_hash(config=None, trend_tf=None, only=None) -> str:
+    ind_cfg = dict(((config or {}).get("indicators", {}) or {}))
+    ind_cfg.pop("cache", None)
+    ind_cfg.pop("streaming", None)
+    ind_cfg["vwap_anchor"] = vwap_anchor(config)
+    ind_cfg["trend_tf"] = trend_tf
+    ind_cfg["only"] = sorted(resolve_indicators(only)) if only is not None else None
+    raw = json.dumps(ind_cfg, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+class _Entry:
+    __slots__ = ("stream", "first_ts", "n_closed", "bar", "result", "nbytes", "patches")
+
+    def __init__(self, first_ts, n_closed, n_keys):
+        self.stream = None
+        self.first_ts = first_ts
+        self.n_closed = n_closed
+        self.bar = None
+        self.result = None
+        self.patches = 0
+        self.nbytes = n_closed * _BYTES_PER_KEY_ROW * n_keys
+
+def _freeze(result: Dict) -> Dict:
+    """Khóa ghi các Series của kết quả (dùng chung giữa các lần gọi)."""
+    for v in result.values():
+        if isinstance(v, pd.Series):
+            arr = v.values
+            if isinstance(arr, np.ndarray):
+                arr.flags.writeable = False
+    return result
+
+class IndicatorCache:
+    def __init__(self, max_entries: int = 512, max_mb: float = 128.0):
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(float(max_mb) * 1024 * 1024)
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.stats = {"hits": 0, "misses": 0, "patches": 0, "evictions": 0, "bypass": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def invalidate(self, symbol: str, timeframe: Optional[str] = None):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == symbol and (timeframe is None or k[1] == timeframe)]:
+                self._drop(key)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    def _put(self, key, entry: _Entry):
+        # Mỗi (symbol, timeframe, params) chỉ giữ nến đóng mới nhất
+        for old in [k for k in self._entries if k[0] == key[0] and k[1] == key[1] and k[3] == key[3]]:
+            self._drop(old)
+        self._entries[key] = entry
+        self._bytes += entry.nbytes
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            if len(self._entries) == 1:
+                break
+            old_key = next(iter(self._entries))
+            self._drop(old_key)
+            self.stats["evictions"] += 1
+
+    def indicators(self, symbol: str, timeframe: str, ohlcv_df: pd.DataFrame, config=None,
+                   trend_tf: Optional[str] = None, now_ms: Optional[int] = None, only=None) -> Optional[Dict]:
+        """
+        Thay thế calculate_indicators(ohlcv_df, config, timeframe=trend_tf or timeframe, only=only).
+        `timeframe` là khung thật của nến (xác định nến đã đóng), `trend_tf` là nhãn
+        truyền cho calculate_indicators nếu khác (vd. H1 được gắn nhãn "4h").
+        """
+        label = trend_tf or timeframe
+        if ohlcv_df is None or len(ohlcv_df) < 200 or 'timestamp' not in ohlcv_df.columns:
+            self.stats["bypass"] += 1
+            return calculate_indicators(ohlcv_df, config, timeframe=label, only=only)
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        tf_ms = timeframe_ms(timeframe)
+        ts = ohlcv_df['timestamp'].to_numpy()
+        closed_mask = (ts + tf_ms) <= now_ms
+        n_closed = int(closed_mask.sum())
+        # Nến đang chạy phải nằm cuối khung
+        if n_closed == 0 or not closed_mask[:n_closed].all() or len(ohlcv_df) - n_closed > 1:
+            self.stats["bypass"] += 1
+            return calculate_indicators(ohlcv_df, config, timeframe=label, only=only)
+
+        key = (symbol, timeframe, int(ts[n_closed - 1]), params_hash(config, label, only))
+        first_ts = int(ts[0])
+        forming = None
+        if n_closed < len(ohlcv_df):
+            r = ohlcv_df.iloc[-1]
+            forming = (float(r['open']), float(r['high']), float(r['low']), float(r['close']), float(r['volume']), int(r['timestamp']))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.first_ts == first_ts and entry.n_closed == n_closed:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                if entry.bar == forming and entry.result is not None:
+                    return dict(entry.result)
+                self.stats["patches"] += 1
+                entry.patches += 1
+            else:
+                self.stats["misses"] += 1
+                result = _freeze(calculate_indicators(ohlcv_df, config, timeframe=label, only=only))
+                if result is None:
+                    return None
+                entry = _Entry(first_ts, n_closed, sum(isinstance(v, pd.Series) for v in result.values()))
+                entry.bar, entry.result = forming, result
+                self._put(key, entry)
+                return dict(result)
+
+            if forming is None or (entry.stream is None and entry.patches < STREAM_AFTER_PATCHES):
+                result = calculate_indicators(ohlcv_df, config, timeframe=label, only=only)
+            else:
+                if entry.stream is None:
+                    entry.stream = StreamingIndicators(max_history=n_closed, vwap_anchor=vwap_anchor(config), only=only)
+                    entry.stream.seed(ohlcv_df.iloc[:n_closed])
+                result = entry.stream.as_indicators(ohlcv_df, forming_bar=forming[:5], timeframe=label, forming_ts=forming[5])
+            entry.bar = forming
+            entry.result = _freeze(result)
+            return dict(result)
+
+def build_indicator_cache(cfg) -> IndicatorCache:
+    c = ((cfg or {}).get("indicators", {}) or {}).get("cache", {}) or {}
+    return IndicatorCache(max_entries=int(c.get("max_entries", 512)), max_mb=float(c.get("max_mb", 128)))
+
+_cache = IndicatorCache()
+
+def get_indicator_cache() -> IndicatorCache:
+    return _cache
+
+def set_indicator_cache(cache: IndicatorCache):
+    global _cache
+    _cache = cache
+
+def cached_indicators(symbol: str, timeframe: str, ohlcv_df: pd.DataFrame, config=None,
+                      trend_tf: Optional[str] = None, now_ms: Optional[int] = None, only=None) -> Optional[Dict]:
+    """calculate_indicators qua cache chung; tắt bằng indicators.cache.enabled = false."""
+    enabled = (((config or {}).get("indicators", {}) or {}).get("cache", {}) or {}).get("enabled", True)
+    if not enabled:
+        return calculate_indicators(ohlcv_df, config, timeframe=trend_tf or timeframe, only=only)
+    return _cache.indicators(symbol, timeframe, ohlcv_df, config, trend_tf=trend_tf, now_ms=now_ms, only=only)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Registry + DAG cho chỉ báo.
+
+Mỗi loại chỉ báo khai báo hàm tính, đầu vào (cột OHLCV hoặc node khác) và lookback.
+Node cụ thể được định danh theo tham số, vd. "atr(14)", "ema(close,200)";
+planner gom toàn bộ node cần cho các mục tiêu, sắp xếp topo và tính mỗi node
+đúng một lần trên một khung dữ liệu. Thời gian từng node được cộng dồn để profile.
+"""
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+# Tham chiếu đầu vào: tên cột ("close") hoặc (loại, {tham số}) của một node khác
+InputRef = Union[str, Tuple[str, Dict]]
+
+def node_id(kind: str, params: Optional[Dict] = None) -> str:
+    if not params:
+        return kind
+    return f"{kind}({','.join(str(v) for v in params.values())})"
+
+class IndicatorSpec:
+    __slots__ = ("kind", "fn", "inputs", "lookback")
+
+    def __init__(self, kind: str, fn: Callable, inputs, lookback):
+        self.kind = kind
+        self.fn = fn
+        self.inputs = inputs
+        self.lookback = lookback
+
+    def resolve_inputs(self, params: Dict) -> Sequence[InputRef]:
+        return self.inputs(**params) if callable(self.inputs) else self.inputs
+
+    def resolve_lookback(self, params: Dict) -> int:
+        return int(self.lookback(**params) if callable(self.lookback) else self.lookback)
+
+class _Node:
+    __slots__ = ("id", "spec", "params", "inputs", "lookback")
+
+    def __init__(self, nid, spec, params, inputs, lookback):
+        self.id = nid
+        self.spec = spec
+        self.params = params
+        self.inputs = inputs
+        self.lookback = lookback
+
+class IndicatorGraph:
+    """
+    graph.register("atr", fn, inputs=lambda window: [("tr", {})], lookback=lambda window: window)
+    nid = graph.node("atr", window=14)                  # -> "atr(14)"
+    out = graph.evaluate(df, [nid, ...])                # {node_id: Series}
+    """
+    def __init__(self):
+        self.specs: Dict[str, IndicatorSpec] = {}
+        self._nodes: Dict[str, _Node] = {}
+        self._plans: Dict[Tuple[str, ...], List[str]] = {}
+        self.timings = defaultdict(float)
+        self.calls = defaultdict(int)
+
+    def register(self, kind: str, fn: Callable, inputs=(), lookback=0):
+        """fn(*giá trị đầu vào, **tham số) -> Series / array cùng độ dài khung."""
+        self.specs[kind] = IndicatorSpec(kind, fn, inputs, lookback)
+        return fn
+
+    def node(self, kind: str, **params) -> str:
+        nid = node_id(kind, params)
+        if nid in self._nodes:
+            return nid
+        spec = self.specs.get(kind)
+        if spec is None:
+            raise KeyError(f"Chỉ báo chưa đăng ký: {kind}")
+        inputs = []
+        for ref in spec.resolve_inputs(params):
+            if isinstance(ref, tuple):
+                inputs.append(self.node(ref[0], **(ref[1] or {})))
+            else:
+                inputs.append(ref)
+        self._nodes[nid] = _Node(nid, spec, params, tuple(inputs), spec.resolve_lookback(params))
+        return nid
+
+    def plan(self, targets: Iterable[str]) -> List[str]:
+        """Thứ tự topo của các node cần cho `targets` (mỗi node một lần)."""
+        key = tuple(sorted(set(targets)))
+        cached = self._plans.get(key)
+        if cached is not None:
+            return cached
+        order, seen = [], set()
+
+        def visit(nid, stack):
+            if nid in seen:
+                return
+            if nid in stack:
+                raise ValueError(f"Vòng lặp phụ thuộc tại {nid}")
+            node = self._nodes[nid]
+            stack.add(nid)
+            for dep in node.inputs:
+                if dep in self._nodes:
+                    visit(dep, stack)
+            stack.discard(nid)
+            seen.add(nid)
+            order.append(nid)
+
+        for t in key:
+            visit(t, set())
+        self._plans[key] = order
+        return order
+
+    def lookback(self, nid: str) -> int:
+        """Số nến tối thiểu trước khi node có giá trị (cộng dồn theo chuỗi phụ thuộc)."""
+        node = self._nodes[nid]
+        deps = [self.lookback(d) for d in node.inputs if d in self._nodes]
+        return node.lookback + (max(deps) if deps else 0)
+
+    def evaluate(self, df: pd.DataFrame, targets: Iterable[str]) -> Dict[str, object]:
+        values: Dict[str, object] = {}
+        for nid in self.plan(targets):
+            node = self._nodes[nid]
+            # Cột không có trong khung (vd. timestamp) -> None, hàm node tự xử lý
+            args = [values[d] if d in values else (df[d] if d in df.columns else None) for d in node.inputs]
+            t0 = time.perf_counter()
+            out = node.spec.fn(*args, **node.params)
+            if not isinstance(out, pd.Series):
+                out = pd.Series(out, index=df.index)
+            values[nid] = out
+            self.timings[nid] += time.perf_counter() - t0
+            self.calls[nid] += 1
+        return values
+
+    def profile(self, top: Optional[int] = None) -> List[Tuple[str, int, float]]:
+        """[(node, số lần tính, tổng giây)] giảm dần theo thời gian."""
+        rows = sorted(((nid, self.calls[nid], t) for nid, t in self.timings.items()), key=lambda r: -r[2])
+        return rows[:top] if top else rows
+
+    def reset_profile(self):
+        self.timings.clear()
+        self.calls.clear()
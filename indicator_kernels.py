@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Kernel mảng cho các chỉ báo dạng "máy trạng thái" (Supertrend, range filter).
+Đầu vào là mảng float64 liền bộ nhớ; vòng lặp chạy trên list float thuần,
+không đọc/ghi từng phần tử qua pandas (.iloc).
+So sánh với NaN cho kết quả giống hệt bản pandas cũ (luôn False).
+"""
+from typing import Tuple
+
+import numpy as np
+
+def as_float_array(x) -> np.ndarray:
+    return np.ascontiguousarray(np.asarray(x, dtype=np.float64))
+
+def supertrend_kernel(high, low, close, atr, multiplier: float = 3.0, first_dir: int = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Dải Supertrend cuối cùng + hướng.
+    Hướng tại i xét close[i] so với dải của nến i-1 (như bản gốc); nến 0 = `first_dir`.
+    Trả về (final_ub, final_lb, direction[int64]).
+    """
+    h, l, c, a = as_float_array(high), as_float_array(low), as_float_array(close), as_float_array(atr)
+    n = len(c)
+    hl2 = (h + l) / 2
+    basic_ub = (hl2 + multiplier * a).tolist()
+    basic_lb = (hl2 - multiplier * a).tolist()
+    cl = c.tolist()
+    ub = basic_ub[:]
+    lb = basic_lb[:]
+    direction = [first_dir] * n
+    cur = first_dir
+    for i in range(1, n):
+        pu, pl, pc = ub[i - 1], lb[i - 1], cl[i - 1]
+        if pc > pu:
+            ub[i] = min(basic_ub[i], pu)
+        if pc < pl:
+            lb[i] = max(basic_lb[i], pl)
+        ci = cl[i]
+        if ci > pu:
+            cur = 1
+        elif ci < pl:
+            cur = -1
+        direction[i] = cur
+    return np.array(ub, dtype=np.float64), np.array(lb, dtype=np.float64), np.array(direction, dtype=np.int64)
+
+def band_direction(close, upper, lower, init: int = -1) -> np.ndarray:
+    """
+    Hướng chỉ đổi khi giá thoát khỏi dải [lower, upper]; dải NaN giữ nguyên hướng cũ.
+    """
+    cl = as_float_array(close).tolist()
+    up = as_float_array(upper).tolist()
+    lo = as_float_array(lower).tolist()
+    out = [init] * len(cl)
+    cur = init
+    for i, ci in enumerate(cl):
+        u, d = up[i], lo[i]
+        if u == u and d == d:
+            if ci > u:
+                cur = 1
+            elif ci < d:
+                cur = -1
+        out[i] = cur
+    return np.array(out, dtype=np.int64)
+
+def true_range(high, low, close) -> np.ndarray:
+    """True range như ta: nến đầu = high - low."""
+    h, l, c = as_float_array(high), as_float_array(low), as_float_array(close)
+    tr = h - l
+    if len(c) > 1:
+        pc = c[:-1]
+        tr[1:] = np.maximum(tr[1:], np.maximum(np.abs(h[1:] - pc), np.abs(l[1:] - pc)))
+    return tr
+
+def wilder_atr_kernel(tr, window: int = 14) -> np.ndarray:
+    """ATR của ta (AverageTrueRange): 0 tới nến window-2, nến window-1 = trung bình, sau đó Wilder."""
+    t = as_float_array(tr)
+    n = len(t)
+    out = [0.0] * n
+    if n >= window:
+        tl = t.tolist()
+        prev = float(np.mean(t[:window]))
+        out[window - 1] = prev
+        for i in range(window, n):
+            prev = (prev * (window - 1) + tl[i]) / float(window)
+            out[i] = prev
+    return np.array(out, dtype=np.float64)
+
+def adx_kernel(high, low, tr, window: int = 14) -> np.ndarray:
+    """
+    ADX của ta (ADXIndicator) tính từ true range có sẵn (dùng chung với ATR).
+    0 cho tới nến 2*window-1.
+    """
+    h, l = as_float_array(high).tolist(), as_float_array(low).tolist()
+    t = as_float_array(tr).tolist()
+    n = len(t)
+    out = [0.0] * n
+    if n <= window:
+        return np.array(out, dtype=np.float64)
+    pos = [0.0] * n
+    neg = [0.0] * n
+    for i in range(1, n):
+        up = h[i] - h[i - 1]
+        dn = l[i - 1] - l[i]
+        pos[i] = up if (up > dn and up > 0) else 0.0
+        neg[i] = dn if (dn > up and dn > 0) else 0.0
+    w = float(window)
+    trs, dip, din = sum(t[1:window + 1]), sum(pos[1:window + 1]), sum(neg[1:window + 1])
+    dx_seed = []
+    value = 0.0
+    for i in range(window, n):
+        if i > window:
+            trs = trs - trs / w + t[i]
+            dip = dip - dip / w + pos[i]
+            din = din - din / w + neg[i]
+        pdi = 100.0 * dip / trs if trs != 0 else 0.0
+        ndi = 100.0 * din / trs if trs != 0 else 0.0
+        dx = 100.0 * abs((pdi - ndi) / (pdi + ndi)) if (pdi + ndi) != 0 else 0.0
+        if i < 2 * window - 1:
+            dx_seed.append(dx)
+            continue
+        if i == 2 * window - 1:
+            dx_seed.append(dx)
+            value = float(np.mean(dx_seed))
+        else:
+            value = (value * (window - 1) + dx) / w
+        out[i] = value
+    return np.array(out, dtype=np.float64)
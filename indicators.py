@@ -1,79 +1,153 @@
+import numpy as np
 import pandas as pd
-import ta
 
-def calculate_indicators(ohlcv_df, config=None, timeframe=None):
+from anchored_vwap import vwap_anchor, vwap_series
+from indicator_graph import IndicatorGraph
+from indicator_kernels import adx_kernel, supertrend_kernel, true_range, wilder_atr_kernel
+
+INDICATOR_KEYS = (
+    'ema200', 'ma50', 'macd', 'macd_signal', 'rsi', 'adx', 'vwap', 'supertrend',
+    'range_filter', 'atr', 'chaikin_mf', 'volume_spike', 'stoch_rsi',
+    'bollinger_bands_upper', 'bollinger_bands_lower', 'bollinger_bands_mid', 'bollinger_bands',
+)
+
+# Chỉ báo kéo theo khi được yêu cầu (dùng chung trạng thái / công thức)
+_BB_KEYS = ('bollinger_bands_upper', 'bollinger_bands_lower', 'bollinger_bands_mid', 'bollinger_bands')
+INDICATOR_DEPS = {
+    'macd': ('macd_signal',),
+    'macd_signal': ('macd',),
+    'stoch_rsi': ('rsi',),
+    **{k: _BB_KEYS for k in _BB_KEYS},
+}
+
+def resolve_indicators(only=None):
+    """Tập key cần tính cho `only` (None = tất cả), đã gồm phụ thuộc."""
+    if only is None:
+        return set(INDICATOR_KEYS)
+    need = set()
+    for k in only:
+        if k not in INDICATOR_KEYS:
+            raise KeyError(f"Indicator không hỗ trợ: {k}")
+        need.add(k)
+        need.update(INDICATOR_DEPS.get(k, ()))
+    return need
+
+
+# ---- Registry chỉ báo (công thức giống thư viện ta) ----
+INDICATOR_GRAPH = IndicatorGraph()
+_reg = INDICATOR_GRAPH.register
+
+def _ema(s, window):
+    return s.ewm(span=window, min_periods=window, adjust=False).mean()
+
+_reg("tr", lambda h, l, c: true_range(h, l, c), inputs=("high", "low", "close"), lookback=1)
+_reg("atr", lambda tr, window: wilder_atr_kernel(tr, window),
+     inputs=[("tr", {})], lookback=lambda window: window)
+_reg("adx", lambda h, l, tr, window: adx_kernel(h, l, tr, window),
+     inputs=("high", "low", ("tr", {})), lookback=lambda window: 2 * window)
+_reg("ema", lambda s, source, window: _ema(s, window),
+     inputs=lambda source, window: [source], lookback=lambda source, window: window)
+_reg("sma", lambda s, source, window: s.rolling(window, min_periods=window).mean(),
+     inputs=lambda source, window: [source], lookback=lambda source, window: window)
+_reg("macd", lambda fast_ema, slow_ema, fast, slow: fast_ema - slow_ema,
+     inputs=lambda fast, slow: [("ema", {"source": "close", "window": fast}), ("ema", {"source": "close", "window": slow})],
+     lookback=lambda fast, slow: slow)
+_reg("macd_signal", lambda macd, fast, slow, signal: _ema(macd, signal),
+     inputs=lambda fast, slow, signal: [("macd", {"fast": fast, "slow": slow})], lookback=lambda fast, slow, signal: signal)
+
+def _rsi(close, window):
+    diff = close.diff(1)
+    up = diff.where(diff > 0, 0.0)
+    dn = -diff.where(diff < 0, 0.0)
+    emaup = up.ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+    emadn = dn.ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+    return pd.Series(np.where(emadn == 0, 100, 100 - (100 / (1 + emaup / emadn))), index=close.index)
+
+_reg("rsi", _rsi, inputs=("close",), lookback=lambda window: window)
+
+def _stoch_rsi(rsi, window):
+    lo = rsi.rolling(window).min()
+    return (rsi - lo) / (rsi.rolling(window).max() - lo)
+
+_reg("stoch_rsi", _stoch_rsi, inputs=lambda window: [("rsi", {"window": window})], lookback=lambda window: window)
+
+_reg("bb_std", lambda c, window: c.rolling(window, min_periods=window).std(ddof=0),
+     inputs=("close",), lookback=lambda window: window)
+_reg("bb_upper", lambda mid, std, window, dev: mid + dev * std,
+     inputs=lambda window, dev: [("sma", {"source": "close", "window": window}), ("bb_std", {"window": window})], lookback=0)
+_reg("bb_lower", lambda mid, std, window, dev: mid - dev * std,
+     inputs=lambda window, dev: [("sma", {"source": "close", "window": window}), ("bb_std", {"window": window})], lookback=0)
+_reg("bb_width", lambda up, lo, window, dev: up - lo,
+     inputs=lambda window, dev: [("bb_upper", {"window": window, "dev": dev}), ("bb_lower", {"window": window, "dev": dev})], lookback=0)
+
+_reg("typical_price", lambda h, l, c: (h + l + c) / 3, inputs=("high", "low", "close"))
+_reg("vwap", lambda tp, v, ts, anchor: vwap_series(tp, v, ts=ts, anchor=anchor),
+     inputs=[("typical_price", {}), "volume", "timestamp"])
+
+def _supertrend(h, l, c, atr, period, multiplier):
+    _, _, direction = supertrend_kernel(h, l, c, atr, multiplier, first_dir=1)
+    return pd.Series(direction, index=c.index)
+
+_reg("supertrend", _supertrend,
+     inputs=lambda period, multiplier: ["high", "low", "close", ("atr", {"window": period})], lookback=0)
+
+def _range_filter(h, l, window, threshold):
+    rng = h - l
+    return (rng > (rng.rolling(window=window).mean() * threshold)).astype(int)
+
+_reg("range_filter", _range_filter, inputs=("high", "low"), lookback=lambda window, threshold: window)
+
+def _chaikin_mf(h, l, c, v, window):
+    mfv = ((c - l) - (h - c)) / (h - l) * v
+    mfv = mfv.replace([float('inf'), -float('inf')], 0).fillna(0)
+    return mfv.rolling(window=window).sum() / v.rolling(window=window).sum()
+
+_reg("chaikin_mf", _chaikin_mf, inputs=("high", "low", "close", "volume"), lookback=lambda window: window)
+_reg("volume_spike", lambda v, avg, window, threshold: (v > avg * threshold).astype(int),
+     inputs=lambda window, threshold: ["volume", ("sma", {"source": "volume", "window": window})], lookback=0)
+
+def indicator_nodes(config=None) -> dict:
+    """Key kết quả của calculate_indicators -> node trong INDICATOR_GRAPH."""
+    node = INDICATOR_GRAPH.node
+    return {
+        'ema200': node("ema", source="close", window=200),
+        'ma50': node("sma", source="close", window=50),
+        'macd': node("macd", fast=12, slow=26),
+        'macd_signal': node("macd_signal", fast=12, slow=26, signal=9),
+        'rsi': node("rsi", window=14),
+        'adx': node("adx", window=14),
+        'vwap': node("vwap", anchor=vwap_anchor(config)),
+        'supertrend': node("supertrend", period=10, multiplier=3),
+        'range_filter': node("range_filter", window=20, threshold=1.5),
+        'atr': node("atr", window=14),
+        'chaikin_mf': node("chaikin_mf", window=20),
+        'volume_spike': node("volume_spike", window=20, threshold=1.5),
+        'stoch_rsi': node("stoch_rsi", window=14),
+        'bollinger_bands_upper': node("bb_upper", window=20, dev=2),
+        'bollinger_bands_lower': node("bb_lower", window=20, dev=2),
+        'bollinger_bands_mid': node("sma", source="close", window=20),
+        'bollinger_bands': node("bb_width", window=20, dev=2),
+    }
+
+def calculate_indicators(ohlcv_df, config=None, timeframe=None, only=None):
+    """
+    `only`: tập key cần dùng (vd. từ tight_gate.required_indicators); None = tính tất cả.
+    Các node dùng chung (tr, atr, ema(close,200), sma(close,20)...) chỉ tính một lần mỗi khung.
+    """
     min_window = 200
     if ohlcv_df is None or len(ohlcv_df) < min_window:
         print(f"[ERROR] DataFrame quá nhỏ ({len(ohlcv_df) if ohlcv_df is not None else 0}), cần >= {min_window}")
         return None
 
-    indicators = {}
-    indicators['ema200'] = ta.trend.ema_indicator(ohlcv_df['close'], window=200)
-    indicators['ma50'] = ta.trend.sma_indicator(ohlcv_df['close'], window=50)
-    indicators['macd'] = ta.trend.macd(ohlcv_df['close'])
-    indicators['macd_signal'] = ta.trend.macd_signal(ohlcv_df['close'])
-    indicators['rsi'] = ta.momentum.rsi(ohlcv_df['close'], window=14)
-    indicators['adx'] = ta.trend.adx(ohlcv_df['high'], ohlcv_df['low'], ohlcv_df['close'], window=14)
-
-    typical_price = (ohlcv_df['high'] + ohlcv_df['low'] + ohlcv_df['close']) / 3
-    cum_tp_vol = (typical_price * ohlcv_df['volume']).cumsum()
-    cum_vol = ohlcv_df['volume'].cumsum()
-    indicators['vwap'] = cum_tp_vol / cum_vol
-
-    def supertrend(df, period=10, multiplier=3):
-        atr = ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=period)
-        hl2 = (df['high'] + df['low']) / 2
-        basic_ub = hl2 + multiplier * atr
-        basic_lb = hl2 - multiplier * atr
-        final_ub = basic_ub.copy()
-        final_lb = basic_lb.copy()
-        supertrend_list = [1]
-        for i in range(1,len(df)):
-            if df['close'].iloc[i-1] > final_ub.iloc[i-1]:
-                final_ub.iloc[i] = min(basic_ub.iloc[i], final_ub.iloc[i-1])
-            else:
-                final_ub.iloc[i] = basic_ub.iloc[i]
-            if df['close'].iloc[i-1] < final_lb.iloc[i-1]:
-                final_lb.iloc[i] = max(basic_lb.iloc[i], final_lb.iloc[i-1])
-            else:
-                final_lb.iloc[i] = basic_lb.iloc[i]
-            if df['close'].iloc[i] > final_ub.iloc[i-1]:
-                supertrend_list.append(1)
-            elif df['close'].iloc[i] < final_lb.iloc[i-1]:
-                supertrend_list.append(-1)
-            else:
-                supertrend_list.append(supertrend_list[-1])
-        return pd.Series(supertrend_list, index=df.index)
-    indicators['supertrend'] = supertrend(ohlcv_df)
-
-    def range_filter(df, threshold=1.5):
-        rng = df['high'] - df['low']
-        return (rng > (rng.rolling(window=20).mean() * threshold)).astype(int)
-    indicators['range_filter'] = range_filter(ohlcv_df)
-
-    indicators['atr'] = ta.volatility.average_true_range(
-        ohlcv_df['high'], ohlcv_df['low'], ohlcv_df['close'], window=14
-    )
-
-    def chaikin_money_flow(df, window=20):
-        mfv = ((df['close'] - df['low']) - (df['high'] - df['close'])) / (df['high'] - df['low']) * df['volume']
-        mfv = mfv.replace([float('inf'), -float('inf')], 0).fillna(0)
-        cmf = mfv.rolling(window=window).sum() / df['volume'].rolling(window=window).sum()
-        return cmf
-    indicators['chaikin_mf'] = chaikin_money_flow(ohlcv_df, window=20)
-
-    def volume_spike(df, threshold=1.5):
-        avg_vol = df['volume'].rolling(window=20).mean()
-        return (df['volume'] > avg_vol * threshold).astype(int)
-    indicators['volume_spike'] = volume_spike(ohlcv_df)
-
-    indicators['stoch_rsi'] = ta.momentum.stochrsi(ohlcv_df['close'], window=14, smooth1=3, smooth2=3)
-
-    bb = ta.volatility.BollingerBands(ohlcv_df['close'], window=20, window_dev=2)
-    indicators['bollinger_bands_upper'] = bb.bollinger_hband()
-    indicators['bollinger_bands_lower'] = bb.bollinger_lband()
-    indicators['bollinger_bands_mid'] = bb.bollinger_mavg()
-    indicators['bollinger_bands'] = bb.bollinger_hband() - bb.bollinger_lband()
+    need = resolve_indicators(only)
+    nodes = indicator_nodes(config)
+    tf = str(timeframe).lower() if timeframe is not None else None
+    trend_tf = tf in ['4h', 'h4', '1d', 'd1', 'daily']
+    targets = {nodes[k] for k in need}
+    if trend_tf:
+        targets.add(nodes['ema200'])
+    values = INDICATOR_GRAPH.evaluate(ohlcv_df, targets)
+    indicators = {k: values[nodes[k]] for k in INDICATOR_KEYS if k in need}
 
     for key, series in indicators.items():
         if isinstance(series, pd.Series):
@@ -84,12 +158,11 @@ def calculate_indicators(ohlcv_df, config=None, timeframe=None):
     def calc_trend(df):
         if df is None or len(df) < 200: return "-"
         close = df['close'].iloc[-1]
-        ema200 = ta.trend.ema_indicator(df['close'], window=200).iloc[-1]
+        ema200 = values[nodes['ema200']].iloc[-1]
         if pd.isna(close) or pd.isna(ema200): return "-"
         return "UP" if close > ema200 else "DOWN"
 
-    if timeframe is not None:
-        tf = str(timeframe).lower()
+    if tf is not None:
         if tf in ['4h','h4']:
             indicators['trend_h4'] = calc_trend(ohlcv_df)
         elif tf in ['1d','d1','daily']:
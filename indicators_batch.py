@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Tính chỉ báo theo lô cho nhiều symbol trên mảng 2-D (symbols × bars).
+
+Khung của từng symbol được căn phải (nến cuối trùng cột cuối), phần thiếu ở đầu
+là NaN. EMA/SMA/RSI/ATR/Bollinger/MACD/volume-spike chạy một lượt cho cả lô:
+vòng lặp theo nến là phép toán vector trên toàn bộ symbol, nên chi phí Python
+không tăng theo số symbol. Kết quả trả về là dict giống calculate_indicators
+cho từng symbol, với Series là view của hàng tương ứng (dùng thẳng cho
+build_indicator_results). Key khác (adx, vwap, supertrend...) tính từng symbol.
+"""
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from indicators import INDICATOR_KEYS, calculate_indicators, resolve_indicators
+
+# Key tính theo lô
+BATCH_KEYS = frozenset({
+    'ema200', 'ma50', 'macd', 'macd_signal', 'rsi', 'stoch_rsi', 'atr', 'volume_spike',
+    'bollinger_bands_upper', 'bollinger_bands_lower', 'bollinger_bands_mid', 'bollinger_bands',
+})
+
+class OhlcvStack:
+    """OHLCV của nhiều symbol căn phải thành mảng (n_symbols, n_bars); start[i] = cột đầu có dữ liệu."""
+    __slots__ = ("symbols", "frames", "open", "high", "low", "close", "volume", "start")
+
+    def __init__(self, frames: Dict[str, pd.DataFrame]):
+        self.symbols = list(frames)
+        self.frames = frames
+        n_bars = max((len(df) for df in frames.values()), default=0)
+        self.start = np.array([n_bars - len(frames[s]) for s in self.symbols], dtype=np.int64)
+        cols = ("open", "high", "low", "close", "volume")
+        cube = np.full((len(cols), len(self.symbols), n_bars), np.nan)
+        for i, s in enumerate(self.symbols):
+            cube[:, i, self.start[i]:] = frames[s][list(cols)].to_numpy(dtype=np.float64).T
+        for j, col in enumerate(cols):
+            setattr(self, col, cube[j])
+
+    @property
+    def shape(self):
+        return self.close.shape
+
+    def row(self, i: int, arr: np.ndarray) -> pd.Series:
+        """View hàng i (bỏ phần đệm) dưới dạng Series theo index khung gốc."""
+        df = self.frames[self.symbols[i]]
+        return pd.Series(arr[i, self.start[i]:], index=df.index, copy=False)
+
+# ---- Kernel theo hàng (công thức giống thư viện ta / pandas) ----
+def ewm_rows(x: np.ndarray, alpha: float, min_periods: int = 0) -> np.ndarray:
+    """ewm(alpha, adjust=False, min_periods).mean() cho từng hàng; NaN đầu hàng được bỏ qua."""
+    out = np.full(x.shape, np.nan)
+    w = np.full(x.shape[0], np.nan)
+    cnt = np.zeros(x.shape[0], dtype=np.int64)
+    old, new = 1.0 - alpha, alpha
+    for j in range(x.shape[1]):
+        xj = x[:, j]
+        ok = ~np.isnan(xj)
+        w = np.where(ok, np.where(np.isnan(w), xj, (old * w + new * xj) / (old + new)), w)
+        cnt += ok
+        out[:, j] = np.where(cnt >= min_periods, w, np.nan)
+    return out
+
+def ema_rows(x: np.ndarray, span: int) -> np.ndarray:
+    return ewm_rows(x, 2.0 / (span + 1), min_periods=span)
+
+def _rolling(x: np.ndarray, window: int, fn) -> np.ndarray:
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= window:
+        out[:, window - 1:] = fn(sliding_window_view(x, window, axis=1), axis=-1)
+    return out
+
+def sma_rows(x: np.ndarray, window: int) -> np.ndarray:
+    return _rolling(x, window, np.mean)
+
+def rolling_std_rows(x: np.ndarray, window: int) -> np.ndarray:
+    return _rolling(x, window, np.std)
+
+def rsi_rows(close: np.ndarray, start: np.ndarray, window: int = 14) -> np.ndarray:
+    diff = np.full(close.shape, np.nan)
+    diff[:, 1:] = close[:, 1:] - close[:, :-1]
+    pad = np.arange(close.shape[1])[None, :] < start[:, None]
+    # ta: diff NaN ở nến đầu -> up/dn = 0 (vẫn tính vào min_periods)
+    up = np.where(pad, np.nan, np.where(diff > 0, diff, 0.0))
+    dn = np.where(pad, np.nan, np.where(diff < 0, -diff, 0.0))
+    emaup = ewm_rows(up, 1.0 / window, min_periods=window)
+    emadn = ewm_rows(dn, 1.0 / window, min_periods=window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(emadn == 0, 100.0, 100 - (100 / (1 + emaup / emadn)))
+
+def atr_rows(high: np.ndarray, low: np.ndarray, close: np.ndarray, start: np.ndarray, window: int = 14) -> np.ndarray:
+    """ATR Wilder của ta cho từng hàng: 0 tới nến window-2 của hàng, nến window-1 = trung bình TR."""
+    pc = np.full(close.shape, np.nan)
+    pc[:, 1:] = close[:, :-1]
+    tr = np.fmax(high - low, np.fmax(np.abs(high - pc), np.abs(low - pc)))
+    seed = sma_rows(tr, window)
+    k = np.arange(close.shape[1])[None, :] - start[:, None]
+    out = np.zeros(close.shape)
+    prev = np.zeros(close.shape[0])
+    for j in range(close.shape[1]):
+        kj = k[:, j]
+        prev = np.where(kj == window - 1, seed[:, j],
+                        np.where(kj >= window, (prev * (window - 1) + tr[:, j]) / float(window), 0.0))
+        out[:, j] = prev
+    return out
+
+def compute_batch(stack: OhlcvStack, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+    """Mảng (n_symbols, n_bars) cho các key trong BATCH_KEYS được yêu cầu."""
+    need = set(keys) & BATCH_KEYS
+    c, v = stack.close, stack.volume
+    out: Dict[str, np.ndarray] = {}
+    if 'ema200' in need:
+        out['ema200'] = ema_rows(c, 200)
+    if 'ma50' in need:
+        out['ma50'] = sma_rows(c, 50)
+    if need & {'macd', 'macd_signal'}:
+        macd = ema_rows(c, 12) - ema_rows(c, 26)
+        out['macd'] = macd
+        out['macd_signal'] = ema_rows(macd, 9)
+    if need & {'rsi', 'stoch_rsi'}:
+        rsi = rsi_rows(c, stack.start, 14)
+        out['rsi'] = rsi
+        if 'stoch_rsi' in need:
+            lo = _rolling(rsi, 14, np.min)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                out['stoch_rsi'] = (rsi - lo) / (_rolling(rsi, 14, np.max) - lo)
+    if 'atr' in need:
+        out['atr'] = atr_rows(stack.high, stack.low, c, stack.start, 14)
+    if 'volume_spike' in need:
+        out['volume_spike'] = (v > sma_rows(v, 20) * 1.5).astype(np.int64)
+    if need & {'bollinger_bands_upper', 'bollinger_bands_lower', 'bollinger_bands_mid', 'bollinger_bands'}:
+        mid = sma_rows(c, 20)
+        std = rolling_std_rows(c, 20)
+        upper, lower = mid + 2 * std, mid - 2 * std
+        out.update({'bollinger_bands_upper': upper, 'bollinger_bands_lower': lower,
+                    'bollinger_bands_mid': mid, 'bollinger_bands': upper - lower})
+    return out
+
+def batch_indicators(frames: Dict[str, pd.DataFrame], config=None, timeframe=None, only=None) -> Dict[str, Optional[Dict]]:
+    """
+    calculate_indicators cho nhiều symbol một lượt: {symbol: dict chỉ báo | None}.
+    Khung None hoặc < 200 nến -> None (như calculate_indicators).
+    """
+    result: Dict[str, Optional[Dict]] = {}
+    valid = {}
+    for s, df in frames.items():
+        if df is None or len(df) < 200:
+            print(f"[ERROR] DataFrame quá nhỏ ({len(df) if df is not None else 0}), cần >= 200")
+            result[s] = None
+        else:
+            valid[s] = df
+    if not valid:
+        return result
+
+    need = resolve_indicators(only)
+    tf = str(timeframe).lower() if timeframe is not None else None
+    label = 'trend_h4' if tf in ['4h', 'h4'] else ('trend_d1' if tf in ['1d', 'd1', 'daily'] else None)
+    stack = OhlcvStack(valid)
+    arrays = compute_batch(stack, need | ({'ema200'} if label else set()))
+    rest = need - BATCH_KEYS
+    batch_keys = [k for k in INDICATOR_KEYS if k in need and k in BATCH_KEYS]
+    # Số giá trị hợp lệ mỗi hàng (phần đệm là NaN nên không bị đếm)
+    n_valid = {k: np.count_nonzero(~np.isnan(arrays[k].astype(np.float64)), axis=1) for k in batch_keys}
+
+    for i, s in enumerate(stack.symbols):
+        df = valid[s]
+        ind = None
+        if rest:
+            ind = calculate_indicators(df, config, only=rest)
+            if ind is None:
+                result[s] = None
+                continue
+        bad = next((k for k in batch_keys if n_valid[k][i] < 5), None)
+        if bad is not None:
+            print(f"[ERROR] Indicator '{bad}' có quá ít giá trị hợp lệ.")
+            result[s] = None
+            continue
+        views = {k: stack.row(i, arrays[k]) for k in batch_keys}
+        merged = {k: (views[k] if k in views else ind[k]) for k in INDICATOR_KEYS if k in need}
+        merged['trend_h4'] = "-"
+        merged['trend_d1'] = "-"
+        if label:
+            close, ema200 = df['close'].iloc[-1], arrays['ema200'][i, -1]
+            if not (pd.isna(close) or pd.isna(ema200)):
+                merged[label] = "UP" if close > ema200 else "DOWN"
+        result[s] = merged
+    return result
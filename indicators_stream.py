@@ -0,0 +1,481 @@
+# -*- coding: utf-8 -*-
+import math
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+from anchored_vwap import VwapAccumulator
+from candle_store import timeframe_ms
+from indicators import INDICATOR_KEYS, resolve_indicators
+
+NAN = float("nan")
+
+# Thứ tự & tên khóa giống calculate_indicators
+SERIES_KEYS = list(INDICATOR_KEYS)
+
+class _Ema:
+    """EMA kiểu ta: ewm(span, adjust=False, min_periods=span), bỏ qua NaN đầu chuỗi."""
+    __slots__ = ("alpha", "min_periods", "value", "count")
+
+    def __init__(self, span=None, alpha=None, min_periods=None):
+        self.alpha = alpha if alpha is not None else 2.0 / (span + 1.0)
+        self.min_periods = int(min_periods if min_periods is not None else span)
+        self.value = None
+        self.count = 0
+
+    def step(self, x):
+        if x != x:
+            return self.value if (self.value is not None and self.count >= self.min_periods) else NAN
+        self.value = x if self.value is None else (1.0 - self.alpha) * self.value + self.alpha * x
+        self.count += 1
+        return self.value if self.count >= self.min_periods else NAN
+
+    def save(self):
+        return self.value, self.count
+
+    def restore(self, st):
+        self.value, self.count = st
+
+class _Rolling:
+    """
+    Cửa sổ trượt cố định; NaN nếu chưa đủ `window` giá trị hoặc có NaN trong cửa sổ.
+    Tổng và tổng bình phương (của x - shift, giảm triệt tiêu khi giá lớn) cập nhật O(1) khi
+    push/đẩy ra; cứ `window` lần push thì cộng lại bằng fsum để chặn sai số tích lũy
+    (khấu hao O(1)). min/max vẫn duyệt cửa sổ (chỉ dùng cho stoch RSI, cửa sổ 14).
+    """
+    __slots__ = ("window", "buf", "n", "nan", "shift", "s1", "s2", "since_resum")
+
+    def __init__(self, window):
+        self.window = int(window)
+        self.buf = deque(maxlen=self.window)
+        self.n = 0
+        self.nan = 0
+        self.shift = 0.0
+        self.s1 = self.s2 = 0.0
+        self.since_resum = 0
+
+    def push(self, x):
+        buf = self.buf
+        if len(buf) == self.window:
+            old = buf[0]
+            if old != old:
+                self.nan -= 1
+            else:
+                d = old - self.shift
+                self.s1 -= d
+                self.s2 -= d * d
+        elif not buf and x == x:
+            self.shift = x
+        buf.append(x)
+        self.n += 1
+        if x != x:
+            self.nan += 1
+        else:
+            d = x - self.shift
+            self.s1 += d
+            self.s2 += d * d
+        self.since_resum += 1
+        if self.since_resum >= self.window:
+            self._resum()
+
+    def _resum(self):
+        vals = [v for v in self.buf if v == v]
+        self.shift = vals[-1] if vals else 0.0
+        self.s1 = math.fsum(v - self.shift for v in vals)
+        self.s2 = math.fsum((v - self.shift) ** 2 for v in vals)
+        self.since_resum = 0
+
+    def ready(self):
+        return len(self.buf) == self.window and self.nan == 0
+
+    def mean(self):
+        return self.shift + self.s1 / self.window if self.ready() else NAN
+
+    def sum(self):
+        return self.s1 + self.window * self.shift if self.ready() else NAN
+
+    def std0(self):
+        if not self.ready():
+            return NAN
+        m = self.s1 / self.window
+        return math.sqrt(max(0.0, self.s2 / self.window - m * m))
+
+    def min(self):
+        return min(self.buf) if self.ready() else NAN
+
+    def max(self):
+        return max(self.buf) if self.ready() else NAN
+
+    def save(self):
+        full = len(self.buf) == self.window
+        return (self.n, self.buf[0] if full else None, full, self.nan, self.shift, self.s1, self.s2, self.since_resum)
+
+    def restore(self, st):
+        n, first, full, self.nan, self.shift, self.s1, self.s2, self.since_resum = st
+        if self.n != n:  # đã push đúng một giá trị
+            self.buf.pop()
+            if full:
+                self.buf.appendleft(first)
+            self.n = n
+
+class _WilderAtr:
+    """ATR của thư viện ta: 0 cho tới nến window-1, rồi trung bình Wilder."""
+    __slots__ = ("n", "i", "seed", "value")
+
+    def __init__(self, n):
+        self.n = int(n)
+        self.i = 0
+        self.seed = []
+        self.value = 0.0
+
+    def step(self, tr):
+        if self.i < self.n:
+            self.seed.append(tr)
+            if self.i == self.n - 1:
+                self.value = sum(self.seed) / self.n
+        else:
+            self.value = (self.value * (self.n - 1) + tr) / self.n
+        self.i += 1
+        return self.value
+
+    def save(self):
+        return self.i, len(self.seed), self.value
+
+    def restore(self, st):
+        self.i, n_seed, self.value = st
+        del self.seed[n_seed:]
+
+class _Adx:
+    """ADX của thư viện ta (trend.ADXIndicator), kể cả phần khởi tạo (0 cho tới nến 2*window-1)."""
+    __slots__ = ("n", "i", "trs", "dip", "din", "seed_tr", "seed_p", "seed_n", "dx_seed", "value")
+
+    def __init__(self, n=14):
+        self.n = int(n)
+        self.i = 0
+        self.trs = self.dip = self.din = 0.0
+        self.seed_tr, self.seed_p, self.seed_n, self.dx_seed = [], [], [], []
+        self.value = 0.0
+
+    def step(self, tr, pos, neg):
+        n = self.n
+        i = self.i
+        self.i += 1
+        if i == 0:
+            return self.value
+        if i < n:
+            self.seed_tr.append(tr); self.seed_p.append(pos); self.seed_n.append(neg)
+            return self.value
+        if i == n:
+            self.seed_tr.append(tr); self.seed_p.append(pos); self.seed_n.append(neg)
+            self.trs, self.dip, self.din = sum(self.seed_tr), sum(self.seed_p), sum(self.seed_n)
+        else:
+            self.trs = self.trs - self.trs / n + tr
+            self.dip = self.dip - self.dip / n + pos
+            self.din = self.din - self.din / n + neg
+        dip = 100.0 * self.dip / self.trs if self.trs != 0 else 0.0
+        din = 100.0 * self.din / self.trs if self.trs != 0 else 0.0
+        dx = 100.0 * abs((dip - din) / (dip + din)) if (dip + din) != 0 else 0.0
+        if i < 2 * n - 1:
+            self.dx_seed.append(dx)
+        elif i == 2 * n - 1:
+            self.dx_seed.append(dx)
+            self.value = sum(self.dx_seed) / n
+        else:
+            self.value = (self.value * (n - 1) + dx) / n
+        return self.value
+
+    def save(self):
+        return (self.i, self.trs, self.dip, self.din, len(self.seed_tr), len(self.seed_p), len(self.seed_n),
+                len(self.dx_seed), self.value)
+
+    def restore(self, st):
+        self.i, self.trs, self.dip, self.din, a, b, c, d, self.value = st
+        del self.seed_tr[a:], self.seed_p[b:], self.seed_n[c:], self.dx_seed[d:]
+
+class IndicatorState:
+    """
+    Trạng thái chạy của các chỉ báo trong calculate_indicators (lọc theo `only`).
+    step() nhận một nến đã đóng, cập nhật O(1) và trả về giá trị chỉ báo tại nến đó.
+    """
+    def __init__(self, vwap_anchor: str = "daily_utc", only=None):
+        # ema200 luôn giữ để tính trend_h4/trend_d1
+        self.need = resolve_indicators(only) | {'ema200'}
+        self.ema200 = _Ema(span=200)
+        self.ma50 = _Rolling(50)
+        self.ema12 = _Ema(span=12)
+        self.ema26 = _Ema(span=26)
+        self.macd_sig = _Ema(span=9)
+        self.rsi_up = _Ema(alpha=1 / 14, min_periods=14)
+        self.rsi_dn = _Ema(alpha=1 / 14, min_periods=14)
+        self.rsi_win = _Rolling(14)
+        self.adx = _Adx(14)
+        self.atr14 = _WilderAtr(14)
+        self.atr10 = _WilderAtr(10)
+        self.rng20 = _Rolling(20)
+        self.mfv20 = _Rolling(20)
+        self.vol20 = _Rolling(20)
+        self.close20 = _Rolling(20)
+        self.vwap = VwapAccumulator(vwap_anchor)
+        self.prev_close = None
+        self.prev_high = None
+        self.prev_low = None
+        self.st_ub = None
+        self.st_lb = None
+        self.st_dir = 1
+        self.count = 0
+
+    _PARTS = ("ema200", "ma50", "ema12", "ema26", "macd_sig", "rsi_up", "rsi_dn", "rsi_win", "adx",
+              "atr14", "atr10", "rng20", "mfv20", "vol20", "close20")
+    _SCALARS = ("prev_close", "prev_high", "prev_low", "st_ub", "st_lb", "st_dir", "count")
+
+    def save(self):
+        """Trạng thái đủ để hoàn tác đúng một step(commit=False): O(1), không sao chép cửa sổ."""
+        return ([getattr(self, p).save() for p in self._PARTS], [getattr(self, k) for k in self._SCALARS])
+
+    def restore(self, st):
+        parts, scalars = st
+        for p, ps in zip(self._PARTS, parts):
+            getattr(self, p).restore(ps)
+        for k, v in zip(self._SCALARS, scalars):
+            setattr(self, k, v)
+
+    def step(self, o, h, l, c, v, ts=None, commit=True) -> Dict[str, float]:
+        """commit=False: VWAP chỉ peek (không ghi); các phần còn lại hoàn tác bằng save()/restore()."""
+        out = {}
+        need = self.need
+        pc = self.prev_close
+        first = pc is None
+
+        out['ema200'] = self.ema200.step(c)
+        if 'ma50' in need:
+            self.ma50.push(c)
+            out['ma50'] = self.ma50.mean()
+
+        if 'macd' in need:
+            fast, slow = self.ema12.step(c), self.ema26.step(c)
+            macd = fast - slow
+            out['macd'] = macd
+            out['macd_signal'] = self.macd_sig.step(macd)
+
+        if 'rsi' in need:
+            diff = 0.0 if first else c - pc
+            up = self.rsi_up.step(diff if diff > 0 else 0.0)
+            dn = self.rsi_dn.step(-diff if diff < 0 else 0.0)
+            if dn != dn or up != up:
+                rsi = NAN
+            elif dn == 0:
+                rsi = 100.0
+            else:
+                rsi = 100.0 - 100.0 / (1.0 + up / dn)
+            out['rsi'] = rsi
+            if 'stoch_rsi' in need:
+                self.rsi_win.push(rsi)
+                lo, hi = self.rsi_win.min(), self.rsi_win.max()
+                out['stoch_rsi'] = (rsi - lo) / (hi - lo) if hi == hi and hi != lo else NAN
+
+        tr = (h - l) if first else max(h - l, abs(h - pc), abs(l - pc))
+        if 'adx' in need:
+            if first:
+                pos = neg = 0.0
+            else:
+                d_up = h - self.prev_high
+                d_dn = self.prev_low - l
+                pos = d_up if (d_up > d_dn and d_up > 0) else 0.0
+                neg = d_dn if (d_dn > d_up and d_dn > 0) else 0.0
+            out['adx'] = self.adx.step(tr, pos, neg)
+
+        if 'vwap' in need:
+            tp = (h + l + c) / 3.0
+            out['vwap'] = self.vwap.update(ts, tp, v) if commit else self.vwap.peek(ts, tp, v)
+
+        if 'supertrend' in need:
+            atr10 = self.atr10.step(tr)
+            hl2 = (h + l) / 2.0
+            basic_ub, basic_lb = hl2 + 3 * atr10, hl2 - 3 * atr10
+            if first:
+                ub, lb = basic_ub, basic_lb
+                self.st_dir = 1
+            else:
+                ub = min(basic_ub, self.st_ub) if pc > self.st_ub else basic_ub
+                lb = max(basic_lb, self.st_lb) if pc < self.st_lb else basic_lb
+                if c > self.st_ub:
+                    self.st_dir = 1
+                elif c < self.st_lb:
+                    self.st_dir = -1
+            self.st_ub, self.st_lb = ub, lb
+            out['supertrend'] = self.st_dir
+
+        if 'range_filter' in need:
+            rng = h - l
+            self.rng20.push(rng)
+            rng_mean = self.rng20.mean()
+            out['range_filter'] = int(rng > rng_mean * 1.5) if rng_mean == rng_mean else 0
+
+        if 'atr' in need:
+            out['atr'] = self.atr14.step(tr)
+
+        if 'chaikin_mf' in need or 'volume_spike' in need:
+            self.vol20.push(v)
+        if 'chaikin_mf' in need:
+            mfv = ((c - l) - (h - c)) / (h - l) * v if h != l else 0.0
+            if mfv != mfv or mfv in (float('inf'), -float('inf')):
+                mfv = 0.0
+            self.mfv20.push(mfv)
+            vol_sum = self.vol20.sum()
+            out['chaikin_mf'] = self.mfv20.sum() / vol_sum if vol_sum == vol_sum and vol_sum != 0 else NAN
+        if 'volume_spike' in need:
+            vol_mean = self.vol20.mean()
+            out['volume_spike'] = int(v > vol_mean * 1.5) if vol_mean == vol_mean else 0
+
+        if 'bollinger_bands' in need:
+            self.close20.push(c)
+            mid, sd = self.close20.mean(), self.close20.std0()
+            out['bollinger_bands_upper'] = mid + 2 * sd
+            out['bollinger_bands_lower'] = mid - 2 * sd
+            out['bollinger_bands_mid'] = mid
+            out['bollinger_bands'] = out['bollinger_bands_upper'] - out['bollinger_bands_lower']
+
+        self.prev_close, self.prev_high, self.prev_low = c, h, l
+        self.count += 1
+        return out
+
+def _trend(close, ema200):
+    if close != close or ema200 != ema200:
+        return "-"
+    return "UP" if close > ema200 else "DOWN"
+
+class StreamingIndicators:
+    """
+    Chỉ báo cho một (symbol, timeframe), cập nhật O(1) mỗi khi nến đóng.
+    - update(): nến đã đóng, ghi vào trạng thái + lịch sử.
+    - peek(): nến đang chạy, step rồi hoàn tác bằng save()/restore() O(1) (không ghi).
+    Cùng điểm bắt đầu dữ liệu thì kết quả khớp calculate_indicators; khác biệt duy nhất
+    khi chạy lâu là stream không "seed lại" EMA/Wilder theo cửa sổ 300-400 nến trượt.
+    """
+    def __init__(self, max_history=1000, vwap_anchor: str = "daily_utc", only=None):
+        self.vwap_anchor = vwap_anchor
+        self.state = IndicatorState(vwap_anchor, only)
+        self.keys = [k for k in SERIES_KEYS if k in self.state.need]
+        self.max_history = int(max_history)
+        self.history = {k: deque(maxlen=self.max_history) for k in self.keys}
+        self.closes = deque(maxlen=self.max_history)
+        self.last_ts: Optional[int] = None
+
+    def update(self, bar, ts: Optional[int] = None) -> Dict[str, float]:
+        o, h, l, c, v = (float(x) for x in bar)
+        out = self.state.step(o, h, l, c, v, ts)
+        for k in self.keys:
+            self.history[k].append(out[k])
+        self.closes.append(c)
+        if ts is not None:
+            self.last_ts = int(ts)
+        return out
+
+    def seed(self, ohlcv_df: pd.DataFrame):
+        cols = ohlcv_df[['open', 'high', 'low', 'close', 'volume']].to_numpy(dtype=float)
+        ts = ohlcv_df['timestamp'].to_numpy() if 'timestamp' in ohlcv_df.columns else [None] * len(cols)
+        for row, t in zip(cols, ts):
+            self.update(row, t)
+
+    def peek(self, bar, ts: Optional[int] = None) -> Dict[str, float]:
+        o, h, l, c, v = (float(x) for x in bar)
+        saved = self.state.save()
+        try:
+            return self.state.step(o, h, l, c, v, ts, commit=False)
+        finally:
+            self.state.restore(saved)
+
+    def as_indicators(self, ohlcv_df: pd.DataFrame, forming_bar=None, timeframe=None, forming_ts=None) -> Dict:
+        """
+        Dict giống calculate_indicators, Series căn theo index của `ohlcv_df`
+        (các dòng cuối). `forming_bar` = (o, h, l, c, v) của nến đang chạy nếu có.
+        """
+        extra = self.peek(forming_bar, forming_ts) if forming_bar is not None else None
+        n_hist = len(self.closes) + (1 if extra is not None else 0)
+        n = len(ohlcv_df)
+        index = ohlcv_df.index
+        indicators = {}
+        for k in self.keys:
+            vals = list(self.history[k])
+            if extra is not None:
+                vals.append(extra[k])
+            if n_hist >= n:
+                vals = vals[n_hist - n:]
+            else:
+                vals = [NAN] * (n - n_hist) + vals
+            dtype = "int64" if k in ('supertrend', 'range_filter', 'volume_spike') and n_hist >= n else "float64"
+            indicators[k] = pd.Series(vals, index=index, dtype=dtype)
+        if extra is not None:
+            last_close = float(forming_bar[3])
+        else:
+            last_close = self.closes[-1] if self.closes else NAN
+        trend = _trend(last_close, indicators['ema200'].iloc[-1]) if n >= 200 else "-"
+        indicators['trend_h4'] = "-"
+        indicators['trend_d1'] = "-"
+        if timeframe is not None:
+            tf = str(timeframe).lower()
+            if tf in ['4h', 'h4']:
+                indicators['trend_h4'] = trend
+            elif tf in ['1d', 'd1', 'daily']:
+                indicators['trend_d1'] = trend
+        return indicators
+
+class StreamingIndicatorEngine:
+    """
+    Quản lý StreamingIndicators theo (symbol, timeframe), tự đồng bộ với DataFrame
+    nến mới nhất: nến đóng mới -> update(), nến đang chạy -> peek().
+    """
+    def __init__(self, max_history=1000, vwap_anchor: str = "daily_utc"):
+        self.max_history = int(max_history)
+        self.vwap_anchor = vwap_anchor
+        self._streams: Dict[Tuple[str, str], StreamingIndicators] = {}
+
+    def get(self, symbol: str, timeframe: str) -> Optional[StreamingIndicators]:
+        return self._streams.get((symbol, timeframe))
+
+    def reset(self, symbol: str = None, timeframe: str = None):
+        if symbol is None:
+            self._streams.clear()
+        else:
+            self._streams.pop((symbol, timeframe), None)
+
+    def indicators(self, symbol: str, timeframe: str, ohlcv_df: pd.DataFrame, now_ms: Optional[int] = None,
+                   vwap_anchor: Optional[str] = None, only=None):
+        if ohlcv_df is None or len(ohlcv_df) < 200:
+            print(f"[ERROR] DataFrame quá nhỏ ({len(ohlcv_df) if ohlcv_df is not None else 0}), cần >= 200")
+            return None
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        tf_ms = timeframe_ms(timeframe)
+        ts = ohlcv_df['timestamp'].to_numpy()
+        closed_mask = (ts + tf_ms) <= now_ms
+        closed = ohlcv_df[closed_mask]
+        forming = ohlcv_df[~closed_mask]
+
+        anchor = vwap_anchor or self.vwap_anchor
+        key = (symbol, timeframe)
+        stream = self._streams.get(key)
+        if stream is not None and (stream.vwap_anchor != anchor or not resolve_indicators(only) <= stream.state.need):
+            stream = None
+        if stream is not None and stream.last_ts is not None:
+            new = closed[closed['timestamp'] > stream.last_ts]
+            if len(new) and int(new['timestamp'].iloc[0]) != stream.last_ts + tf_ms:
+                stream = None  # thủng dữ liệu -> seed lại
+            elif len(closed) and int(closed['timestamp'].iloc[-1]) < stream.last_ts:
+                stream = None
+        if stream is None:
+            stream = StreamingIndicators(self.max_history, anchor, only)
+            stream.seed(closed)
+            self._streams[key] = stream
+        else:
+            for row in new[['timestamp', 'open', 'high', 'low', 'close', 'volume']].itertuples(index=False):
+                stream.update(row[1:], row[0])
+
+        bar, bar_ts = None, None
+        if len(forming):
+            r = forming.iloc[-1]
+            bar = (r['open'], r['high'], r['low'], r['close'], r['volume'])
+            bar_ts = int(r['timestamp'])
+        return stream.as_indicators(ohlcv_df, forming_bar=bar, timeframe=timeframe, forming_ts=bar_ts)
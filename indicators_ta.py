@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from anchored_vwap import parse_anchor, vwap_series
+from indicator_graph import IndicatorGraph
+from indicator_kernels import band_direction, supertrend_kernel
+
+def ema(series: pd.Series, period: int) -> pd.Series:
+    return series.ewm(span=period, adjust=False).mean()
+
+def true_range(h: pd.Series, l: pd.Series, c: pd.Series) -> pd.Series:
+    prev_close = c.shift(1)
+    return pd.concat([
+        (h - l),
+        (h - prev_close).abs(),
+        (l - prev_close).abs()
+    ], axis=1).max(axis=1)
+
+def atr(h: pd.Series, l: pd.Series, c: pd.Series, period: int = 14, tr: pd.Series = None) -> pd.Series:
+    if tr is None:
+        tr = true_range(h, l, c)
+    return tr.rolling(window=period, min_periods=period).mean()
+
+def rsi(close: pd.Series, period: int = 14) -> pd.Series:
+    delta = close.diff()
+    up = np.where(delta > 0, delta, 0.0)
+    down = np.where(delta < 0, -delta, 0.0)
+    roll_up = pd.Series(up, index=close.index).ewm(alpha=1/period, adjust=False).mean()
+    roll_down = pd.Series(down, index=close.index).ewm(alpha=1/period, adjust=False).mean()
+    rs = roll_up / (roll_down.replace(0, np.nan))
+    rsi = 100 - (100 / (1 + rs))
+    return rsi.fillna(50)
+
+def adx(h: pd.Series, l: pd.Series, c: pd.Series, period: int = 14, atr_val: pd.Series = None) -> pd.Series:
+    up_move = h.diff()
+    down_move = -l.diff()
+    plus_dm = np.where((up_move > down_move) & (up_move > 0), up_move, 0.0)
+    minus_dm = np.where((down_move > up_move) & (down_move > 0), down_move, 0.0)
+    if atr_val is None:
+        atr_val = atr(h, l, c, period)
+    plus_di = 100 * pd.Series(plus_dm, index=h.index).ewm(alpha=1/period, adjust=False).mean() / atr_val
+    minus_di = 100 * pd.Series(minus_dm, index=h.index).ewm(alpha=1/period, adjust=False).mean() / atr_val
+    dx = ( (plus_di - minus_di).abs() / (plus_di + minus_di).replace(0, np.nan) ) * 100
+    return dx.ewm(alpha=1/period, adjust=False).mean().fillna(0)
+
+def supertrend(h: pd.Series, l: pd.Series, c: pd.Series, atr_period: int = 10, multiplier: float = 3.0,
+               atr_val: pd.Series = None) -> pd.Series:
+    if atr_val is None:
+        atr_val = atr(h, l, c, atr_period)
+    _, _, direction = supertrend_kernel(h, l, c, atr_val, multiplier, first_dir=-1)
+    dir_long = pd.Series(direction, index=c.index, dtype=float)
+    return dir_long  # 1 = long, -1 = short
+
+def vwap(c: pd.Series, v: pd.Series, anchor: str = "daily_utc", ts=None) -> pd.Series:
+    """
+    Anchored VWAP. `ts`: bar open times (epoch ms or datetimes); defaults to the DatetimeIndex of `c`.
+    Calendar anchors (daily/weekly/session) need bar times; without them this raises instead of
+    silently falling back to a cumulative VWAP.
+    """
+    kind, _ = parse_anchor(anchor)
+    if kind not in ("rolling", "cumulative") and ts is None and not isinstance(c.index, pd.DatetimeIndex):
+        raise ValueError(f"VWAP anchor {anchor!r} needs bar timestamps (a timestamp column or a DatetimeIndex)")
+    return vwap_series(c, v, ts=ts, anchor=anchor)
+
+def range_filter_direction(c: pd.Series, h: pd.Series, l: pd.Series, length: int = 20, atr_mult: float = 1.5,
+                           base: pd.Series = None, atr_val: pd.Series = None) -> pd.Series:
+    """
+    Simple ATR-banded EMA baseline. Direction flips only when price exits the band.
+    Returns 1 for long, -1 for short.
+    `base` / `atr_val` may be passed in when ema(length) / atr(14) are already computed.
+    """
+    if base is None:
+        base = ema(c, length)
+    if atr_val is None:
+        atr_val = atr(h, l, c, 14)
+    upper = base + atr_mult * atr_val
+    lower = base - atr_mult * atr_val
+    return pd.Series(band_direction(c, upper, lower, init=-1), index=c.index, dtype=float)
+
+def slope(series: pd.Series, lookback: int = 3) -> float:
+    if len(series) < lookback + 1:
+        return 0.0
+    return series.iloc[-1] - series.iloc[-1 - lookback]
+
+# ---- Indicator DAG: shared nodes (tr, atr(n), ema(close,n)) are computed once per frame ----
+GRAPH = IndicatorGraph()
+GRAPH.register("tr", true_range, inputs=("high", "low", "close"), lookback=1)
+GRAPH.register("atr", lambda tr, period: atr(None, None, None, period, tr=tr),
+               inputs=[("tr", {})], lookback=lambda period: period)
+GRAPH.register("ema", lambda s, source, period: ema(s, period),
+               inputs=lambda source, period: [source], lookback=lambda source, period: period)
+GRAPH.register("rsi", lambda c, period: rsi(c, period), inputs=("close",), lookback=lambda period: period)
+GRAPH.register("adx", lambda h, l, a, period: adx(h, l, None, period, atr_val=a),
+               inputs=lambda period: ["high", "low", ("atr", {"period": period})], lookback=lambda period: period)
+GRAPH.register("supertrend", lambda h, l, c, a, atr_period, multiplier: supertrend(h, l, c, atr_period, multiplier, atr_val=a),
+               inputs=lambda atr_period, multiplier: ["high", "low", "close", ("atr", {"period": atr_period})], lookback=0)
+GRAPH.register("range_filter",
+               lambda c, b, a, length, atr_mult: range_filter_direction(c, None, None, length, atr_mult, base=b, atr_val=a),
+               inputs=lambda length, atr_mult: ["close", ("ema", {"source": "close", "period": length}), ("atr", {"period": 14})],
+               lookback=0)
+GRAPH.register("vwap", lambda c, v, ts, anchor: vwap(c, v if v is not None else pd.Series(0.0, index=c.index), anchor, ts=ts),
+               inputs=("close", "volume", "timestamp"))
@@ -4,7 +4,7 @@ from typing import Dict, Optional
 
 import pandas as pd
 
-from indicators import calculate_indicators
+from indicator_cache import cached_indicators
 from votes import tally_votes
 from tight_gate import (
     StablePassTracker,
@@ -15,6 +15,8 @@ from tight_gate import (
 )
 from order_planner import plan_probe_and_topup
 from exec_engine import ExecutionEngine
+from data import get_candle_store
+from resampler import CandleResampler
 
 class SharkEngineFacade:
     def __init__(self, cfg: Dict):
@@ -26,6 +28,8 @@ class SharkEngineFacade:
             required_passes=int((self.cfg.get("tight_mode") or {}).get("snapshot_confirmations", 2)),
         )
         self.cd = CooldownManager(path=(self.cfg.get("tight_mode") or {}).get("cooldown_path", "tight_cooldown.json"))
+        store = get_candle_store()
+        self.resampler = CandleResampler(store) if store is not None else None
 
         self.th_m15 = float((self.cfg.get("thresholds") or {}).get("M15", self.cfg.get("score_threshold", 17.0)))
         self.adx_h1_th = int(self.cfg.get("adx_h1_threshold", 25))
@@ -45,13 +49,21 @@ class SharkEngineFacade:
             return "SHORT"
         return "NEUTRAL"
 
+    def _derive(self, symbol: str, timeframe: str, m5: Optional[pd.DataFrame], df: Optional[pd.DataFrame], limit: int = 300):
+        # Khung lớn không truyền vào thì dựng từ M5 (cùng một thời điểm với M5)
+        if df is not None and not df.empty:
+            return df
+        if self.resampler is None or m5 is None or m5.empty:
+            return df
+        return self.resampler.derive(symbol, timeframe, m5, limit=limit)
+
     def process_intrabar(
         self,
         symbol: str,
         m5: pd.DataFrame,
-        m15: pd.DataFrame,
-        h1: pd.DataFrame,
-        d1: pd.DataFrame,  # <--- Nhận thêm D1
+        m15: Optional[pd.DataFrame] = None,
+        h1: Optional[pd.DataFrame] = None,
+        d1: Optional[pd.DataFrame] = None,  # <--- Nhận thêm D1
         now_ts: Optional[float] = None,
         config: Optional[Dict] = None,
     ) -> Dict:
@@ -60,13 +72,17 @@ class SharkEngineFacade:
         if config is None:
             config = self.cfg
 
+        m15 = self._derive(symbol, "15m", m5, m15)
+        h1 = self._derive(symbol, "1h", m5, h1)
+        d1 = self._derive(symbol, "1d", m5, d1)
+
         timeframe = "15m"
         if m15 is None or m15.empty or h1 is None or h1.empty or m5 is None or m5.empty:
             return {"entry_ready": False, "blocked_by": ["No data"], "actions": []}
 
-        ind_m15 = calculate_indicators(m15, config, timeframe="15m")
-        ind_h1 = calculate_indicators(h1, config, timeframe="4h")
-        ind_d1 = calculate_indicators(d1, config, timeframe="1d") if d1 is not None and not d1.empty else None  # <--- Tính trend D1
+        ind_m15 = cached_indicators(symbol, "15m", m15, config)
+        ind_h1 = cached_indicators(symbol, "1h", h1, config, trend_tf="4h")
+        ind_d1 = cached_indicators(symbol, "1d", d1, config) if d1 is not None and not d1.empty else None  # <--- Tính trend D1
 
         map_m15 = build_indicator_results(m15, ind_m15)
         vr_m15 = tally_votes(map_m15, self.w_m15)
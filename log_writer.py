@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Ghi log CSV dồn lô (write-behind) dùng chung cho các log theo dòng (trades_sim_log, scores_log,
+entries_reasons, latency_log, trailing_log...).
+
+- write(): mã hóa dòng thành chuỗi CSV ngay (lệnh/dict có bị sửa sau đó cũng không ảnh hưởng),
+  đưa vào bộ đệm của file, không mở/stat file.
+- flush(): mỗi file mở một lần, kiểm tra header một lần, ghi cả lô. Tự flush khi bộ đệm đủ
+  max_rows dòng hoặc dòng cũ nhất quá max_age_sec; main gọi flush mỗi vòng lặp và khi nhận SIGTERM.
+- background=True: một thread nền làm việc ghi; flush(wait=False) chỉ đánh thức thread, vòng scan
+  không chờ đĩa.
+- Ghi lỗi: các dòng của file đó được đưa lại đầu bộ đệm để lần flush sau ghi lại (giữ tối đa
+  MAX_RETRY_ROWS dòng mỗi file, quá thì bỏ dòng cũ nhất và báo số dòng bị bỏ).
+- Writer mặc định của module (khi chưa có vòng lặp nào gọi set_log_writer) ghi đồng bộ từng dòng,
+  như append_csv trước đây; main thay bằng build_log_writer(cfg).
+"""
+import atexit
+import csv
+import io
+import os
+import threading
+import time
+from typing import Dict, List, Sequence
+
+MAX_RETRY_ROWS = 100_000
+
+def _encode(values) -> str:
+    buf = io.StringIO()
+    csv.writer(buf).writerow(values)  # lineterminator \r\n như csv.DictWriter
+    return buf.getvalue()
+
+class LogWriter:
+    def __init__(self, max_rows: int = 1000, max_age_sec: float = 5.0, background: bool = False):
+        self.max_rows = max(1, int(max_rows))
+        self.max_age_sec = float(max_age_sec)
+        self._lock = threading.Lock()      # bộ đệm
+        self._io_lock = threading.Lock()   # một lần ghi tại một thời điểm -> giữ thứ tự dòng
+        self._buf: Dict[str, List] = {}    # path -> [fieldnames (header), [dòng CSV]]
+        self._rows = 0
+        self._first_at = None
+        self.stats = {"rows": 0, "flushes": 0, "errors": 0, "dropped": 0}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+
+    def write(self, path: str, fieldnames: Sequence[str], row: dict):
+        """Thêm một dòng (chỉ các cột trong fieldnames, thiếu = rỗng) vào bộ đệm của `path`."""
+        line = _encode([row.get(k) for k in fieldnames])
+        with self._lock:
+            ent = self._buf.get(path)
+            if ent is None:
+                ent = self._buf[path] = [list(fieldnames), []]
+            ent[1].append(line)
+            self._rows += 1
+            now = time.monotonic()
+            if self._first_at is None:
+                self._first_at = now
+            due = self._rows >= self.max_rows or now - self._first_at >= self.max_age_sec
+        if due:
+            self.flush(wait=False)
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._rows
+
+    def flush(self, wait: bool = True) -> int:
+        """Ghi mọi dòng đang đệm; wait=False với thread nền: chỉ đánh thức thread. Trả số dòng đã ghi."""
+        if not wait and self._thread is not None:
+            self._wake.set()
+            return 0
+        return self._write_pending()
+
+    def _write_pending(self) -> int:
+        with self._io_lock:
+            with self._lock:
+                buf, self._buf = self._buf, {}
+                n, self._rows, self._first_at = self._rows, 0, None
+            if not buf:
+                return 0
+            failed = {}
+            for path, (fieldnames, lines) in buf.items():
+                try:
+                    d = os.path.dirname(path)
+                    if d:
+                        os.makedirs(d, exist_ok=True)
+                    header = not os.path.exists(path) or os.path.getsize(path) == 0
+                    with open(path, "a", encoding="utf-8", newline="") as f:
+                        if header:
+                            f.write(_encode(fieldnames))
+                        f.write("".join(lines))
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    failed[path] = (fieldnames, lines)
+                    print(f"[LOG] Lỗi ghi {path} ({len(lines)} dòng, giữ lại để ghi lại): {e}")
+            if failed:
+                n -= sum(len(lines) for _, lines in failed.values())
+                self._requeue(failed)
+            self.stats["rows"] += n
+            self.stats["flushes"] += 1
+            return n
+
+    def _requeue(self, failed: Dict[str, tuple]):
+        """Đưa các dòng ghi lỗi về đầu bộ đệm (trước các dòng mới đến trong lúc ghi)."""
+        with self._lock:
+            for path, (fieldnames, lines) in failed.items():
+                ent = self._buf.get(path)
+                if ent is None:
+                    ent = self._buf[path] = [fieldnames, []]
+                before = len(ent[1])
+                ent[1][:0] = lines
+                drop = len(ent[1]) - MAX_RETRY_ROWS
+                if drop > 0:
+                    del ent[1][:drop]
+                    self.stats["dropped"] += drop
+                    print(f"[LOG] Bỏ {drop} dòng cũ nhất của {path} (ghi lỗi liên tục)")
+                self._rows += len(ent[1]) - before
+            if self._first_at is None and self._rows:
+                self._first_at = time.monotonic()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.max_age_sec)
+            self._wake.clear()
+            self._write_pending()
+
+    def close(self):
+        """Dừng thread nền (nếu có) và ghi nốt bộ đệm."""
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join(timeout=10)
+            self._thread = None
+        self._write_pending()
+
+def build_log_writer(cfg) -> LogWriter:
+    c = (cfg or {}).get("log_writer", {}) or {}
+    return LogWriter(max_rows=int(c.get("max_rows", 1000)), max_age_sec=float(c.get("max_age_sec", 5.0)),
+                     background=bool(c.get("background", True)))
+
+_writer = LogWriter(max_rows=1)  # chưa có vòng lặp sở hữu: ghi ngay từng dòng
+
+def get_log_writer() -> LogWriter:
+    return _writer
+
+def set_log_writer(writer: LogWriter):
+    """Thay writer dùng chung; writer cũ được đóng (ghi nốt bộ đệm) trước."""
+    global _writer
+    old, _writer = _writer, writer
+    if old is not writer:
+        old.close()
+
+@atexit.register
+def _close_at_exit():
+    _writer.close()
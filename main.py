@@ -12,15 +12,23 @@ import csv
 import os
 import unicodedata
 
-from data import fetch_data
+from data import fetch_many, close_async_exchange, get_candle_store
+from resampler import CandleResampler
+from rate_limiter import PRIORITY_POSITION, PRIORITY_SCAN
+from bar_scheduler import DayRollover, build_scheduler
 from indicators import calculate_indicators
-from tight_gate import build_indicator_results, StablePassTracker, _heavy_hits
-from votes import tally_votes
+from indicators_batch import batch_indicators
+from indicators_stream import StreamingIndicatorEngine
+from anchored_vwap import vwap_anchor
+from indicator_cache import build_indicator_cache, cached_indicators, get_indicator_cache, set_indicator_cache
+from log_writer import build_log_writer, get_log_writer, set_log_writer
+from tight_gate import build_indicator_results, recent_bar_votes, StablePassTracker, _heavy_hits, required_indicators
+from votes import compile_weights
 from notifier import Notifier
 from order_planner import plan_probe_and_topup
-from config import SIGNAL_MONITOR_CONFIG
+from config import SIGNAL_MONITOR_CONFIG, apply_profile
 from signal_manager import SignalMonitor
-from trade_simulator import TradeSimulator
+from trade_simulator import TradeSimulator, gmt7_date
 
 from sideway_strategy import handle_sideway_entry
 
@@ -31,6 +39,8 @@ PRE_STATE: Dict[str, Dict[str, Any]] = {}
 
 monitor = SignalMonitor(SIGNAL_MONITOR_CONFIG)
 simulator = TradeSimulator(capital=100.0, leverage=10, fee_bps=4)
+resampler = CandleResampler(get_candle_store(), base_timeframe="5m")
+indicator_engine = StreamingIndicatorEngine(max_history=1000)
 stable_tracker = None
 
 PROBE_INDICATOR_PCT = 90
@@ -44,6 +54,16 @@ SPAM_PROBE_WARNED = {}
 LAST_CLOSE_TIME = {}
 LAST_TRADE: Dict[str, Dict[str, Any]] = {}
 
+FETCH_PLAN = (("5m", 400), ("15m", 300), ("1h", 300), ("1d", 300))
+
+# Chỉ báo gate/quản lý lệnh dùng trực tiếp (ngoài phiếu bầu) theo khung
+GATE_INDICATORS = {
+    "5m": (),
+    "15m": ("atr", "vwap", "ma50", "ema200", "adx", "rsi", "bollinger_bands_upper", "bollinger_bands_lower"),
+    "1h": ("adx", "ema200", "supertrend", "range_filter"),
+    "1d": (),
+}
+
 def safe_float_fmt(val, digits=4, default=""):
     try:
         if val is None or (hasattr(pd, "isnull") and pd.isnull(val)):
@@ -81,14 +101,7 @@ def log_reason_vi_no_accent(log_dict):
             out[k] = remove_accents(v)
         else:
             out[k] = v
-    fn = "entries_reasons.csv"
-    fieldnames = list(out.keys())
-    write_header = not os.path.exists(fn)
-    with open(fn, 'a', encoding="utf-8", newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        if write_header:
-            writer.writeheader()
-        writer.writerow(out)
+    get_log_writer().write("entries_reasons.csv", list(out.keys()), out)
 
 def should_send_new_entry(symbol, timeframe, direction, entry, sl, tp, min_interval_min=15, min_entry_diff_pct=0.5):
     key = (normalize_symbol(symbol), timeframe)
@@ -154,17 +167,12 @@ def snapshot_m5_confirmed(side_m15, m5, ind_m5, count=2, w_m15_u=None):
         return True
     if m5 is None or len(m5) < count:
         return False
-    votes = []
-    for i in range(-count, 0):
-        # Tính indicator và votes cho từng nến M5 gần nhất
-        df_one = m5.iloc[:i+1] if i != -1 else m5
-        ind_one = calculate_indicators(df_one, timeframe="5m")
-        map_one_u = build_indicator_results(df_one, ind_one)
-        tally = tally_votes(map_one_u, w_m15_u)
-        sl = tally.get('score_long', 0)
-        ss = tally.get('score_short', 0)
-        side = decide_side(sl, ss)
-        votes.append(side)
+    # Một lần tính indicator cho cả khung, phiếu/điểm của từng nến M5 gần nhất tra từ chuỗi
+    need = required_indicators(w_m15_u)
+    ind = ind_m5 if ind_m5 is not None and need <= set(ind_m5) else calculate_indicators(m5, timeframe="5m", only=need)
+    if ind is None:
+        return False
+    votes = [decide_side(b["score_long"], b["score_short"]) for b in recent_bar_votes(m5, ind, w_m15_u, bars=count)]
     # Normalize kiểu dữ liệu để so sánh chính xác
     def normalize_side(s):
         return str(s).strip().upper()
@@ -249,12 +257,7 @@ def _write_trailing_log(trade, price_now, old_sl, new_sl, roi_now):
         "new_sl": new_sl,
         "roi_now": roi_now
     }
-    write_header = not os.path.exists(fn)
-    with open(fn, "a", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=list(row.keys()))
-        if write_header:
-            writer.writeheader()
-        writer.writerow(row)
+    get_log_writer().write(fn, list(row.keys()), row)
 
 def update_trailing_stop(trade, price_now):
     if trade is None:
@@ -313,6 +316,108 @@ def _calc_initial_sl(entry_price: float, direction: str, atr_val: float, mult: f
     else:
         return entry_price + mult * atr_val
 
+def _close_on_tp_sl(trade, price_now, tp_sim, sl_sim, now_epoch) -> bool:
+    dside = trade.get("direction")
+    if price_now is not None and tp_sim is not None and (
+        (dside == "LONG" and price_now >= tp_sim) or
+        (dside == "SHORT" and price_now <= tp_sim)
+    ):
+        simulator.close_trade(trade, price_now, "TP", now_epoch, reason="take_profit")
+        return True
+    if price_now is not None and sl_sim is not None and (
+        (dside == "LONG" and price_now <= sl_sim) or
+        (dside == "SHORT" and price_now >= sl_sim)
+    ):
+        simulator.close_trade(trade, price_now, "SL", now_epoch, reason="stop_loss")
+        return True
+    return False
+
+def _on_trade_closed(symbol, trade, now_epoch):
+    dside = trade.get("direction")
+    try:
+        LAST_TRADE[symbol] = {"direction": dside, "entry": float(trade.get("entry") or 0), "close_ts": now_epoch}
+    except Exception:
+        pass
+    mark_closed_entry(symbol, "15m", dside)
+    monitor.remove_signal(symbol)
+    CLOSE_WARNED.pop(f"{symbol}|{trade.get('entry')}", None)
+    LAST_CLOSE_TIME[symbol] = time.time()
+
+def indicator_plan(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Tập chỉ báo cần tính cho từng khung khi bật indicators.lazy (None = tính tất cả):
+    phiếu có trọng số khác 0 trong weights_sets + phụ thuộc của gate.
+    """
+    if not bool((cfg.get("indicators", {}) or {}).get("lazy", False)):
+        return {tf: None for tf in GATE_INDICATORS}
+    wsets = cfg.get("weights_sets") or {}
+    w_m15, w_h1 = wsets.get("M15", {}), wsets.get("H1", {})
+    return {
+        # snapshot_m5_confirmed chấm điểm M5 theo trọng số mặc định -> cần đủ phiếu mặc định
+        "5m": required_indicators(w_m15, GATE_INDICATORS["5m"]) | required_indicators(None),
+        "15m": required_indicators(w_m15, GATE_INDICATORS["15m"]),
+        # map H1 chỉ giữ các key có trong weights_sets.H1
+        "1h": required_indicators(w_h1, GATE_INDICATORS["1h"], weighted_only=True),
+        "1d": set(GATE_INDICATORS["1d"]),
+    }
+
+def batch_frame_indicators(cfg: Dict[str, Any], frames, symbols, plan) -> Dict[Tuple[str, str], Any]:
+    """indicators.batch: tính chỉ báo cho toàn bộ symbol của mỗi khung trên mảng (symbols × bars)."""
+    if not bool((cfg.get("indicators", {}) or {}).get("batch", False)):
+        return {}
+    out = {}
+    for tf in GATE_INDICATORS:
+        per_tf = {s: frames.get((s, tf)) for s in symbols if frames.get((s, tf)) is not None}
+        for s, ind in batch_indicators(per_tf, cfg, timeframe=tf, only=plan[tf]).items():
+            out[(s, tf)] = ind
+    return out
+
+def compute_indicators(cfg: Dict[str, Any], symbol: str, timeframe: str, df, only=None, batch=None):
+    if batch and (symbol, timeframe) in batch:
+        return batch[(symbol, timeframe)]
+    # Stream: chỉ cập nhật nến mới đóng + vá nến đang chạy; mặc định dùng cache theo nến đóng
+    if bool((cfg.get("indicators", {}) or {}).get("streaming", False)):
+        return indicator_engine.indicators(symbol, timeframe, df, vwap_anchor=vwap_anchor(cfg), only=only)
+    return cached_indicators(symbol, timeframe, df, cfg, only=only)
+
+async def fetch_frames(cfg: Dict[str, Any], symbols) -> Dict[Tuple[str, str], Any]:
+    sched_cfg = cfg.get("scheduler", {}) or {}
+    fetch_kw = {
+        "max_concurrency": int(sched_cfg.get("fetch_concurrency", 10)),
+        "timeout_sec": float(sched_cfg.get("fetch_timeout_sec", 10)),
+    }
+    derive = bool((cfg.get("data", {}) or {}).get("derive_from_m5", False)) and resampler.store is not None
+    plan = FETCH_PLAN[:1] if derive else FETCH_PLAN
+    # Symbol đang có lệnh mở được ưu tiên quota request trước danh sách quét
+    prio = {s: (PRIORITY_POSITION if simulator.get_active_trade(s) else PRIORITY_SCAN) for s in symbols}
+    # Tải song song toàn bộ (symbol, timeframe): thời gian vòng ~ request chậm nhất
+    frames = await fetch_many([(s, tf, lim, prio[s]) for s in symbols for tf, lim in plan], **fetch_kw)
+    if not derive:
+        return frames
+
+    # M15/H1/D1 dựng từ M5; chỉ gọi REST khi kho chưa đủ lịch sử cho khung đó
+    base_tf = FETCH_PLAN[0][0]
+    backfill = [
+        (s, tf, lim, prio[s]) for s in symbols for tf, lim in FETCH_PLAN[1:]
+        if resampler.needs_backfill(s, tf, frames.get((s, base_tf)), lim)
+    ]
+    if backfill:
+        frames.update(await fetch_many(backfill, **fetch_kw))
+    fallback = []
+    for s in symbols:
+        base = frames.get((s, base_tf))
+        if base is None:
+            continue
+        for tf, lim in FETCH_PLAN[1:]:
+            derived = resampler.derive(s, tf, base, limit=lim)
+            if derived is not None:
+                frames[(s, tf)] = derived
+            elif frames.get((s, tf)) is None:
+                fallback.append((s, tf, lim, prio[s]))
+    if fallback:
+        frames.update(await fetch_many(fallback, **fetch_kw))
+    return frames
+
 async def run_once(cfg: Dict[str, Any], notifier: Notifier, tracker: StablePassTracker):
     now_epoch = time.time()
 
@@ -328,6 +433,8 @@ async def run_once(cfg: Dict[str, Any], notifier: Notifier, tracker: StablePassT
     w_h1_u = _upper_keys(w_h1)
     m15_max_w = _sum_positive_weights(w_m15_u)
     h1_max_w  = _sum_positive_weights(w_h1_u)
+    cw_m15, cw_h1 = compile_weights(w_m15_u), compile_weights(w_h1_u)
+    ind_plan = indicator_plan(cfg)
 
     PROBE_PCT = float((cfg.get("trading", {}) or {}).get("probe_pct", 0.1))
     FULL_PCT = float((cfg.get("trading", {}) or {}).get("full_pct", 0.5))
@@ -340,16 +447,25 @@ async def run_once(cfg: Dict[str, Any], notifier: Notifier, tracker: StablePassT
     sl_mult_full  = float((cfg.get("trading", {}) or {}).get("sl_atr_mult_full",  (cfg.get("tight_mode", {}) or {}).get("sl_atr_mult", 1.2)))
     bypass_breakout_anti_ch_normal = bool((cfg.get("engine", {}) or {}).get("bypass_anti_chase_on_breakout_normal", False))
 
+    cooldown_period = 15 * 60
+    active_symbols = []
     for symbol in symbols:
-        cooldown_period = 15 * 60
         if symbol in LAST_CLOSE_TIME and time.time() - LAST_CLOSE_TIME[symbol] < cooldown_period:
             print(f"[COOLDOWN] {symbol}: chờ 1 nến M15 sau khi vừa đóng lệnh")
             continue
+        active_symbols.append(symbol)
+
+    frames = await fetch_frames(cfg, active_symbols)
+    batch_ind = batch_frame_indicators(cfg, frames, active_symbols, ind_plan)
 
-        m5 = fetch_data(symbol, "5m", limit=400)
-        m15 = fetch_data(symbol, "15m", limit=300)
-        h1 = fetch_data(symbol, "1h", limit=300)
-        d1 = fetch_data(symbol, "1d", limit=300)
+    for symbol in active_symbols:
+        # Nhường event loop giữa các symbol để wait_for có thể ngắt vòng quét
+        await asyncio.sleep(0)
+
+        m5 = frames.get((symbol, "5m"))
+        m15 = frames.get((symbol, "15m"))
+        h1 = frames.get((symbol, "1h"))
+        d1 = frames.get((symbol, "1d"))
 
         if not check_indicator_input(m5, 215, f"{symbol} M5"): continue
         if not check_indicator_input(m15, 200, f"{symbol} M15"): continue
@@ -361,10 +477,10 @@ async def run_once(cfg: Dict[str, Any], notifier: Notifier, tracker: StablePassT
         if not is_data_fresh(h1, tf_min=60, symbol=symbol, tf_name="H1"): continue
         if not is_data_fresh(d1, tf_min=1440, symbol=symbol, tf_name="D1"): continue
 
-        ind_m5 = calculate_indicators(m5, cfg, timeframe="5m")
-        ind_m15 = calculate_indicators(m15, cfg, timeframe="15m")
-        ind_h1 = calculate_indicators(h1, cfg, timeframe="1h")
-        ind_d1 = calculate_indicators(d1, cfg, timeframe="1d")
+        ind_m5 = compute_indicators(cfg, symbol, "5m", m5, only=ind_plan["5m"], batch=batch_ind)
+        ind_m15 = compute_indicators(cfg, symbol, "15m", m15, only=ind_plan["15m"], batch=batch_ind)
+        ind_h1 = compute_indicators(cfg, symbol, "1h", h1, only=ind_plan["1h"], batch=batch_ind)
+        ind_d1 = compute_indicators(cfg, symbol, "1d", d1, only=ind_plan["1d"], batch=batch_ind)
         if ind_m5 is None or ind_m15 is None or ind_h1 is None or ind_d1 is None: continue
 
         map_m5_u  = _upper_keys(build_indicator_results(m5,  ind_m5))
@@ -372,9 +488,9 @@ async def run_once(cfg: Dict[str, Any], notifier: Notifier, tracker: StablePassT
         map_h1_u  = _upper_keys(build_indicator_results(h1,  ind_h1))
         map_h1_u_filtered = {k: v for k, v in map_h1_u.items() if k in w_h1_u}
 
-        vr_m5  = tally_votes(map_m5_u,  w_m15_u)
-        vr_m15 = tally_votes(map_m15_u, w_m15_u)
-        vr_h1  = tally_votes(map_h1_u_filtered,  w_h1_u)
+        vr_m5  = cw_m15.tally(map_m5_u)
+        vr_m15 = cw_m15.tally(map_m15_u)
+        vr_h1  = cw_h1.tally(map_h1_u_filtered)
 
         sl5, ss5   = float(vr_m5.get("score_long", 0) or 0),  float(vr_m5.get("score_short", 0) or 0)
         sl15, ss15 = float(vr_m15.get("score_long", 0) or 0), float(vr_m15.get("score_short", 0) or 0)
@@ -491,14 +607,8 @@ async def run_once(cfg: Dict[str, Any], notifier: Notifier, tracker: StablePassT
         sim_tp_long = price_now * (1 + roi_target / LEVERAGE)
         sim_tp_short = price_now * (1 - roi_target / LEVERAGE)
 
-        active_probe = None
-        active_full = None
-        for t in simulator.get_all_trades():
-            if t["symbol"] == symbol and t["time_close"] is None:
-                if t["stage"] == "probe":
-                    active_probe = t
-                elif t["stage"] == "full":
-                    active_full = t
+        active_probe = simulator.get_stage_trade(symbol, "probe")
+        active_full = simulator.get_stage_trade(symbol, "full")
 
         if active_probe:
             age_min = (now_epoch - active_probe.get("time_open", now_epoch)) / 60.0
@@ -564,14 +674,8 @@ async def run_once(cfg: Dict[str, Any], notifier: Notifier, tracker: StablePassT
                                 )
                                 notifier.text(f"Probe {symbol} ({trade_direction}) – {regime} | Entry {safe_float_fmt(price_now)} | SL {safe_float_fmt(init_sl)}")
 
-        active_probe = None
-        active_full = None
-        for t in simulator.get_all_trades():
-            if t["symbol"] == symbol and t["time_close"] is None:
-                if t["stage"] == "probe":
-                    active_probe = t
-                elif t["stage"] == "full":
-                    active_full = t
+        active_probe = simulator.get_stage_trade(symbol, "probe")
+        active_full = simulator.get_stage_trade(symbol, "full")
 
         if active_probe and active_probe.get("stage") == "probe":
             last_close = float(m15["close"].iloc[-1])
@@ -602,78 +706,48 @@ async def run_once(cfg: Dict[str, Any], notifier: Notifier, tracker: StablePassT
                 simulator.close_trade(active_probe, price_now, "TRAP", now_epoch, reason="trap_reversal")
                 notifier.text(f"Đóng probe {symbol} do trap đảo chiều vol lớn")
 
-        for t in simulator.get_all_trades():
-            if t["symbol"] == symbol and t["time_close"] is None:
-                dside = t.get("direction")
-                tp_sim = t.get("tp")
-                sl_sim = t.get("sl")
-                active_id = f"{symbol}|{t.get('entry')}"
-                closed = False
-
-                update_trailing_stop(t, price_now)
-
-                if price_now is not None and tp_sim is not None and (
-                    (dside == "LONG" and price_now >= tp_sim) or
-                    (dside == "SHORT" and price_now <= tp_sim)
-                ):
-                    simulator.close_trade(t, price_now, "TP", now_epoch, reason="take_profit")
-                    closed = True
-
-                if not closed and price_now is not None and sl_sim is not None and (
-                    (dside == "LONG" and price_now <= sl_sim) or
-                    (dside == "SHORT" and price_now >= sl_sim)
-                ):
-                    simulator.close_trade(t, price_now, "SL", now_epoch, reason="stop_loss")
-                    closed = True
-
-                if not closed and side_m15 and dside and side_m15 != dside and side_m15 in ("LONG", "SHORT"):
-                    simulator.close_trade(t, price_now, "REVERSE", now_epoch, reason="reverse_signal")
-                    closed = True
-
-                try:
-                    adx_latest = float(ind_m15['adx'].iloc[-1])
-                except Exception:
-                    adx_latest = None
-                try:
-                    rsi_latest = float(ind_m15['rsi'].iloc[-1])
-                except Exception:
-                    rsi_latest = None
-                suggest, reason, content = should_suggest_close(t, side_m15, ind_m15, adx_latest, rsi_latest, now_epoch)
-                pnl = t.get("result", 0)
-                if not closed and (suggest and pnl is not None and pnl > 0 and AUTO_CLOSE_ON_WARNING_IF_PNL_POS):
-                    simulator.close_trade(t, price_now, "CLOSE_WARN_PNL_POS", now_epoch, reason="close_on_warning_pnl_positive")
-                    notifier.text(f"Đóng {symbol} do cảnh báo & PnL dương {safe_float_fmt(pnl,2)}")
-                    closed = True
-                elif not closed and suggest:
-                    last_warned = CLOSE_WARNED.get(active_id)
-                    if last_warned != reason:
-                        notifier.text(content)
-                        CLOSE_WARNED[active_id] = reason
-                else:
-                    if CLOSE_WARNED.get(active_id):
-                        CLOSE_WARNED.pop(active_id, None)
-
-                if closed:
-                    try:
-                        LAST_TRADE[symbol] = {"direction": dside, "entry": float(t.get("entry") or 0), "close_ts": now_epoch}
-                    except Exception:
-                        pass
-                    mark_closed_entry(symbol, "15m", dside)
-                    monitor.remove_signal(symbol)
+        for t in simulator.get_open_trades(symbol):
+            dside = t.get("direction")
+            tp_sim = t.get("tp")
+            sl_sim = t.get("sl")
+            active_id = f"{symbol}|{t.get('entry')}"
+            closed = False
+
+            update_trailing_stop(t, price_now)
+            simulator.equity.mark(t, price_now)
+            closed = _close_on_tp_sl(t, price_now, tp_sim, sl_sim, now_epoch)
+
+            if not closed and side_m15 and dside and side_m15 != dside and side_m15 in ("LONG", "SHORT"):
+                simulator.close_trade(t, price_now, "REVERSE", now_epoch, reason="reverse_signal")
+                closed = True
+
+            try:
+                adx_latest = float(ind_m15['adx'].iloc[-1])
+            except Exception:
+                adx_latest = None
+            try:
+                rsi_latest = float(ind_m15['rsi'].iloc[-1])
+            except Exception:
+                rsi_latest = None
+            suggest, reason, content = should_suggest_close(t, side_m15, ind_m15, adx_latest, rsi_latest, now_epoch)
+            pnl = t.get("result", 0)
+            if not closed and (suggest and pnl is not None and pnl > 0 and AUTO_CLOSE_ON_WARNING_IF_PNL_POS):
+                simulator.close_trade(t, price_now, "CLOSE_WARN_PNL_POS", now_epoch, reason="close_on_warning_pnl_positive")
+                notifier.text(f"Đóng {symbol} do cảnh báo & PnL dương {safe_float_fmt(pnl,2)}")
+                closed = True
+            elif not closed and suggest:
+                last_warned = CLOSE_WARNED.get(active_id)
+                if last_warned != reason:
+                    notifier.text(content)
+                    CLOSE_WARNED[active_id] = reason
+            else:
+                if CLOSE_WARNED.get(active_id):
                     CLOSE_WARNED.pop(active_id, None)
-                    LAST_CLOSE_TIME[symbol] = time.time()
-
-    now_dt = datetime.now()
-    if now_dt.hour == 23 and now_dt.minute >= 59:
-        csv_path = "trades_sim_log.csv"
-        simulator.save_report(csv_path, date=now_dt.strftime("%Y-%m-%d"))
-        md_report = simulator.format_markdown_report(date=now_dt.strftime("%Y-%m-%d"))
-        summary = simulator.summary_by_stage(date=now_dt.strftime("%Y-%m-%d"))
-        notifier.text("Báo cáo cuối ngày:\n" + md_report + "\n" + summary)
-        try:
-            notifier.send_file(csv_path, "Báo cáo giao dịch (CSV)")
-        except Exception:
-            pass
+
+            if closed:
+                _on_trade_closed(symbol, t, now_epoch)
+
+    simulator.equity.sample(now_epoch)
 
     for symbol in cfg.get("symbols", []):
         active_trade = simulator.get_active_trade(symbol)
@@ -683,6 +757,63 @@ async def run_once(cfg: Dict[str, Any], notifier: Notifier, tracker: StablePassT
                 notifier.text(f"Lệnh {symbol} đã treo {hold_m15} nến M15")
                 active_trade["hold_warned"] = True
 
+def send_daily_report(notifier: Notifier, date_str: str):
+    """Báo cáo cuối ngày cho ngày `date_str` (YYYY-MM-DD, GMT+7 như kho lệnh)."""
+    csv_path = "trades_sim_log.csv"
+    try:
+        simulator.save_report(csv_path, date=date_str)
+        md_report = simulator.format_markdown_report(date=date_str)
+        summary = simulator.summary_by_stage(date=date_str)
+        notifier.text("Báo cáo cuối ngày:\n" + md_report + "\n" + summary)
+    except Exception as e:
+        print(f"[ERROR] send_daily_report {date_str}: {e!r}")
+        return
+    try:
+        notifier.send_file(csv_path, "Báo cáo giao dịch (CSV)")
+    except Exception:
+        pass
+
+async def run_refresh(cfg: Dict[str, Any], notifier: Notifier):
+    """
+    Vòng nhẹ giữa hai lần đóng nến: chỉ cập nhật nến M5 đang chạy của các symbol có lệnh mở
+    để dời trailing stop và chốt TP/SL, không tính lại chỉ báo.
+    """
+    now_epoch = time.time()
+    open_symbols = [s for s in cfg.get("symbols", []) if simulator.get_active_trade(s)]
+    if not open_symbols:
+        return
+    sched_cfg = cfg.get("scheduler", {}) or {}
+    base_tf, base_limit = FETCH_PLAN[0]
+    frames = await fetch_many(
+        [(s, base_tf, base_limit, PRIORITY_POSITION) for s in open_symbols],
+        max_concurrency=int(sched_cfg.get("fetch_concurrency", 10)),
+        timeout_sec=float(sched_cfg.get("fetch_timeout_sec", 10)),
+    )
+    for symbol in open_symbols:
+        m5 = frames.get((symbol, base_tf))
+        if m5 is None or m5.empty or pd.isnull(m5["close"].iloc[-1]):
+            continue
+        price_now = float(m5["close"].iloc[-1])
+        for t in simulator.get_open_trades(symbol):
+            tp_sim = t.get("tp")
+            sl_sim = t.get("sl")
+            update_trailing_stop(t, price_now)
+            simulator.equity.mark(t, price_now)
+            if _close_on_tp_sl(t, price_now, tp_sim, sl_sim, now_epoch):
+                notifier.text(f"Đóng {symbol} ({t.get('status')}) tại {safe_float_fmt(price_now)}")
+                _on_trade_closed(symbol, t, now_epoch)
+    simulator.equity.sample(now_epoch)
+
+async def _run_guarded(coro, timeout: float, label: str):
+    try:
+        await asyncio.wait_for(coro, timeout=timeout)
+    except asyncio.TimeoutError:
+        print(f"[WARN] {label} timeout")
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"[ERROR] {label}: {e!r}")
+
 async def main():
     global stable_tracker
     parser = argparse.ArgumentParser()
@@ -692,17 +823,15 @@ async def main():
     cfg = load_config()
     prof = args.profile or cfg.get("active_profile")
     if prof:
-        p = (cfg.get("profiles") or {}).get(prof) or {}
-        for k in ("thresholds","tight_mode","trading","risk","scheduler","engine","signal_flow","regime","discord"):
-            if k in p: cfg.setdefault(k, {}).update(p[k])
-        if "adx_h1_threshold" in p:
-            cfg["adx_h1_threshold"] = p["adx_h1_threshold"]
+        apply_profile(cfg, prof)
 
     tight = cfg.get("tight_mode", {}) or {}
     snapshot_min_gap_sec = int(tight.get("snapshot_min_gap_sec", 60))
     snapshot_confirmations = int(tight.get("snapshot_confirmations", 3))
     state_path = tight.get("state_path", "tight_state.json")
     stable_tracker = StablePassTracker(path=state_path, min_gap_sec=snapshot_min_gap_sec, required_passes=snapshot_confirmations)
+    set_indicator_cache(build_indicator_cache(cfg))
+    set_log_writer(build_log_writer(cfg))
 
     notifier = Notifier(cfg)
     if notifier.enabled():
@@ -710,25 +839,55 @@ async def main():
 
     stop_event = asyncio.Event()
     loop = asyncio.get_running_loop()
+    def _on_stop():
+        stop_event.set()
+        get_log_writer().flush()  # ghi ngay log đang đệm, kể cả khi vòng hiện tại chưa kết thúc
+
     try:
-        loop.add_signal_handler(signal.SIGTERM, stop_event.set)
-        loop.add_signal_handler(signal.SIGINT, stop_event.set)
+        loop.add_signal_handler(signal.SIGTERM, _on_stop)
+        loop.add_signal_handler(signal.SIGINT, _on_stop)
     except NotImplementedError:
         pass
 
-    interval_sec = int((cfg.get("scheduler") or {}).get("interval_sec", 45))
+    sched_cfg = cfg.get("scheduler") or {}
+    interval_sec = int(sched_cfg.get("interval_sec", 45))
+    run_timeout = max(5, int(sched_cfg.get("run_timeout_sec", interval_sec - 5)))
+    bar_sched = build_scheduler(cfg) if str(sched_cfg.get("mode", "bar_close")).lower() == "bar_close" else None
 
+    # Báo cáo cuối ngày chạy khi vòng lặp thấy đã sang ngày mới (ngày GMT+7 như kho lệnh)
+    report_day = DayRollover(gmt7_date)
+    last_close_at = 0.0
     while not stop_event.is_set():
+        if bar_sched is not None:
+            # Vòng nặng ngay sau khi nến đóng, xen giữa là vòng nhẹ cập nhật nến đang chạy
+            fire_at, kind, closed_tfs = bar_sched.next_event(max(time.time(), last_close_at))
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=max(0, fire_at - time.time()))
+            except asyncio.TimeoutError:
+                pass
+            if stop_event.is_set():
+                break
+            done_day = report_day.check()
+            if done_day:
+                send_daily_report(notifier, done_day)
+            if kind == "close":
+                last_close_at = fire_at
+                print(f"[LOOP] {datetime.now().isoformat(timespec='seconds')} close={','.join(closed_tfs)}")
+                await _run_guarded(run_once(cfg, notifier, stable_tracker), run_timeout, "run_once")
+                st = get_indicator_cache().stats
+                print(f"[CACHE] indicators hit={st['hits']} miss={st['misses']} patch={st['patches']} evict={st['evictions']}")
+            else:
+                await _run_guarded(run_refresh(cfg, notifier), run_timeout, "run_refresh")
+            get_log_writer().flush(wait=False)
+            continue
+
         start = time.time()
+        done_day = report_day.check(start)
+        if done_day:
+            send_daily_report(notifier, done_day)
         print(f"[LOOP] {datetime.now().isoformat(timespec='seconds')}")
-        try:
-            await asyncio.wait_for(run_once(cfg, notifier, stable_tracker), timeout=max(5, interval_sec - 5))
-        except asyncio.TimeoutError:
-            print("[WARN] iteration timeout")
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            print(f"[ERROR] run_once: {e!r}")
+        await _run_guarded(run_once(cfg, notifier, stable_tracker), run_timeout, "run_once")
+        get_log_writer().flush(wait=False)
         elapsed = time.time() - start
         remain = max(0, interval_sec - elapsed)
         try:
@@ -736,6 +895,9 @@ async def main():
         except asyncio.TimeoutError:
             pass
 
+    await close_async_exchange()
+    get_log_writer().close()
+    simulator.archive.flush()
     print("[MAIN] Stopped")
 
 if __name__ == "__main__":
@@ -7,7 +7,7 @@ from typing import Dict
 import pandas as pd
 
 from data import fetch_data
-from indicators import calculate_indicators
+from indicator_cache import cached_indicators
 from votes import tally_votes
 from report_utils import format_votes
 
@@ -68,8 +68,8 @@ def main():
             if not check_indicator_input(m15, 200, f"{symbol} M15"): continue
             if not check_indicator_input(h1, 200, f"{symbol} H1"): continue
 
-            ind_m15 = calculate_indicators(m15, cfg)
-            ind_h1 = calculate_indicators(h1, cfg)
+            ind_m15 = cached_indicators(symbol, "15m", m15, cfg)
+            ind_h1 = cached_indicators(symbol, "1h", h1, cfg)
 
             map_m15 = build_indicator_results(m15, ind_m15)
             map_h1 = build_indicator_results(h1, ind_h1)
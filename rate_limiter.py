@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+from typing import Optional
+
+import ccxt
+
+# Thứ tự ưu tiên: số nhỏ được phục vụ trước
+PRIORITY_POSITION = 0   # symbol đang có lệnh mở
+PRIORITY_SCAN = 1       # phần còn lại của danh sách quét
+_PRIORITIES = (PRIORITY_POSITION, PRIORITY_SCAN)
+
+# Trọng số request của Binance (REQUEST_WEIGHT, giới hạn 6000/phút)
+ENDPOINT_WEIGHTS = {
+    "ticker_price": 2,
+    "exchange_info": 20,
+}
+# klines tính theo limit: [1,100) -> 1, [100,500) -> 2, [500,1000] -> 5, > 1000 -> 10
+KLINES_WEIGHT_TIERS = ((100, 1), (500, 2), (1001, 5))
+KLINES_DEFAULT_LIMIT = 500  # limit=None: sàn trả 500 nến
+
+RATE_LIMIT_STATUS = (429, 418)
+
+def endpoint_weight(endpoint: str, limit: Optional[int] = None) -> int:
+    if endpoint == "klines":
+        limit = KLINES_DEFAULT_LIMIT if limit is None else int(limit)
+        for upper, w in KLINES_WEIGHT_TIERS:
+            if limit < upper:
+                return w
+        return 10
+    return int(ENDPOINT_WEIGHTS.get(endpoint, 1))
+
+class RateLimited(Exception):
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status}, retry_after={retry_after}")
+        self.status = status
+        self.retry_after = retry_after
+
+class RequestScheduler:
+    """
+    Token bucket theo trọng số request của sàn, dùng chung cho mọi lời gọi REST
+    (sync lẫn async). Request ưu tiên thấp hơn phải chờ khi còn request ưu tiên cao đang đợi.
+    Gặp 429/418: chặn toàn bộ request cho tới hết Retry-After (hoặc backoff lũy thừa).
+    """
+    def __init__(self, capacity=6000, window_sec=60.0, safety=0.8, max_retries=3, base_backoff_sec=1.0, ban_backoff_sec=120.0):
+        self.capacity = float(capacity) * float(safety)
+        self.refill_per_sec = self.capacity / float(window_sec)
+        self.tokens = self.capacity
+        self.max_retries = int(max_retries)
+        self.base_backoff = float(base_backoff_sec)
+        self.ban_backoff = float(ban_backoff_sec)
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._strikes = 0
+        self._waiting = {p: 0 for p in _PRIORITIES}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "weight": 0, "waits": 0, "rate_limited": 0, "failed": 0}
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.refill_per_sec)
+        self._last = now
+
+    def _try_take(self, weight: float, priority: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            if any(self._waiting.get(p, 0) for p in _PRIORITIES if p < priority):
+                return 0.05
+            if self.tokens >= weight:
+                self.tokens -= weight
+                self.stats["requests"] += 1
+                self.stats["weight"] += weight
+                return 0.0
+            return (weight - self.tokens) / self.refill_per_sec
+
+    def _enter(self, priority: int):
+        with self._lock:
+            self._waiting[priority] = self._waiting.get(priority, 0) + 1
+
+    def _leave(self, priority: int):
+        with self._lock:
+            self._waiting[priority] -= 1
+
+    def acquire(self, weight: float = 1, priority: int = PRIORITY_SCAN):
+        self._enter(priority)
+        try:
+            while True:
+                wait = self._try_take(weight, priority)
+                if wait <= 0:
+                    return
+                self.stats["waits"] += 1
+                time.sleep(min(wait, 1.0))
+        finally:
+            self._leave(priority)
+
+    async def acquire_async(self, weight: float = 1, priority: int = PRIORITY_SCAN):
+        self._enter(priority)
+        try:
+            while True:
+                wait = self._try_take(weight, priority)
+                if wait <= 0:
+                    return
+                self.stats["waits"] += 1
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            self._leave(priority)
+
+    def sync_used_weight(self, headers):
+        # Đồng bộ bucket với trọng số sàn báo về (gồm cả request từ tiến trình khác cùng IP)
+        if not headers:
+            return
+        used = None
+        for k, v in headers.items():
+            if str(k).lower() == "x-mbx-used-weight-1m":
+                try:
+                    used = float(v)
+                except (TypeError, ValueError):
+                    pass
+                break
+        if used is None:
+            return
+        with self._lock:
+            # capacity đã trừ biên an toàn: trọng số sàn báo về ăn thẳng vào ngân sách đó
+            self.tokens = min(self.tokens, max(0.0, self.capacity - used))
+
+    def on_rate_limited(self, status: int = 429, retry_after: Optional[float] = None):
+        with self._lock:
+            self._strikes += 1
+            if retry_after is None:
+                base = self.ban_backoff if status == 418 else self.base_backoff
+                retry_after = base * (2 ** (self._strikes - 1))
+            self._blocked_until = max(self._blocked_until, time.monotonic() + float(retry_after))
+            self.tokens = 0.0
+            self.stats["rate_limited"] += 1
+        print(f"[RATE] HTTP {status}: tạm dừng mọi request {float(retry_after):.1f}s")
+
+    def _on_success(self):
+        if self._strikes:
+            with self._lock:
+                self._strikes = 0
+
+    def _classify(self, result=None, exc=None, exchange=None):
+        headers = None
+        if exc is not None:
+            if isinstance(exc, RateLimited):
+                return exc.status, exc.retry_after
+            if not isinstance(exc, (ccxt.RateLimitExceeded, ccxt.DDoSProtection)):
+                return None, None
+            headers = getattr(exchange, "last_response_headers", None)
+            status = 418 if "418" in str(exc) else 429
+        else:
+            status = getattr(result, "status_code", None)
+            if status not in RATE_LIMIT_STATUS:
+                return None, None
+            headers = getattr(result, "headers", None)
+        retry_after = None
+        for k, v in (headers or {}).items():
+            if str(k).lower() == "retry-after":
+                try:
+                    retry_after = float(v)
+                except (TypeError, ValueError):
+                    pass
+        return status, retry_after
+
+    def call(self, fn, *args, weight: float = 1, priority: int = PRIORITY_SCAN, exchange=None, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self.acquire(weight, priority)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                status, retry_after = self._classify(exc=e, exchange=exchange)
+                if status is None or attempt >= self.max_retries:
+                    self.stats["failed"] += 1
+                    raise
+                self.on_rate_limited(status, retry_after)
+                continue
+            status, retry_after = self._classify(result=result)
+            if status is not None:
+                if attempt >= self.max_retries:
+                    self.stats["failed"] += 1
+                    return result
+                self.on_rate_limited(status, retry_after)
+                continue
+            self._on_success()
+            self.sync_used_weight(getattr(exchange, "last_response_headers", None) or getattr(result, "headers", None))
+            return result
+
+    async def call_async(self, fn, *args, weight: float = 1, priority: int = PRIORITY_SCAN, exchange=None, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            await self.acquire_async(weight, priority)
+            try:
+                result = await fn(*args, **kwargs)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                status, retry_after = self._classify(exc=e, exchange=exchange)
+                if status is None or attempt >= self.max_retries:
+                    self.stats["failed"] += 1
+                    raise
+                self.on_rate_limited(status, retry_after)
+                continue
+            self._on_success()
+            self.sync_used_weight(getattr(exchange, "last_response_headers", None))
+            return result
+
+_scheduler = RequestScheduler()
+
+def get_scheduler() -> RequestScheduler:
+    return _scheduler
+
+def set_scheduler(scheduler: RequestScheduler):
+    global _scheduler
+    _scheduler = scheduler
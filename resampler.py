@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from candle_store import COLUMNS, timeframe_ms
+
+def aggregate_ohlcv(base_df: pd.DataFrame, timeframe: str, base_timeframe: str = "5m") -> pd.DataFrame:
+    """
+    Gộp nến base (M5) thành nến khung lớn hơn, mốc theo UTC như Binance.
+    Cột `complete` = True khi bucket có đủ số nến base (nến đã đóng đầy đủ),
+    cột `aligned` = True khi nến base đầu tiên trùng mốc mở của bucket.
+    """
+    tf_ms = timeframe_ms(timeframe)
+    per_bucket = tf_ms // timeframe_ms(base_timeframe)
+    if base_df is None or len(base_df) == 0:
+        return pd.DataFrame(columns=COLUMNS + ['complete', 'aligned'])
+    ts = base_df['timestamp'].to_numpy(dtype=np.int64)
+    bucket = ts - ts % tf_ms
+    g = base_df.groupby(bucket, sort=True)
+    out = pd.DataFrame({
+        'timestamp': g['timestamp'].first().index.to_numpy(dtype=np.int64),
+        'open': g['open'].first().to_numpy(),
+        'high': g['high'].max().to_numpy(),
+        'low': g['low'].min().to_numpy(),
+        'close': g['close'].last().to_numpy(),
+        'volume': g['volume'].sum().to_numpy(),
+    })
+    out['aligned'] = g['timestamp'].first().to_numpy() == out['timestamp'].to_numpy()
+    out['complete'] = out['aligned'] & (g.size().to_numpy() == per_bucket)
+    return out
+
+class CandleResampler:
+    """
+    Duy trì nến M15/H1/D1 từ một luồng M5 duy nhất.
+    Lịch sử nến đóng của khung lớn nằm trong CandleStore (backfill một lần qua REST),
+    mỗi vòng chỉ gộp các nến M5 mới hơn nến đóng cuối cùng của khung đó,
+    kể cả nến đang hình thành.
+    """
+    def __init__(self, store, base_timeframe: str = "5m"):
+        self.store = store
+        self.base_timeframe = base_timeframe
+
+    def needs_backfill(self, symbol: str, timeframe: str, base_df: pd.DataFrame, limit: int = 300) -> bool:
+        if base_df is None or len(base_df) == 0:
+            return False
+        last_ts = self.store.last_closed_ts(symbol, timeframe)
+        if last_ts is None or self.store.closed_count(symbol, timeframe) < limit - 1:
+            return True
+        # M5 phải phủ liền mạch từ nến đóng cuối cùng trở đi
+        return int(base_df['timestamp'].iloc[0]) > last_ts + timeframe_ms(timeframe)
+
+    def derive(self, symbol: str, timeframe: str, base_df: pd.DataFrame, limit: int = 300, now_ms: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """
+        Trả về `limit` nến gần nhất của `timeframe` (kèm nến đang chạy), hoặc None nếu
+        M5 không đủ để dựng chính xác (cần backfill qua REST).
+        """
+        if base_df is None or len(base_df) == 0:
+            return None
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        tf_ms = timeframe_ms(timeframe)
+        last_ts = self.store.last_closed_ts(symbol, timeframe)
+        base = base_df
+        if last_ts is not None:
+            base = base_df[base_df['timestamp'] >= last_ts + tf_ms]
+        agg = aggregate_ohlcv(base, timeframe, self.base_timeframe)
+        if last_ts is None:
+            # Bỏ bucket đầu bị cắt dở
+            while len(agg) and not bool(agg['aligned'].iloc[0]):
+                agg = agg.iloc[1:]
+        elif len(agg) and int(agg['timestamp'].iloc[0]) != last_ts + tf_ms:
+            return None
+        if len(agg):
+            closed = (agg['timestamp'] + tf_ms) <= now_ms
+            if bool((closed & ~agg['complete']).any()):
+                print(f"[RESAMPLE] {symbol} {timeframe}: thiếu nến {self.base_timeframe}, cần backfill")
+                return None
+        df = self.store.merge(symbol, timeframe, agg[COLUMNS], now_ms=now_ms)
+        return df.tail(limit).reset_index(drop=True)
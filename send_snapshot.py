@@ -2,6 +2,8 @@ import requests
 import time
 import csv
 
+from rate_limiter import endpoint_weight, get_scheduler
+
 api_url = "http://127.0.0.1:5000/suggest_signal"
 binance_url = "https://api.binance.com/api/v3/klines"
 params = {
@@ -10,25 +12,30 @@ params = {
     "limit": 1
 }
 
-with open('signal_log.csv', 'a', newline='') as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow(['timestamp', 'action', 'reason', 'close'])
+def main():
+    with open('signal_log.csv', 'a', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['timestamp', 'action', 'reason', 'close'])
+
+        while True:
+            resp = get_scheduler().call(requests.get, binance_url, params=params, timeout=10, weight=endpoint_weight("klines", params["limit"]))
+            candle = resp.json()[0]
+            snapshot = {
+                "close": float(candle[4]),
+                "direction": "LONG",
+                "score_total": 20,
+                "quality_pct": 95,
+                "fast_points": 10,
+                "slow_points": 5,
+                "bars_since_breakout": 1,
+                "prev_m15_high": float(candle[2]),
+                "entry_price": float(candle[4])
+            }
+            response = requests.post(api_url, json=snapshot)
+            result = response.json()
+            print(result)
+            writer.writerow([candle[0], result.get('action'), result.get('reason'), candle[4]])
+            time.sleep(60)
 
-    while True:
-        candle = requests.get(binance_url, params=params).json()[0]
-        snapshot = {
-            "close": float(candle[4]),
-            "direction": "LONG",
-            "score_total": 20,
-            "quality_pct": 95,
-            "fast_points": 10,
-            "slow_points": 5,
-            "bars_since_breakout": 1,
-            "prev_m15_high": float(candle[2]),
-            "entry_price": float(candle[4])
-        }
-        response = requests.post(api_url, json=snapshot)
-        result = response.json()
-        print(result)
-        writer.writerow([candle[0], result.get('action'), result.get('reason'), candle[4]])
-        time.sleep(60)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from signal_types import GateHistory, GateResult, Side
+from indicators_ta import GRAPH
+
+def _h1_nodes(cfg: Dict) -> Dict[str, str]:
+    st, rf = cfg["supertrend"], cfg["range_filter"]
+    return {
+        "ema200": GRAPH.node("ema", source="close", period=200),
+        "st": GRAPH.node("supertrend", atr_period=st["atr_period"], multiplier=st["multiplier"]),
+        "rf": GRAPH.node("range_filter", length=rf["length"], atr_mult=rf["atr_mult"]),
+        "adx": GRAPH.node("adx", period=cfg["adx_h1_period"]),
+    }
+
+def _m15_nodes(cfg: Dict) -> Dict[str, str]:
+    st, rf = cfg["supertrend"], cfg["range_filter"]
+    return {
+        "ema20": GRAPH.node("ema", source="close", period=20),
+        "ema50": GRAPH.node("ema", source="close", period=50),
+        "ema200": GRAPH.node("ema", source="close", period=200),
+        "st": GRAPH.node("supertrend", atr_period=st["atr_period"], multiplier=st["multiplier"]),
+        "rf": GRAPH.node("range_filter", length=rf["length"], atr_mult=rf["atr_mult"]),
+        "atr": GRAPH.node("atr", period=cfg["atr_period"]),
+        "rsi": GRAPH.node("rsi", period=cfg["rsi_m15_period"]),
+        "vwap": GRAPH.node("vwap", anchor=cfg.get("vwap_anchor", "daily_utc")),
+    }
+
+# Reason names in score order; bit i of GateHistory.reasons <-> M15_REASONS[side][i]
+M15_REASONS = {
+    "long": ("c>ema200", "ema200_up", "st_long", "rf_long", "c>ema50", "ema50_up", "c>ema20", "ema20_up",
+             "c>vwap", "dist_vwap_ok", "close_rising", "hl", "hh", "rsi>=55", "rsi_rising",
+             "h1_ema200_up", "h1_st_long", "h1_rf_long"),
+    "short": ("c<ema200", "ema200_dn", "st_short", "rf_short", "c<ema50", "ema50_dn", "c<ema20", "ema20_dn",
+              "c<vwap", "dist_vwap_ok", "close_falling", "lh", "ll", "rsi<=45", "rsi_falling",
+              "h1_ema200_dn", "h1_st_short", "h1_rf_short"),
+}
+
+def _evaluate(df: pd.DataFrame, nodes: Dict[str, str]) -> Dict[str, pd.Series]:
+    values = GRAPH.evaluate(df, nodes.values())
+    return {k: values[nid] for k, nid in nodes.items()}
+
+def _heavy_direction(ema200_up: bool, st_dir: int, rf_dir: int, side: Side) -> int:
+    score = 0
+    if side == "long":
+        score += 1 if ema200_up else 0
+        score += 1 if st_dir == 1 else 0
+        score += 1 if rf_dir == 1 else 0
+    else:
+        score += 1 if (not ema200_up) else 0
+        score += 1 if st_dir == -1 else 0
+        score += 1 if rf_dir == -1 else 0
+    return score
+
+def compute_h1_gate(h1_df: pd.DataFrame, side: Side, cfg: Dict) -> Tuple[bool, Dict]:
+    v = _evaluate(h1_df, _h1_nodes(cfg))
+    ema200 = v["ema200"]
+    ema200_up = ema200.iloc[-1] > ema200.iloc[-2]
+    st = v["st"].iloc[-1]
+    rf = v["rf"].iloc[-1]
+    adx_val = v["adx"].iloc[-1]
+    heavy_hits = _heavy_direction(ema200_up, st, rf, side)
+    ok = (adx_val >= cfg["adx_h1_threshold"]) and (heavy_hits >= cfg["heavy_required_h1"])
+    return ok, {
+        "adx": float(adx_val),
+        "ema200_up": bool(ema200_up),
+        "st_dir": int(st),
+        "rf_dir": int(rf),
+        "heavy_hits": int(heavy_hits)
+    }
+
+def compute_m15_features(m15_df: pd.DataFrame, h1_ctx: Dict, side: Side, cfg: Dict) -> Dict:
+    m15 = m15_df
+    v = _evaluate(m15, _m15_nodes(cfg))
+    ema20, ema50, ema200 = v["ema20"], v["ema50"], v["ema200"]
+    st, rf, atrv = v["st"], v["rf"], v["atr"]
+    rsi_m15 = v["rsi"]
+    vwap_m15 = v["vwap"]
+
+    close = m15["close"]
+    high = m15["high"]
+    low = m15["low"]
+
+    ema200_up = ema200.iloc[-1] > ema200.iloc[-2]
+    ema50_up = ema50.iloc[-1] > ema50.iloc[-2]
+    ema20_up = ema20.iloc[-1] > ema20.iloc[-2]
+
+    st_dir = st.iloc[-1]
+    rf_dir = rf.iloc[-1]
+
+    heavy_hits_m15 = _heavy_direction(ema200_up, st_dir, rf_dir, side)
+
+    curr = len(m15) - 1
+    c0, c1 = close.iloc[-1], close.iloc[-2]
+    h0, h1v = high.iloc[-1], high.iloc[-2]
+    l0, l1v = low.iloc[-1], low.iloc[-2]
+    rsi0, rsi1 = rsi_m15.iloc[-1], rsi_m15.iloc[-2]
+    vwap0 = vwap_m15.iloc[-1]
+    atr0 = atrv.iloc[-1]
+
+    # Build 18-point score (long side)
+    score = 0
+    reasons = []
+
+    def add(flag: bool, key: str):
+        nonlocal score, reasons
+        if flag:
+            score += 1
+            reasons.append(key)
+
+    if side == "long":
+        add(c0 > ema200.iloc[-1], "c>ema200")
+        add(ema200_up, "ema200_up")
+        add(st_dir == 1, "st_long")
+        add(rf_dir == 1, "rf_long")
+        add(c0 > ema50.iloc[-1], "c>ema50")
+        add(ema50_up, "ema50_up")
+        add(c0 > ema20.iloc[-1], "c>ema20")
+        add(ema20_up, "ema20_up")
+        add(c0 > vwap0, "c>vwap")
+        add(abs(c0 - vwap0) <= cfg["anti_chase_atr_mult"] * atr0, "dist_vwap_ok")
+        add(c0 > c1, "close_rising")
+        add(l0 >= l1v, "hl")
+        add(h0 >= h1v, "hh")
+        add(rsi0 >= 55, "rsi>=55")
+        add(rsi0 >= rsi1, "rsi_rising")
+        # H1 context contributions
+        add(h1_ctx.get("ema200_up", False), "h1_ema200_up")
+        add(h1_ctx.get("st_dir", -1) == 1, "h1_st_long")
+        add(h1_ctx.get("rf_dir", -1) == 1, "h1_rf_long")
+    else:
+        add(c0 < ema200.iloc[-1], "c<ema200")
+        add(not ema200_up, "ema200_dn")
+        add(st_dir == -1, "st_short")
+        add(rf_dir == -1, "rf_short")
+        add(c0 < ema50.iloc[-1], "c<ema50")
+        add(not ema50_up, "ema50_dn")
+        add(c0 < ema20.iloc[-1], "c<ema20")
+        add(not ema20_up, "ema20_dn")
+        add(c0 < vwap0, "c<vwap")
+        add(abs(c0 - vwap0) <= cfg["anti_chase_atr_mult"] * atr0, "dist_vwap_ok")
+        add(c0 < c1, "close_falling")
+        add(l0 <= l1v, "lh")
+        add(h0 <= h1v, "ll")
+        add(rsi0 <= 45, "rsi<=45")
+        add(rsi0 <= rsi1, "rsi_falling")
+        add(not h1_ctx.get("ema200_up", True), "h1_ema200_dn")
+        add(h1_ctx.get("st_dir", 1) == -1, "h1_st_short")
+        add(h1_ctx.get("rf_dir", 1) == -1, "h1_rf_short")
+
+    features = {
+        "score": int(score),
+        "reasons": reasons,
+        "heavy_hits_m15": int(heavy_hits_m15),
+        "anti_chase_ok": bool(abs(c0 - vwap0) <= cfg["anti_chase_atr_mult"] * atr0)
+    }
+    return features
+
+def compute_gates(h1_df: pd.DataFrame, m15_df: pd.DataFrame, symbol: str, side: Side, cfg: Dict) -> GateResult:
+    h1_ok, h1_ctx = compute_h1_gate(h1_df, side, cfg)
+    m15_feats = compute_m15_features(m15_df, h1_ctx, side, cfg)
+
+    m15_ok = m15_feats["score"] >= cfg["score_threshold_m15"]
+    heavy_ok = m15_feats["heavy_hits_m15"] >= cfg["heavy_required_m15"]
+    anti_chase_ok = m15_feats["anti_chase_ok"]
+
+    reasons = []
+    if h1_ok: reasons.append("h1_ok")
+    if m15_ok: reasons.append("m15_score_ok")
+    if heavy_ok: reasons.append("heavy_m15_ok")
+    if anti_chase_ok: reasons.append("anti_chase_ok")
+
+    return GateResult(
+        symbol=symbol,
+        timeframe_m15_ts=int(m15_df.index[-1].value // 1_000_000),  # ns->ms
+        side=side,
+        h1_ok=h1_ok,
+        m15_ok=m15_ok,
+        heavy_m15_ok=heavy_ok,
+        anti_chase_ok=anti_chase_ok,
+        score_m15=m15_feats["score"],
+        reasons=reasons if reasons else ["fail"]
+    )
+
+# ---- Full-history mode: every bar at once, same indicator nodes as the live path ----
+def _prev(x: np.ndarray) -> np.ndarray:
+    out = np.empty_like(x, dtype=np.float64)
+    out[0] = np.nan
+    out[1:] = x[:-1]
+    return out
+
+def _ts_ms(df: pd.DataFrame) -> np.ndarray:
+    return pd.DatetimeIndex(df.index).as_unit("ns").asi8 // 1_000_000
+
+def _bar_ms(ts: np.ndarray) -> int:
+    return int(np.median(np.diff(ts))) if len(ts) > 1 else 0
+
+def _heavy_direction_arr(ema200_up: np.ndarray, st_dir: np.ndarray, rf_dir: np.ndarray, side: Side) -> np.ndarray:
+    if side == "long":
+        return ema200_up.astype(np.int8) + (st_dir == 1) + (rf_dir == 1)
+    return (~ema200_up).astype(np.int8) + (st_dir == -1) + (rf_dir == -1)
+
+def compute_h1_history(h1_df: pd.DataFrame, side: Side, cfg: Dict) -> Dict[str, np.ndarray]:
+    """compute_h1_gate for every H1 bar: ok, adx, ema200_up, st_dir, rf_dir, heavy_hits."""
+    v = _evaluate(h1_df, _h1_nodes(cfg))
+    ema200 = v["ema200"].to_numpy(dtype=np.float64)
+    ema200_up = ema200 > _prev(ema200)
+    st = v["st"].to_numpy(dtype=np.float64)
+    rf = v["rf"].to_numpy(dtype=np.float64)
+    adx_val = v["adx"].to_numpy(dtype=np.float64)
+    heavy_hits = _heavy_direction_arr(ema200_up, st, rf, side)
+    ok = (adx_val >= cfg["adx_h1_threshold"]) & (heavy_hits >= cfg["heavy_required_h1"])
+    return {"ok": ok, "adx": adx_val, "ema200_up": ema200_up, "st_dir": st, "rf_dir": rf, "heavy_hits": heavy_hits}
+
+def asof_h1_index(m15_ts: np.ndarray, h1_ts: np.ndarray, m15_ms: Optional[int] = None, h1_ms: Optional[int] = None) -> np.ndarray:
+    """
+    For each M15 bar, index of the last H1 bar closed at or before the M15 bar's close (-1 = none).
+    Only closed H1 bars are joined, so no look-ahead.
+    """
+    m15_ms = _bar_ms(m15_ts) if m15_ms is None else m15_ms
+    h1_ms = _bar_ms(h1_ts) if h1_ms is None else h1_ms
+    return np.searchsorted(h1_ts + h1_ms, m15_ts + m15_ms, side="right") - 1
+
+def compute_gates_history(h1_df: pd.DataFrame, m15_df: pd.DataFrame, symbol: str, side: Side, cfg: Dict,
+                          m15_ms: Optional[int] = None, h1_ms: Optional[int] = None) -> GateHistory:
+    """
+    Vectorized compute_gates over every M15 bar: score, reasons bitmask, heavy hits and
+    anti-chase per bar, with H1 context from the last closed H1 bar (as-of join).
+    """
+    v = _evaluate(m15_df, _m15_nodes(cfg))
+    f = lambda k: v[k].to_numpy(dtype=np.float64)
+    ema20, ema50, ema200 = f("ema20"), f("ema50"), f("ema200")
+    st, rf, atr0, rsi0, vwap0 = f("st"), f("rf"), f("atr"), f("rsi"), f("vwap")
+    c0 = m15_df["close"].to_numpy(dtype=np.float64)
+    h0 = m15_df["high"].to_numpy(dtype=np.float64)
+    l0 = m15_df["low"].to_numpy(dtype=np.float64)
+    c1, h1v, l1v, rsi1 = _prev(c0), _prev(h0), _prev(l0), _prev(rsi0)
+    ema200_up, ema50_up, ema20_up = ema200 > _prev(ema200), ema50 > _prev(ema50), ema20 > _prev(ema20)
+
+    m15_ts = _ts_ms(m15_df)
+    h1 = compute_h1_history(h1_df, side, cfg)
+    j = asof_h1_index(m15_ts, _ts_ms(h1_df), m15_ms, h1_ms)
+    has_h1 = j >= 0
+    jj = np.maximum(j, 0)
+    h1_up = np.where(has_h1, h1["ema200_up"][jj], False)
+    h1_st = np.where(has_h1, h1["st_dir"][jj], np.nan)
+    h1_rf = np.where(has_h1, h1["rf_dir"][jj], np.nan)
+
+    dist_ok = np.abs(c0 - vwap0) <= cfg["anti_chase_atr_mult"] * atr0
+    if side == "long":
+        flags = (c0 > ema200, ema200_up, st == 1, rf == 1, c0 > ema50, ema50_up, c0 > ema20, ema20_up,
+                 c0 > vwap0, dist_ok, c0 > c1, l0 >= l1v, h0 >= h1v, rsi0 >= 55, rsi0 >= rsi1,
+                 h1_up, h1_st == 1, h1_rf == 1)
+    else:
+        flags = (c0 < ema200, ~ema200_up, st == -1, rf == -1, c0 < ema50, ~ema50_up, c0 < ema20, ~ema20_up,
+                 c0 < vwap0, dist_ok, c0 < c1, l0 <= l1v, h0 <= h1v, rsi0 <= 45, rsi0 <= rsi1,
+                 has_h1 & ~h1_up, h1_st == -1, h1_rf == -1)
+    bits = np.stack(flags).astype(np.uint32)
+    reasons = (bits << np.arange(len(flags), dtype=np.uint32)[:, None]).sum(axis=0, dtype=np.uint32)
+    score = bits.sum(axis=0).astype(np.int8)
+    heavy_m15 = _heavy_direction_arr(ema200_up, st, rf, side)
+
+    return GateHistory(
+        symbol=symbol,
+        side=side,
+        ts=m15_ts,
+        score=score,
+        reasons=reasons,
+        heavy_hits_m15=heavy_m15,
+        anti_chase_ok=dist_ok,
+        h1_ok=np.where(has_h1, h1["ok"][jj], False),
+        h1_adx=np.where(has_h1, h1["adx"][jj], np.nan).astype(np.float32),
+        m15_ok=score >= cfg["score_threshold_m15"],
+        heavy_m15_ok=heavy_m15 >= cfg["heavy_required_m15"],
+    )
+
+def decode_reasons(mask: int, side: Side):
+    names = M15_REASONS[side]
+    return [names[i] for i in range(len(names)) if (int(mask) >> i) & 1]
+
+def gate_result_at(hist: GateHistory, i: int) -> GateResult:
+    """GateResult of bar i, as compute_gates would return at that bar."""
+    reasons = []
+    if hist.h1_ok[i]: reasons.append("h1_ok")
+    if hist.m15_ok[i]: reasons.append("m15_score_ok")
+    if hist.heavy_m15_ok[i]: reasons.append("heavy_m15_ok")
+    if hist.anti_chase_ok[i]: reasons.append("anti_chase_ok")
+    return GateResult(
+        symbol=hist.symbol,
+        timeframe_m15_ts=int(hist.ts[i]),
+        side=hist.side,
+        h1_ok=bool(hist.h1_ok[i]),
+        m15_ok=bool(hist.m15_ok[i]),
+        heavy_m15_ok=bool(hist.heavy_m15_ok[i]),
+        anti_chase_ok=bool(hist.anti_chase_ok[i]),
+        score_m15=int(hist.score[i]),
+        reasons=reasons if reasons else ["fail"]
+    )
@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+from typing import List, Literal, Optional
+
+import numpy as np
+import pandas as pd
+
+Side = Literal["long", "short"]
+
+@dataclass
+class Candle:
+    ts: int  # epoch ms
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: Optional[float] = None
+
+@dataclass
+class GateResult:
+    symbol: str
+    timeframe_m15_ts: int
+    side: Side
+    h1_ok: bool
+    m15_ok: bool
+    heavy_m15_ok: bool
+    anti_chase_ok: bool
+    score_m15: int
+    reasons: List[str]
+
+@dataclass
+class GateHistory:
+    """Columnar gate evaluation, one entry per M15 bar (see signal_gates.compute_gates_history)."""
+    symbol: str
+    side: Side
+    ts: np.ndarray              # int64 epoch ms of the M15 bar
+    score: np.ndarray           # int8, 18-point M15 score
+    reasons: np.ndarray         # uint32 bitmask over signal_gates.M15_REASONS[side]
+    heavy_hits_m15: np.ndarray  # int8
+    anti_chase_ok: np.ndarray   # bool
+    h1_ok: np.ndarray           # bool, from the last closed H1 bar
+    h1_adx: np.ndarray          # float32
+    m15_ok: np.ndarray          # bool
+    heavy_m15_ok: np.ndarray    # bool
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def passed(self) -> np.ndarray:
+        return self.h1_ok & self.m15_ok & self.heavy_m15_ok & self.anti_chase_ok
+
+    def to_frame(self) -> pd.DataFrame:
+        cols = ("score", "reasons", "heavy_hits_m15", "anti_chase_ok", "h1_ok", "h1_adx", "m15_ok", "heavy_m15_ok")
+        return pd.DataFrame({c: getattr(self, c) for c in cols}, index=pd.to_datetime(self.ts, unit="ms"))
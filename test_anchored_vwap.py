@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from anchored_vwap import VwapAccumulator, anchored_vwap, vwap_series
+from indicators_ta import GRAPH, vwap
+
+HOUR_MS = 3_600_000
+
+def _frame(n=500, step_ms=HOUR_MS, seed=1):
+    rng = np.random.default_rng(seed)
+    # Bắt đầu 2024-01-03 (thứ Tư) 17:00 UTC để phủ nhiều ngày/tuần
+    ts = 1_704_301_200_000 + np.arange(n, dtype=np.int64) * step_ms
+    price = 100 + np.cumsum(rng.normal(0, 0.5, n))
+    volume = rng.uniform(0, 50, n)
+    volume[::37] = 0.0
+    return ts, price, volume
+
+def _reference(ts, price, volume, key_fn):
+    out, cum_pv, cum_v, prev = [], 0.0, 0.0, None
+    for t, p, v in zip(ts, price, volume):
+        k = key_fn(int(t))
+        if k != prev:
+            cum_pv, cum_v, prev = 0.0, 0.0, k
+        cum_pv += p * v
+        cum_v += v
+        out.append(cum_pv / cum_v if cum_v > 0 else p)
+    return np.array(out)
+
+def test_calendar_anchors_match_loop():
+    ts, price, volume = _frame()
+    dt = lambda t: pd.Timestamp(t, unit="ms", tz="UTC")
+    cases = {
+        "daily_utc": lambda t: dt(t).date(),
+        "weekly": lambda t: (dt(t) - pd.Timedelta(days=dt(t).weekday())).date(),
+        "session:13:30": lambda t: (dt(t) - pd.Timedelta(hours=13, minutes=30)).date(),
+    }
+    for anchor, key_fn in cases.items():
+        np.testing.assert_allclose(anchored_vwap(price, volume, ts, anchor), _reference(ts, price, volume, key_fn), rtol=1e-10, err_msg=anchor)
+
+def test_rolling_anchor():
+    ts, price, volume = _frame(200)
+    got = anchored_vwap(price, volume, anchor="rolling:20")
+    pv = pd.Series(price * volume).rolling(20, min_periods=1).sum()
+    vs = pd.Series(volume).rolling(20, min_periods=1).sum()
+    np.testing.assert_allclose(got, np.where(vs > 0, pv / vs, price), rtol=1e-9)
+
+def test_accumulator_matches_vectorized():
+    ts, price, volume = _frame()
+    for anchor in ("daily_utc", "weekly", "session:08:00", "rolling:24", "cumulative"):
+        acc = VwapAccumulator(anchor)
+        peeks = [acc.peek(t, p, v) for t, p, v in zip(ts[:1], price[:1], volume[:1])]
+        got = [acc.update(t, p, v) for t, p, v in zip(ts, price, volume)]
+        np.testing.assert_allclose(got, anchored_vwap(price, volume, ts, anchor), rtol=1e-9, err_msg=anchor)
+        assert peeks[0] == got[0]
+
+def test_series_uses_datetime_index():
+    ts, price, volume = _frame(100)
+    idx = pd.to_datetime(ts, unit="ms")
+    s = vwap_series(pd.Series(price, index=idx), pd.Series(volume, index=idx))
+    np.testing.assert_allclose(s.to_numpy(), anchored_vwap(price, volume, ts, "daily_utc"))
+
+def test_ta_vwap_node_uses_bar_times_or_refuses():
+    ts, price, volume = _frame(100)
+    expected = anchored_vwap(price, volume, ts, "daily_utc")
+    node = GRAPH.node("vwap", anchor="daily_utc")
+    by_column = pd.DataFrame({"timestamp": ts, "close": price, "volume": volume})
+    by_index = pd.DataFrame({"close": price, "volume": volume}, index=pd.to_datetime(ts, unit="ms"))
+    for df in (by_column, by_index):
+        np.testing.assert_allclose(GRAPH.evaluate(df, [node])[node].to_numpy(), expected)
+    # Không có mốc thời gian: không lặng lẽ đổi sang VWAP cộng dồn
+    with pytest.raises(ValueError):
+        GRAPH.evaluate(by_column.drop(columns="timestamp"), [node])
+    rolling = vwap(pd.Series(price), pd.Series(volume), "rolling:20")
+    np.testing.assert_allclose(rolling.to_numpy(), anchored_vwap(price, volume, None, "rolling:20"))
@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+import pytest
+
+from backtest_engine import CSV_FIELDS, BacktestEngine, prepare_symbol, run_backtest
+from indicators import calculate_indicators
+from tight_gate import _heavy_hits, build_indicator_results
+from votes import compile_weights
+from test_indicator_cache import _ohlcv
+
+H1_MS = 3_600_000
+T0 = 1_700_000_000_000
+
+def _frames(n15=600, seed=1):
+    m15 = _ohlcv(n15, seed=seed)
+    m15['timestamp'] = T0 + np.arange(n15, dtype=np.int64) * 900_000
+    h1 = _ohlcv(n15 // 4 + 220, seed=seed + 10)
+    h1['timestamp'] = T0 - 220 * H1_MS + np.arange(len(h1), dtype=np.int64) * H1_MS
+    return m15, h1
+
+def _side(sl, ss):
+    return 1 if sl - ss > 0.1 else (-1 if ss - sl > 0.1 else 0)
+
+def test_prepared_arrays_match_prefix_scores():
+    cfg = json.load(open("config.json", encoding="utf-8"))
+    m15, h1 = _frames()
+    arr = prepare_symbol(m15, h1, None, cfg)
+    up = lambda d: {k.upper(): v for k, v in d.items()}
+    w15, wh1 = up(cfg["weights_sets"]["M15"]), up(cfg["weights_sets"]["H1"])
+    for i in (250, 401, 599):
+        close_ms = int(m15['timestamp'].iloc[i]) + 900_000
+        p15 = m15.iloc[:i + 1]
+        ph1 = h1[h1['timestamp'] + H1_MS <= close_ms]
+        i15, ih1 = calculate_indicators(p15, cfg), calculate_indicators(ph1, cfg)
+        t15 = compile_weights(w15).tally(up(build_indicator_results(p15, i15)))
+        map_h1 = up(build_indicator_results(ph1, ih1))
+        th1 = compile_weights(wh1).tally({k: v for k, v in map_h1.items() if k in wh1})
+        s15, sh1 = _side(t15["score_long"], t15["score_short"]), _side(th1["score_long"], th1["score_short"])
+        assert arr["side15"][i] == s15
+        assert arr["ts"][i] == close_ms / 1000
+        assert arr["atr"][i] == pytest.approx(float(i15['atr'].iloc[-1]))
+        # _classify_regime của main (chỉ khi M15/H1 đồng pha)
+        hh = _heavy_hits(map_h1, ih1['ema200'], "LONG" if s15 == 1 else "SHORT") if s15 else 0
+        adx, r = float(ih1['adx'].iloc[-1]), cfg["regime"]
+        regime = 0
+        if s15 == sh1 != 0:
+            regime = 2 if adx >= r["strong"]["adx_h1"] and hh >= r["strong"]["heavy_hits"] else (
+                1 if adx >= r["normal"]["adx_h1"] and hh >= r["normal"]["heavy_hits"] else 0)
+        assert arr["regime"][i] == regime
+
+def test_run_writes_simulator_schema(tmp_path):
+    cfg = json.load(open("config.json", encoding="utf-8"))
+    m15, h1 = _frames(900, seed=4)
+    res = run_backtest({"AAA/USDT": {"15m": m15, "1h": h1}}, cfg)
+    assert res.events, "synthetic data should trigger at least one entry"
+    out = tmp_path / "bt.csv"
+    res.write_csv(out)
+    assert out.read_text(encoding="utf-8").splitlines()[0].split(",") == CSV_FIELDS
+    closed = [t for t in res.trades if t["time_close"] is not None]
+    assert res.balance == pytest.approx(100.0 + sum(t["result"] for t in closed))
+    s = res.summary()
+    assert s["trades"] == len(closed) and s["final_equity"] == pytest.approx(res.balance)
+
+def test_intrabar_stop_fills_at_level_or_gap_open():
+    eng = BacktestEngine({})
+    arr = {"open": np.array([100.0, 97.0]), "high": np.array([101.0, 99.0]), "low": np.array([98.5, 96.0])}
+    t1 = eng._open("X", "LONG", 100.0, 99.0, 110.0, 50.0, True, 0.0, None, "probe_breakout_long")
+    eng._intrabar("X", arr, 0, 900.0)
+    assert t1["status"] == "SL" and t1["close_price"] == 99.0
+    t2 = eng._open("X", "LONG", 100.0, 98.0, 110.0, 50.0, True, 0.0, None, "probe_breakout_long")
+    eng._intrabar("X", arr, 1, 1800.0)
+    assert t2["close_price"] == 97.0  # gap mở dưới SL -> khớp giá mở
+    assert eng.n_open == 0 and eng.last_trade["X"]["direction"] == "LONG"
@@ -0,0 +1,34 @@
+import copy
+import json
+
+from backtest_engine import CSV_FIELDS, run_backtest
+from backtest_parallel import run_sweep
+from test_backtest_engine import _frames
+
+def test_sweep_matches_single_runs_and_resumes(tmp_path):
+    cfg = json.load(open("config.json", encoding="utf-8"))
+    alt = copy.deepcopy(cfg)
+    alt["regime"]["sideway"]["adx_h1"] = 25
+    alt["weights_sets"]["M15"]["ADX"] = 1.0
+    profiles = {"base": cfg, "alt": alt}
+    history = {}
+    for k, s in enumerate(("AAA/USDT", "BBB/USDT")):
+        m15, h1 = _frames(900, seed=4 + k)
+        history[s] = {"15m": m15, "1h": h1}
+
+    res = run_sweep(list(history), profiles, str(tmp_path / "work"), history=history, processes=2)
+    for p in res.payloads:
+        ref = run_backtest({p["symbol"]: history[p["symbol"]]}, profiles[p["profile"]])
+        assert p["events"] == ref.events
+    summary = res.summary()
+    assert set(summary["symbol"]) == {"AAA/USDT", "BBB/USDT", "ALL"}
+    res.write(str(tmp_path / "out"))
+    assert (tmp_path / "out" / "trades_alt.csv").read_text(encoding="utf-8").splitlines()[0].split(",") == CSV_FIELDS
+
+    # Chạy lại: mọi job lấy từ checkpoint, một job bị xóa thì chỉ job đó chạy lại
+    ckpts = sorted((tmp_path / "work" / "jobs").glob("*.json"))
+    assert len(ckpts) == 4
+    ckpts[0].unlink()
+    again = run_sweep(list(history), profiles, str(tmp_path / "work"), history=history, processes=0)
+    assert [p["events"] for p in again.payloads] == [p["events"] for p in res.payloads]
+    assert again.summary().equals(summary)
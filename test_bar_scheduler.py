@@ -0,0 +1,80 @@
+import pytest
+
+from bar_scheduler import BarCloseScheduler, DayRollover, build_scheduler, utc_date
+from trade_simulator import gmt7_date
+
+H1 = 1_700_002_800.0  # mốc đóng nến H1 (chia hết cho 3600)
+
+def test_next_close_at_exact_boundary():
+    s = BarCloseScheduler(("5m", "15m", "1h"), settle_sec=0.0, refresh_sec=0)
+    # Đúng giờ đóng nến: nến đó coi như đã chạy -> lần kế tiếp là nến M5 sau
+    assert s.next_close(H1) == (H1 + 300, ["5m"])
+    assert s.next_close(H1 - 1e-3) == (H1, ["5m", "15m", "1h"])
+    assert s.next_close(H1 + 600) == (H1 + 900, ["5m", "15m"])
+
+def test_close_delay_offsets_fire_time():
+    s = BarCloseScheduler(("5m", "15m", "1h"), settle_sec=3.0, refresh_sec=0)
+    # Trong khoảng [đóng nến, đóng nến + settle) vẫn chờ vòng của nến vừa đóng
+    assert s.next_close(H1) == (H1 + 3.0, ["5m", "15m", "1h"])
+    assert s.next_close(H1 + 2.9) == (H1 + 3.0, ["5m", "15m", "1h"])
+    assert s.next_close(H1 + 3.0) == (H1 + 303.0, ["5m"])
+    assert s.next_close(H1 - 100) == (H1 + 3.0, ["5m", "15m", "1h"])
+
+def test_refresh_does_not_crowd_the_close():
+    s = BarCloseScheduler(("5m",), settle_sec=3.0, refresh_sec=15.0)
+    assert s.next_event(H1 + 3.0) == (H1 + 18.0, "refresh", [])
+    assert s.next_event(H1 + 275.0) == (H1 + 303.0, "close", ["5m"])
+    assert build_scheduler({}).timeframes == ["5m", "15m", "1h"]
+
+def _run_loop(sched, durations, start, rollover=None, reports=None):
+    """Vòng lặp như main(): chờ tới fire_at, chạy vòng nặng mất durations[k] giây, lặp lại."""
+    clock, last_close_at, fired = start, 0.0, []
+    for d in durations:
+        fire_at, kind, closed = sched.next_event(max(clock, last_close_at))
+        assert kind == "close"
+        clock = max(clock, fire_at)
+        if rollover is not None:
+            done = rollover.check(clock)
+            if done:
+                reports.append((clock, done))
+        last_close_at = fire_at
+        fired.append((fire_at, closed))
+        clock += d
+    return fired
+
+def test_overrunning_iteration_skips_to_next_close_without_double_fire():
+    s = BarCloseScheduler(("5m", "15m"), settle_sec=3.0, refresh_sec=0)
+    fired = _run_loop(s, [1.0, 700.0, 0.0, 0.0], start=H1 - 10)
+    assert fired == [
+        (H1 + 3.0, ["5m", "15m"]),
+        (H1 + 303.0, ["5m"]),
+        # Vòng này chạy quá 2 nến M5 (tới H1 + 1003): bỏ các mốc đã qua, không chạy bù
+        (H1 + 1203.0, ["5m"]),
+        # Vòng 0 giây: đồng hồ vẫn đúng fire_at -> không bắn lại cùng mốc
+        (H1 + 1503.0, ["5m"]),
+    ]
+    times = [f for f, _ in fired]
+    assert times == sorted(set(times))
+
+@pytest.mark.parametrize("settle", [0.1, 0.7, 2.9])
+def test_fire_time_is_not_repeated_with_fractional_settle(settle):
+    s = BarCloseScheduler(("5m",), settle_sec=settle, refresh_sec=0)
+    fire_at, _ = s.next_close(H1 + 1e-3)
+    for _ in range(200):
+        nxt, _ = s.next_close(fire_at)
+        assert nxt == pytest.approx(fire_at + 300)
+        fire_at = nxt
+
+@pytest.mark.parametrize("day_fn, midnight", [
+    (utc_date, 1_710_115_200.0),    # 2024-03-11 00:00 UTC
+    (gmt7_date, 1_710_090_000.0),   # 2024-03-11 00:00 GMT+7
+])
+def test_daily_report_fires_once_after_midnight(day_fn, midnight):
+    s = BarCloseScheduler(("5m", "15m", "1h"), settle_sec=3.0, refresh_sec=0)
+    start = midnight - 3600
+    rollover, reports = DayRollover(day_fn, now=start), []
+    # Không vòng nào rơi vào phút 23:59 (vòng chạy ở phút chia hết cho 5 + 3 giây)
+    fired = _run_loop(s, [1.0] * 40 + [400.0] + [1.0] * 10, start, rollover, reports)
+    assert fired[0][0] < midnight < fired[-1][0]
+    assert reports == [(midnight + 3.0, "2024-03-10")]
+    assert rollover.check(fired[-1][0] + 60) is None
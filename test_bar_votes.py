@@ -0,0 +1,52 @@
+import numpy as np
+
+from indicators import calculate_indicators
+from tight_gate import build_indicator_results, build_indicator_results_bars, recent_bar_votes, trailing_streak
+from votes import tally_votes
+from test_indicator_cache import _ohlcv
+
+W = {"MA50": 2.0, "MACD": 2.0, "RSI": 1.5, "EMA200": 0.0}
+
+def test_bars_match_prefix_recompute():
+    df = _ohlcv(260, seed=5)
+    ind = calculate_indicators(df, timeframe="5m")
+    k = 6
+    maps = build_indicator_results_bars(df, ind, bars=k)
+    bars = recent_bar_votes(df, ind, W, bars=k)
+    assert len(maps) == len(bars) == k
+    for j, i in enumerate(range(-k, 0)):
+        prefix = df.iloc[:len(df) + i + 1]
+        ref = build_indicator_results(prefix, calculate_indicators(prefix, timeframe="5m"))
+        assert maps[j] == ref
+        tally = tally_votes(ref, W)
+        assert (bars[j]["score_long"], bars[j]["score_short"]) == (tally["score_long"], tally["score_short"])
+        assert bars[j]["ts"] == int(prefix['timestamp'].iloc[-1])
+    assert maps[-1] == build_indicator_results(df, ind)
+
+def test_bars_respect_lazy_subset_and_streak():
+    df = _ohlcv(260)
+    ind = calculate_indicators(df, only={"rsi", "ma50"})
+    assert set(build_indicator_results_bars(df, ind, bars=3)[0]) == {"RSI", "MA50"}
+    assert trailing_streak(["SHORT", "LONG", "LONG"], "LONG") == 2
+    assert trailing_streak(["LONG", "SHORT"], "LONG") == 0
+
+def test_compiled_weights_match_tally():
+    from votes import CompiledWeights
+    from tight_gate import vote_matrix
+    cw = CompiledWeights(W)
+    df = _ohlcv(400, seed=2)
+    ind = calculate_indicators(df)
+    for m in ({"RSI": "LONG", "MA50": "-", "Volume_Spike": "SHORT"}, build_indicator_results(df, ind), {}):
+        assert cw.tally(m) == tally_votes(m, W)
+    assert cw.tally({"Foo": "LONG"}) == tally_votes({"Foo": "LONG"}, W)
+    # Cả lịch sử và nhiều "symbol" trong một phép nhân
+    dirs, active = vote_matrix(df, ind, cw)
+    sc = cw.scores(np.stack([dirs, -dirs]), active)
+    assert sc["score_long"].shape == (2, len(df))
+    for i in (-1, -40, -100):
+        prefix = df.iloc[:len(df) + i + 1]
+        t = tally_votes(build_indicator_results(prefix, calculate_indicators(prefix)), W)
+        assert (sc["score_long"][0, i], sc["score_short"][0, i]) == (t["score_long"], t["score_short"])
+        assert sc["score_long"][1, i] == t["score_short"]
+    full = tally_votes(build_indicator_results(df, ind), W)
+    assert cw.result(dirs[-1], active, None)["breakdown_long"] == full["breakdown_long"]
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import data
+from candle_store import COLUMNS, CandleStore
+
+TF = "15m"
+TF_MS = 900_000
+
+def _bars(ts):
+    ts = np.asarray(ts, dtype=np.int64)
+    px = 100.0 + (ts // TF_MS % 1000) * 0.1
+    return [[int(t), p, p + 1.0, p - 1.0, p + 0.5, 10.0] for t, p in zip(ts, px)]
+
+def _disk(store, symbol):
+    return pd.read_csv(store._path(symbol, TF))
+
+def test_overlapping_batches_append_once_and_forming_bar_stays_in_memory(tmp_path):
+    store = CandleStore(str(tmp_path), memory_rows=100)
+    t0 = 1_700_000_100_000 - 1_700_000_100_000 % TF_MS
+    now = t0 + 6 * TF_MS + 1  # nến 0..5 đã đóng, nến 6 đang chạy
+
+    out = store.merge("BTC/USDT", TF, _bars(t0 + np.arange(7) * TF_MS), now_ms=now)
+    assert list(out.columns) == COLUMNS and len(out) == 7
+    assert store.closed_count("BTC/USDT", TF) == 6 and store.last_closed_ts("BTC/USDT", TF) == t0 + 5 * TF_MS
+    assert len(_disk(store, "BTC/USDT")) == 6  # nến đang chạy không xuống đĩa
+
+    # Lô sau chồng lên lô trước (nến 3..9, nến 6 giờ đã đóng với giá cuối)
+    later = _bars(t0 + np.arange(3, 10) * TF_MS)
+    later[3][4] = 123.0
+    out = store.merge("BTC/USDT", TF, later, now_ms=t0 + 10 * TF_MS)
+    disk = _disk(store, "BTC/USDT")
+    assert list(disk["timestamp"]) == list(t0 + np.arange(10) * TF_MS)
+    assert disk["close"].iloc[6] == 123.0
+    assert out["timestamp"].is_unique and len(out) == 10
+
+    # Lô toàn nến cũ: không ghi thêm gì
+    store.merge("BTC/USDT", TF, _bars(t0 + np.arange(4) * TF_MS), now_ms=t0 + 10 * TF_MS)
+    assert len(_disk(store, "BTC/USDT")) == 10
+
+def test_reload_from_csv(tmp_path):
+    t0 = 1_700_000_100_000 - 1_700_000_100_000 % TF_MS
+    store = CandleStore(str(tmp_path))
+    store.merge("ETH/USDT:USDT", TF, _bars(t0 + np.arange(8) * TF_MS), now_ms=t0 + 8 * TF_MS)
+    # File bị ghi trùng (vd hai tiến trình) -> đọc lại vẫn một dòng mỗi nến, theo thứ tự
+    path = store._path("ETH/USDT:USDT", TF)
+    pd.DataFrame(_bars([t0 + 2 * TF_MS]), columns=COLUMNS).to_csv(path, mode="a", header=False, index=False)
+
+    again = CandleStore(str(tmp_path), memory_rows=5)
+    df = again.load("ETH/USDT:USDT", TF)
+    assert list(df["timestamp"]) == list(t0 + np.arange(3, 8) * TF_MS)
+    assert df["timestamp"].dtype == np.int64 and df["close"].dtype == np.float64
+    assert again.last_closed_ts("ETH/USDT:USDT", TF) == t0 + 7 * TF_MS
+    assert CandleStore(str(tmp_path)).load("BTC/USDT", TF).empty
+
+class _FakeExchange:
+    """fetch_ohlcv như sàn: tối đa `limit` nến từ `since`, nến cuối là nến đang chạy."""
+    def __init__(self, t_now):
+        self.t_now = t_now
+        self.calls = []
+
+    def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        self.calls.append((since, limit))
+        if since is None:
+            since = self.t_now - (limit - 1) * TF_MS
+        return _bars(np.arange(since, self.t_now + 1, TF_MS)[:limit])
+
+def test_fetch_pages_through_gap_longer_than_one_page(tmp_path, monkeypatch):
+    now = int(time.time() * 1000)
+    t_now = now - now % TF_MS  # nến đang chạy
+    ex = _FakeExchange(t_now)
+    store = CandleStore(str(tmp_path))
+    monkeypatch.setattr(data, "_store", store)
+    monkeypatch.setattr(data, "_exchange", ex)
+    monkeypatch.setattr(data, "PAGE_LIMIT", 10)
+    monkeypatch.setattr(data, "MAX_PAGES", 5)
+
+    # Kho có 30 nến đóng, cách hiện tại 25 nến -> 3 trang (10 + 10 + 6)
+    last = t_now - 26 * TF_MS
+    store.merge("BTC/USDT", TF, _bars(last - np.arange(30)[::-1] * TF_MS), now_ms=now)
+    df = data.fetch_data("BTC/USDT", TF, limit=30)
+    assert ex.calls == [(last + TF_MS, 10), (last + 11 * TF_MS, 10), (last + 21 * TF_MS, 10)]
+    assert len(df) == 30 and df["timestamp"].iloc[-1] == t_now
+    assert np.all(np.diff(df["timestamp"]) == TF_MS)
+    assert list(_disk(store, "BTC/USDT")["timestamp"]) == list(last - 29 * TF_MS + np.arange(55) * TF_MS)
+
+    # Khoảng trống quá MAX_PAGES trang: bỏ kho cũ, tải lại một lô `limit` nến
+    ex.calls.clear()
+    store.reset("BTC/USDT", TF)
+    old = t_now - 200 * TF_MS
+    store.merge("BTC/USDT", TF, _bars(old - np.arange(30)[::-1] * TF_MS), now_ms=now)
+    df = data.fetch_data("BTC/USDT", TF, limit=30)
+    assert len(ex.calls) == 6 and ex.calls[-1] == (None, 30)
+    disk = _disk(store, "BTC/USDT")
+    assert disk["timestamp"].iloc[0] == t_now - 29 * TF_MS and np.all(np.diff(disk["timestamp"]) == TF_MS)
+    assert df["timestamp"].iloc[-1] == t_now
+
+def test_async_fetch_keeps_store_io_off_the_event_loop(tmp_path, monkeypatch):
+    now = int(time.time() * 1000)
+    t_now = now - now % TF_MS
+    sync_ex = _FakeExchange(t_now)
+
+    class AsyncExchange:
+        async def fetch_ohlcv(self, *args, **kwargs):
+            return sync_ex.fetch_ohlcv(*args, **kwargs)
+
+    io_threads = []
+
+    class RecordingStore(CandleStore):
+        def load(self, symbol, timeframe):
+            io_threads.append(threading.get_ident())
+            return super().load(symbol, timeframe)
+
+        def _append_disk(self, symbol, timeframe, rows):
+            io_threads.append(threading.get_ident())
+            super()._append_disk(symbol, timeframe, rows)
+
+    store = RecordingStore(str(tmp_path))
+    monkeypatch.setattr(data, "_store", store)
+    monkeypatch.setattr(data, "_get_async_exchange", lambda: AsyncExchange())
+
+    async def run():
+        loop_thread = threading.get_ident()
+        out = await data.fetch_many([(s, TF, 30) for s in ("AAA/USDT", "BBB/USDT", "CCC/USDT")])
+        return loop_thread, out
+
+    loop_thread, out = asyncio.run(run())
+    assert all(len(df) == 30 and df["timestamp"].iloc[-1] == t_now for df in out.values())
+    assert io_threads and loop_thread not in io_threads
+    assert len(_disk(store, "BBB/USDT")) == 29
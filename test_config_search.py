@@ -0,0 +1,37 @@
+import json
+
+import numpy as np
+
+from backtest_engine import entry_arrays, prepare_symbol, run_backtest, symbol_features
+from config_search import SEARCH_SPACE, SliceCache, sample_candidates, successive_halving
+from test_backtest_engine import _frames
+
+def test_slices_reuse_features():
+    cfg = json.load(open("config.json", encoding="utf-8"))
+    m15, h1 = _frames(900, seed=11)
+    F = symbol_features(m15, h1, None, cfg)
+    full = prepare_symbol(m15, h1, None, cfg)
+    view = SliceCache({"AAA/USDT": F}).get(3)["AAA/USDT"]
+    assert np.shares_memory(view["close"], F["close"])
+    sliced = entry_arrays(view, cfg)
+    n = len(sliced["ts"])
+    assert 0 < n < len(full["ts"])
+    for k, v in sliced.items():
+        assert np.array_equal(v, full[k][-n:]), k
+
+def test_halving_promotes_to_full_history():
+    cfg = json.load(open("config.json", encoding="utf-8"))
+    history = {}
+    for k, s in enumerate(("AAA/USDT", "BBB/USDT")):
+        m15, h1 = _frames(1500, seed=20 + k)
+        history[s] = {"15m": m15, "1h": h1}
+    feats = {s: symbol_features(f["15m"], f["1h"], None, cfg) for s, f in history.items()}
+    cands = sample_candidates(cfg, SEARCH_SPACE, 9, seed=2)
+    assert len(cands) == 9 and cands[0][0] == {}
+    rows = successive_halving(SliceCache(feats), cands, eta=3, min_days=3, min_trades=0)
+    sizes = [sum(r["rung"] == k for r in rows) for k in range(rows[-1]["rung"] + 1)]
+    assert sizes == [9, 3, 1]
+    best = rows[-1]
+    assert best["days"] is None
+    ref = run_backtest(history, cands[best["index"]][1]).summary()
+    assert all(best[k] == v for k, v in ref.items())
@@ -0,0 +1,70 @@
+import pytest
+
+from equity_tracker import EQUITY_COLUMNS, load_curve
+from trade_simulator import TradeSimulator
+
+def test_marks_track_equity_drawdown_and_excursions(tmp_path):
+    path = str(tmp_path / "equity.bin")
+    sim = TradeSimulator(log_path=str(tmp_path / "log.csv"), archive_dir=str(tmp_path / "arch"), equity_path=path)
+    eq = sim.equity
+    t0 = 1_700_000_000
+    a = sim.open_trade("BTC/USDT", "LONG", 100.0, 95.0, 120.0, 50.0, now_ts=t0)
+    b = sim.open_trade("ETH/USDT", "SHORT", 10.0, 11.0, 8.0, 20.0, now_ts=t0)
+    for k, (pa, pb) in enumerate([(104.0, 10.0), (97.0, 10.5), (102.0, 9.0)]):
+        eq.mark(a, pa)
+        eq.mark(b, pb)
+        eq.sample(t0 + 60 * (k + 1))
+    assert a["mfe_pct"] == pytest.approx(4.0) and a["mae_pct"] == pytest.approx(3.0)
+    assert b["mfe_pct"] == pytest.approx(10.0) and b["mae_pct"] == pytest.approx(5.0)
+    upl = (102.0 - 100.0) * 0.5 + (10.0 - 9.0) * 2.0 - sim._calc_fee(100.0, 102.0, 0.5) - sim._calc_fee(10.0, 9.0, 2.0)
+    assert eq.equity == pytest.approx(100.0 + upl)
+
+    # Đóng lệnh tại giá đã mark: equity liên tục (lãi/lỗ chưa chốt -> balance)
+    before = eq.equity
+    sim.close_trade(a, 102.0, "TP", t0 + 300, reason="take_profit")
+    assert eq.equity == pytest.approx(before) and eq.snapshot()["open_trades"] == 1
+    sim.close_trade(b, 12.0, "SL", t0 + 360, reason="stop_loss")
+    assert b["mae_pct"] == pytest.approx(20.0)
+    assert eq.unrealized == 0.0 and eq.equity == sim.balance
+    assert eq.max_drawdown > 0 and eq.peak - eq.equity <= eq.max_drawdown
+    eq.sample(t0 + 360)
+    assert not eq.sample(t0 + 400)  # equity không đổi, chưa quá min_interval_sec
+
+    curve = load_curve(path)
+    assert curve.shape == (4, len(EQUITY_COLUMNS))
+    assert curve[-1, 1] == pytest.approx(sim.balance) and curve[-1, 3] == pytest.approx(eq.max_drawdown)
+    # MAE/MFE đi vào archive
+    day = sim.archive.days()[0]
+    assert sorted(sim.archive.ledger(day)["mae_pct"]) == pytest.approx([3.0, 20.0])
+
+def test_restart_resumes_from_last_record(tmp_path):
+    path = str(tmp_path / "equity.bin")
+    kw = dict(log_path=str(tmp_path / "log.csv"), archive_dir=str(tmp_path / "arch"), equity_path=path)
+    t0 = 1_700_000_000
+    sim = TradeSimulator(**kw)
+    a = sim.open_trade("BTC/USDT", "LONG", 100.0, 95.0, 120.0, 50.0, now_ts=t0)
+    sim.close_trade(a, 110.0, "TP", t0 + 60, reason="take_profit")
+    b = sim.open_trade("BTC/USDT", "LONG", 110.0, 100.0, 130.0, 50.0, now_ts=t0 + 120)
+    sim.close_trade(b, 104.0, "SL", t0 + 180, reason="stop_loss")
+    sim.equity.sample(t0 + 180)
+    first = sim.equity.snapshot()
+    assert first["max_drawdown"] > 0 and first["peak"] > first["equity"]
+    with open(path, "ab") as f:
+        f.write(b"\0" * 12)  # bản ghi bị ghi dở lúc dừng
+
+    # Phiên mới: balance về vốn ban đầu nhưng equity/peak/drawdown nối tiếp file
+    sim2 = TradeSimulator(**kw)
+    eq = sim2.equity
+    assert sim2.balance == 100.0
+    assert eq.equity == pytest.approx(first["equity"]) and eq.peak == pytest.approx(first["peak"])
+    assert eq.max_drawdown == pytest.approx(first["max_drawdown"])
+    assert not eq.sample(t0 + 200)  # không ghi lặp điểm cuối
+    c = sim2.open_trade("ETH/USDT", "SHORT", 10.0, 11.0, 8.0, 20.0, now_ts=t0 + 300)
+    sim2.close_trade(c, 10.5, "SL", t0 + 360, reason="stop_loss")
+    assert eq.equity == pytest.approx(first["equity"] + sim2.balance - 100.0)
+    assert eq.max_drawdown == pytest.approx(first["peak"] - eq.equity)
+    eq.sample(t0 + 360)
+
+    curve = load_curve(path)
+    assert curve.shape == (2, len(EQUITY_COLUMNS))
+    assert curve[1, 2] == pytest.approx(first["peak"]) and curve[1, 3] == pytest.approx(eq.max_drawdown)
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicator_cache import STREAM_AFTER_PATCHES, IndicatorCache
+from indicators import calculate_indicators
+from indicators_stream import SERIES_KEYS
+
+TF_MS = 60 * 60 * 1000
+
+def _ohlcv(n=400, seed=3, t0=1_700_000_000_000):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.5, n))
+    open_ = np.r_[close[0], close[:-1]] + rng.normal(0, 0.1, n)
+    return pd.DataFrame({
+        'timestamp': t0 + np.arange(n, dtype=np.int64) * TF_MS,
+        'open': open_,
+        'high': np.maximum(open_, close) + rng.uniform(0, 0.5, n),
+        'low': np.minimum(open_, close) - rng.uniform(0, 0.5, n),
+        'close': close,
+        'volume': rng.uniform(1, 100, n),
+    })
+
+def _assert_same(a, b):
+    for k in SERIES_KEYS:
+        np.testing.assert_allclose(a[k].to_numpy(dtype=float), b[k].to_numpy(dtype=float), rtol=1e-9, atol=1e-8, equal_nan=True, err_msg=k)
+    assert a['trend_h4'] == b['trend_h4'] and a['trend_d1'] == b['trend_d1']
+
+def test_forming_bar_patch_matches_batch():
+    df = _ohlcv()
+    now = int(df['timestamp'].iloc[-1]) + TF_MS // 2
+    cache = IndicatorCache()
+    _assert_same(cache.indicators("BTC/USDT", "1h", df, trend_tf="4h", now_ms=now), calculate_indicators(df, timeframe="4h"))
+    assert cache.stats["misses"] == 1
+
+    # Cùng nến đóng, nến đang chạy thay đổi -> hit + vá
+    df2 = df.copy()
+    df2.loc[df2.index[-1], ['high', 'close', 'volume']] = [df2['high'].iloc[-1] + 1, df2['close'].iloc[-1] + 0.8, df2['volume'].iloc[-1] * 2]
+    _assert_same(cache.indicators("BTC/USDT", "1h", df2, trend_tf="4h", now_ms=now), calculate_indicators(df2, timeframe="4h"))
+    cache.indicators("BTC/USDT", "1h", df2, trend_tf="4h", now_ms=now)
+    assert cache.stats == {"hits": 2, "misses": 1, "patches": 1, "evictions": 0, "bypass": 0}
+
+def test_new_closed_bar_replaces_entry():
+    df = _ohlcv(401)
+    cache = IndicatorCache()
+    cache.indicators("ETH/USDT", "1h", df.iloc[:400], now_ms=int(df['timestamp'].iloc[399]) + 1)
+    now = int(df['timestamp'].iloc[400]) + 1
+    _assert_same(cache.indicators("ETH/USDT", "1h", df.iloc[1:], now_ms=now), calculate_indicators(df.iloc[1:]))
+    assert cache.stats["misses"] == 2 and len(cache) == 1
+
+def test_lru_eviction():
+    df = _ohlcv(250)
+    cache = IndicatorCache(max_entries=2)
+    now = int(df['timestamp'].iloc[-1]) + TF_MS
+    for sym in ("A", "B", "A", "C"):
+        cache.indicators(sym, "1h", df, now_ms=now)
+    assert len(cache) == 2 and cache.stats["evictions"] == 1
+    cache.indicators("B", "1h", df, now_ms=now)
+    assert cache.stats["misses"] == 4
+
+def test_miss_is_vectorized_and_stream_seeded_after_repeated_patches():
+    df = _ohlcv()
+    now = int(df['timestamp'].iloc[-1]) + TF_MS // 2
+    cache = IndicatorCache()
+    cache.indicators("BTC/USDT", "1h", df, now_ms=now)
+    (entry,) = cache._entries.values()
+    assert entry.stream is None  # miss: calculate_indicators, không seed stream
+    for k in range(1, STREAM_AFTER_PATCHES + 2):
+        d = df.copy()
+        d.loc[d.index[-1], 'close'] = d['close'].iloc[-1] + 0.1 * k
+        _assert_same(cache.indicators("BTC/USDT", "1h", d, now_ms=now), calculate_indicators(d))
+        assert (entry.stream is not None) == (k >= STREAM_AFTER_PATCHES)
+
+def test_hits_return_copies_with_read_only_series():
+    df = _ohlcv()
+    now = int(df['timestamp'].iloc[-1]) + TF_MS
+    cache = IndicatorCache()
+    a = cache.indicators("BTC/USDT", "1h", df, now_ms=now)
+    a["extra"] = 1
+    b = cache.indicators("BTC/USDT", "1h", df, now_ms=now)
+    assert "extra" not in b and cache.stats["hits"] == 1
+    with pytest.raises(ValueError):
+        b["rsi"].iloc[-1] = 0.0
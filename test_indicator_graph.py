@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+import ta
+
+from indicator_graph import IndicatorGraph
+from indicators import INDICATOR_GRAPH, INDICATOR_KEYS, calculate_indicators, indicator_nodes
+from test_indicator_cache import _ohlcv
+
+def test_shared_nodes_computed_once():
+    df = _ohlcv(300)
+    nodes = indicator_nodes()
+    plan = INDICATOR_GRAPH.plan(nodes[k] for k in INDICATOR_KEYS)
+    assert len(plan) == len(set(plan))
+    for shared in ("tr", "atr(14)", "atr(10)", "ema(close,200)", "sma(close,20)"):
+        assert shared in plan
+    INDICATOR_GRAPH.reset_profile()
+    calculate_indicators(df)
+    assert set(INDICATOR_GRAPH.calls.values()) == {1}
+    assert {nid for nid, _, _ in INDICATOR_GRAPH.profile()} == set(plan)
+
+def test_matches_ta_library():
+    df = _ohlcv(400)
+    out = calculate_indicators(df)
+    h, l, c = df['high'], df['low'], df['close']
+    ref = {
+        'atr': ta.volatility.average_true_range(h, l, c, window=14),
+        'adx': ta.trend.adx(h, l, c, window=14),
+        'rsi': ta.momentum.rsi(c, window=14),
+        'macd_signal': ta.trend.macd_signal(c),
+        'bollinger_bands_upper': ta.volatility.bollinger_hband(c, window=20, window_dev=2),
+        'ema200': ta.trend.ema_indicator(c, window=200),
+    }
+    for k, s in ref.items():
+        np.testing.assert_allclose(out[k].to_numpy(float), s.to_numpy(float), rtol=1e-9, equal_nan=True, err_msg=k)
+
+def test_graph_lookback_and_unknown_kind():
+    g = IndicatorGraph()
+    g.register("a", lambda s, n: s, inputs=("close",), lookback=lambda n: n)
+    g.register("b", lambda s, n: s, inputs=lambda n: [("a", {"n": n})], lookback=3)
+    assert g.lookback(g.node("b", n=10)) == 13
+    with pytest.raises(KeyError):
+        g.node("missing")
@@ -0,0 +1,26 @@
+from indicators import calculate_indicators
+from indicators_batch import BATCH_KEYS, batch_indicators
+from tight_gate import build_indicator_results
+from test_indicator_cache import _assert_same, _ohlcv
+
+def test_batch_matches_per_symbol():
+    # Độ dài khác nhau -> hàng được đệm NaN ở đầu
+    frames = {f"S{i}": _ohlcv(400 - 60 * i, seed=i) for i in range(4)}
+    frames["SHORT"] = _ohlcv(150)
+    out = batch_indicators(frames, timeframe="4h")
+    assert out["SHORT"] is None
+    for s, df in frames.items():
+        if s == "SHORT":
+            continue
+        ref = calculate_indicators(df, timeframe="4h")
+        _assert_same(out[s], ref)
+        assert out[s]['volume_spike'].dtype == ref['volume_spike'].dtype
+        assert build_indicator_results(df, out[s]) == build_indicator_results(df, ref)
+
+def test_batch_only_subset():
+    frames = {s: _ohlcv(300, seed=k) for k, s in enumerate(("A", "B"))}
+    out = batch_indicators(frames, only={"rsi", "macd", "adx"})
+    assert set(out["A"]) == {"rsi", "macd", "macd_signal", "adx", "trend_h4", "trend_d1"}
+    assert {"rsi", "macd"} <= BATCH_KEYS and "adx" not in BATCH_KEYS
+    ref = calculate_indicators(frames["B"], only={"adx"})
+    assert out["B"]["adx"].equals(ref["adx"])
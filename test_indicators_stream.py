@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+from indicators import calculate_indicators
+from indicators_stream import SERIES_KEYS, StreamingIndicators, StreamingIndicatorEngine
+
+TF_MS = 15 * 60 * 1000
+
+def _ohlcv(n=600, seed=0, t0=1_700_000_000_000):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.5, n))
+    open_ = np.r_[close[0], close[:-1]] + rng.normal(0, 0.1, n)
+    high = np.maximum(open_, close) + rng.uniform(0, 0.5, n)
+    low = np.minimum(open_, close) - rng.uniform(0, 0.5, n)
+    return pd.DataFrame({
+        'timestamp': t0 + np.arange(n, dtype=np.int64) * TF_MS,
+        'open': open_, 'high': high, 'low': low, 'close': close,
+        'volume': rng.uniform(1, 100, n),
+    })
+
+def _assert_parity(batch, stream):
+    for k in SERIES_KEYS:
+        np.testing.assert_allclose(
+            stream[k].to_numpy(dtype=float), batch[k].to_numpy(dtype=float),
+            rtol=1e-9, atol=1e-8, equal_nan=True, err_msg=k,
+        )
+
+def test_stream_matches_batch_on_prefixes():
+    df = _ohlcv()
+    for n in (210, 301, 450, 600):
+        sub = df.iloc[:n]
+        s = StreamingIndicators()
+        s.seed(sub)
+        _assert_parity(calculate_indicators(sub), s.as_indicators(sub))
+
+def test_forming_bar_peek_does_not_commit():
+    df = _ohlcv(400)
+    s = StreamingIndicators()
+    s.seed(df.iloc[:-1])
+    last = df.iloc[-1]
+    bar = (last['open'], last['high'], last['low'], last['close'], last['volume'])
+    _assert_parity(calculate_indicators(df), s.as_indicators(df, forming_bar=bar, forming_ts=int(last['timestamp'])))
+    _assert_parity(calculate_indicators(df.iloc[:-1]), s.as_indicators(df.iloc[:-1]))
+
+def test_engine_updates_incrementally():
+    df = _ohlcv(450)
+    eng = StreamingIndicatorEngine()
+    # Nến cuối đang chạy: now nằm giữa nến cuối
+    for end in (300, 301, 305, 450):
+        sub = df.iloc[:end]
+        now_ms = int(sub['timestamp'].iloc[-1]) + TF_MS // 2
+        out = eng.indicators("BTC/USDT", "15m", sub, now_ms=now_ms)
+        _assert_parity(calculate_indicators(sub), out)
+    assert eng.get("BTC/USDT", "15m").last_ts == int(df['timestamp'].iloc[-2])
+
+def test_peek_restores_state_through_warmup_and_eviction():
+    df = _ohlcv(260, seed=4)
+    rows = df[['open', 'high', 'low', 'close', 'volume']].to_numpy()
+    ts = df['timestamp'].to_numpy()
+    plain, peeked = StreamingIndicators(), StreamingIndicators()
+    for k, (row, t) in enumerate(zip(rows, ts)):
+        if k:
+            # nến đang chạy giả (kể cả NaN volume) rồi mới tới nến đóng thật
+            peeked.peek((row[0], row[1] + 1, row[2] - 1, row[3] * 1.01, float("nan")), int(t))
+            peeked.peek(row, int(t))
+        np.testing.assert_equal(peeked.update(row, int(t)), plain.update(row, int(t)))
+
+def test_rolling_sums_stay_accurate_on_large_prices():
+    df = _ohlcv(1500, seed=5)
+    for c in ('open', 'high', 'low', 'close'):
+        df[c] = df[c] * 600.0  # ~60000 như BTC
+    s = StreamingIndicators(max_history=1500)
+    s.seed(df)
+    _assert_parity(calculate_indicators(df), s.as_indicators(df))
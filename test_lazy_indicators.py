@@ -0,0 +1,43 @@
+import json
+
+import numpy as np
+
+from indicator_cache import IndicatorCache
+from indicators import calculate_indicators, resolve_indicators
+from tight_gate import build_indicator_results, required_indicators
+from test_indicator_cache import TF_MS, _ohlcv
+
+def test_resolve_pulls_dependencies():
+    assert resolve_indicators(["stoch_rsi"]) == {"stoch_rsi", "rsi"}
+    assert resolve_indicators(["bollinger_bands_upper"]) >= {"bollinger_bands_lower", "bollinger_bands"}
+
+def test_required_from_weights():
+    w = {"EMA200": 0.0, "MA50": 2.0, "MACD": 1.0, "ADX": 0.0}
+    need = required_indicators(w, extra=("atr",))
+    assert {"ma50", "macd", "macd_signal", "atr", "vwap"} <= need  # VWAP: trọng số mặc định
+    assert "ema200" not in need and "adx" not in need
+    assert required_indicators({"EMA200": 3.0, "Range": 2.5}, weighted_only=True) == {"ema200", "range_filter"}
+
+def test_only_matches_full_and_votes_subset():
+    df = _ohlcv(300)
+    full = calculate_indicators(df)
+    only = required_indicators({"MA50": 2.0, "RSI": 1.0, "EMA200": 0.0}, weighted_only=True)
+    lazy = calculate_indicators(df, only=only)
+    assert set(k for k in lazy if not k.startswith("trend_")) == only
+    for k in only:
+        np.testing.assert_allclose(lazy[k].to_numpy(float), full[k].to_numpy(float), equal_nan=True)
+    votes = build_indicator_results(df, lazy)
+    assert set(votes) == {"MA50", "RSI"}
+    assert votes == {k: v for k, v in build_indicator_results(df, full).items() if k in votes}
+
+def test_config_weight_sets_cut_work():
+    cfg = json.load(open("config.json", encoding="utf-8"))
+    w = cfg["weights_sets"]
+    assert len(required_indicators(w["H1"], weighted_only=True)) < len(resolve_indicators())
+    df = _ohlcv(300)
+    now = int(df['timestamp'].iloc[-1]) + TF_MS // 2
+    only = required_indicators(w["H1"], ("adx",), weighted_only=True)
+    got = IndicatorCache().indicators("BTC/USDT", "1h", df, only=only, now_ms=now)
+    full = calculate_indicators(df)
+    for k in only:
+        np.testing.assert_allclose(got[k].to_numpy(float), full[k].to_numpy(float), rtol=1e-9, atol=1e-8, equal_nan=True)
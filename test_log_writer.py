@@ -0,0 +1,73 @@
+import csv
+import time
+
+import log_writer
+from log_writer import LogWriter, get_log_writer
+
+FIELDS = ["a", "b"]
+
+def _rows(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.reader(f))
+
+def test_buffers_until_flush_and_writes_header_once(tmp_path):
+    path = str(tmp_path / "sub" / "log.csv")
+    w = LogWriter(max_rows=100, max_age_sec=60)
+    row = {"a": 1, "b": None, "extra": "x"}
+    w.write(path, FIELDS, row)
+    row["a"] = 99  # dòng đã mã hóa lúc write
+    w.write(path, FIELDS, {"a": "x,y"})
+    assert w.pending() == 2 and not (tmp_path / "sub").exists()
+    assert w.flush() == 2
+    w.write(path, FIELDS, {"a": 3, "b": 4})
+    w.close()
+    assert _rows(path) == [["a", "b"], ["1", ""], ["x,y", ""], ["3", "4"]]
+    assert w.stats == {"rows": 3, "flushes": 2, "errors": 0, "dropped": 0}
+
+def test_size_threshold_and_background_thread(tmp_path):
+    p1, p2 = str(tmp_path / "one.csv"), str(tmp_path / "two.csv")
+    w = LogWriter(max_rows=3, max_age_sec=60)
+    for k in range(4):
+        w.write(p1, FIELDS, {"a": k})
+    assert len(_rows(p1)) == 4 and w.pending() == 1
+
+    bg = LogWriter(max_rows=1000, max_age_sec=0.05, background=True)
+    for k in range(50):
+        bg.write(p2 if k % 2 else p1, FIELDS, {"a": k, "b": k})
+    assert bg.flush(wait=False) == 0
+    deadline = time.time() + 5
+    while bg.pending() and time.time() < deadline:
+        time.sleep(0.01)
+    bg.close()
+    w.close()
+    odd = _rows(p2)
+    assert odd[0] == FIELDS and [int(r[0]) for r in odd[1:]] == list(range(1, 50, 2))
+    assert [int(r[0]) for r in _rows(p1)[1:]] == [0, 1, 2] + list(range(0, 50, 2)) + [3]
+
+def test_failed_write_requeues_rows_in_order(tmp_path, monkeypatch):
+    blocker = tmp_path / "logs"
+    blocker.write_text("không phải thư mục")
+    path = str(blocker / "log.csv")
+    w = LogWriter(max_rows=100, max_age_sec=60)
+    w.write(path, FIELDS, {"a": 1})
+    w.write(path, FIELDS, {"a": 2})
+    assert w.flush() == 0 and w.pending() == 2 and w.stats["errors"] == 1
+    w.write(path, FIELDS, {"a": 3})
+
+    blocker.unlink()
+    assert w.flush() == 3 and w.pending() == 0
+    assert _rows(path) == [["a", "b"], ["1", ""], ["2", ""], ["3", ""]]
+
+    # Lỗi kéo dài: chỉ giữ MAX_RETRY_ROWS dòng mới nhất, có đếm số dòng bỏ
+    monkeypatch.setattr(log_writer, "MAX_RETRY_ROWS", 2)
+    bad = str(tmp_path / "missing" / "x.csv")
+    (tmp_path / "missing").write_text("")
+    for k in range(4):
+        w.write(bad, FIELDS, {"a": k})
+    w.flush()
+    assert w.pending() == 2 and w.stats["dropped"] == 2
+
+def test_default_writer_writes_each_row_without_a_loop(tmp_path):
+    path = str(tmp_path / "default.csv")
+    get_log_writer().write(path, FIELDS, {"a": 1, "b": 2})
+    assert _rows(path) == [["a", "b"], ["1", "2"]]
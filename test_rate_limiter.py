@@ -0,0 +1,72 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimited, RequestScheduler, endpoint_weight
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", c)
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda sec: setattr(c, "now", c.now + sec))
+    return c
+
+def test_klines_weight_follows_limit():
+    assert [endpoint_weight("klines", n) for n in (1, 99, 100, 499, 500, 1000, 1001, 1500)] == [1, 1, 2, 2, 5, 5, 10, 10]
+    assert endpoint_weight("klines") == 5 and endpoint_weight("exchange_info") == 20 and endpoint_weight("other") == 1
+
+def test_weight_accounting_and_window_refill(clock):
+    s = RequestScheduler(capacity=100, window_sec=10.0, safety=1.0)
+    for _ in range(20):
+        s.acquire(endpoint_weight("klines", 1000))
+    assert s.tokens == 0 and s.stats["weight"] == 100 and s.stats["waits"] == 0
+    t0 = clock.now
+    s.acquire(5)  # chờ bucket nạp lại 5 token = 0.5s
+    assert clock.now - t0 == pytest.approx(0.5) and s.stats["waits"] == 1
+    clock.now += 100
+    s._refill(clock.now)
+    assert s.tokens == 100  # không vượt capacity
+
+    s.sync_used_weight({"X-MBX-USED-WEIGHT-1M": "60"})
+    assert s.tokens == 40
+
+    # Biên an toàn 0.8 (ngân sách 4800/6000): trọng số do tiến trình khác dùng trừ thẳng vào ngân sách
+    s = RequestScheduler(capacity=6000, window_sec=60.0, safety=0.8)
+    s.sync_used_weight({"x-mbx-used-weight-1m": "1000"})
+    assert s.tokens == 3800
+    for used in ("4800", "5900"):
+        s.sync_used_weight({"X-MBX-USED-WEIGHT-1M": used})
+        assert s.tokens == 0
+    t0 = clock.now
+    s.acquire(40)  # phải chờ nạp lại (4800/60s -> 40 token = 0.5s)
+    assert clock.now - t0 == pytest.approx(0.5)
+
+def test_429_retry_after_blocks_then_retries(clock):
+    s = RequestScheduler(capacity=100, window_sec=10.0, safety=1.0)
+    calls = []
+
+    def fn():
+        calls.append(clock.now)
+        if len(calls) == 1:
+            raise RateLimited(429, retry_after=7)
+        return "ok"
+
+    assert s.call(fn, weight=1) == "ok"
+    assert calls[1] - calls[0] >= 7 and s.stats["rate_limited"] == 1
+    # Không có Retry-After: backoff lũy thừa theo số lần liên tiếp
+    s.on_rate_limited(429)
+    first = s._blocked_until - clock.now
+    s.on_rate_limited(429)
+    assert s._blocked_until - clock.now == pytest.approx(2 * first)
+
+    def always_limited():
+        raise RateLimited(429, retry_after=1)
+
+    with pytest.raises(RateLimited):
+        RequestScheduler(max_retries=0).call(always_limited)
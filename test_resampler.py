@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from candle_store import COLUMNS, CandleStore
+from resampler import CandleResampler, aggregate_ohlcv
+
+M5_MS = 300_000
+DAY_MS = 86_400_000
+T0 = int(pd.Timestamp("2024-03-09 21:35", tz="UTC").value // 1_000_000)  # không trùng mốc H1/D1
+
+def _m5(n, t0=T0, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.3, n))
+    open_ = np.r_[close[0], close[:-1]]
+    return pd.DataFrame({
+        'timestamp': t0 + np.arange(n, dtype=np.int64) * M5_MS,
+        'open': open_,
+        'high': np.maximum(open_, close) + rng.uniform(0, 0.2, n),
+        'low': np.minimum(open_, close) - rng.uniform(0, 0.2, n),
+        'close': close,
+        'volume': rng.uniform(1, 50, n),
+    })
+
+def _native(m5, rule):
+    """Nến sàn: bucket theo UTC (mốc epoch), như Binance."""
+    df = m5.set_index(pd.to_datetime(m5['timestamp'], unit='ms', utc=True))
+    out = df.resample(rule, origin='epoch', label='left', closed='left').agg(
+        {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}).dropna()
+    out.insert(0, 'timestamp', out.index.as_unit('ms').asi8)
+    return out.reset_index(drop=True)
+
+@pytest.mark.parametrize("tf, rule", [("15m", "15min"), ("1h", "1h"), ("1d", "1D")])
+def test_aggregate_matches_native_bars(tf, rule):
+    m5 = _m5(3 * 288)
+    agg = aggregate_ohlcv(m5, tf)
+    ref = _native(m5, rule)
+    pd.testing.assert_frame_equal(agg[COLUMNS].reset_index(drop=True), ref[COLUMNS], check_dtype=False)
+    # Bucket đầu bị cắt (bắt đầu 21:35) và bucket cuối chưa đủ nến -> không complete
+    per = {"15m": 3, "1h": 12, "1d": 288}[tf]
+    counts = m5.groupby(m5['timestamp'] - m5['timestamp'] % (per * M5_MS)).size().to_numpy()
+    np.testing.assert_array_equal(agg['complete'].to_numpy(), counts == per)
+    if tf == "1d":
+        assert list(agg['timestamp'] % DAY_MS) == [0] * len(agg)
+        assert agg['timestamp'].iloc[1] == int(pd.Timestamp("2024-03-10", tz="UTC").value // 1_000_000)
+        assert not agg['aligned'].iloc[0] and not agg['complete'].iloc[-1]
+
+def test_d1_boundary_is_utc_midnight():
+    m5 = _m5(4, t0=int(pd.Timestamp("2024-03-10 23:50", tz="UTC").value // 1_000_000))
+    agg = aggregate_ohlcv(m5, "1d")
+    midnight = int(pd.Timestamp("2024-03-11", tz="UTC").value // 1_000_000)
+    assert list(agg['timestamp']) == [midnight - DAY_MS, midnight]
+    assert agg['close'].iloc[0] == m5['close'].iloc[1] and agg['open'].iloc[1] == m5['open'].iloc[2]
+    assert agg['volume'].iloc[0] == pytest.approx(m5['volume'].iloc[:2].sum())
+
+def test_derive_keeps_partial_bucket_forming(tmp_path):
+    store = CandleStore(str(tmp_path))
+    rs = CandleResampler(store)
+    m5 = _m5(5 + 12 * 29 + 5)  # ~30 giờ từ 21:35, nến H1 cuối mới có 5/12 nến M5
+    now = int(m5['timestamp'].iloc[-1]) + M5_MS - 1
+    df = rs.derive("BTC/USDT", "1h", m5, limit=50, now_ms=now)
+    ref = _native(m5, "1h").iloc[1:].reset_index(drop=True)  # bucket đầu bị cắt dở -> bỏ
+    pd.testing.assert_frame_equal(df[COLUMNS], ref[COLUMNS], check_dtype=False)
+    # Nến cuối đang chạy: trả về nhưng không vào kho
+    assert store.last_closed_ts("BTC/USDT", "1h") == int(df['timestamp'].iloc[-2])
+    assert store.closed_count("BTC/USDT", "1h") == len(df) - 1
+
+    # Vòng sau: nến H1 đó đủ 12 nến M5 và đã đóng -> vào kho với giá cuối
+    more = _m5(5 + 12 * 30)
+    now = int(more['timestamp'].iloc[-1]) + M5_MS
+    df = rs.derive("BTC/USDT", "1h", more.tail(40), limit=50, now_ms=now)
+    last = _native(more, "1h").iloc[-1]
+    assert store.last_closed_ts("BTC/USDT", "1h") == last['timestamp']
+    assert df[COLUMNS].iloc[-1].tolist() == pytest.approx(last[COLUMNS].tolist())
+
+    # Bucket đã đóng mà thiếu nến M5 -> None (cần backfill)
+    gap = _m5(5 + 12 * 31).drop(index=5 + 12 * 30 + 3)
+    assert rs.derive("BTC/USDT", "1h", gap.tail(30), now_ms=int(gap['timestamp'].iloc[-1]) + M5_MS) is None
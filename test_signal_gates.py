@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from signal_gates import asof_h1_index, compute_gates, compute_gates_history, gate_result_at
+
+M15_MS = 15 * 60 * 1000
+
+CFG = {
+    "supertrend": {"atr_period": 10, "multiplier": 3.0},
+    "range_filter": {"length": 20, "atr_mult": 1.5},
+    "adx_h1_period": 14,
+    "atr_period": 14,
+    "rsi_m15_period": 14,
+    "vwap_anchor": "daily_utc",
+    "adx_h1_threshold": 20,
+    "heavy_required_h1": 2,
+    "anti_chase_atr_mult": 1.5,
+    "score_threshold_m15": 10,
+    "heavy_required_m15": 2,
+}
+
+def _m15(n=900, seed=5, t0=1_700_000_100_000):
+    rng = np.random.default_rng(seed)
+    t0 -= t0 % (60 * 60 * 1000)  # nến H1 đầu tiên trọn 4 nến M15
+    close = 100 + np.cumsum(rng.normal(0.02, 0.4, n))
+    open_ = np.r_[close[0], close[:-1]]
+    return pd.DataFrame({
+        "open": open_,
+        "high": np.maximum(open_, close) + rng.uniform(0, 0.3, n),
+        "low": np.minimum(open_, close) - rng.uniform(0, 0.3, n),
+        "close": close,
+        "volume": rng.uniform(1, 100, n),
+    }, index=pd.to_datetime(t0 + np.arange(n, dtype=np.int64) * M15_MS, unit="ms"))
+
+def _h1(m15):
+    return m15.resample("1h").agg({"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"})
+
+@pytest.mark.parametrize("side", ["long", "short"])
+def test_history_matches_live_gates_on_prefixes(side):
+    m15 = _m15()
+    h1 = _h1(m15)
+    hist = compute_gates_history(h1, m15, "BTC/USDT", side, CFG)
+    assert len(hist) == len(m15)
+    j = asof_h1_index(hist.ts, h1.index.as_unit("ns").asi8 // 1_000_000)
+    for i in (250, 401, 402, 403, 404, 650, len(m15) - 1):
+        # Live: chỉ các nến H1 đã đóng tại lúc nến M15 thứ i đóng
+        live = compute_gates(h1.iloc[:j[i] + 1], m15.iloc[:i + 1], "BTC/USDT", side, CFG)
+        assert gate_result_at(hist, i) == live, i
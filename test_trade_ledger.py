@@ -0,0 +1,77 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from trade_ledger import Trade, TradeLedger
+from trade_simulator import TradeSimulator, gmt7_date
+
+def test_trade_is_dict_like_with_fixed_schema():
+    t = Trade(symbol="BTC/USDT", direction="LONG", entry=100.0, sl=99.0)
+    assert t["sl"] == 99.0 and t.get("tp") is None and t.get("hold_warned", True) is False
+    t["sideway"] = True
+    assert dict(t.items())["sideway"] is True and "sl" in t
+    with pytest.raises(KeyError):
+        t["typo"] = 1
+    assert t.get("typo", "x") == "x" and not hasattr(t, "__dict__")
+    assert pickle.loads(pickle.dumps(t)).to_dict() == t.to_dict()
+
+def test_ledger_aggregates_roundtrip_and_join(tmp_path):
+    rows = [Trade(symbol=s, stage=st, result=r, r_value=1.0, fee=0.1, status="TP")
+            for s, st, r in [("A", "probe", 1.0), ("B", "full", -2.0), ("A", "full", None), ("C", "probe", 0.5)]]
+    led = TradeLedger(capacity=1)
+    led.extend(rows)
+    assert led.summary() == {"trades": 4, "wins": 2, "losses": 1, "win_rate": 2 / 3 * 100.0,
+                             "pnl": -0.5, "fees": pytest.approx(0.4), "avg_r": 1.0}
+    assert led.summary(led.mask(stage="full"))["pnl"] == -2.0
+    assert led.group_sum("symbol") == {"A": 1.0, "B": -2.0, "C": 0.5}
+    assert led.trade(2)["result"] is None and led["symbol"].tolist() == ["A", "B", "A", "C"]
+
+    led.meta["x"] = 3.0
+    led.save(str(tmp_path / "d.npz"))
+    back = TradeLedger.load(str(tmp_path / "d.npz"))
+    assert back.meta == {"x": 3.0} and back.to_frame().equals(led.to_frame())
+    both = TradeLedger.join([back, TradeLedger.from_trades([Trade(symbol="D", result=2.0)])])
+    assert both["symbol"].tolist() == ["A", "B", "A", "C", "D"] and both.summary()["pnl"] == 1.5
+
+def test_archive_rebuilds_stale_snapshot(tmp_path):
+    sim = TradeSimulator(log_path=str(tmp_path / "log.csv"), archive_dir=str(tmp_path / "arch"))
+    t0 = 1_700_000_000
+    for k in range(3):
+        t = sim.open_trade("BTC/USDT", "LONG", 100.0, 99.0, 110.0, 10.0, now_ts=t0 + k)
+        sim.close_trade(t, 101.0, "TP", t0 + 60 + k, reason="take_profit")
+    day = sim.archive.days()[0]
+    # Snapshot .npz lệch với .jsonl (vd tắt giữa chừng) -> dựng lại từ .jsonl
+    stale = TradeLedger.from_trades(sim.archive.load_day(day)[:1])
+    stale.meta["jsonl_bytes"] = 1.0
+    stale.save(str(tmp_path / "arch" / f"{day}.npz"))
+    again = TradeSimulator(log_path=str(tmp_path / "log.csv"), archive_dir=str(tmp_path / "arch"))
+    led = again.archive.ledger(day)
+    assert len(led) == 3 and np.allclose(led["close_price"], 101.0)
+
+def test_archive_writes_snapshot_on_rollover_and_flush_only(tmp_path, monkeypatch):
+    arch = tmp_path / "arch"
+    sim = TradeSimulator(log_path=str(tmp_path / "log.csv"), archive_dir=str(arch))
+    saves = []
+    real_save = TradeLedger.save
+    monkeypatch.setattr(TradeLedger, "save", lambda self, path: (saves.append(path), real_save(self, path)))
+    t0 = 1_700_000_000
+    day0 = gmt7_date(t0 + 60)
+    for k in range(20):
+        t = sim.open_trade("BTC/USDT", "LONG", 100.0, 99.0, 110.0, 10.0, now_ts=t0 + k)
+        sim.close_trade(t, 101.0, "TP", t0 + 60 + k, reason="take_profit")
+    assert saves == [] and not (arch / f"{day0}.npz").exists()
+    assert len(sim.archive.ledger(day0)) == 20  # sổ trong RAM vẫn đủ
+
+    # Lệnh đầu tiên của ngày sau: chốt .npz ngày trước (một lần)
+    t = sim.open_trade("ETH/USDT", "LONG", 10.0, 9.0, 11.0, 1.0, now_ts=t0 + 86400)
+    sim.close_trade(t, 10.5, "TP", t0 + 86400 + 60, reason="take_profit")
+    day1 = gmt7_date(t0 + 86400 + 60)
+    assert saves == [str(arch / f"{day0}.npz")]
+    assert len(TradeLedger.load(saves[0])) == 20
+
+    sim.save_report(str(tmp_path / "report.csv"), date=day1)
+    assert saves[1:] == [str(arch / f"{day1}.npz")]
+    again = TradeSimulator(log_path=str(tmp_path / "log.csv"), archive_dir=str(arch))
+    monkeypatch.setattr(TradeLedger, "from_trades", None)  # phải đọc thẳng .npz, không dựng lại
+    assert len(again.archive.ledger(day0)) == 20 and len(again.archive.ledger(day1)) == 1
@@ -0,0 +1,42 @@
+from trade_simulator import TradeSimulator, gmt7_date
+
+DAY = 86400
+
+def _sim(tmp_path, **kw):
+    return TradeSimulator(log_path=str(tmp_path / "log.csv"), archive_dir=str(tmp_path / "archive"), **kw)
+
+def test_open_index_and_stage_lookup(tmp_path):
+    sim = _sim(tmp_path)
+    t0 = 1_700_000_000
+    a = sim.open_trade("BTC/USDT", "LONG", 100.0, 99.0, 110.0, 10.0, is_probe=True, now_ts=t0)
+    b = sim.open_trade("BTC/USDT", "LONG", 101.0, 99.0, 110.0, 10.0, is_probe=True, now_ts=t0 + 60)
+    c = sim.open_trade("ETH/USDT", "SHORT", 50.0, 51.0, 45.0, 10.0, is_probe=False, now_ts=t0 + 60)
+    assert sim.get_active_trade("BTC/USDT") is a
+    assert sim.get_stage_trade("BTC/USDT", "probe") is b
+    assert sim.get_stage_trade("BTC/USDT", "full") is None
+    sim.promote_trade(a, 20.0, 102.0, now_ts=t0 + 120)
+    assert sim.get_stage_trade("BTC/USDT", "full") is a
+    for t in sim.get_open_trades("BTC/USDT"):
+        sim.close_trade(t, 105.0, "TP", t0 + 180, reason="take_profit")
+    assert sim.get_active_trade("BTC/USDT") is None and sim.get_open_trades() == [c]
+    assert sim.has_probe_only("ETH/USDT") is False
+
+def test_archive_is_bounded_and_partitioned_by_day(tmp_path):
+    sim = _sim(tmp_path, archive_memory=5)
+    t0 = 1_700_000_000
+    for k in range(40):
+        ts = t0 + k * DAY / 4
+        t = sim.open_trade("BTC/USDT", "LONG", 100.0, 99.0, 110.0, 10.0, now_ts=ts)
+        sim.close_trade(t, 100.0 + k % 3, "TP", ts + 600, reason="take_profit")
+    still_open = sim.open_trade("BTC/USDT", "SHORT", 100.0, 101.0, 90.0, 10.0, now_ts=t0 + 10 * DAY)
+    assert len(sim.trades) <= 2 * 5 + 1 and sim.trades[-1] is still_open
+
+    day = gmt7_date(t0 + 3 * DAY + 600)
+    report = sim.daily_report(day, include_open=False)
+    assert len(report) == 4 and set(report["time_close"].map(gmt7_date)) == {day}
+    assert len(sim.daily_report(None, include_open=False)) == 40
+    assert sim.daily_report(gmt7_date(t0 + 10 * DAY), include_open=True)["status"].tolist()[-1] == "open"
+
+    # Archive trên đĩa đọc lại được sau khi khởi động lại
+    again = _sim(tmp_path)
+    assert again.daily_report(day, include_open=False)["result"].tolist() == report["result"].tolist()
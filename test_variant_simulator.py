@@ -0,0 +1,56 @@
+import copy
+import json
+
+import numpy as np
+
+from backtest_engine import BacktestEngine, prepare_symbol
+from variant_simulator import VariantSimulator
+from test_backtest_engine import _frames
+
+VARIANTS = [
+    {},
+    {"probe_pct": 0.2, "full_pct": 0.3, "fee_bps": 2},
+    {"sl_atr_mult_probe": 0.6, "sl_atr_mult_full": 2.0, "leverage": 20},
+    {"trail_roi": 0.01, "trail_buffer": 0.001, "capital": 50.0, "sideway_pct": 0.2},
+]
+
+def _engine_for(cfg, v):
+    c = copy.deepcopy(cfg)
+    trading = c.setdefault("trading", {})
+    for k in ("probe_pct", "full_pct", "sl_atr_mult_probe", "sl_atr_mult_full"):
+        if k in v:
+            trading[k] = v[k]
+    if "sideway_pct" in v:
+        c["regime"]["sideway"]["max_pos_size_pct"] = v["sideway_pct"]
+    e = BacktestEngine(c, capital=v.get("capital", 100.0), leverage=v.get("leverage", 10), fee_bps=v.get("fee_bps", 4))
+    e.trail_roi, e.trail_buffer = v.get("trail_roi", e.trail_roi), v.get("trail_buffer", e.trail_buffer)
+    return e
+
+def test_variants_match_separate_engine_runs():
+    cfg = json.load(open("config.json", encoding="utf-8"))
+    # Nới regime để dữ liệu giả có cả breakout probe/full lẫn sideway
+    cfg["regime"]["normal"].update(adx_h1=10, heavy_hits=1, body_atr_mult=0.4, vol_ma20_mult=0.6)
+    cfg["regime"]["strong"].update(adx_h1=20, heavy_hits=2, body_atr_mult=0.4, vol_ma20_mult=0.6)
+    cfg.setdefault("engine", {})["direct_full_on_strong_breakout"] = True
+    arrays = {}
+    for k, s in enumerate(("AAA/USDT", "BBB/USDT")):
+        m15, h1 = _frames(1200, seed=40 + k)
+        arrays[s] = prepare_symbol(m15, h1, None, cfg)
+
+    vs = VariantSimulator(cfg, VARIANTS, slots=1)  # slots=1: buộc nén/giãn slot trong lúc chạy
+    vs.run(arrays)
+    res = vs.close_all()
+    summary = res.summary()
+    for k, v in enumerate(VARIANTS):
+        e = _engine_for(cfg, v)
+        e.run(arrays)
+        ref = e.close_all(arrays)
+        closed = sorted((float(t["time_close"]), t["symbol"], t["status"], float(t["result"]))
+                        for t in ref.trades if t.get("result") is not None)
+        got = res.trades(k)
+        assert len(closed) == len(got) > 0
+        assert sorted(zip(got["time_close"], got["symbol"], got["status"], got["result"])) == closed
+        assert res.balance[k] == ref.balance
+        assert summary.loc[k, "final_equity"] == ref.summary()["final_equity"]
+    assert set(res.trades(0)["stage"]) == {"probe", "full"}
+    assert np.all(res.open_trades == 0)
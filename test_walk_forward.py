@@ -0,0 +1,81 @@
+import copy
+import json
+
+import numpy as np
+
+from backtest_engine import BacktestEngine, prepare_symbol, symbol_features
+from config_search import SEARCH_SPACE, sample_candidates
+from walk_forward import build_features, feature_group, make_windows, walk_forward
+from test_backtest_engine import _frames
+
+def _features(cfg, n15=1500):
+    history = {}
+    for k, s in enumerate(("AAA/USDT", "BBB/USDT")):
+        m15, h1 = _frames(n15, seed=30 + k)
+        history[s] = {"15m": m15, "1h": h1}
+    return history, {s: symbol_features(f["15m"], f["1h"], None, cfg) for s, f in history.items()}
+
+def test_windows_tile_history():
+    w = make_windows(0.0, 10 * 86400.0, 4, 2)
+    assert [(a / 86400, b / 86400, c / 86400) for a, b, c in w] == [(0, 4, 6), (2, 6, 8), (4, 8, 10)]
+    assert make_windows(0.0, 86400.0, 4, 2) == []
+
+def test_oos_windows_match_sliced_runs_and_stitch():
+    cfg = json.load(open("config.json", encoding="utf-8"))
+    history, feats = _features(cfg)
+    # 1 ứng viên: mỗi OOS = engine chạy trên đúng đoạn mảng của prepare_symbol toàn lịch sử
+    res = walk_forward(feats, [({}, cfg)], is_days=4, oos_days=3, processes=0)
+    assert len(res.windows) >= 3
+    full = {s: prepare_symbol(f["15m"], f["1h"], None, cfg) for s, f in history.items()}
+    for w in res.windows:
+        arrays = {}
+        for s, A in full.items():
+            m = (A["ts"] >= w["oos_start"]) & (A["ts"] < w["oos_end"])
+            arrays[s] = {k: v[m] for k, v in A.items()}
+        engine = BacktestEngine(cfg)
+        engine.run(arrays)
+        assert engine.close_all(arrays).events == w["events"]
+        assert engine.n_open == 0
+    eq = res.equity()
+    assert np.all(np.diff(eq["time_close"]) >= 0)
+    assert np.isclose(eq["equity"].iloc[-1], res.summary()["final_equity"])
+
+def test_parallel_windows_match_serial():
+    cfg = json.load(open("config.json", encoding="utf-8"))
+    _, feats = _features(cfg)
+    cands = sample_candidates(cfg, SEARCH_SPACE, 4, seed=5)
+    serial = walk_forward(feats, cands, is_days=6, oos_days=3, eta=2, min_days=2, min_trades=0, processes=0)
+    parallel = walk_forward(feats, cands, is_days=6, oos_days=3, eta=2, min_days=2, min_trades=0, processes=2)
+    assert [w["index"] for w in serial.windows] == [w["index"] for w in parallel.windows]
+    assert serial.events == parallel.events
+    assert serial.table().equals(parallel.table())
+
+def test_candidates_changing_weights_get_their_own_features():
+    cfg = json.load(open("config.json", encoding="utf-8"))
+    alt = copy.deepcopy(cfg)
+    alt["weights_sets"]["M15"].update(EMA200=3.0, Supertrend=3.0)
+    alt["regime"]["sideway"]["adx_h1"] = 25
+    same = copy.deepcopy(cfg)
+    same["trading"]["probe_pct"] = 0.15
+    assert feature_group(same) == feature_group(cfg) != feature_group(alt)
+    history, _ = _features(cfg, n15=1200)
+    feats = build_features(history, [cfg, alt, same])
+    assert len(feats) == 2
+
+    # OOS của ứng viên alt = engine trên prepare_symbol(alt), không phải trên features của config gốc
+    res = walk_forward(feats, [({"profile": "alt"}, alt)], is_days=4, oos_days=3, processes=0)
+    full = {s: prepare_symbol(f["15m"], f["1h"], None, alt) for s, f in history.items()}
+    for w in res.windows:
+        arrays = {s: {k: v[(A["ts"] >= w["oos_start"]) & (A["ts"] < w["oos_end"])] for k, v in A.items()}
+                  for s, A in full.items()}
+        engine = BacktestEngine(alt)
+        engine.run(arrays)
+        assert engine.close_all(arrays).events == w["events"]
+    stale = walk_forward(feats[feature_group(cfg)], [({"profile": "alt"}, alt)], is_days=4, oos_days=3, processes=0)
+    assert stale.events != res.events
+
+    cands = [({}, cfg), ({"profile": "alt"}, alt), ({"probe_pct": 0.15}, same)]
+    mixed = walk_forward(feats, cands, is_days=4, oos_days=3, eta=3, min_days=2, min_trades=0, processes=0)
+    for w in mixed.windows:
+        only = walk_forward(feats, [cands[w["index"]]], is_days=4, oos_days=3, processes=0)
+        assert only.windows[w["window"]]["events"] == w["events"]
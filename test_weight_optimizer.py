@@ -0,0 +1,57 @@
+import json
+import shutil
+
+import numpy as np
+
+from config import apply_profile, write_profile
+from indicators import calculate_indicators
+from tight_gate import build_indicator_results
+from votes import compile_weights
+from weight_optimizer import Optimizer, SearchSpace, _side_scores, build_score_cache
+from test_backtest_engine import _frames
+
+def _history():
+    out = {}
+    for k, s in enumerate(("AAA/USDT", "BBB/USDT")):
+        m15, h1 = _frames(700, seed=7 + k)
+        out[s] = {"15m": m15, "1h": h1}
+    return out
+
+def test_cached_scores_match_tally():
+    cfg = json.load(open("config.json", encoding="utf-8"))
+    history = _history()
+    cache = build_score_cache(history, cfg, horizon=4)
+    space = SearchSpace(cfg)
+    cands = [space.base, space.sample(np.random.default_rng(3))]
+    w15 = space.matrices(cands)[0]
+    side, _ = _side_scores(np.asarray(cache.d15), np.round(w15 * 100).astype(np.float32))
+    m15 = history["AAA/USDT"]["15m"]
+    close_ms = m15['timestamp'].to_numpy() + 900_000
+    for r in np.flatnonzero(cache.sym == 0)[10::60]:
+        prefix = m15.iloc[:int(np.searchsorted(close_ms, cache.ts[r])) + 1]
+        votes = {k.upper(): v for k, v in build_indicator_results(prefix, calculate_indicators(prefix, cfg)).items()}
+        for c, p in enumerate(cands):
+            t = compile_weights({k[4:]: v for k, v in p.items() if k.startswith("M15.")}).tally(votes)
+            want = 1 if t["score_long"] - t["score_short"] > 0.1 else (-1 if t["score_short"] - t["score_long"] > 0.1 else 0)
+            assert side[r, c] == want
+
+def test_search_and_write_profile(tmp_path):
+    cfg = json.load(open("config.json", encoding="utf-8"))
+    build_score_cache(_history(), cfg).save(str(tmp_path / "cache"))
+    space = SearchSpace(cfg)
+    with Optimizer(str(tmp_path / "cache"), space, processes=0, min_signals=5) as opt:
+        best = opt.random_search(40, seed=1)
+        refined = opt.coordinate_descent(rounds=1)
+        assert refined["score"] >= best["score"]
+        grid = opt.grid_search({"thresholds.M15": [6, 9], "thresholds.H1": [4, 6]})
+        assert grid["score"] == opt.best()["score"]
+    path = tmp_path / "config.json"
+    shutil.copy("config.json", path)
+    profile = space.to_profile(refined["params"])
+    write_profile(str(path), "opt_test", profile)
+    written = json.load(open(path, encoding="utf-8"))
+    assert written["profiles"]["opt_test"] == profile
+    applied = apply_profile(written, "opt_test")
+    assert applied["weights_sets"]["H1"] == profile["weights_sets"]["H1"]
+    assert set(applied["weights_sets"]["M15"]) == set(cfg["weights_sets"]["M15"])
+    assert applied["thresholds"]["M15"] == profile["thresholds"]["M15"]
@@ -1,28 +1,150 @@
 import json, os, time
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from votes import DEFAULT_WEIGHTS, CompiledWeights, compile_weights
 
 def _normalize_key(name: str) -> str:
     return name.strip().replace(" ", "").replace("-", "").replace("_", "").upper()
 
+# Series cần cho từng phiếu của build_indicator_results
+VOTE_INDICATORS = {
+    'EMA200': ('ema200',),
+    'MA50': ('ma50',),
+    'MACD': ('macd', 'macd_signal'),
+    'RSI': ('rsi',),
+    'ADX': ('adx',),
+    'VWAP': ('vwap',),
+    'Supertrend': ('supertrend',),
+    'Range': ('range_filter',),
+    'Chaikin_MF': ('chaikin_mf',),
+    'Volume_Spike': ('volume_spike',),
+    'StochRSI': ('stoch_rsi',),
+    'BollingerBands': ('bollinger_bands_upper', 'bollinger_bands_lower'),
+}
+
+def required_indicators(weights: Dict[str, float] = None, extra=(), weighted_only: bool = False) -> set:
+    """
+    Tập series cần tính cho một khung: phiếu có trọng số khác 0 + phụ thuộc của gate (`extra`).
+    weighted_only=False: phiếu không có trong `weights` dùng trọng số mặc định (votes.DEFAULT_WEIGHTS),
+    weighted_only=True: chỉ các phiếu có mặt trong `weights` (map đã lọc theo weights, như H1).
+    """
+    w = {_normalize_key(k): float(v) for k, v in (weights or {}).items()}
+    defaults = {_normalize_key(k): float(v) for k, v in DEFAULT_WEIGHTS.items()}
+    need = set(extra or ())
+    for name, keys in VOTE_INDICATORS.items():
+        nk = _normalize_key(name)
+        weight = w.get(nk, 0.0 if weighted_only else defaults.get(nk, 1.0))
+        if weight != 0:
+            need.update(keys)
+    return need
+
 def build_indicator_results(ohlcv, indicators):
+    """Phiếu của từng chỉ báo; chỉ báo không được tính (lazy) thì bỏ qua phiếu đó."""
+    close = ohlcv['close'].iloc[-1]
+    last = {k: v.iloc[-1] for k, v in indicators.items() if hasattr(v, 'iloc')}
+    rules = {
+        'EMA200': lambda: "LONG" if close > last['ema200'] else "SHORT",
+        'MA50': lambda: "LONG" if close > last['ma50'] else "SHORT",
+        'MACD': lambda: "LONG" if last['macd'] > last['macd_signal'] else "SHORT",
+        'RSI': lambda: "LONG" if last['rsi'] > 55 else ("SHORT" if last['rsi'] < 45 else "-"),
+        'ADX': lambda: "LONG" if last['adx'] > 25 else "-",
+        'VWAP': lambda: "LONG" if close > last['vwap'] else "SHORT",
+        'Supertrend': lambda: "LONG" if last['supertrend'] == 1 else "SHORT",
+        'Range': lambda: "LONG" if last['range_filter'] == 1 else "SHORT",
+        'Chaikin_MF': lambda: "LONG" if last['chaikin_mf'] > 0 else "SHORT",
+        'Volume_Spike': lambda: "LONG" if last['volume_spike'] == 1 else "-",
+        'StochRSI': lambda: "LONG" if last['stoch_rsi'] > 0.8 else ("SHORT" if last['stoch_rsi'] < 0.2 else "-"),
+        'BollingerBands': lambda: (
+            "LONG" if close > last['bollinger_bands_upper']
+            else ("SHORT" if close < last['bollinger_bands_lower'] else "-")
+        ),
+    }
+    return {
+        name: rule() for name, rule in rules.items()
+        if all(k in last for k in VOTE_INDICATORS[name])
+    }
+
+def vote_directions(ohlcv, indicators, bars=None) -> Dict[str, np.ndarray]:
+    """
+    Hướng phiếu dạng số (+1 LONG / -1 SHORT / 0 "-") của build_indicator_results cho `bars`
+    nến cuối (None = cả khung), từ MỘT lần tính chỉ báo. Chỉ báo đều nhân quả nên giá trị ở
+    nến i trùng với tính lại trên ohlcv.iloc[:i+1]. Phiếu thiếu series (lazy) bị bỏ qua.
+    """
+    n = len(ohlcv) if bars is None else max(1, min(int(bars), len(ohlcv)))
+    close = ohlcv['close'].to_numpy(dtype=float)[-n:]
+    v = {k: s.to_numpy(dtype=float)[-n:] for k, s in indicators.items() if hasattr(s, 'iloc')}
+    side = lambda cond: np.where(cond, 1, -1)
+    rules = {
+        'EMA200': lambda: side(close > v['ema200']),
+        'MA50': lambda: side(close > v['ma50']),
+        'MACD': lambda: side(v['macd'] > v['macd_signal']),
+        'RSI': lambda: np.where(v['rsi'] > 55, 1, np.where(v['rsi'] < 45, -1, 0)),
+        'ADX': lambda: np.where(v['adx'] > 25, 1, 0),
+        'VWAP': lambda: side(close > v['vwap']),
+        'Supertrend': lambda: side(v['supertrend'] == 1),
+        'Range': lambda: side(v['range_filter'] == 1),
+        'Chaikin_MF': lambda: side(v['chaikin_mf'] > 0),
+        'Volume_Spike': lambda: np.where(v['volume_spike'] == 1, 1, 0),
+        'StochRSI': lambda: np.where(v['stoch_rsi'] > 0.8, 1, np.where(v['stoch_rsi'] < 0.2, -1, 0)),
+        'BollingerBands': lambda: np.where(close > v['bollinger_bands_upper'], 1,
+                                           np.where(close < v['bollinger_bands_lower'], -1, 0)),
+    }
     return {
-        'EMA200': "LONG" if ohlcv['close'].iloc[-1] > indicators['ema200'].iloc[-1] else "SHORT",
-        'MA50': "LONG" if ohlcv['close'].iloc[-1] > indicators['ma50'].iloc[-1] else "SHORT",
-        'MACD': "LONG" if indicators['macd'].iloc[-1] > indicators['macd_signal'].iloc[-1] else "SHORT",
-        'RSI': "LONG" if indicators['rsi'].iloc[-1] > 55 else ("SHORT" if indicators['rsi'].iloc[-1] < 45 else "-"),
-        'ADX': "LONG" if indicators['adx'].iloc[-1] > 25 else "-",
-        'VWAP': "LONG" if ohlcv['close'].iloc[-1] > indicators['vwap'].iloc[-1] else "SHORT",
-        'Supertrend': "LONG" if indicators['supertrend'].iloc[-1] == 1 else "SHORT",
-        'Range': "LONG" if indicators['range_filter'].iloc[-1] == 1 else "SHORT",
-        'Chaikin_MF': "LONG" if indicators['chaikin_mf'].iloc[-1] > 0 else "SHORT",
-        'Volume_Spike': "LONG" if indicators['volume_spike'].iloc[-1] == 1 else "-",
-        'StochRSI': "LONG" if indicators['stoch_rsi'].iloc[-1] > 0.8 else ("SHORT" if indicators['stoch_rsi'].iloc[-1] < 0.2 else "-"),
-        'BollingerBands': (
-            "LONG" if ohlcv['close'].iloc[-1] > indicators['bollinger_bands_upper'].iloc[-1]
-            else ("SHORT" if ohlcv['close'].iloc[-1] < indicators['bollinger_bands_lower'].iloc[-1] else "-")
-        )
+        name: rule().astype(np.int8) for name, rule in rules.items()
+        if all(k in v for k in VOTE_INDICATORS[name])
     }
 
+def vote_matrix(ohlcv, indicators, compiled: CompiledWeights, bars=None, dirs_by_name=None):
+    """(dirs int8[bars, n_cols], active bool[n_cols]) theo cột của CompiledWeights."""
+    if dirs_by_name is None:
+        dirs_by_name = vote_directions(ohlcv, indicators, bars)
+    n = len(ohlcv) if bars is None else max(1, min(int(bars), len(ohlcv)))
+    dirs = np.zeros((n, len(compiled)), dtype=np.int8)
+    active = np.zeros(len(compiled), dtype=bool)
+    for name, col in dirs_by_name.items():
+        c = compiled.column(name)
+        dirs[:, c] = col
+        active[c] = True
+    return dirs, active
+
+_DIR_LABEL = np.array(["SHORT", "-", "LONG"])
+
+def build_indicator_results_bars(ohlcv, indicators, bars: int = 1, dirs_by_name=None) -> List[Dict[str, str]]:
+    """Phiếu của build_indicator_results cho `bars` nến cuối (cũ -> mới)."""
+    if dirs_by_name is None:
+        dirs_by_name = vote_directions(ohlcv, indicators, bars)
+    cols = {name: _DIR_LABEL[d + 1].tolist() for name, d in dirs_by_name.items()}
+    n = max(1, min(int(bars), len(ohlcv)))
+    return [{name: col[j] for name, col in cols.items()} for j in range(n)]
+
+def recent_bar_votes(ohlcv, indicators, weights=None, bars: int = 1) -> List[Dict]:
+    """
+    Phiếu + điểm long/short của `bars` nến cuối (cũ -> mới): [{"ts", "votes", "score_long", "score_short"}].
+    `weights`: dict trọng số hoặc CompiledWeights. Dùng cho xác nhận nhiều nến (snapshot M5)
+    hoặc kiểm tra ổn định kiểu StablePassTracker.
+    """
+    cw = weights if isinstance(weights, CompiledWeights) else compile_weights(weights)
+    by_name = vote_directions(ohlcv, indicators, bars)
+    dirs, active = vote_matrix(ohlcv, indicators, cw, bars, dirs_by_name=by_name)
+    sc = cw.scores(dirs, active)
+    maps = build_indicator_results_bars(ohlcv, indicators, bars, dirs_by_name=by_name)
+    ts = ohlcv['timestamp'].to_numpy()[-len(maps):].tolist() if 'timestamp' in ohlcv.columns else [None] * len(maps)
+    return [
+        {"ts": t, "votes": m, "score_long": float(sl), "score_short": float(ss)}
+        for t, m, sl, ss in zip(ts, maps, sc["score_long"], sc["score_short"])
+    ]
+
+def trailing_streak(sides: List[str], side: str) -> int:
+    """Số nến liên tiếp cuối chuỗi có cùng `side` (vd. yêu cầu N nến đồng pha)."""
+    n = 0
+    for s in reversed(sides):
+        if s != side:
+            break
+        n += 1
+    return n
+
 def _heavy_hits(h1_map: Dict[str,str], ema200_series, side: str) -> int:
     """
     Đếm số lượng các chỉ báo EMA200, Supertrend, Range trên H1 đồng pha với side,
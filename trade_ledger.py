@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+Bản ghi lệnh schema cố định + sổ lệnh dạng cột cho báo cáo.
+
+- Trade: __slots__ theo TRADE_FIELDS, truy cập như dict (t["sl"], t.get(...), t["sl"] = ..., t.items())
+  để main/sideway_strategy/BacktestEngine dùng nguyên như cũ; khóa ngoài schema -> KeyError.
+- TradeLedger: mỗi trường một mảng NumPy (số: float64 với None = NaN; chuỗi: mã int32 + bảng nhãn;
+  cờ: bool). Thêm lệnh khấu hao O(1), tổng hợp bằng phép toán mảng, lưu/đọc .npz (chỉ cần NumPy,
+  Web backend đọc trực tiếp được).
+"""
+import os
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+FLOAT_FIELDS = ("entry", "sl", "tp", "size", "time_open", "time_full", "time_close", "close_price",
+                "result", "fee", "pnl_pct", "r_value", "mae_pct", "mfe_pct")
+TEXT_FIELDS = ("symbol", "direction", "stage", "reason", "status")
+BOOL_FIELDS = ("is_probe", "sideway", "hold_warned")
+TRADE_FIELDS = ("symbol", "direction", "entry", "sl", "tp", "size", "stage", "time_open", "time_full",
+                "time_close", "close_price", "result", "reason", "fee", "pnl_pct", "r_value", "is_probe",
+                "status", "sideway", "hold_warned", "mae_pct", "mfe_pct")
+_FIELDS = frozenset(TRADE_FIELDS)
+
+class Trade:
+    """Một lệnh; các trường chưa gán là None (riêng sideway/hold_warned mặc định False)."""
+    __slots__ = TRADE_FIELDS
+
+    def __init__(self, **fields):
+        for k in TRADE_FIELDS:
+            object.__setattr__(self, k, None)
+        self.sideway = self.hold_warned = False
+        for k, v in fields.items():
+            self[k] = v
+
+    def __getitem__(self, key):
+        if key not in _FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in _FIELDS:
+            raise KeyError(f"Trade không có trường {key!r}")
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in _FIELDS
+
+    def __iter__(self):
+        return iter(TRADE_FIELDS)
+
+    def __len__(self):
+        return len(TRADE_FIELDS)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in _FIELDS else default
+
+    def keys(self):
+        return TRADE_FIELDS
+
+    def values(self):
+        return [getattr(self, k) for k in TRADE_FIELDS]
+
+    def items(self):
+        return [(k, getattr(self, k)) for k in TRADE_FIELDS]
+
+    def to_dict(self) -> Dict:
+        return dict(self.items())
+
+    def __getstate__(self):
+        return self.values()
+
+    def __setstate__(self, state):
+        for k, v in zip(TRADE_FIELDS, state):
+            object.__setattr__(self, k, v)
+
+    def __repr__(self):
+        return (f"Trade({self.symbol} {self.direction} {self.stage} entry={self.entry} "
+                f"status={self.status} result={self.result})")
+
+class TradeLedger:
+    """Sổ lệnh dạng cột; self.n dòng đầu của mỗi mảng là dữ liệu thật."""
+
+    def __init__(self, capacity: int = 64):
+        capacity = max(1, int(capacity))
+        self.n = 0
+        self._f = {k: np.full(capacity, np.nan) for k in FLOAT_FIELDS}
+        self._c = {k: np.full(capacity, -1, dtype=np.int32) for k in TEXT_FIELDS}
+        self._b = {k: np.zeros(capacity, dtype=bool) for k in BOOL_FIELDS}
+        self._labels = {k: [] for k in TEXT_FIELDS}
+        self._codes = {k: {} for k in TEXT_FIELDS}
+        self.meta: Dict[str, float] = {}  # số liệu kèm theo (lưu cùng .npz), vd kích thước nguồn
+
+    @classmethod
+    def from_trades(cls, trades: Iterable) -> "TradeLedger":
+        trades = list(trades)
+        led = cls(len(trades))
+        for t in trades:
+            led.append(t)
+        return led
+
+    def __len__(self):
+        return self.n
+
+    def _grow(self):
+        cap = 2 * len(self._f["entry"])
+        for cols, fill in ((self._f, np.nan), (self._c, -1), (self._b, False)):
+            for k, a in cols.items():
+                b = np.full(cap, fill, dtype=a.dtype)
+                b[:self.n] = a[:self.n]
+                cols[k] = b
+
+    def _code(self, field: str, value) -> int:
+        if value is None:
+            return -1
+        value = str(value)
+        codes = self._codes[field]
+        c = codes.get(value)
+        if c is None:
+            c = codes[value] = len(self._labels[field])
+            self._labels[field].append(value)
+        return c
+
+    def append(self, trade):
+        """Thêm một lệnh (Trade hoặc dict); trường thiếu = None/False."""
+        if self.n == len(self._f["entry"]):
+            self._grow()
+        i = self.n
+        get = trade.get
+        for k, a in self._f.items():
+            v = get(k)
+            a[i] = np.nan if v is None else float(v)
+        for k, a in self._c.items():
+            a[i] = self._code(k, get(k))
+        for k, a in self._b.items():
+            a[i] = bool(get(k) or False)
+        self.n += 1
+
+    def extend(self, trades: Iterable):
+        for t in trades:
+            self.append(t)
+
+    # ---- Đọc cột ----
+    def __getitem__(self, field: str) -> np.ndarray:
+        """Cột số/cờ (view) hoặc cột chuỗi đã giải mã (mảng object, None nếu trống)."""
+        if field in self._f:
+            return self._f[field][:self.n]
+        if field in self._b:
+            return self._b[field][:self.n]
+        if field in self._c:
+            return self.labels(field)[self._c[field][:self.n]]
+        raise KeyError(field)
+
+    def codes(self, field: str) -> np.ndarray:
+        return self._c[field][:self.n]
+
+    def labels(self, field: str) -> np.ndarray:
+        """Bảng nhãn của cột chuỗi; phần tử cuối là None để mã -1 tra thẳng được."""
+        return np.array(self._labels[field] + [None], dtype=object)
+
+    def mask(self, **equals) -> np.ndarray:
+        """Mặt nạ dòng có cột chuỗi bằng giá trị cho trước, vd mask(stage="probe")."""
+        m = np.ones(self.n, dtype=bool)
+        for field, value in equals.items():
+            c = self._codes[field].get(str(value))
+            if c is None:
+                return np.zeros(self.n, dtype=bool)
+            m &= self._c[field][:self.n] == c
+        return m
+
+    def trade(self, i: int) -> Trade:
+        t = Trade()
+        for k, a in self._f.items():
+            v = a[i]
+            t[k] = None if np.isnan(v) else float(v)
+        for k, a in self._c.items():
+            c = a[i]
+            t[k] = None if c < 0 else self._labels[k][c]
+        for k, a in self._b.items():
+            t[k] = bool(a[i])
+        return t
+
+    def trades(self) -> List[Trade]:
+        return [self.trade(i) for i in range(self.n)]
+
+    @classmethod
+    def join(cls, ledgers: Iterable["TradeLedger"]) -> "TradeLedger":
+        """Sổ mới nối các sổ theo thứ tự (cột chuỗi được mã hóa lại theo bảng nhãn chung)."""
+        ledgers = list(ledgers)
+        out = cls(sum(led.n for led in ledgers))
+        for led in ledgers:
+            lo, hi = out.n, out.n + led.n
+            for k in FLOAT_FIELDS:
+                out._f[k][lo:hi] = led._f[k][:led.n]
+            for k in BOOL_FIELDS:
+                out._b[k][lo:hi] = led._b[k][:led.n]
+            for k in TEXT_FIELDS:
+                remap = np.array([out._code(k, s) for s in led._labels[k]] + [-1], dtype=np.int32)
+                out._c[k][lo:hi] = remap[led._c[k][:led.n]]
+            out.n = hi
+        return out
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame({k: self[k] for k in TRADE_FIELDS})
+
+    # ---- Tổng hợp (vector hóa) ----
+    def summary(self, mask: Optional[np.ndarray] = None) -> Dict[str, float]:
+        """Số lệnh, thắng/thua, tổng P&L, phí, R trung bình (lệnh chưa đóng: result NaN, không tính vào P&L)."""
+        pnl, r = self["result"], self["r_value"]
+        fee = self["fee"]
+        if mask is not None:
+            pnl, r, fee = pnl[mask], r[mask], fee[mask]
+        wins, losses = int(np.count_nonzero(pnl > 0)), int(np.count_nonzero(pnl < 0))
+        return {
+            "trades": int(len(pnl)), "wins": wins, "losses": losses,
+            "win_rate": wins / max(1, wins + losses) * 100.0,
+            "pnl": float(np.nansum(pnl)), "fees": float(np.nansum(fee)),
+            "avg_r": float(np.nanmean(r)) if np.any(~np.isnan(r)) else float("nan"),
+        }
+
+    def group_sum(self, field: str, value: str = "result") -> Dict[str, float]:
+        """{nhãn: tổng cột `value`} theo cột chuỗi `field` (NaN bỏ qua)."""
+        codes = self._c[field][:self.n]
+        v = np.nan_to_num(self._f[value][:self.n])
+        keep = codes >= 0
+        sums = np.bincount(codes[keep], weights=v[keep], minlength=len(self._labels[field]))
+        return {lab: float(s) for lab, s in zip(self._labels[field], sums)}
+
+    # ---- Lưu/đọc ----
+    def save(self, path: str):
+        """Ghi .npz (nguyên tử: file tạm rồi os.replace); nhãn lưu thành mảng chuỗi, meta thành số vô hướng, không cần pickle."""
+        arrays = {k: a[:self.n] for k, a in self._f.items()}
+        arrays.update({k: a[:self.n] for k, a in self._b.items()})
+        arrays.update({k: a[:self.n] for k, a in self._c.items()})
+        arrays.update({f"{k}__labels": np.array(self._labels[k], dtype=str) for k in TEXT_FIELDS})
+        arrays.update({f"meta__{k}": np.float64(v) for k, v in self.meta.items()})
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TradeLedger":
+        with np.load(path, allow_pickle=False) as z:
+            n = len(z["entry"])
+            led = cls(n)
+            for k in FLOAT_FIELDS:
+                if k in z.files:  # file cũ thiếu cột mới -> giữ NaN/False
+                    led._f[k][:n] = z[k]
+            for k in BOOL_FIELDS:
+                if k in z.files:
+                    led._b[k][:n] = z[k]
+            for k in TEXT_FIELDS:
+                led._c[k][:n] = z[k]
+                led._labels[k] = [str(s) for s in z[f"{k}__labels"]]
+                led._codes[k] = {s: i for i, s in enumerate(led._labels[k])}
+            led.meta = {k[len("meta__"):]: float(z[k]) for k in z.files if k.startswith("meta__")}
+            led.n = n
+        return led
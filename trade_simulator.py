@@ -1,8 +1,14 @@
 import os
+import glob
+import json
 from datetime import datetime, timedelta
 import pandas as pd
 import csv
 
+from equity_tracker import EquityTracker
+from log_writer import get_log_writer
+from trade_ledger import TRADE_FIELDS, Trade, TradeLedger
+
 def safe_float_fmt(val, digits=4, default=""):
     try:
         if val is None or (hasattr(pd, "isnull") and pd.isnull(val)):
@@ -20,13 +26,136 @@ def to_gmt7_str(ts):
     except Exception:
         return ""
 
+def gmt7_date(ts):
+    """Ngày (YYYY-MM-DD) theo GMT+7 của epoch giây, như daily_report."""
+    return (datetime.utcfromtimestamp(float(ts)) + timedelta(hours=7)).date().isoformat()
+
+class TradeArchive:
+    """
+    Kho lệnh đã đóng, chỉ ghi thêm: mỗi ngày (GMT+7 theo time_close) một file <root>/<YYYY-MM-DD>.jsonl,
+    kèm ảnh chụp dạng cột <YYYY-MM-DD>.npz (TradeLedger) cho báo cáo/Web đọc thẳng không cần parse JSON.
+    Mỗi lệnh đóng chỉ append một dòng .jsonl + thêm vào sổ trong RAM; .npz của ngày chỉ được ghi lại
+    khi sang ngày mới, khi sổ bị đẩy khỏi cache hoặc khi flush() (save_report, lúc dừng bot).
+    root=None: chỉ giữ trong RAM (backtest).
+    """
+    def __init__(self, root="trade_archive", cached_days=2):
+        self.root = root
+        self._mem = [] if root is None else None
+        self._ledgers = {}  # day -> TradeLedger (vài ngày gần nhất)
+        self._dirty = set()  # ngày có lệnh mới chưa ghi .npz
+        self.cached_days = cached_days
+        if root:
+            os.makedirs(root, exist_ok=True)
+
+    def _path(self, day, ext="jsonl"):
+        return os.path.join(self.root, f"{day}.{ext}")
+
+    def append(self, trade):
+        if self.root is None:
+            self._mem.append(trade)
+            return
+        day = gmt7_date(trade["time_close"])
+        if any(d < day for d in self._dirty):
+            self.flush(before=day)  # sang ngày mới: chốt .npz của các ngày trước
+        led = self.ledger(day)
+        row = {k: v for k, v in trade.items() if not k.startswith("_")}
+        with open(self._path(day), "a", encoding="utf-8") as f:
+            f.write(json.dumps(row, default=lambda o: o.item() if hasattr(o, "item") else str(o)) + "\n")
+        led.append(trade)
+        self._dirty.add(day)
+
+    def flush(self, before=None):
+        """Ghi .npz của các ngày có lệnh mới (before: chỉ các ngày < before)."""
+        for day in sorted(self._dirty):
+            if before is None or day < before:
+                self._save(day)
+
+    def _save(self, day):
+        self._dirty.discard(day)
+        led = self._ledgers.get(day)
+        if led is None:
+            return
+        try:
+            led.meta["jsonl_bytes"] = os.path.getsize(self._path(day))
+            led.save(self._path(day, "npz"))
+        except Exception as e:
+            print(f"[ARCHIVE] Lỗi ghi {self._path(day, 'npz')}: {e}")
+
+    def days(self):
+        if self.root is None:
+            return sorted({gmt7_date(t["time_close"]) for t in self._mem})
+        return sorted(os.path.basename(p)[:-len(".jsonl")] for p in glob.glob(os.path.join(self.root, "*.jsonl")))
+
+    def _read_jsonl(self, day):
+        path = self._path(day)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        return [Trade(**{k: v for k, v in r.items() if k in TRADE_FIELDS}) for r in rows]
+
+    def ledger(self, day):
+        """TradeLedger của ngày `day`: cache RAM -> .npz (nếu khớp kích thước .jsonl) -> dựng lại từ .jsonl."""
+        if self.root is None:
+            return TradeLedger.from_trades(self.load_day(day))
+        led = self._ledgers.get(day)
+        if led is not None:
+            return led
+        path, npz = self._path(day), self._path(day, "npz")
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        led = None
+        if size and os.path.exists(npz):
+            try:
+                led = TradeLedger.load(npz)
+            except Exception as e:
+                print(f"[ARCHIVE] Lỗi đọc {npz}: {e}")
+            if led is not None and led.meta.get("jsonl_bytes") != size:
+                led = None
+        if led is None:
+            led = TradeLedger.from_trades(self._read_jsonl(day))
+            led.meta["jsonl_bytes"] = size
+        self._ledgers[day] = led
+        while len(self._ledgers) > self.cached_days:
+            old = min(self._ledgers)
+            if old in self._dirty:
+                self._save(old)  # ghi .npz trước khi bỏ khỏi cache
+            self._ledgers.pop(old)
+        return led
+
+    def load_day(self, day):
+        """Lệnh đóng trong ngày `day` (chỉ đọc đúng một partition)."""
+        if self.root is None:
+            return [t for t in self._mem if gmt7_date(t["time_close"]) == day]
+        return self._read_jsonl(day)
+
+    def load_all(self):
+        if self.root is None:
+            return list(self._mem)
+        return [t for d in self.days() for t in self.load_day(d)]
+
+    def ledger_all(self):
+        if self.root is None:
+            return TradeLedger.from_trades(self._mem)
+        return TradeLedger.join(self.ledger(d) for d in self.days())
+
 class TradeSimulator:
-    def __init__(self, capital=100.0, leverage=10, fee_bps=4, log_path="trades_sim_log.csv"):
+    def __init__(self, capital=100.0, leverage=10, fee_bps=4, log_path="trades_sim_log.csv",
+                 archive_dir="trade_archive", archive_memory=500, equity_path="equity_curve.bin"):
+        """
+        archive_dir: thư mục partition lệnh đã đóng (None = giữ trong RAM).
+        archive_memory: số lệnh đã đóng gần nhất giữ lại trong self.trades (None = giữ tất cả).
+        equity_path: file chuỗi equity của EquityTracker (None = không ghi).
+        """
         self.initial_capital = capital
         self.balance = capital
         self.leverage = leverage
         self.fee_bps = fee_bps  # 4 bps = 0.04% (Binance taker fee)
-        self.trades = []
+        self.trades = []  # lệnh mở + lệnh đóng gần nhất, theo thứ tự mở
+        self.open_by_symbol = {}  # symbol -> [lệnh mở theo thứ tự mở]
+        self.archive = TradeArchive(archive_dir)
+        self.archive_memory = archive_memory
+        self._closed_in_memory = 0
+        self.equity = EquityTracker(self, equity_path)
         self.log_path = log_path
         self.csv_fieldnames = [
             "event_type","symbol","direction","stage","entry","close_price","time_open","time_close",
@@ -48,12 +177,7 @@ class TradeSimulator:
             row.update(extra)
         for tcol in ["time_open", "time_close"]:
             row[tcol + "_human"] = to_gmt7_str(trade.get(tcol))
-        write_header = not os.path.exists(self.log_path) or os.path.getsize(self.log_path) == 0
-        with open(self.log_path, "a", encoding="utf-8", newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=self.csv_fieldnames)
-            if write_header:
-                writer.writeheader()
-            writer.writerow(row)
+        get_log_writer().write(self.log_path, self.csv_fieldnames, row)
 
     def _calc_fee(self, entry, exit_price, size):
         # Binance: fee = (entry + exit) * size * fee_rate
@@ -67,30 +191,52 @@ class TradeSimulator:
         now_ts = now_ts or datetime.utcnow().timestamp()
         notional = size_quote
         size = notional / max(1e-12, entry) if entry else 0
-        trade = {
-            "symbol": symbol,
-            "direction": direction,
-            "entry": entry,
-            "sl": sl,
-            "tp": tp,
-            "size": size,
-            "stage": "probe" if is_probe else "full",
-            "time_open": now_ts,
-            "time_full": None if is_probe else now_ts,
-            "time_close": None,
-            "close_price": None,
-            "result": None,
-            "reason": reason,
-            "fee": 0.0,
-            "pnl_pct": None,
-            "r_value": r_value,
-            "is_probe": is_probe,
-            "status": "open"
-        }
+        trade = Trade(
+            symbol=symbol,
+            direction=direction,
+            entry=entry,
+            sl=sl,
+            tp=tp,
+            size=size,
+            stage="probe" if is_probe else "full",
+            time_open=now_ts,
+            time_full=None if is_probe else now_ts,
+            reason=reason,
+            fee=0.0,
+            r_value=r_value,
+            is_probe=is_probe,
+            status="open",
+        )
         self.trades.append(trade)
+        self.open_by_symbol.setdefault(symbol, []).append(trade)
         self.log_event("open", trade)
         return trade
 
+    def _archive(self, trade):
+        """Lệnh vừa đóng/hủy: bỏ khỏi chỉ mục lệnh mở, ghi vào archive, cắt bớt lệnh đóng cũ trong RAM."""
+        opens = self.open_by_symbol.get(trade["symbol"], [])
+        for i, t in enumerate(opens):
+            if t is trade:
+                del opens[i]
+                break
+        if not opens:
+            self.open_by_symbol.pop(trade["symbol"], None)
+        self.equity.on_close(trade)
+        self.archive.append(trade)
+        self._closed_in_memory += 1
+        keep = self.archive_memory
+        # Cắt theo lô (khi vượt gấp đôi) để chi phí dựng lại danh sách được khấu hao
+        if keep is not None and self._closed_in_memory > 2 * keep:
+            drop = self._closed_in_memory - keep
+            kept = []
+            for t in self.trades:
+                if drop and t["time_close"] is not None:
+                    drop -= 1
+                    continue
+                kept.append(t)
+            self.trades = kept
+            self._closed_in_memory = keep
+
     def promote_trade(self, trade, add_notional, price_now, now_ts=None):
         now_ts = now_ts or datetime.utcnow().timestamp()
         if trade["stage"] == "full":
@@ -138,6 +284,7 @@ class TradeSimulator:
         trade["pnl_pct"] = (pnl_net / base_cap) * 100.0 if base_cap > 0 else 0
         self.balance += pnl_net
         self.log_event("close", trade)
+        self._archive(trade)
 
     def cancel_probe(self, trade, now_ts=None, reason="cancel_probe"):
         now_ts = now_ts or datetime.utcnow().timestamp()
@@ -147,10 +294,22 @@ class TradeSimulator:
         trade["status"] = "cancel"
         trade["reason"] = reason
         self.log_event("cancel", trade)
+        self._archive(trade)
 
     def get_active_trade(self, symbol):
-        for t in self.trades:
-            if t["symbol"] == symbol and t["time_close"] is None:
+        opens = self.open_by_symbol.get(symbol)
+        return opens[0] if opens else None
+
+    def get_open_trades(self, symbol=None):
+        """Bản sao danh sách lệnh mở (của symbol hoặc tất cả) theo thứ tự mở; đóng lệnh khi duyệt vẫn an toàn."""
+        if symbol is not None:
+            return list(self.open_by_symbol.get(symbol, ()))
+        return [t for opens in self.open_by_symbol.values() for t in opens]
+
+    def get_stage_trade(self, symbol, stage):
+        """Lệnh mở MỞ SAU CÙNG của symbol ở stage ("probe"/"full"), None nếu không có."""
+        for t in reversed(self.open_by_symbol.get(symbol, ())):
+            if t["stage"] == stage:
                 return t
         return None
 
@@ -164,59 +323,59 @@ class TradeSimulator:
         now_ts = now_ts or datetime.utcnow().timestamp()
         return (now_ts - trade["time_open"]) >= timeout_min * 60
 
+    def report_ledger(self, date_str=None, include_open=True):
+        """TradeLedger cho báo cáo: lệnh đóng trong ngày (chỉ một partition; None = mọi ngày) + lệnh đang mở."""
+        closed = self.archive.ledger(date_str) if date_str is not None else self.archive.ledger_all()
+        if not include_open:
+            return closed
+        opens = [t for t in self.get_open_trades() if date_str is None or gmt7_date(t["time_open"]) == date_str]
+        return TradeLedger.join([closed, TradeLedger.from_trades(opens)]) if opens else closed
+
     def daily_report(self, date_str=None, include_open=True):
-        rows=[]
-        for t in self.trades:
-            # Lệnh đã đóng trong ngày
-            if t["time_close"]:
-                d = (datetime.utcfromtimestamp(float(t["time_close"])) + timedelta(hours=7)).date().isoformat()
-                if date_str is None or d == date_str:
-                    rows.append(t)
-            # Lệnh đang mở
-            elif include_open:
-                d = (datetime.utcfromtimestamp(float(t["time_open"])) + timedelta(hours=7)).date().isoformat()
-                if date_str is None or d == date_str:
-                    rows.append(t)
-        return pd.DataFrame(rows)
+        return self.report_ledger(date_str, include_open).to_frame()
 
     def get_all_trades(self):
         return self.trades
 
     def save_report(self, path, date=None):
-        trades = self.daily_report(date, include_open=True)
-        fieldnames = self.csv_fieldnames
-        if "time_open_human" not in trades.columns:
-            trades["time_open_human"] = trades["time_open"].apply(to_gmt7_str)
-        if "time_close_human" not in trades.columns:
-            trades["time_close_human"] = trades["time_close"].apply(to_gmt7_str)
-        trades = trades if not trades.empty else pd.DataFrame(columns=fieldnames)
-        trades.to_csv(path, header=True, index=False, columns=fieldnames)
+        get_log_writer().flush()  # path thường chính là log_path: ghi nốt sự kiện đang đệm trước khi ghi đè
+        self.archive.flush()
+        led = self.report_ledger(date, include_open=True)
+        with open(path, "w", encoding="utf-8", newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=self.csv_fieldnames, extrasaction="ignore")
+            writer.writeheader()
+            for t in led.trades():
+                row = {k: ("" if v is None else v) for k, v in t.items()}
+                row["time_open_human"] = to_gmt7_str(t["time_open"])
+                row["time_close_human"] = to_gmt7_str(t["time_close"])
+                writer.writerow(row)
 
     def format_markdown_report(self, date=None):
-        df = self.daily_report(date, include_open=True)
-        if df.empty:
+        led = self.report_ledger(date, include_open=True)
+        if not len(led):
             return "Không có giao dịch nào trong ngày."
+        st = led.summary()
         stats = (
-            f"**Lệnh:** {len(df)} | Win: {(df['result']>0).sum()} | "
-            f"Loss: {(df['result']<0).sum()} | Tổng P&L: {safe_float_fmt(df['result'].sum(skipna=True),2)} | "
+            f"**Lệnh:** {st['trades']} | Win: {st['wins']} | "
+            f"Loss: {st['losses']} | Tổng P&L: {safe_float_fmt(st['pnl'],2)} | "
             f"Vốn: {safe_float_fmt(self.balance,2)}"
         )
         lines = [stats]
-        for _, t in df.iterrows():
-            entry = safe_float_fmt(getattr(t, "entry", None))
-            exit_ = safe_float_fmt(getattr(t, "close_price", None))
-            tp = safe_float_fmt(getattr(t, "tp", None))
-            sl = safe_float_fmt(getattr(t, "sl", None))
-            size = safe_float_fmt(getattr(t, "size", None))
-            fee = safe_float_fmt(getattr(t, "fee", None), 2)
-            pnl = safe_float_fmt(getattr(t, "result", None), 2)
-            pnl_pct = safe_float_fmt(getattr(t, "pnl_pct", None), 2, "") + "%" if getattr(t, "pnl_pct", None) is not None and not pd.isnull(getattr(t, "pnl_pct", None)) else ""
-            reason = getattr(t, "reason", "")
-            open_time = getattr(t, "time_open_human", "") or to_gmt7_str(getattr(t, "time_open", None))
-            close_time = getattr(t, "time_close_human", "") or to_gmt7_str(getattr(t, "time_close", None))
-            pair = getattr(t, "symbol", "")
-            direction = getattr(t, "direction", "")
-            stage = getattr(t, "stage", "")
+        for t in led.trades():
+            entry = safe_float_fmt(t["entry"])
+            exit_ = safe_float_fmt(t["close_price"])
+            tp = safe_float_fmt(t["tp"])
+            sl = safe_float_fmt(t["sl"])
+            size = safe_float_fmt(t["size"])
+            fee = safe_float_fmt(t["fee"], 2)
+            pnl = safe_float_fmt(t["result"], 2)
+            pnl_pct = safe_float_fmt(t["pnl_pct"], 2, "") + "%" if t["pnl_pct"] is not None else ""
+            reason = t["reason"]
+            open_time = to_gmt7_str(t["time_open"])
+            close_time = to_gmt7_str(t["time_close"])
+            pair = t["symbol"]
+            direction = t["direction"]
+            stage = t["stage"]
             lines.append(
                 "──────────────\n"
                 f"Cặp:     {pair}\n"
@@ -236,18 +395,14 @@ class TradeSimulator:
         return "\n".join(lines)
 
     def summary_by_stage(self, date=None):
-        df = self.daily_report(date, include_open=True)
-        if df.empty: return "Không có giao dịch nào trong ngày."
+        led = self.report_ledger(date, include_open=True)
+        if not len(led): return "Không có giao dịch nào trong ngày."
         lines = ["--- Tổng hợp theo loại lệnh ---"]
         for stage in ["probe", "full"]:
-            d = df[df["stage"] == stage]
-            if d.empty: continue
-            win = (d["result"] > 0).sum()
-            loss = (d["result"] < 0).sum()
-            total = len(d)
-            pnl = d["result"].sum(skipna=True)
-            rr = d["r_value"].mean(skipna=True)
+            m = led.mask(stage=stage)
+            if not m.any(): continue
+            st = led.summary(m)
             lines.append(
-                f"{stage.upper()}: Tổng {total} | Win {win} | Loss {loss} | PnL: {safe_float_fmt(pnl,2)} | R tb: {safe_float_fmt(rr,2)}"
+                f"{stage.upper()}: Tổng {st['trades']} | Win {st['wins']} | Loss {st['losses']} | PnL: {safe_float_fmt(st['pnl'],2)} | R tb: {safe_float_fmt(st['avg_r'],2)}"
             )
         return "\n".join(lines)
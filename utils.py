@@ -1,20 +1,17 @@
 import csv, os
 from datetime import datetime
 
+from log_writer import get_log_writer
+
 def ensure_dir(path: str):
     d = os.path.dirname(path)
     if d and not os.path.exists(d):
         os.makedirs(d, exist_ok=True)
 
 def append_csv(path: str, fieldnames, row: dict):
-    ensure_dir(path)
-    exists = os.path.isfile(path)
-    with open(path, "a", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        if not exists:
-            w.writeheader()
-        # chỉ ghi các field có trong fieldnames (tránh KeyError)
-        w.writerow({k: row.get(k) for k in fieldnames})
+    # Qua LogWriter dùng chung: dồn lô theo file, header ghi khi flush nếu file chưa có
+    # (chỉ ghi các field có trong fieldnames, tránh KeyError)
+    get_log_writer().write(path, fieldnames, row)
 
 # -------- Latency log --------
 LATENCY_FIELDS = [
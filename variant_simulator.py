@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""
+Mô phỏng K biến thể quản lý vốn/lệnh cùng lúc trên CÙNG đường giá (struct-of-arrays).
+
+- Tín hiệu vào lệnh (entry_arrays) dùng chung; mỗi biến thể khác nhau ở vốn, đòn bẩy, phí, probe_pct/full_pct,
+  hệ số SL theo ATR, ngưỡng trailing, tỷ lệ vốn lệnh sideway (VARIANT_KEYS).
+- Trạng thái là mảng NumPy: số dư (K,), lệnh mở (K, M) theo slot, LAST_TRADE/LAST_CLOSE_TIME (K, S).
+  Mỗi bước run_once là một số cố định phép toán có mặt nạ trên cả K biến thể: chi phí chủ yếu là phần
+  cố định theo nến, mỗi biến thể thêm chỉ tốn một phần nhỏ so với một lần BacktestEngine riêng.
+- Slot giữ đúng thứ tự mở lệnh (chỉ nén lại khi đầy) nên thứ tự cộng số dư, "lệnh probe cuối", LAST_TRADE
+  khớp BacktestEngine chạy riêng từng biến thể.
+- Lệnh đã đóng ghi vào các mảng cột (VariantResult.closed); không ghi CSV.
+
+    res = VariantSimulator(cfg, [{"probe_pct": 0.05}, {"sl_atr_mult_full": 1.5, "fee_bps": 2}]).run(arrays)
+    print(res.summary())
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from backtest_engine import COOLDOWN_SEC, LEVERAGE, ROI_TARGET, TRAIL_BUFFER, TRAIL_ROI, engine_params, summarize_pnl
+
+VARIANT_KEYS = ("capital", "leverage", "fee_bps", "probe_pct", "full_pct", "sl_atr_mult_probe", "sl_atr_mult_full",
+                "trail_roi", "trail_buffer", "sideway_pct")
+STATUSES = ("SL", "TP", "REVERSE", "TIMEOUT", "TRAP", "END")
+_SL, _TP, _REVERSE, _TIMEOUT, _TRAP, _END = range(len(STATUSES))
+_CLOSED_FIELDS = ("variant", "symbol", "direction", "stage", "entry", "close_price", "size", "result", "fee",
+                  "time_open", "time_close", "status", "seq")
+
+def _any(a) -> bool:
+    # np.count_nonzero nhanh hơn ndarray.any() nhiều lần trên mảng nhỏ của vòng lặp theo nến
+    return np.count_nonzero(a) > 0
+
+def variant_params(cfg, variants: List[Dict], capital=100.0, leverage=LEVERAGE, fee_bps=4) -> Dict[str, np.ndarray]:
+    """{khóa VARIANT_KEYS: mảng (K,)}; khóa thiếu lấy theo config như BacktestEngine."""
+    p = engine_params(cfg)
+    base = {"capital": capital, "leverage": leverage, "fee_bps": fee_bps, "probe_pct": p["probe_pct"],
+            "full_pct": p["full_pct"], "sl_atr_mult_probe": p["sl_mult_probe"], "sl_atr_mult_full": p["sl_mult_full"],
+            "trail_roi": TRAIL_ROI, "trail_buffer": TRAIL_BUFFER, "sideway_pct": p["sw_pct"]}
+    for v in variants:
+        unknown = set(v) - set(VARIANT_KEYS)
+        if unknown:
+            raise KeyError(f"Khóa biến thể không hỗ trợ: {sorted(unknown)}")
+    return {k: np.array([float(v.get(k, base[k])) for v in variants], dtype=np.float64) for k in VARIANT_KEYS}
+
+class VariantSimulator:
+    """Phát lại run_once (như BacktestEngine) cho K biến thể; mọi symbol dùng chung số dư của biến thể."""
+    def __init__(self, cfg=None, variants: Optional[List[Dict]] = None, capital=100.0, leverage=LEVERAGE,
+                 fee_bps=4, slots: int = 8):
+        self.cfg = cfg or {}
+        self.variants = list(variants) if variants else [{}]
+        self.params = variant_params(self.cfg, self.variants, capital, leverage, fee_bps)
+        p = engine_params(self.cfg)
+        self.min_notional = p["min_notional"]
+        self.promote_pullback_atr = p["promote_pullback_atr"]
+        self.probe_timeout_min = p["probe_timeout_min"]
+        self.plan_sl_mult = p["plan_sl_mult"]
+        self.sw_sl, self.sw_tp = float(p["sw_sl"]), float(p["sw_tp"])
+        K = self.K = len(self.variants)
+        self.rows = np.arange(K)
+        P = self.params
+        self.fee_rate = (P["fee_bps"] / 10000.0)[:, None]
+        # Dạng cột (K, 1) để nhân trực tiếp với mảng slot (K, M)
+        self.lev = np.where(P["leverage"] != 0, P["leverage"], 1.0)[:, None]
+        self.trail_roi, self.trail_buffer = P["trail_roi"][:, None], P["trail_buffer"][:, None]
+        self.balance = P["capital"].copy()
+        self.n_used = np.zeros(K, dtype=np.int64)
+        self.n_seq = np.zeros(K, dtype=np.int64)
+        self._alloc(max(1, int(slots)))
+        self._closed: List[Dict[str, np.ndarray]] = []
+        self.n_open = 0
+        self.stats = {"bars_visited": 0, "trailing_updates": 0}
+
+    # ---- Slot lệnh mở (K, M) ----
+    def _alloc(self, M):
+        K = self.K
+        self.active = np.zeros((K, M), dtype=bool)
+        self.sym = np.full((K, M), -1, dtype=np.int32)
+        self.dirn = np.zeros((K, M))                    # 1.0 LONG, -1.0 SHORT
+        self.stage = np.zeros((K, M), dtype=np.int8)    # 0 probe, 1 full
+        self.seq = np.zeros((K, M), dtype=np.int64)
+        self.entry, self.size, self.sl, self.tp, self.r_value, self.t_open = (
+            np.full((K, M), np.nan) for _ in range(6))
+
+    _SLOT_FIELDS = ("active", "sym", "dirn", "stage", "seq", "entry", "size", "sl", "tp", "r_value", "t_open")
+
+    def _make_room(self):
+        """Nén slot (giữ thứ tự mở lệnh); vẫn đầy thì gấp đôi số slot."""
+        order = np.argsort(~self.active, axis=1, kind="stable")
+        for f in self._SLOT_FIELDS:
+            setattr(self, f, np.take_along_axis(getattr(self, f), order, axis=1))
+        self.n_used = self.active.sum(axis=1)
+        M = self.active.shape[1]
+        if self.n_used.max(initial=0) >= M:
+            old = {f: getattr(self, f) for f in self._SLOT_FIELDS}
+            self._alloc(2 * M)
+            for f, v in old.items():
+                getattr(self, f)[:, :M] = v
+
+    def _open(self, go, s, direction, entry, sl, tp, notional, stage, r_value, now, own=None):
+        """
+        Mở lệnh cho các biến thể `go` (K,) tại slot kế tiếp; sl/notional: mảng (K,).
+        Trả về mặt nạ lệnh mở của symbol s (slot có thể đã được nén lại).
+        """
+        if not _any(go):
+            return own
+        if _any(self.n_used[go] >= self.active.shape[1]):
+            self._make_room()
+        ks = np.flatnonzero(go)
+        m = self.n_used[ks]
+        self.active[ks, m] = True
+        self.sym[ks, m] = s
+        self.dirn[ks, m] = direction if np.ndim(direction) == 0 else direction[ks]
+        self.stage[ks, m] = stage
+        self.seq[ks, m] = self.n_seq[ks]
+        self.entry[ks, m] = entry
+        self.size[ks, m] = notional[ks] / max(1e-12, entry) if entry else 0.0
+        self.sl[ks, m] = sl[ks]
+        self.tp[ks, m] = tp
+        self.r_value[ks, m] = r_value
+        self.t_open[ks, m] = now
+        self.n_used[ks] += 1
+        self.n_seq[ks] += 1
+        self.n_open += len(ks)
+        self.open_by_sym[s] += len(ks)
+        return self.active & (self.sym == s)
+
+    def _close(self, mask, s, price, status, now, on_closed=True):
+        """Đóng các slot `mask` (K, M) của symbol s; price/status: vô hướng hoặc (K, M)."""
+        if not _any(mask):
+            return
+        entry, size = self.entry, self.size
+        gross = self.dirn * (price - entry) * size
+        fee = self.fee_rate * (entry + price) * size
+        pnl = gross - fee
+        ks, ms = np.nonzero(mask)
+        price_c = price[ks, ms] if np.ndim(price) else np.full(len(ks), float(price))
+        status_c = (status[ks, ms] if np.ndim(status) else np.full(len(ks), status)).astype(np.int8)
+        # Cộng số dư theo thứ tự slot (= thứ tự mở lệnh) như vòng lặp của BacktestEngine
+        for m in np.flatnonzero(mask.any(axis=0)):
+            col = mask[:, m]
+            self.balance[col] += pnl[col, m]
+        self._closed.append({
+            "variant": ks, "symbol": self.sym[ks, ms], "direction": self.dirn[ks, ms].astype(np.int8), "stage": self.stage[ks, ms],
+            "entry": entry[ks, ms], "close_price": price_c, "size": size[ks, ms], "result": pnl[ks, ms],
+            "fee": fee[ks, ms], "time_open": self.t_open[ks, ms], "time_close": np.full(len(ks), now),
+            "status": status_c, "seq": self.seq[ks, ms],
+        })
+        any_k = mask.any(axis=1)
+        if on_closed:
+            last = mask.shape[1] - 1 - np.argmax(mask[:, ::-1], axis=1)
+            k = np.flatnonzero(any_k)
+            self.last_dir[k, s] = self.dirn[k, last[k]]
+            self.last_entry[k, s] = entry[k, last[k]]
+        if on_closed or np.all(status_c == _TIMEOUT):
+            self.last_close[any_k, s] = now
+        self.active[mask] = False
+        self.n_open -= len(ks)
+        self.open_by_sym[s] -= len(ks)
+
+    @staticmethod
+    def _last(mask):
+        """(có, chỉ số slot) của slot cuối cùng thỏa mask trên mỗi dòng (= _stage của BacktestEngine)."""
+        has = mask.any(axis=1)
+        return has, mask.shape[1] - 1 - np.argmax(mask[:, ::-1], axis=1)
+
+    @staticmethod
+    def _initial_sl(entry, direction, atr_val, mult):
+        """BacktestEngine._initial_sl trên mảng hệ số `mult`; NaN = không đặt SL."""
+        sl = np.where(np.asarray(direction) == 1, np.maximum(0.0, entry - mult * atr_val), entry + mult * atr_val)
+        return np.where(mult > 0, sl, np.nan)
+
+    # ---- Một lần run_once cho mọi biến thể ----
+    def step(self, s, A, i):
+        self.stats["bars_visited"] += 1
+        now = A["ts"][i]
+        rows = self.rows
+        own = self.active & (self.sym == s) if self.open_by_sym[s] else None
+        if own is not None:
+            # Chiều lệnh d = ±1: điều kiện LONG/SHORT viết chung bằng phép nhân dấu (đổi dấu là phép tính chính xác)
+            o, h, l = A["open"][i], A["high"][i], A["low"][i]
+            d, sl, tp = self.dirn, self.sl, self.tp
+            long_ = d > 0
+            sl_hit = own & (d * (sl - np.where(long_, l, h)) >= 0)
+            tp_hit = own & ~sl_hit & (d * (np.where(long_, h, l) - tp) >= 0)
+            hit = sl_hit | tp_hit
+            if _any(hit):
+                lvl = np.where(sl_hit, sl, tp)
+                # Khớp tại mức SL/TP, hoặc giá mở nếu nhảy gap qua mức
+                gap = np.where(sl_hit, -d, d) * (o - lvl) > 0
+                self._close(hit, s, np.where(gap, o, lvl), np.where(sl_hit, _SL, _TP), now)
+                own &= ~hit
+        if not A["valid"][i]:
+            return
+        live = ~(now - self.last_close[:, s] < COOLDOWN_SEC)  # NaN (chưa đóng lệnh nào) -> không cooldown
+        if not _any(live):
+            return
+        P = self.params
+        price = A["close"][i]
+        atr_val = A["atr"][i]
+
+        if own is not None:
+            has_probe, pi = self._last(own & (self.stage == 0))
+            expired = live & has_probe & ((now - self.t_open[rows, pi]) / 60.0 >= self.probe_timeout_min)
+            if _any(has_probe) and _any(expired):
+                mask = np.zeros_like(own)
+                mask[rows[expired], pi[expired]] = True
+                self._close(mask, s, price, _TIMEOUT, now, on_closed=False)
+                own &= ~mask
+
+        sw = int(A["sideway"][i])
+        if sw:
+            size = np.maximum(self.balance * P["sideway_pct"], 0)
+            go = live & (size >= self.min_notional)
+            if sw == 1:
+                sl, tp = price - self.sw_sl * atr_val, price + self.sw_tp * atr_val
+            else:
+                sl, tp = price + self.sw_sl * atr_val, price - self.sw_tp * atr_val
+            own = self._open(go, s, sw, price, np.full(self.K, round(sl, 5)), round(tp, 5), size, 0, np.nan, now, own)
+            live = live & ~go
+            if not _any(live):
+                return
+
+        if A["entry"][i]:
+            trade_dir = 1 if A["trade_dir"][i] == 1 else -1
+            ld = self.last_dir[:, s]
+            blocked = (ld != 0) & (ld != trade_dir) & (np.abs(price - self.last_entry[:, s]) < (atr_val or 0) * 0.7)
+            go = live & ~blocked
+            if own is not None:
+                go &= ~own.any(axis=1)  # chưa có probe/full của symbol
+            tp = price * (1 + ROI_TARGET / LEVERAGE) if trade_dir == 1 else price * (1 - ROI_TARGET / LEVERAGE)
+            if A["direct_full"][i]:
+                size = np.maximum(self.balance * P["full_pct"], 0)
+                go &= size >= self.min_notional
+                sl = self._initial_sl(price, trade_dir, atr_val, P["sl_atr_mult_full"])
+                own = self._open(go, s, trade_dir, price, sl, tp, size, 1, np.nan, now, own)
+            else:
+                size = np.maximum(self.balance * P["probe_pct"], 0)
+                go &= size >= self.min_notional
+                sl = self._initial_sl(price, trade_dir, atr_val, P["sl_atr_mult_probe"])
+                own = self._open(go, s, trade_dir, price, sl, tp, size, 0, round(self.plan_sl_mult * atr_val, 6), now, own)
+
+        if own is None:
+            return
+        own &= live[:, None]
+        has_probe, pi = self._last(own & (self.stage == 0))
+        if _any(has_probe):
+            has_full = (own & (self.stage == 1)).any(axis=1)
+            p_entry, p_dir = self.entry[rows, pi], self.dirn[rows, pi]
+            pullback_ok = np.abs(price - p_entry) <= self.promote_pullback_atr * atr_val
+            candle_dir = 1 if price > A["open"][i] else -1
+            avg_vol = A["avg_vol"][i]
+            big_trap = (candle_dir != p_dir) & (bool(A["volume"][i] > 1.8 * avg_vol) if avg_vol else False)
+            anti_now = bool(abs(price - A["ma50"][i]) > A["anti_mult"][i] * atr_val) if atr_val else False
+            size = np.maximum(self.balance * P["full_pct"], 0)
+            promote = has_probe & pullback_ok & ~big_trap & (not anti_now) & ~has_full & (size >= self.min_notional)
+            if _any(promote):
+                k, m = rows[promote], pi[promote]
+                add_size = size[k] / max(1e-12, price)
+                new_size = self.size[k, m] + add_size
+                self.entry[k, m] = (self.entry[k, m] * self.size[k, m] + price * add_size) / np.maximum(1e-12, new_size)
+                self.size[k, m] = new_size
+                self.stage[k, m] = 1
+                new_sl = self._initial_sl(price, self.dirn[k, m], atr_val, P["sl_atr_mult_full"][k])
+                old_sl = self.sl[k, m]
+                merged = np.where(self.dirn[k, m] > 0, np.fmax(old_sl, new_sl), np.fmin(old_sl, new_sl))
+                self.sl[k, m] = np.where(np.isnan(old_sl), new_sl, merged)
+            trap = has_probe & big_trap
+            if _any(trap):
+                mask = np.zeros_like(own)
+                mask[rows[trap], pi[trap]] = True
+                self._close(mask, s, price, _TRAP, now, on_closed=False)
+                own &= ~mask
+
+        if not _any(own):
+            return
+        tp_sim, sl_sim = self.tp, self.sl  # như run_once: mức trước khi dời trailing (trailing gán mảng mới)
+        d, entry = self.dirn, self.entry
+        trig = own & (d * (price - entry) / entry * self.lev >= self.trail_roi)
+        if _any(trig):
+            # LONG: max(sl, giá - buffer·entry, entry); SHORT: min(...) — viết chung qua d·x
+            cand = np.maximum(np.maximum(d * np.where(np.isnan(sl_sim), -d * 1e20, sl_sim),
+                                         d * price - self.trail_buffer * entry), d * entry)
+            new_sl = d * cand
+            upd = trig & (np.isnan(sl_sim) | (np.abs(new_sl - sl_sim) > 1e-9))
+            self.sl = np.where(upd, np.round(new_sl, 6), sl_sim)
+            self.stats["trailing_updates"] += int(upd.sum())
+        tp_hit = own & (d * (price - tp_sim) >= 0)
+        sl_hit = own & ~tp_hit & (d * (sl_sim - price) >= 0)
+        side15 = int(A["side15"][i])
+        rev = own & ~tp_hit & ~sl_hit & (side15 != 0) & (d != side15) if side15 else None
+        close = tp_hit | sl_hit if rev is None else tp_hit | sl_hit | rev
+        if _any(close):
+            self._close(close, s, price, np.where(tp_hit, _TP, np.where(sl_hit, _SL, _REVERSE)), now)
+
+    def run(self, arrays: Dict[str, Dict[str, np.ndarray]]) -> "VariantResult":
+        """arrays: {symbol: entry_arrays(...)} (như BacktestEngine.run)."""
+        self.symbols = list(arrays)
+        S = len(self.symbols)
+        self.open_by_sym = np.zeros(S, dtype=np.int64)
+        self.last_close = np.full((self.K, S), np.nan)
+        self.last_dir = np.zeros((self.K, S))
+        self.last_entry = np.full((self.K, S), np.nan)
+        if not S:
+            return VariantResult(self)
+        As = [arrays[s] for s in self.symbols]
+        timeline = np.unique(np.concatenate([A["ts"] for A in As]))
+        bar_at, cand = [], []
+        any_cand = np.zeros(len(timeline), dtype=bool)
+        for A in As:
+            pos = np.minimum(np.searchsorted(A["ts"], timeline), len(A["ts"]) - 1)
+            hit = A["ts"][pos] == timeline
+            bar_at.append(np.where(hit, pos, -1).tolist())
+            cand.append(A["candidate"].tolist())
+            any_cand |= hit & A["candidate"][pos]
+        # Slot trống mang NaN: so sánh với NaN luôn False, bỏ cảnh báo một lần cho cả vòng lặp
+        with np.errstate(invalid="ignore"):
+            for k in range(len(timeline)):
+                if not any_cand[k] and not self.n_open:
+                    continue
+                for s in range(S):
+                    i = bar_at[s][k]
+                    if i >= 0 and (cand[s][i] or self.open_by_sym[s]):
+                        self.step(s, As[s], i)
+        self._last_bar = {s: (float(A["close"][-1]), A["ts"][-1]) for s, A in enumerate(As)}
+        return VariantResult(self)
+
+    def close_all(self) -> "VariantResult":
+        """Đóng mọi lệnh còn mở tại giá đóng nến cuối của symbol (như BacktestEngine.close_all)."""
+        with np.errstate(invalid="ignore"):
+            for s, (price, now) in self._last_bar.items():
+                self._close(self.active & (self.sym == s), s, price, _END, now, on_closed=False)
+        return VariantResult(self)
+
+class VariantResult:
+    def __init__(self, vs: VariantSimulator):
+        self.variants = vs.variants
+        self.params = vs.params
+        self.symbols = getattr(vs, "symbols", [])
+        self.balance = vs.balance.copy()
+        self.open_trades = vs.active.sum(axis=1)
+        parts = vs._closed
+        self.closed = {f: (np.concatenate([p[f] for p in parts]) if parts else np.array([]))
+                       for f in _CLOSED_FIELDS}
+
+    def trades(self, k: int) -> pd.DataFrame:
+        """Lệnh đã đóng của biến thể k (theo giờ đóng, cùng giờ thì theo thứ tự mở)."""
+        c = self.closed
+        idx = np.flatnonzero(c["variant"] == k) if len(c["variant"]) else np.array([], dtype=np.int64)
+        idx = idx[np.lexsort((c["seq"][idx], c["time_close"][idx]))]
+        df = pd.DataFrame({f: c[f][idx] for f in _CLOSED_FIELDS if f != "variant"})
+        if len(df):
+            df["symbol"] = [self.symbols[s] for s in df["symbol"]]
+            df["direction"] = np.where(df["direction"] == 1, "LONG", "SHORT")
+            df["stage"] = np.where(df["stage"] == 1, "full", "probe")
+            df["status"] = [STATUSES[s] for s in df["status"]]
+        return df
+
+    def summary(self) -> pd.DataFrame:
+        """Một dòng cho mỗi biến thể: tham số + chỉ số như backtest_engine.summarize."""
+        rows = []
+        for k in range(len(self.variants)):
+            t = self.trades(k)
+            pnl = t["result"].to_numpy(dtype=np.float64) if len(t) else np.array([], dtype=np.float64)
+            fees = float(t["fee"].sum()) if len(t) else 0.0
+            rows.append({"variant": k, **{p: self.params[p][k] for p in VARIANT_KEYS},
+                         **summarize_pnl(pnl, fees, float(self.params["capital"][k])),
+                         "open_trades": int(self.open_trades[k])})
+        return pd.DataFrame(rows)
@@ -1,5 +1,7 @@
 from typing import Dict, List
 
+import numpy as np
+
 DEFAULT_WEIGHTS: Dict[str, float] = {
     "EMA200": 2.65,
     "MA50": 1.27,
@@ -88,3 +90,121 @@ def tally_votes(indicators: Dict[str,str], weights: Dict[str,float]=None) -> Dic
         "total_weight": round(total_weight,2),
         "active_total_weight": round(active_total,2),
     }
+
+# Mã hướng phiếu trong ma trận int8
+_DIR_CODE = {"LONG": 1, "SHORT": -1, "NEUTRAL": 0}
+
+class CompiledWeights:
+    """
+    Trọng số đã biên dịch một lần từ weights_sets: mỗi phiếu (key đã normalize) có cột cố định.
+    Hướng phiếu là ma trận int8 (+1 LONG / -1 SHORT / 0 trung lập) shape (..., n_cols), kèm mask
+    `active` (phiếu có mặt). Điểm = một phép nhân ma trận với vector trọng số, nên chấm một nến,
+    cả lịch sử (bars × cols) hay nhiều symbol (symbols × bars × cols) như nhau.
+    tally() trả về đúng các trường của tally_votes.
+    """
+    def __init__(self, weights: Dict[str, float] = None, extra_keys=()):
+        wmap = _normalize_weight_dict(DEFAULT_WEIGHTS)
+        if weights: wmap.update(_normalize_weight_dict(weights))
+        for k in extra_keys or ():
+            wmap.setdefault(_normalize_key(k), 1.0)
+        self.wmap = wmap
+        self.keys: List[str] = list(wmap)
+        self.col = {k: i for i, k in enumerate(self.keys)}
+        self.weights = np.array([wmap[k] for k in self.keys], dtype=np.float64)
+        self._wlist = self.weights.tolist()
+        self.total_weight = round(sum(wmap.values()), 2)
+        self._raw_cols: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def column(self, name: str) -> int:
+        c = self._raw_cols.get(name)
+        if c is None:
+            nk = _normalize_key(name)
+            if nk not in self.col:
+                raise KeyError(f"Phiếu không có trong trọng số: {name}")
+            c = self._raw_cols[name] = self.col[nk]
+        return c
+
+    def encode(self, indicators: Dict[str, str]):
+        """Map {phiếu: "LONG"/"SHORT"/...} -> (dirs int8[n_cols], active bool[n_cols])."""
+        dirs = np.zeros(len(self.keys), dtype=np.int8)
+        active = np.zeros(len(self.keys), dtype=bool)
+        for name, v in (indicators or {}).items():
+            c = self.column(name)
+            active[c] = True
+            dirs[c] = _DIR_CODE[_to_direction(v)]
+        return dirs, active
+
+    def scores(self, dirs, active=None) -> Dict[str, np.ndarray]:
+        """Điểm cho ma trận hướng bất kỳ shape (..., n_cols); active=None = mọi cột đều có mặt."""
+        d = np.asarray(dirs, dtype=np.int8)
+        sides = np.stack((d > 0, d < 0), axis=-2).astype(np.float64)  # (..., 2, n_cols)
+        sl_ss = sides @ self.weights
+        act = np.ones(d.shape, dtype=bool) if active is None else np.asarray(active, dtype=bool)
+        return {
+            "score_long": np.round(sl_ss[..., 0], 2),
+            "score_short": np.round(sl_ss[..., 1], 2),
+            "votes_long": (d > 0).sum(axis=-1),
+            "votes_short": (d < 0).sum(axis=-1),
+            "active_total_weight": np.round(act.astype(np.float64) @ self.weights, 2),
+        }
+
+    def tally(self, indicators: Dict[str, str]) -> Dict:
+        """Thay thế tally_votes(indicators, weights) với cùng kết quả (không chuẩn hóa lại key/trọng số)."""
+        try:
+            cells = [(self.column(name), _DIR_CODE[_to_direction(v)]) for name, v in (indicators or {}).items()]
+        except KeyError:
+            # Phiếu lạ (trọng số mặc định 1.0) -> đường cũ
+            return tally_votes(indicators, self.wmap)
+        return self._result(cells)
+
+    def result(self, dirs, active, order=None) -> Dict:
+        """Dict kiểu tally_votes cho một hàng của ma trận hướng; `order` = thứ tự cột của các list."""
+        d, a = np.asarray(dirs).tolist(), np.asarray(active).tolist()
+        if order is None:
+            order = [i for i in range(len(self.keys)) if a[i]]
+        return self._result([(i, d[i]) for i in order])
+
+    def _result(self, cells) -> Dict:
+        keys, w = self.keys, self._wlist
+        long_list, short_list, neutral_list = [], [], []
+        breakdown_long = dict.fromkeys(keys, 0.0)
+        breakdown_short = dict.fromkeys(keys, 0.0)
+        breakdown_neutral = dict.fromkeys(keys, 0.0)
+        score_long = score_short = 0.0
+        active = set()
+        for i, code in cells:
+            k, wi = keys[i], w[i]
+            active.add(i)
+            if code > 0:
+                long_list.append(k); breakdown_long[k] = wi; score_long += wi
+            elif code < 0:
+                short_list.append(k); breakdown_short[k] = wi; score_short += wi
+            else:
+                neutral_list.append(k); breakdown_neutral[k] = wi
+        return {
+            "votes_long": len(long_list),
+            "votes_short": len(short_list),
+            "score_long": round(score_long,2),
+            "score_short": round(score_short,2),
+            "long_list": long_list,
+            "short_list": short_list,
+            "neutral_list": neutral_list,
+            "breakdown_long": breakdown_long,
+            "breakdown_short": breakdown_short,
+            "breakdown_neutral": breakdown_neutral,
+            "total_weight": self.total_weight,
+            "active_total_weight": round(sum(w[i] for i in active),2),
+        }
+
+_compiled: Dict[tuple, CompiledWeights] = {}
+
+def compile_weights(weights: Dict[str, float] = None) -> CompiledWeights:
+    """CompiledWeights dùng lại theo nội dung weights (build một lần cho mỗi bộ weights_sets)."""
+    key = tuple(sorted(_normalize_weight_dict(weights).items()))
+    cw = _compiled.get(key)
+    if cw is None:
+        cw = _compiled[key] = CompiledWeights(weights)
+    return cw
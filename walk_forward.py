@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Walk-forward: chọn cấu hình trên cửa sổ in-sample (IS), chạy cấu hình đó trên cửa sổ out-of-sample (OOS)
+ngay sau, rồi trượt tiếp một bước OOS cho tới hết lịch sử.
+
+- Chỉ báo/điểm phiếu (backtest_engine.symbol_features) tính MỘT lần cho cả lịch sử; mỗi cửa sổ chỉ
+  cắt view [lo, hi) từ các mảng đó (không tính lại chỉ báo, không có vùng warm-up riêng).
+  Ứng viên được nhóm theo tham số chỉ báo + weights_sets (feature_group, như backtest_parallel);
+  mỗi nhóm có features riêng.
+- Cửa sổ độc lập: OOS bắt đầu không có lệnh, với vốn `capital`, lệnh còn mở cuối OOS đóng tại giá đóng
+  nến cuối (status END) -> các cửa sổ chạy song song trên process pool.
+- Chọn cấu hình trong IS bằng config_search.successive_halving (ứng viên ngẫu nhiên hoặc profile có sẵn).
+- Ghép: mọi lệnh OOS theo giờ đóng -> một đường equity (vốn + lãi/lỗ cộng dồn).
+
+    python walk_forward.py --symbols BTC/USDT ETH/USDT --is-days 90 --oos-days 30 --n 27 -j 4 --out wf_results
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest_engine import CSV_FIELDS, BacktestEngine, entry_arrays, load_history, slice_features, summarize, symbol_features, write_events
+from backtest_parallel import TIMEFRAMES, profile_configs
+from config_search import SEARCH_SPACE, SliceCache, sample_candidates, successive_halving
+from indicator_cache import params_hash
+
+DAY = 86400.0
+
+def make_windows(t_start: float, t_end: float, is_days: float, oos_days: float) -> List[Tuple[float, float, float]]:
+    """[(is_lo, oos_lo, oos_hi)] (giây, nửa mở [lo, hi)); OOS cuối có thể ngắn hơn oos_days."""
+    out = []
+    lo = t_start
+    while lo + is_days * DAY < t_end:
+        mid = lo + is_days * DAY
+        out.append((lo, mid, min(mid + oos_days * DAY, t_end)))
+        lo += oos_days * DAY
+    return out
+
+def feature_group(cfg: Dict) -> str:
+    """Khóa features của một config: tham số chỉ báo từng khung (params_hash) + weights_sets."""
+    raw = json.dumps([params_hash(cfg, tf) for tf in TIMEFRAMES] + [cfg.get("weights_sets") or {}], sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+def build_features(history: Dict[str, Dict[str, pd.DataFrame]], configs: List[Dict],
+                   log_prefix: str = "[WF]") -> Dict[str, Dict[str, Dict[str, np.ndarray]]]:
+    """{feature_group: {symbol: symbol_features(...)}}, mỗi nhóm tính một lần với config đầu tiên của nhóm."""
+    groups = {}
+    for c in configs:
+        groups.setdefault(feature_group(c), c)
+    out = {g: {} for g in groups}
+    for s, frames in history.items():
+        m15, h1, m5 = frames.get("15m"), frames.get("1h"), frames.get("5m")
+        if m15 is None or h1 is None or len(m15) < 200 or len(h1) < 200:
+            print(f"{log_prefix} {s}: thiếu dữ liệu M15/H1, bỏ qua")
+            continue
+        for g, c in groups.items():
+            out[g][s] = symbol_features(m15, h1, m5 if m5 is not None and len(m5) >= 215 else None, c)
+    return out
+
+def _grouped(features) -> bool:
+    """True nếu features dạng {feature_group: {symbol: F}} (F luôn có "ts")."""
+    return bool(features) and "ts" not in next(iter(features.values()))
+
+def window_features(features: Dict[str, Dict[str, np.ndarray]], lo: float, hi: float) -> Dict[str, Dict[str, np.ndarray]]:
+    """Các nến M15 có giờ đóng trong [lo, hi) của mỗi symbol (view); symbol không có nến bị bỏ."""
+    out = {}
+    for s, F in features.items():
+        a, b = np.searchsorted(F["ts"], [lo, hi])
+        if b > a:
+            out[s] = slice_features(F, int(a), int(b))
+    return out
+
+# ---- Hàm chạy trong worker (cấp module để pickle được) ----
+_WORKER = {}
+
+def _init_worker(features, candidates, groups, opts):
+    _WORKER.update(features=features, candidates=candidates, groups=groups, opts=opts)
+
+def _run_window(k: int, window: Tuple[float, float, float]) -> Dict:
+    features, candidates, groups, o = _WORKER["features"], _WORKER["candidates"], _WORKER["groups"], _WORKER["opts"]
+    is_lo, oos_lo, oos_hi = window
+    row = {"window": k, "is_start": is_lo, "oos_start": oos_lo, "oos_end": oos_hi, "index": 0, "params": {},
+           "is_score": None, "events": [], "trades": []}
+    if len(candidates) > 1:
+        caches = {}
+        for g, F in features.items():
+            is_feats = window_features(F, is_lo, oos_lo)
+            if is_feats:
+                caches[g] = SliceCache(is_feats)
+        if len(caches) == len(features):
+            rows = successive_halving([caches[g] for g in groups], candidates, o["eta"], o["min_days"], o["metric"],
+                                      o["min_trades"], o["capital"], o["fee_bps"], verbose=False)
+            best = next(r for r in rows if r["rung"] == rows[-1]["rung"])
+            row.update(index=best["index"], params=best["params"], is_score=best["score"])
+    cfg = candidates[row["index"]][1]
+    oos_feats = window_features(features[groups[row["index"]]], oos_lo, oos_hi)
+    oos = {s: entry_arrays(F, cfg) for s, F in oos_feats.items()}
+    engine = BacktestEngine(cfg, capital=o["capital"], fee_bps=o["fee_bps"])
+    engine.run(oos)
+    res = engine.close_all(oos)
+    row.update(events=res.events, trades=[t for t in res.trades if t.get("time_close")])
+    return row
+
+class WalkForwardResult:
+    def __init__(self, windows: List[Dict], capital: float):
+        self.windows = sorted(windows, key=lambda w: w["window"])
+        self.capital = capital
+
+    @property
+    def events(self) -> List[Dict]:
+        return [e for w in self.windows for e in w["events"]]
+
+    def equity(self) -> pd.DataFrame:
+        """Đường equity ghép từ các lệnh OOS (theo giờ đóng lệnh)."""
+        rows = sorted(((float(t["time_close"]), w["window"], float(t["result"] or 0.0))
+                       for w in self.windows for t in w["trades"] if t.get("result") is not None))
+        df = pd.DataFrame(rows, columns=["time_close", "window", "pnl"])
+        df["equity"] = self.capital + df["pnl"].cumsum()
+        df["drawdown_pct"] = (1.0 - df["equity"] / np.maximum.accumulate(np.r_[self.capital, df["equity"].to_numpy()])[1:]) * 100.0
+        return df
+
+    def table(self) -> pd.DataFrame:
+        """Mỗi cửa sổ: tham số được chọn, điểm IS, chỉ số OOS."""
+        return pd.DataFrame([{"window": w["window"], "is_start": w["is_start"], "oos_start": w["oos_start"],
+                              "oos_end": w["oos_end"], "candidate": w["index"], "is_score": w["is_score"],
+                              **summarize(w["trades"], self.capital), "params": json.dumps(w["params"])}
+                             for w in self.windows])
+
+    def summary(self) -> Dict[str, float]:
+        return summarize([t for w in self.windows for t in w["trades"]], self.capital)
+
+    def write(self, out_dir: str):
+        os.makedirs(out_dir, exist_ok=True)
+        write_events(os.path.join(out_dir, "trades_oos.csv"), self.events, CSV_FIELDS)
+        self.table().to_csv(os.path.join(out_dir, "windows.csv"), index=False)
+        self.equity().to_csv(os.path.join(out_dir, "equity.csv"), index=False)
+
+def walk_forward(features: Dict[str, Dict[str, np.ndarray]], candidates, is_days: float = 90.0, oos_days: float = 30.0,
+                 eta: int = 3, min_days: float = 14.0, metric: str = "pnl", min_trades: int = 5,
+                 capital: float = 100.0, fee_bps: float = 4, processes: Optional[int] = None) -> WalkForwardResult:
+    """
+    features: {symbol: symbol_features(...)} trên cả lịch sử, dùng chung cho mọi ứng viên; hoặc
+    {feature_group: {symbol: ...}} từ build_features khi ứng viên đổi indicators/weights_sets.
+    candidates: [(tham số, config)] (1 ứng viên = chỉ kiểm tra OOS, không chọn).
+    processes=0 chạy tuần tự trong tiến trình hiện tại.
+    """
+    if _grouped(features):
+        groups = [feature_group(c) for _, c in candidates]
+        missing = sorted(set(groups) - set(features))
+        if missing:
+            raise KeyError(f"Thiếu features cho nhóm {missing} (dùng build_features với mọi config ứng viên)")
+    else:
+        features, groups = {"": features}, [""] * len(candidates)
+    ref = next(iter(features.values()))
+    t_start = min(float(F["ts"][0]) for F in ref.values())
+    t_end = max(float(F["ts"][-1]) for F in ref.values()) + 1.0
+    windows = make_windows(t_start, t_end, is_days, oos_days)
+    opts = {"eta": eta, "min_days": min_days, "metric": metric, "min_trades": min_trades,
+            "capital": capital, "fee_bps": fee_bps}
+    features = {g: features[g] for g in dict.fromkeys(groups)}
+    print(f"[WF] {len(ref)} symbol | {len(windows)} cửa sổ IS {is_days:g}d / OOS {oos_days:g}d | "
+          f"{len(candidates)} ứng viên | {len(features)} nhóm features")
+    t0 = time.perf_counter()
+    if processes == 0 or len(windows) <= 1:
+        _init_worker(features, candidates, groups, opts)
+        out = [_run_window(k, w) for k, w in enumerate(windows)]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                 initargs=(features, candidates, groups, opts)) as pool:
+            out = list(pool.map(_run_window, range(len(windows)), windows))
+    print(f"[WF] xong sau {time.perf_counter() - t0:.1f}s")
+    return WalkForwardResult(out, capital)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default="config.json")
+    ap.add_argument("--symbols", nargs="*", help="mặc định: config.symbols")
+    ap.add_argument("--root", default="data/candles", help="thư mục CandleStore")
+    ap.add_argument("--is-days", type=float, default=90.0)
+    ap.add_argument("--oos-days", type=float, default=30.0)
+    ap.add_argument("--profiles", nargs="*", help='chọn giữa các profile có sẵn ("base" = config gốc) thay cho lưới ngẫu nhiên')
+    ap.add_argument("--space", help="file JSON lưới tham số (mặc định config_search.SEARCH_SPACE)")
+    ap.add_argument("--n", type=int, default=27, help="số ứng viên ngẫu nhiên (gồm config gốc)")
+    ap.add_argument("--eta", type=int, default=3)
+    ap.add_argument("--min-days", type=float, default=14.0)
+    ap.add_argument("--metric", default="pnl")
+    ap.add_argument("--min-trades", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--capital", type=float, default=100.0)
+    ap.add_argument("-j", "--processes", type=int, default=None)
+    ap.add_argument("--out", default="wf_results")
+    args = ap.parse_args()
+    with open(args.config, encoding="utf-8") as f:
+        cfg = json.load(f)
+
+    if args.profiles:
+        candidates = [({"profile": name}, c) for name, c in profile_configs(cfg, args.profiles).items()]
+    else:
+        space = SEARCH_SPACE
+        if args.space:
+            with open(args.space, encoding="utf-8") as f:
+                space = json.load(f)
+        candidates = sample_candidates(cfg, space, args.n, args.seed)
+
+    t0 = time.perf_counter()
+    history = load_history(args.symbols or cfg.get("symbols", []), args.root)
+    features = build_features(history, [c for _, c in candidates])
+    print(f"[WF] features {len(next(iter(features.values())))} symbol × {len(features)} nhóm | "
+          f"{time.perf_counter() - t0:.1f}s")
+
+    res = walk_forward(features, candidates, args.is_days, args.oos_days, args.eta, args.min_days, args.metric,
+                       args.min_trades, args.capital, processes=args.processes)
+    res.write(args.out)
+    print(res.table().drop(columns=["params"]).to_string(index=False))
+    print(f"[WF] OOS ghép: {res.summary()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+Tối ưu weights_sets (M15/H1) + thresholds trên ma trận phiếu đã cache.
+
+tally_votes là tuyến tính theo trọng số: điểm long/short của mọi nến = (phiếu LONG/SHORT dạng 0/1) @ w.
+Vì vậy chỉ cần tính chỉ báo MỘT lần để có ma trận hướng phiếu int8 (nến × phiếu) của M15 và H1
+(ghép as-of theo giờ đóng nến M15) cùng lợi nhuận tương lai sau `horizon` nến; mỗi bộ trọng số
+ứng viên chỉ còn là vài phép nhân ma trận, chấm theo lô trên process pool.
+
+Mục tiêu: nến "qua cổng điểm" như run_once (M15/H1 cùng hướng, điểm hướng đó >= ngưỡng) được
+coi là tín hiệu; lợi nhuận tín hiệu = hướng × lợi nhuận tương lai - phí khứ hồi.
+score = mean / std × sqrt(n) (bỏ qua ứng viên có ít hơn min_signals tín hiệu).
+Ngưỡng M15 dùng trực tiếp thresholds.M15 (không áp trần m15_threshold_pct × tổng trọng số của regime).
+
+    python weight_optimizer.py build --symbols BTC/USDT ETH/USDT --cache opt_cache
+    python weight_optimizer.py search --cache opt_cache --method random --n 2000 -j 8 --write opt_random
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from backtest_engine import _asof, _close_ts, load_history
+from config import write_profile
+from indicators import calculate_indicators
+from tight_gate import VOTE_INDICATORS, vote_directions
+from votes import CompiledWeights, _normalize_key
+
+# Thứ tự cột phiếu cố định (key đã normalize như votes.DEFAULT_WEIGHTS)
+VOTE_KEYS = tuple(CompiledWeights().keys)
+
+class ScoreCache:
+    """
+    Ma trận phiếu + lợi nhuận tương lai cho mọi nến hợp lệ của nhiều symbol.
+    d15, dh1: int8 (n, len(VOTE_KEYS)); fwd: float64 (n,); sym: chỉ số symbol; ts: giờ đóng nến M15 (ms).
+    """
+    ARRAYS = ("d15", "dh1", "fwd", "sym", "ts")
+
+    def __init__(self, d15, dh1, fwd, sym, ts, symbols: List[str], horizon: int):
+        self.d15, self.dh1, self.fwd, self.sym, self.ts = d15, dh1, fwd, sym, ts
+        self.symbols = list(symbols)
+        self.horizon = int(horizon)
+
+    def __len__(self):
+        return len(self.fwd)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for k in self.ARRAYS:
+            np.save(os.path.join(path, f"{k}.npy"), getattr(self, k))
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"symbols": self.symbols, "horizon": self.horizon, "keys": list(VOTE_KEYS)}, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "ScoreCache":
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if tuple(meta["keys"]) != VOTE_KEYS:
+            raise ValueError(f"Cache {path} dùng bộ phiếu khác, cần build lại")
+        arrays = {k: np.load(os.path.join(path, f"{k}.npy"), mmap_mode="r" if mmap else None) for k in cls.ARRAYS}
+        return cls(symbols=meta["symbols"], horizon=meta["horizon"], **arrays)
+
+def _dir_matrix(df, ind) -> np.ndarray:
+    out = np.zeros((len(df), len(VOTE_KEYS)), dtype=np.int8)
+    for name, col in vote_directions(df, ind).items():
+        out[:, VOTE_KEYS.index(_normalize_key(name))] = col
+    return out
+
+def build_score_cache(history, cfg=None, horizon: int = 4) -> ScoreCache:
+    """history: {symbol: {"15m": df, "1h": df}}; chỉ giữ nến có >= 200 nến M15/H1 phía trước và đủ `horizon`."""
+    parts, symbols = [], []
+    for s, frames in history.items():
+        m15, h1 = frames.get("15m"), frames.get("1h")
+        if m15 is None or h1 is None or len(m15) < 200 + horizon or len(h1) < 200:
+            print(f"[OPT] {s}: thiếu dữ liệu M15/H1, bỏ qua")
+            continue
+        ind15, ind1 = calculate_indicators(m15, cfg, timeframe="15m"), calculate_indicators(h1, cfg, timeframe="1h")
+        if ind15 is None or ind1 is None:
+            continue
+        t15 = _close_ts(m15, "15m")
+        j = _asof(_close_ts(h1, "1h"), t15)
+        close = m15['close'].to_numpy(dtype=np.float64)
+        fwd = np.full(len(close), np.nan)
+        fwd[:-horizon] = close[horizon:] / close[:-horizon] - 1.0
+        keep = (np.arange(len(m15)) >= 199) & (j >= 199) & ~np.isnan(fwd)
+        parts.append((_dir_matrix(m15, ind15)[keep], _dir_matrix(h1, ind1)[np.maximum(j, 0)][keep],
+                      fwd[keep], np.full(int(keep.sum()), len(symbols), dtype=np.int16), t15[keep]))
+        symbols.append(s)
+    if not parts:
+        raise ValueError("Không có symbol nào đủ dữ liệu")
+    cols = [np.concatenate(c) for c in zip(*parts)]
+    return ScoreCache(*cols, symbols=symbols, horizon=horizon)
+
+class SearchSpace:
+    """
+    Tham số phẳng: "M15.<PHIẾU>", "H1.<PHIẾU>", "thresholds.M15", "thresholds.H1".
+    H1 chỉ tối ưu các phiếu đang có trong weights_sets.H1 (run_once lọc map H1 theo các key này).
+    """
+    def __init__(self, cfg, m15_keys: Optional[Iterable[str]] = None, h1_keys: Optional[Iterable[str]] = None,
+                 w_max: float = 3.0, th_m15=(4.0, 16.0), th_h1=(2.0, 10.0)):
+        wsets = cfg.get("weights_sets") or {}
+        th = cfg.get("thresholds") or {}
+        self.m15_keys = [_normalize_key(k) for k in (m15_keys or VOTE_KEYS)]
+        self.h1_keys = [_normalize_key(k) for k in (h1_keys or wsets.get("H1", {}))]
+        self.bounds = {f"M15.{k}": (0.0, w_max) for k in self.m15_keys}
+        self.bounds.update({f"H1.{k}": (0.0, w_max) for k in self.h1_keys})
+        self.bounds["thresholds.M15"] = tuple(th_m15)
+        self.bounds["thresholds.H1"] = tuple(th_h1)
+        # Điểm xuất phát = config hiện tại (phiếu M15 vắng mặt dùng trọng số mặc định như tally_votes)
+        w15 = CompiledWeights(wsets.get("M15", {})).wmap
+        w1 = {_normalize_key(k): float(v) for k, v in (wsets.get("H1", {}) or {}).items()}
+        self.base = {f"M15.{k}": w15.get(k, 1.0) for k in self.m15_keys}
+        self.base.update({f"H1.{k}": w1.get(k, 0.0) for k in self.h1_keys})
+        self.base["thresholds.M15"] = float(th.get("M15", 11.0))
+        self.base["thresholds.H1"] = float(th.get("H1", 8.0))
+        self.names = list(self.bounds)
+        # Tên phiếu ghi ra profile: giữ cách viết trong config (map H1 được lọc theo tên upper-case)
+        self.labels = {_normalize_key(n): n for n in VOTE_INDICATORS}
+        for tf in ("M15", "H1"):
+            self.labels.update({(tf, _normalize_key(k)): k for k in (wsets.get(tf, {}) or {})})
+
+    def sample(self, rng: np.random.Generator, zero_prob: float = 0.2) -> Dict[str, float]:
+        p = {}
+        for k, (lo, hi) in self.bounds.items():
+            v = rng.uniform(lo, hi)
+            if not k.startswith("thresholds.") and rng.random() < zero_prob:
+                v = 0.0
+            p[k] = round(float(v), 2)
+        return p
+
+    def clip(self, p: Dict[str, float]) -> Dict[str, float]:
+        return {k: round(float(min(max(p[k], self.bounds[k][0]), self.bounds[k][1])), 2) for k in self.names}
+
+    def _label(self, tf, key):
+        return self.labels.get((tf, key), self.labels.get(key, key))
+
+    def to_profile(self, p: Dict[str, float]) -> Dict:
+        """Profile overlay cho config.json (weights_sets thay cả dict M15/H1 + thresholds)."""
+        return {
+            "weights_sets": {
+                "M15": {self._label("M15", k): p[f"M15.{k}"] for k in self.m15_keys},
+                "H1": {self._label("H1", k): p[f"H1.{k}"] for k in self.h1_keys},
+            },
+            "thresholds": {"M15": p["thresholds.M15"], "H1": p["thresholds.H1"]},
+        }
+
+    def matrices(self, cands: List[Dict[str, float]]):
+        """(W15 (K, C), WH1 (K, C), th15 (C,), thh1 (C,)) theo cột VOTE_KEYS."""
+        w15 = np.zeros((len(VOTE_KEYS), len(cands)))
+        wh1 = np.zeros((len(VOTE_KEYS), len(cands)))
+        for c, p in enumerate(cands):
+            for k in self.m15_keys:
+                w15[VOTE_KEYS.index(k), c] = p[f"M15.{k}"]
+            for k in self.h1_keys:
+                wh1[VOTE_KEYS.index(k), c] = p[f"H1.{k}"]
+        th15 = np.array([p["thresholds.M15"] for p in cands])
+        thh1 = np.array([p["thresholds.H1"] for p in cands])
+        return w15, wh1, th15, thh1
+
+def _side_scores(d, w_c):
+    """
+    (side (n, C) int8, điểm theo hướng (n, C)) như decide_side(tally_votes(...)).
+    w_c: trọng số đơn vị 0.01 (số nguyên) -> tổng float32 chính xác tuyệt đối; chỉ các nến chênh
+    đúng 0.1 mới so lại trên float đã làm tròn 2 số lẻ như tally_votes.
+    """
+    sl = (d > 0).astype(np.float32) @ w_c
+    ss = (d < 0).astype(np.float32) @ w_c
+    diff = sl - ss
+    side = (np.sign(diff) * (np.abs(diff) > 10)).astype(np.int8)
+    edge = np.abs(diff) == 10
+    if edge.any():
+        e = sl[edge].astype(np.float64) / 100 - ss[edge].astype(np.float64) / 100
+        side[edge] = np.where(e > 0.1, 1, np.where(e < -0.1, -1, 0))
+    return side, np.where(side > 0, sl, np.where(side < 0, ss, np.float32(0)))
+
+def evaluate(cache: ScoreCache, w15, wh1, th15, thh1, cost_bps: float = 8.0, min_signals: int = 30) -> List[Dict]:
+    """Chỉ số cho từng cột ứng viên (C cột của W15/WH1)."""
+    c15 = np.round(np.asarray(w15) * 100).astype(np.float32)
+    ch1 = np.round(np.asarray(wh1) * 100).astype(np.float32)
+    s15, sc15 = _side_scores(np.asarray(cache.d15), c15)
+    s1, sc1 = _side_scores(np.asarray(cache.dh1), ch1)
+    passed = (s15 == s1) & (s15 != 0) & (sc15 >= np.round(np.asarray(th15) * 100)) & (sc1 >= np.round(np.asarray(thh1) * 100))
+    fwd = np.asarray(cache.fwd)
+    cost = cost_bps / 1e4
+    out = []
+    for c in range(c15.shape[1]):
+        m = passed[:, c]
+        r = s15[m, c] * fwd[m] - cost
+        n = len(r)
+        mean = float(r.mean()) if n else 0.0
+        std = float(r.std()) if n > 1 else 0.0
+        score = mean / std * np.sqrt(n) if n >= min_signals and std > 0 else float("-inf")
+        out.append({"score": float(score), "signals": n, "mean_ret": mean,
+                    "hit_rate": float((r > 0).mean()) if n else 0.0})
+    return out
+
+# ---- Worker: cache được mở memmap một lần cho mỗi tiến trình ----
+_WORKER = {}
+
+def _init_worker(cache_path, space, cost_bps, min_signals):
+    _WORKER.update(cache=ScoreCache.load(cache_path), space=space, cost_bps=cost_bps, min_signals=min_signals)
+
+def _eval_chunk(cands):
+    w = _WORKER
+    return evaluate(w["cache"], *w["space"].matrices(cands), cost_bps=w["cost_bps"], min_signals=w["min_signals"])
+
+class Optimizer:
+    """Chấm ứng viên theo lô `batch` trên process pool (processes=0: chạy tại chỗ)."""
+    def __init__(self, cache_path: str, space: SearchSpace, processes: Optional[int] = None,
+                 cost_bps: float = 8.0, min_signals: int = 30, batch: int = 16):
+        self.space = space
+        self.batch = int(batch)
+        self.history: List[Dict] = []
+        args = (cache_path, space, cost_bps, min_signals)
+        if processes == 0:
+            _init_worker(*args)
+            self.pool = None
+        else:
+            self.pool = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=args)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def evaluate(self, cands: List[Dict[str, float]]) -> List[Dict]:
+        chunks = [cands[i:i + self.batch] for i in range(0, len(cands), self.batch)]
+        results = map(_eval_chunk, chunks) if self.pool is None else self.pool.map(_eval_chunk, chunks)
+        out = [{"params": p, **m} for chunk, res in zip(chunks, results) for p, m in zip(chunk, res)]
+        self.history.extend(out)
+        return out
+
+    def best(self) -> Optional[Dict]:
+        return max(self.history, key=lambda r: r["score"], default=None)
+
+    # ---- Chiến lược tìm kiếm ----
+    def random_search(self, n: int = 1000, seed: int = 0) -> Dict:
+        rng = np.random.default_rng(seed)
+        self.evaluate([self.space.base] + [self.space.sample(rng) for _ in range(n)])
+        return self.best()
+
+    def grid_search(self, grid: Dict[str, List[float]]) -> Dict:
+        """grid: {tham số: [giá trị]}; tham số không có trong grid giữ theo config gốc."""
+        keys = list(grid)
+        cands = [self.space.clip({**self.space.base, **dict(zip(keys, vals))})
+                 for vals in itertools.product(*(grid[k] for k in keys))]
+        self.evaluate(cands)
+        return self.best()
+
+    def coordinate_descent(self, start: Optional[Dict[str, float]] = None, steps=(-1.0, -0.5, -0.25, 0.25, 0.5, 1.0),
+                           rounds: int = 5) -> Dict:
+        """
+        Lần lượt từng tham số: thử mọi bước (một lô song song), giữ giá trị tốt nhất; dừng khi một vòng
+        không cải thiện. Mặc định xuất phát từ ứng viên tốt nhất đã chấm (hoặc config gốc).
+        """
+        if start is None:
+            best = self.best()
+            start = best["params"] if best is not None and best["score"] > float("-inf") else self.space.base
+        cur = self.evaluate([self.space.clip(start)])[0]
+        for _ in range(rounds):
+            improved = False
+            for k in self.space.names:
+                cands = [self.space.clip({**cur["params"], k: cur["params"][k] + s}) for s in steps]
+                cands = [c for c in cands if c[k] != cur["params"][k]]
+                if not cands:
+                    continue
+                top = max(self.evaluate(cands), key=lambda r: r["score"])
+                if top["score"] > cur["score"]:
+                    cur, improved = top, True
+            if not improved:
+                break
+        return cur
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("cmd", choices=("build", "search"))
+    ap.add_argument("--config", default="config.json")
+    ap.add_argument("--cache", default="opt_cache")
+    ap.add_argument("--symbols", nargs="*", help="mặc định: config.symbols")
+    ap.add_argument("--root", default="data/candles", help="thư mục CandleStore")
+    ap.add_argument("--horizon", type=int, default=4, help="số nến M15 tính lợi nhuận tương lai")
+    ap.add_argument("--method", choices=("random", "grid", "cd"), default="random")
+    ap.add_argument("--n", type=int, default=1000, help="số ứng viên random (cd: số ứng viên random chọn điểm xuất phát)")
+    ap.add_argument("--grid", help='JSON {"thresholds.M15": [9, 11, 13], ...}')
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("-j", "--processes", type=int, default=None)
+    ap.add_argument("--cost-bps", type=float, default=8.0)
+    ap.add_argument("--min-signals", type=int, default=30)
+    ap.add_argument("--write", metavar="PROFILE", help="ghi kết quả tốt nhất vào config.profiles.<PROFILE>")
+    args = ap.parse_args()
+    with open(args.config, encoding="utf-8") as f:
+        cfg = json.load(f)
+
+    if args.cmd == "build":
+        t0 = time.perf_counter()
+        cache = build_score_cache(load_history(args.symbols or cfg.get("symbols", []), args.root, ("15m", "1h")), cfg, args.horizon)
+        cache.save(args.cache)
+        print(f"[OPT] cache {len(cache)} nến × {len(VOTE_KEYS)} phiếu -> {args.cache} ({time.perf_counter() - t0:.1f}s)")
+        return
+
+    space = SearchSpace(cfg)
+    t0 = time.perf_counter()
+    with Optimizer(args.cache, space, args.processes, args.cost_bps, args.min_signals) as opt:
+        base = opt.evaluate([space.base])[0]
+        if args.method == "random":
+            best = opt.random_search(args.n, args.seed)
+        elif args.method == "grid":
+            best = opt.grid_search(json.loads(args.grid or '{"thresholds.M15": [9, 10, 11, 12, 13], "thresholds.H1": [6, 7, 8, 9]}'))
+        else:
+            if args.n:
+                opt.random_search(args.n, args.seed)
+            best = opt.coordinate_descent()
+        print(f"[OPT] {args.method}: {len(opt.history)} ứng viên | {time.perf_counter() - t0:.1f}s")
+    print(f"[OPT] config hiện tại: score={base['score']:.3f} n={base['signals']} | tốt nhất: score={best['score']:.3f} n={best['signals']} hit={best['hit_rate']:.2%}")
+    profile = space.to_profile(best["params"])
+    print(json.dumps(profile, ensure_ascii=False))
+    if args.write:
+        write_profile(args.config, args.write, profile)
+        print(f"[OPT] đã ghi profiles.{args.write} vào {args.config}")
+
+if __name__ == "__main__":
+    main()